@@ -18,6 +18,7 @@ Send bug reports to Invisigoth or Metr0.
 
 """
 # Copyright (C) 2007 Invisigoth - See LICENSE file for details
+import struct
 import logging
 
 from stat import *
@@ -213,7 +214,177 @@ class Elf64Section(ElfSection, vs_elf.Elf64Section):
         vs_elf.Elf64Section.__init__(self, bigend=bigend)
         ElfSection.__init__(self)
 
+class ElfRecords:
+    '''
+    A table of fixed size Elf records (symbols, relocations) unpacked in
+    bulk from a single buffer.  The field values are available as columns
+    (tuples) and the record objects are only built (and their names
+    resolved using the namer callback) when they're asked for.
+
+    Example:
+        recs = ElfRecords(Elf64Symbol, False, symtabbytes)
+        for value in recs.columns['st_value']:
+            dostuff()
+
+        sym = recs.getRecord(10)
+    '''
+    def __init__(self, cls, bigend, bytez, entsize=None, namer=None):
+        self.cls = cls
+        self.bigend = bigend
+        self.bytez = bytez
+        self.namer = namer
+
+        rec = cls(bigend=bigend)
+        rec._vsInitFastFields()
+        fmt = rec._vs_fastfmt
+        if entsize is None:
+            entsize = rec._vs_fastlen
+
+        if entsize < rec._vs_fastlen:
+            raise Exception('Invalid %s Entry Size: %d' % (cls.__name__, entsize))
+
+        self.entsize = entsize
+        self.count = len(bytez) // entsize
+
+        recfmt = fmt[1:] + 'x' * (entsize - rec._vs_fastlen)
+        values = struct.unpack_from(fmt[0] + recfmt * self.count, bytez)
+
+        fields = rec._vs_fields
+        nfields = len(fields)
+        self._cols = [(fname, values[i::nfields]) for i, fname in enumerate(fields)]
+        self.columns = dict(self._cols)
+
+        self._recs = [None] * self.count
+
+    def __len__(self):
+        return self.count
+
+    def getRecord(self, idx):
+        '''
+        Return the (cached) record object at the given index.
+        '''
+        rec = self._recs[idx]
+        if rec is None:
+            rec = self.cls(bigend=self.bigend)
+            # (the same as a fast vsParse() of the record bytes)
+            fields = rec._vs_values
+            for fname, col in self._cols:
+                fields[fname].vsSetValue(col[idx])
+
+            if self.namer is not None:
+                rec.setName(self.namer(self, idx))
+            self._recs[idx] = rec
+        return rec
+
+    def getName(self, idx):
+        '''
+        Return the name of the record at the given index (without building
+        the record object).
+        '''
+        rec = self._recs[idx]
+        if rec is not None:
+            return rec.getName()
+        if self.namer is None:
+            return ''
+        return self.namer(self, idx)
+
+    def getValue(self, idx, fname):
+        '''
+        Return the value of the field fname for the record at the given
+        index (without building the record object).
+        '''
+        return self.columns[fname][idx]
+
+class ElfTable(object):
+    '''
+    A list-like view of Elf records (symbols, relocations) which may be
+    backed by ElfRecords tables.  Records from an ElfRecords are not built
+    until they are accessed, so walking a table for a few entries (or by
+    name) is cheap.
+
+    Record objects may also be added directly using append()/extend().
+    '''
+    def __init__(self, recs=()):
+        # either a record object or a (ElfRecords, index) tuple
+        self._slots = list(recs)
+        # are there (possibly) any records left to build?
+        self._lazy = True
+
+    def addRecords(self, recs, idxs=None):
+        '''
+        Add (lazy) entries for the records in an ElfRecords table (or only
+        the given indexes into it).
+        '''
+        if idxs is None:
+            idxs = xrange(len(recs))
+        self._slots.extend([(recs, i) for i in idxs])
+        self._lazy = True
+
+    def append(self, rec):
+        self._slots.append(rec)
+
+    def extend(self, recs):
+        self._slots.extend(recs)
+
+    def getName(self, idx):
+        '''
+        Return the name of the record at the given index (without building
+        the record object).
+        '''
+        slot = self._slots[idx]
+        if slot.__class__ is tuple:
+            return slot[0].getName(slot[1])
+        return slot.getName()
+
+    def getValue(self, idx, fname):
+        '''
+        Return the value of the field fname for the record at the given
+        index (without building the record object).
+        '''
+        slot = self._slots[idx]
+        if slot.__class__ is tuple:
+            return slot[0].getValue(slot[1], fname)
+        return getattr(slot, fname)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ElfTable(self._slots[idx])
+
+        slot = self._slots[idx]
+        if slot.__class__ is tuple:
+            slot = slot[0].getRecord(slot[1])
+            self._slots[idx] = slot
+        return slot
+
+    def __iter__(self):
+        if not self._lazy:
+            return iter(self._slots)
+        return self._iterLazy()
+
+    def _iterLazy(self):
+        slots = self._slots
+        count = len(slots)
+        for i in xrange(count):
+            slot = slots[i]
+            if slot.__class__ is tuple:
+                slot = slots[i] = slot[0].getRecord(slot[1])
+            yield slot
+
+        # everything is built now (unless the table grew while we were
+        # at it), so plain list iteration will do
+        self._lazy = len(slots) != count
+
+    def __repr__(self):
+        return 'ElfTable(%d records)' % len(self._slots)
+
 class Elf(vs_elf.Elf32, vs_elf.Elf64):
+
+    # dynamic symbols are read/unpacked this many at a time
+    dynsym_chunk = 1024
+
     def __init__(self, fd, inmem=False):
         '''
         Parse data from 'fd' and create an Elf object.
@@ -272,15 +443,18 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         self.pheaders = []
         self.sections = []
         self.secnames = {}
-        self.symbols  = []
-        self.relocs   = []
+        self.symbols  = ElfTable()
+        self.relocs   = ElfTable()
         self.relocvas = []
-        self.symbols_by_name = {}
+        self.symbols_by_name = {}     # populated on first lookupSymbol*()
         self.symbols_by_addr = {}
         self.dynamics = []      # deprecated - 2019-10-21
-        self.dynamic_symbols = []
+        self.dynamic_symbols = ElfTable()
         self.dynstrtabmeta = (None, None)
         self.dynstrtab = []
+        self._dynstrbytes = None
+        self._strtabs = {}
+        self._symindexed = 0
         self.dynsymtabct = None     # populated by _parseDynStrs()
         logger.info('self._parsePheaders')
         self._parsePheaders()
@@ -397,28 +571,28 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
 
         # only parse the symbols that are not already accounted for.
         # symbols are ordered, so existence of index Y is always the same
-        sym = self._cls_symbol(bigend=self.bigend)
-        count = len(symtab) / len(sym)
+        recs = ElfRecords(self._cls_symbol, self.bigend, symtab, namer=self._nameDynSecSymbol)
+        count = len(recs)
         diff = count - len(self.dynamic_symbols)
-        if diff == 0:
+        if diff <= 0:
             return
 
-        offset = len(self.dynamic_symbols) * len(sym)
-
-        syms = sym * diff
-        vstruct.VArray(elems=syms).vsParse(symtab[offset:], fast=True)
+        offset = len(self.dynamic_symbols) * recs.entsize
 
         logger.warn("_parseDynSymsFromSections:  current_count: %d\tdiff: %d\toffset: %d\t", count, diff, offset)
-        for sym in syms:
-            if not sym.st_name:
+        stnames = recs.columns['st_name']
+        for i in xrange(len(self.dynamic_symbols), count):
+            if not stnames[i]:
                 continue
-            name = self.getStrtabString(sym.st_name, ".dynstr")
-            sym.setName(name)
 
+            sym = recs.getRecord(i)
             if sym in self.dynamic_symbols:
                 continue
             self.dynamic_symbols.append(sym)
 
+    def _nameDynSecSymbol(self, recs, idx):
+        return self.getStrtabString(recs.columns['st_name'][idx], ".dynstr")
+
     def _parseDynamicsFromSections(self):
         '''
         if by some strange chance, the DYNAMCS PHDR doesn't exist but we have this section...
@@ -497,6 +671,7 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         strtabbytes = self.readAtRva(dynstrtab, strsz)
 
         self.dynstrtabmeta = (dynstrtab, strsz)
+        self._dynstrbytes = strtabbytes
         self.dynstrtab = strtabbytes.split('\0')
 
         # since our string table should certainly end in '\0', we'll have an empty string
@@ -546,25 +721,55 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         if symtabrva is None:
             return
 
-        dsoff = 0
-        while True:
-            syment = self.readAtRva(symtabrva + dsoff, symsz)
-            sym = self._cls_symbol(bigend=self.bigend)
-            sym.vsParse(syment)
-            if sym.st_info & 0xf not in st_info_type:
-                break
+        # the symbol table runs until the first entry that doesn't look like
+        # a symbol, so read and unpack it a chunk at a time until we find it
+        offset = self.rvaToOffset(symtabrva)
+        pgm = self._getRvaPheader(symtabrva)
+        maxoff = pgm.p_offset + pgm.p_memsz
 
-            if sym.st_info >> 4 not in st_info_bind:
+        strlen = None
+        if self.dynstrtabmeta != (None, None):
+            strlen = len(self._dynstrbytes)
+
+        chunks = []
+        count = 0
+        while offset < maxoff:
+            chunk = self.readAtOffset(offset, min(symsz * self.dynsym_chunk, maxoff - offset))
+            recs = ElfRecords(self._cls_symbol, self.bigend, chunk, entsize=symsz)
+            if not len(recs):
                 break
 
-            name = self.getDynStrtabString(sym.st_name)
-            if name is None:
+            valid = self._countDynSyms(recs, strlen)
+            chunks.append(chunk[:valid * symsz])
+            count += valid
+            if valid != len(recs):
                 break
 
-            sym.setName(name)
-            self.dynamic_symbols.append(sym)
+            offset += len(chunk)
+
+        recs = ElfRecords(self._cls_symbol, self.bigend, ''.join(chunks), entsize=symsz,
+                          namer=self._nameDynSymbol)
+        self.dynamic_symbols.addRecords(recs)
+
+    def _countDynSyms(self, recs, strlen):
+        '''
+        Return the number of leading entries in the given ElfRecords which
+        look like valid dynamic symbols.
+        '''
+        for i, (info, stname) in enumerate(zip(recs.columns['st_info'], recs.columns['st_name'])):
+            if info & 0xf not in st_info_type:
+                return i
+
+            if info >> 4 not in st_info_bind:
+                return i
 
-            dsoff += symsz
+            if strlen is not None and stname > strlen:
+                return i
+
+        return len(recs)
+
+    def _nameDynSymbol(self, recs, idx):
+        return self.getDynStrtabString(recs.columns['st_name'][idx])
 
     # FIXME: wrap in VERDEF and SYMINFO into the analysis.
     def _parseSectionSymbols(self):
@@ -573,21 +778,15 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         """
         for sec in self.sections:
             if sec.sh_type == SHT_SYMTAB:
-                sym = self._cls_symbol(bigend=self.bigend)
                 symtab = self.readAtOffset(sec.sh_offset, sec.sh_size)
+                recs = ElfRecords(self._cls_symbol, self.bigend, symtab, namer=self._nameSectionSymbol)
+                self.symbols.addRecords(recs)
 
-                count, remain = divmod(sec.sh_size, len(sym))
-                syms = sym * count
-
-                vstruct.VArray(elems=syms).vsParse(symtab, fast=True)
-
-                for sym in syms:
-                    if sym.st_name:
-                        name = self.getStrtabString(sym.st_name, ".strtab")
-                        sym.setName(name)
-                    # logger.info('SHT_SYMTAB: %r', sym)
-
-                    self.addSymbol(sym)
+    def _nameSectionSymbol(self, recs, idx):
+        stname = recs.columns['st_name'][idx]
+        if not stname:
+            return ''
+        return self.getStrtabString(stname, ".strtab")
 
     def _parseDynRelocs(self):
         """
@@ -612,25 +811,33 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
             self._doDynRelocs(jmprel, pltrelsz, cls)
 
     def _doDynRelocs(self, rva, relsz, cls=None):
-        syms = self.getDynSyms()
-
         if cls is None:
             cls = self._cls_reloc
 
-        reloc = cls(bigend=self.bigend)
         relbytes = self.readAtRva(rva, relsz)
-        count, remain = divmod(relsz, len(reloc))
+        recs = ElfRecords(cls, self.bigend, relbytes, namer=self._nameDynReloc)
+        if not len(recs):
+            return
 
-        relocs = reloc * count
-        vstruct.VArray(elems=relocs).vsParse(relbytes,fast=True)
+        # make sure the dynamic symbols table covers the relocs (this may
+        # grow it, see getDynSymbol())
+        symidx = self._getRelocSymIndex(max(recs.columns['r_info']))
+        if self.dynsymtabct is not None and self.dyns.get(DT_SYMTAB) is not None:
+            self.getDynSymbol(symidx)
 
-        for reloc in relocs:
-            index = reloc.getSymTabIndex()
-            sym = self.getDynSymbol(index)
-            if sym is not None:
-                reloc.setName( sym.getName() )
-            self.relocs.append(reloc)
-            self.relocvas.append(reloc.r_offset)
+        self.relocs.addRecords(recs)
+        self.relocvas.extend(recs.columns['r_offset'])
+
+    def _getRelocSymIndex(self, info):
+        if self.bits == 64:
+            return info >> 32
+        return info >> 8
+
+    def _nameDynReloc(self, recs, idx):
+        symidx = self._getRelocSymIndex(recs.columns['r_info'][idx])
+        if symidx >= len(self.dynamic_symbols):
+            return ''
+        return self.dynamic_symbols.getName(symidx)
 
     def _parseSectionRelocs(self):
         """
@@ -645,6 +852,7 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         jmprel, pltrel, pltrelsz = self.getDynPltRelInfo()
         dynrels = (rel, rela, jmprel)
 
+        relocvas = set(self.relocvas)
         for sec in self.sections:
             if sec.sh_type not in (SHT_REL, SHT_RELA):
                 continue
@@ -656,27 +864,32 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
             if sec.sh_type == SHT_RELA:
                 reloccls = self._cls_reloca
 
+            # reloc names come from the dynamic symbols we know of *now*
+            namer = self._getSectionRelocNamer(len(self.dynamic_symbols))
+
             secbytes = self.readAtOffset(sec.sh_offset, sec.sh_size)
-            reloc = reloccls(bigend=self.bigend)
-            count, remain = divmod(len(secbytes), len(reloc))
+            recs = ElfRecords(reloccls, self.bigend, secbytes, namer=namer)
 
-            relocs = reloc * count
-            vstruct.VArray(elems=relocs).vsParse(secbytes, fast=True)
+            idxs = []
+            for i, r_offset in enumerate(recs.columns['r_offset']):
+                if r_offset in relocvas:
+                    logger.debug('duplicate relocation (section): 0x%x', r_offset)
+                    continue
 
-            for reloc in relocs:
-                index = reloc.getSymTabIndex()
-                if index < len(self.dynamic_symbols):
-                    sym = self.dynamic_symbols[index]
-                    reloc.setName( sym.getName() )
+                logger.info('section reloc: 0x%x', r_offset)
+                idxs.append(i)
+                relocvas.add(r_offset)
+                self.relocvas.append(r_offset)
 
-                if reloc.r_offset in self.relocvas:
-                    # FIXME: This line is hit sever tens of thousands of times during parsing
-                    logger.debug('duplicate relocation (section): %s', reloc)
-                    continue
+            self.relocs.addRecords(recs, idxs)
 
-                logger.info('section reloc: %s', reloc)
-                self.relocs.append(reloc)
-                self.relocvas.append(reloc.r_offset)
+    def _getSectionRelocNamer(self, symcount):
+        def namer(recs, idx):
+            symidx = self._getRelocSymIndex(recs.columns['r_info'][idx])
+            if symidx < symcount:
+                return self.dynamic_symbols.getName(symidx)
+            return ''
+        return namer
 
     def getBaseAddress(self):
         """
@@ -724,6 +937,18 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         '''
         Convert an RVA for this ELF binary to a file offset.
         '''
+        pgm = self._getRvaPheader(rva)
+        if pgm is None:
+            raise Exception('rvaToOffset: rva 0x%x is not in a PT_LOAD segment' % rva)
+
+        # We are inside this pgrm header!
+        return pgm.p_offset + (rva - pgm.p_vaddr)
+
+    def _getRvaPheader(self, rva):
+        '''
+        Return the PT_LOAD program header which contains the given RVA
+        (or None).
+        '''
         baseaddr = 0
         #if self.isPreLinked() or not self.isSharedObject():
         #if not self.isSharedObject():
@@ -738,11 +963,8 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
                 continue
             if rva >= phrva+pgm.p_memsz:
                 continue
-            # We are inside this pgrm header!
-            rvaoff = rva - phrva
-            return pgm.p_offset + rvaoff
+            return pgm
 
-        raise ('omg', hex(rva))
         return None
 
     def readAtOffset(self, off, size):
@@ -808,8 +1030,11 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         return self.readAtOffset(sec.sh_offset, sec.sh_size)
 
     def getStrtabString(self, offset, section=".strtab"):
-        sec = self.getSection(section)
-        bytes = self.readAtOffset(sec.sh_offset, sec.sh_size)
+        bytes = self._strtabs.get(section)
+        if bytes is None:
+            sec = self.getSection(section)
+            bytes = self._strtabs[section] = self.readAtOffset(sec.sh_offset, sec.sh_size)
+
         index = bytes.find("\x00", offset)
         return bytes[offset:index]
 
@@ -873,8 +1098,11 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
     def getRelocs(self):
         '''
         Get the list of relocations.
+
+        NOTE: this is a (lazy) ElfTable copy, the relocation objects are
+              only built as they are accessed.
         '''
-        return list(self.relocs)
+        return self.relocs[:]
 
     def isPreLinked(self):
         '''
@@ -961,6 +1189,7 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         a long representing the address for the given symbol. Or None if
         it's not found.
         """
+        self._indexSymbols()
         return self.symbols_by_name.get(name, None)
 
     def lookupSymbolAddr(self, address):
@@ -968,6 +1197,7 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         lookup symbols from this elf binary by address.
         This returns the name for the given symbol or None for not found
         """
+        self._indexSymbols()
         return self.symbols_by_addr.get(address, None)
 
     def getPheaders(self):
@@ -982,8 +1212,18 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
         These symbols are from ELF Sections of type SHT_SYMTAB
         '''
         self.symbols.append(symbol)
-        self.symbols_by_name[symbol.getName()] = symbol
-        self.symbols_by_addr[symbol.st_value] = symbol
+
+    def _indexSymbols(self):
+        '''
+        Update symbols_by_name and symbols_by_addr with any symbols added
+        since the last update.  (Building these means building all the
+        symbol objects, so it's put off until the first lookup)
+        '''
+        for i in xrange(self._symindexed, len(self.symbols)):
+            symbol = self.symbols[i]
+            self.symbols_by_name[symbol.getName()] = symbol
+            self.symbols_by_addr[symbol.st_value] = symbol
+        self._symindexed = len(self.symbols)
 
     def getSymbols(self):
         '''
@@ -1061,8 +1301,11 @@ class Elf(vs_elf.Elf32, vs_elf.Elf64):
             logger.info("no dyn strtabs!")
             return ''
 
-        dynstrtabva, strsz = self.dynstrtabmeta
-        strings = self.readAtRva(dynstrtabva, strsz)
+        strings = self._dynstrbytes
+        if strings is None:
+            dynstrtabva, strsz = self.dynstrtabmeta
+            strings = self._dynstrbytes = self.readAtRva(dynstrtabva, strsz)
+
         strend = strings.find('\0', stroff)
         if stroff > len(strings):
             return None
@@ -1,28 +1,66 @@
+'''
+Find (possibly XOR encoded) PEs embedded in a buffer or file.
+
+Candidates are found for single byte keys by the MZ magic (for any key the
+two encoded bytes XOR to 'M' ^ 'Z') and for short multi byte keys by
+assuming the (almost always zero) reserved words at 0x20 in the DOS header
+hold the key itself.  Each candidate is then checked for a "PE" signature
+at its decoded e_lfanew.  With numpy, every candidate in a block of the
+buffer is found and checked at once.
+'''
+import os
 import sys
+import mmap
 import struct
 import argparse
 
 from io import StringIO
-from itertools import cycle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import PE
 
+# XOR lookup tables for str.translate (one per key byte)
+xortables = [bytes(bytearray([x ^ i for x in range(256)])) for i in range(256)]
+
+# the multi byte key lengths tried by default (the key must divide 0x20)
+XOR_KEYLENS = (1, 2, 4)
+
+# how much of the buffer to check at once
+CARVE_BLOCK = 0x1000000
+
 
 def xorbytes(data, key):
-    return ''.join(chr(ord(x) ^ ord(y)) for (x, y) in zip(data, cycle(key)))
+    key = bytearray(key)
+    if len(key) == 1:
+        return data.translate(xortables[key[0]])
+
+    ret = bytearray(data)
+    for i, k in enumerate(key):
+        ret[i::len(key)] = data[i::len(key)].translate(xortables[k])
+    return bytes(ret)
 
 
 def xorstatic(data, i):
-    return ''.join(chr(ord(c) ^ i) for c in data)
+    return data.translate(xortables[i])
 
 
-mz_xor = [(xorstatic('MZ', i), xorstatic('PE', i), i) for i in range(256)]
+mz_xor = [(xorstatic(b'MZ', i), xorstatic(b'PE', i), i) for i in range(256)]
 
 
 def carve(pbytes, offset=0):
     '''
-    Return a list of (offset, size, xor) tuples of embedded PEs
+    Yield (offset, xor) tuples for the embedded PEs encoded with a single
+    byte XOR key.
     '''
+    if numpy is not None:
+        for off, key in carveXor(pbytes, offset, keylens=(1,)):
+            yield (off, bytearray(key)[0])
+        return
+
     pblen = len(pbytes)
     todo = [(pbytes.find(mzx, offset), mzx, pex, i) for mzx,pex,i in mz_xor]
     todo = [(off, mzx, pex, i) for (off,mzx,pex,i) in todo if off != -1]
@@ -50,6 +88,99 @@ def carve(pbytes, offset=0):
         if pbytes[ peoff : peoff + 2 ] == pex:
             yield (off, i)
 
+
+def carveXor(pbytes, offset=0, keylens=XOR_KEYLENS):
+    '''
+    Return a sorted list of (offset, xkey) tuples for the embedded PEs in
+    pbytes (a str/bytes, bytearray or mmap) encoded with an XOR key of any
+    of the given lengths.  Multi byte keys which repeat a shorter key are
+    only reported at the shorter length.
+
+    NOTE: without numpy only single byte keys are found.
+    '''
+    for keylen in keylens:
+        if keylen < 1 or 0x20 % keylen:
+            raise ValueError('invalid xor key length: %d' % keylen)
+
+    if numpy is None:
+        return [(off, bytes(bytearray([i]))) for off, i in sorted(carve(pbytes, offset))]
+
+    arr = numpy.frombuffer(pbytes, dtype=numpy.uint8)
+
+    ret = []
+    for keylen in keylens:
+        for start in range(offset, len(arr), CARVE_BLOCK):
+            ret.extend(_carveBlock(arr, start, start + CARVE_BLOCK, keylen))
+
+    ret.sort()
+    return ret
+
+
+def carveFile(filename, offset=0, keylens=XOR_KEYLENS):
+    '''
+    Carve the PEs from a file without reading it into memory (see carveXor).
+    '''
+    with open(filename, 'rb') as fd:
+        if os.fstat(fd.fileno()).st_size == 0:
+            return []
+
+        mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return carveXor(mm, offset, keylens)
+        finally:
+            mm.close()
+
+
+def _carveBlock(arr, start, end, keylen):
+    '''
+    Return the (offset, xkey) tuples for the PEs which start within
+    arr[start:end].
+    '''
+    # (the whole DOS header must be present)
+    end = min(end, len(arr) - 0x3f)
+    if end <= start:
+        return []
+
+    if keylen == 1:
+        head = arr[start:end + 1]
+        offs = numpy.flatnonzero((head[:-1] ^ head[1:]) == 0x4d ^ 0x5a) + start
+        keys = (arr[offs] ^ 0x4d).reshape(-1, 1)
+
+    else:
+        mmask = (arr[start:end] ^ arr[start + 0x20:end + 0x20]) == 0x4d
+        mmask &= (arr[start + 1:end + 1] ^ arr[start + 0x21:end + 0x21]) == 0x5a
+        offs = numpy.flatnonzero(mmask) + start
+        keys = arr[offs.reshape(-1, 1) + (0x20 + numpy.arange(keylen))]
+
+        # skip keys which are a shorter key repeated
+        short = numpy.zeros(len(offs), dtype=bool)
+        for step in range(1, keylen):
+            if keylen % step == 0:
+                short |= (keys[:, step:] == keys[:, :-step]).all(axis=1)
+        offs = offs[~short]
+        keys = keys[~short]
+
+    # decode e_lfanew
+    fidx = 0x3c + numpy.arange(4)
+    lfanew = arr[offs.reshape(-1, 1) + fidx] ^ keys[:, fidx % keylen]
+    lfanew = (lfanew.astype(numpy.int64) << numpy.arange(0, 32, 8)).sum(axis=1)
+
+    peoffs = offs + lfanew
+    mask = peoffs + 2 <= len(arr)
+    offs = offs[mask]
+    keys = keys[mask]
+    lfanew = lfanew[mask]
+    peoffs = peoffs[mask]
+
+    # and check for the PE signature
+    fidx = lfanew.reshape(-1, 1) + numpy.arange(2)
+    rows = numpy.arange(len(offs)).reshape(-1, 1)
+    sig = arr[peoffs.reshape(-1, 1) + numpy.arange(2)] ^ keys[rows, fidx % keylen]
+    mask = (sig[:, 0] == 0x50) & (sig[:, 1] == 0x45)
+
+    return [(int(off), key.tobytes()) for off, key in zip(offs[mask], keys[mask])]
+
+
 class CarvedPE(PE.PE):
 
     def __init__(self, fbytes, offset, xkey):
@@ -60,7 +191,12 @@ class CarvedPE(PE.PE):
 
     def readAtOffset(self, offset, size):
         offset += self.carved_offset
-        return xorbytes(self.fbytes[offset:offset+size], self.xorkey)
+        # (keep the key aligned to the start of the PE)
+        key = self.xorkey
+        if len(key) > 1:
+            idx = (offset - self.carved_offset) % len(key)
+            key = key[idx:] + key[:idx]
+        return xorbytes(self.fbytes[offset:offset+size], key)
 
     def getFileSize(self):
         ret = 0
@@ -73,16 +209,19 @@ def setup():
     desc = 'Output info about PEs embedded inside another PE'
     ap = argparse.ArgumentParser('PE.carve', description=desc)
     ap.add_argument('file', help='Path to PE file')
+    ap.add_argument('-k', '--keylen', type=int, action='append',
+                    help='XOR key length to search for (default: %s)' % ', '.join(map(str, XOR_KEYLENS)))
     return ap
 
 
 def main(argv):
     opts = setup().parse_args(argv)
+    keylens = opts.keylen or XOR_KEYLENS
     with open(opts.file, 'rb') as fd:
-        fbytes = fd.read()
-        for offset, i in carve(fbytes):
-            print('OFFSET: %d (xor: %d)' % (offset, i))
-            p = CarvedPE(fbytes, offset, chr(i))
+        fbytes = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        for offset, xkey in carveXor(fbytes, keylens=keylens):
+            print('OFFSET: %d (xor: %s)' % (offset, ' '.join('%d' % k for k in bytearray(xkey))))
+            p = CarvedPE(fbytes, offset, xkey)
             print('SIZE: %d' % p.getFileSize())
 
 
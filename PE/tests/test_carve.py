@@ -0,0 +1,58 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import PE.carve as pe_carve
+
+# just enough of a PE to be found by carving
+pehdr = b'MZ' + b'\x00' * 0x3a + struct.pack('<I', 0x80) + b'\x00' * 0x40 + b'PE\x00\x00' + b'\x00' * 0x40
+
+
+def junk(size):
+    # (no MZ/PE by accident)
+    return b'\xcc' * size
+
+
+class PECarveTests(unittest.TestCase):
+
+    def setUp(self):
+        self.embeds = [
+            (0x100, b'\x00'),
+            (0x300, b'A'),
+            (0x500, b'\x12\x34'),
+            (0x700, b'ABCD'),
+        ]
+        buf = bytearray(junk(0x1000))
+        for off, key in self.embeds:
+            buf[off:off + len(pehdr)] = pe_carve.xorbytes(pehdr, key)
+        self.buf = bytes(buf)
+
+    def test_carve_xorbytes(self):
+        self.assertEqual(pe_carve.xorbytes(b'\x00\x01\x02\x03\x04', b'\x10'), b'\x10\x11\x12\x13\x14')
+        self.assertEqual(pe_carve.xorbytes(b'\x00\x01\x02\x03\x04', b'\x10\x20'), b'\x10\x21\x12\x23\x14')
+        self.assertEqual(pe_carve.xorstatic(b'MZ', 0x41), b'\x0c\x1b')
+
+    def test_carve_single(self):
+        found = sorted(pe_carve.carve(self.buf))
+        self.assertEqual(found, [(0x100, 0), (0x300, 0x41)])
+        self.assertEqual(sorted(pe_carve.carve(self.buf, 0x101)), [(0x300, 0x41)])
+
+    def test_carve_xor(self):
+        self.assertEqual(pe_carve.carveXor(self.buf), self.embeds)
+        self.assertEqual(pe_carve.carveXor(self.buf, keylens=(1,)), self.embeds[:2])
+        self.assertRaises(ValueError, pe_carve.carveXor, self.buf, keylens=(3,))
+
+        for off, key in self.embeds:
+            cpe = pe_carve.CarvedPE(self.buf, off, key)
+            self.assertEqual(cpe.readAtOffset(0, len(pehdr)), pehdr)
+            self.assertEqual(cpe.readAtOffset(0x81, 3), b'E\x00\x00')
+
+    def test_carve_file(self):
+        fd, fpath = tempfile.mkstemp()
+        try:
+            os.write(fd, self.buf)
+            os.close(fd)
+            self.assertEqual(pe_carve.carveFile(fpath), self.embeds)
+        finally:
+            os.unlink(fpath)
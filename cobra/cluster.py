@@ -4,12 +4,15 @@ Cobra's built in clustering framework
 """
 
 import gc
+import os
 import sys
 import time
+import heapq
 import struct
 import socket
 import logging
 import urllib2
+import itertools
 import traceback
 import threading
 import subprocess
@@ -30,6 +33,11 @@ import cobra.cluster
 cobra.cluster.getAndDoWork("%s", docode=%s)
 """
 
+batch_cmd = """
+import cobra.cluster
+cobra.cluster.getAndDoWorkBatch("%s", docode=%s, prefetch=%d)
+"""
+
 class InvalidInProgWorkId(Exception):
     def __init__(self, workid):
         Exception.__init__(self, "Work ID %d is not valid" % workid)
@@ -41,13 +49,14 @@ class ClusterWork(object):
     a proper module (and not __main__ to be able to use this
     in conjunction with cobra.dcode).
     """
-    def __init__(self, timeout=None):
+    def __init__(self, timeout=None, priority=0):
         object.__init__(self)
         self.id = None # Set by adding to the server
         self.server = None # Set by ClusterClient
         self.starttime = 0
         self.endtime = 0 # Both are set by worker before and after work()
         self.timeout = timeout
+        self.priority = priority # Higher priority work is handed out first
         self.touchtime = None
         self.excinfo = None # Will be exception traceback on work unit fail.
 
@@ -176,6 +185,45 @@ class VerboseCallback(ClusterCallback):
 
 import collections
 
+class WorkQueue:
+    """
+    A priority queue of ClusterWork objects which otherwise behaves like
+    the FIFO deque the ClusterServer has always used.  Work units with a
+    higher "priority" are handed out first, and work units of equal
+    priority are handed out in the order they were added.
+    """
+    def __init__(self):
+        self.heap = []
+        self.seqiter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        return (work for pri, seq, work in sorted(self.heap))
+
+    def append(self, work):
+        heapq.heappush(self.heap, (-work.priority, self.seqiter.next(), work))
+
+    def popleft(self):
+        if not self.heap:
+            raise IndexError('pop from an empty WorkQueue')
+        return heapq.heappop(self.heap)[2]
+
+    def remove(self, workid):
+        """
+        Remove (and return) the work unit with the given id or None.
+        """
+        for i, (pri, seq, work) in enumerate(self.heap):
+            if work.id == workid:
+                self.heap.pop(i)
+                heapq.heapify(self.heap)
+                return work
+        return None
+
+    def clear(self):
+        self.heap = []
+
 class ClusterServer:
 
     def __init__(self, name, maxsize=None, docode=False, bindsrc="", cobrad=None):
@@ -195,9 +243,17 @@ class ClusterServer:
         self.inprog = {}
         self.sharedfiles = {}
         self.maxsize = maxsize
-        self.queue = collections.deque()
+        self.queue = WorkQueue()
         self.qcond = threading.Condition()
-        self.widiter = iter(range(999999999))
+
+        # Per-worker prefetch windows (workerid -> deque of workids) for
+        # clients which use exchangeWork() and the owner of each dispatched
+        # work unit.  Work ids stolen from (or completed on behalf of) a
+        # worker are queued in revoked until that worker next checks in.
+        self.windows = {}
+        self.owners = {}
+        self.revoked = collections.defaultdict(set)
+        self.widiter = itertools.count()
 
         # Initialize a cobra daemon if needed
         if cobrad is None:
@@ -283,8 +339,40 @@ class ClusterServer:
 
     def __cleanWork(self, workid):
         # Used by done/timeout/etc to clea up an in
-        # progress work unit
-        return self.inprog.pop(workid, None)
+        # progress work unit (qcond is an RLock so callers
+        # which already hold it may call this too)
+        self.qcond.acquire()
+        try:
+            owner = self.owners.pop(workid, None)
+            if owner is not None:
+                window = self.windows.get(owner)
+                if window is not None and workid in window:
+                    window.remove(workid)
+            return self.inprog.pop(workid, None)
+        finally:
+            self.qcond.release()
+
+    def __stealWork(self, thief, count):
+        # Take up to count dispatched (but likely not yet started) work
+        # units from the tail of the fullest peer window.  The head of
+        # each window is assumed to be running and is never stolen.
+        victim = None
+        vlen = 1
+        for wid, window in self.windows.items():
+            if wid != thief and len(window) > vlen:
+                victim = wid
+                vlen = len(window)
+
+        if victim is None:
+            return []
+
+        ret = []
+        window = self.windows[victim]
+        for i in range(min(count, vlen // 2)):
+            workid = window.pop()
+            self.revoked[victim].add(workid)
+            ret.append(self.inprog[workid])
+        return ret
 
     def timerThread(self):
         # Internal function to monitor work unit time
@@ -368,26 +456,151 @@ class ClusterServer:
             self.callback.workAdded(self, work)
 
     def getWork(self):
+        """
+        Get the next work unit (or None if the queue is empty).
+        """
+        works = self.getWorkBatch(1)
+        if not works:
+            return None
+        return works[0]
 
-        self.qcond.acquire()
+    def getWorkBatch(self, count, workerid=None):
+        """
+        Get a list of up to count work units in priority order.
 
+        If workerid is specified, the work units are added to that worker's
+        prefetch window and, when the queue is empty, the worker may steal
+        work from the window of another (busier) worker.
+        """
+        ret = []
+        stolen = []
+
+        self.qcond.acquire()
         try:
-            ret = self.queue.popleft()
-        except IndexError:
-            self.qcond.release()
-            return None
+            while len(ret) < count and len(self.queue):
+                ret.append(self.queue.popleft())
 
-        self.qcond.notifyAll()
-        self.qcond.release()
+            if ret:
+                self.qcond.notifyAll()
 
-        self.inprog[ret.id] = ret
-        self.__touchWork(ret.id)
+            for work in ret:
+                self.inprog[work.id] = work
+                work.touch()
+
+            if workerid is not None:
+                if len(ret) < count:
+                    stolen = self.__stealWork(workerid, count - len(ret))
+                    for work in stolen:
+                        work.touch()
+                    ret.extend(stolen)
+
+                window = self.windows.setdefault(workerid, collections.deque())
+                for work in ret:
+                    window.append(work.id)
+                    self.owners[work.id] = workerid
+
+        finally:
+            self.qcond.release()
 
         if self.callback:
-            self.callback.workGotten(self, ret)
+            for work in ret:
+                if work not in stolen:
+                    self.callback.workGotten(self, work)
 
         return ret
 
+    def exchangeWork(self, workerid, results=(), count=1, timedout=()):
+        """
+        Used by batch clients to stream back completed work units and
+        refill their prefetch window in a single round trip.
+
+        timedout is a list of work ids which the worker gave up on (they
+        are timed out here rather than being kept alive by the check in).
+
+        Returns a (works, revoked) tuple where works is a list of up to
+        count new work units and revoked is a list of work ids which were
+        previously handed to this worker but should no longer be run.
+        """
+        for workid in timedout:
+            self.qcond.acquire()
+            try:
+                work = None
+                if self.owners.get(workid) == workerid:
+                    work = self.inprog.get(workid)
+            finally:
+                self.qcond.release()
+
+            if work is not None:
+                self.timeoutWork(work)
+
+        for work in results:
+            self.qcond.acquire()
+            try:
+                owner = self.owners.get(work.id)
+                if owner is not None and owner != workerid:
+                    # Another worker stole it, but we finished first
+                    self.revoked[workerid].discard(work.id)
+                    self.revoked[owner].add(work.id)
+                known = self.__cleanWork(work.id) is not None
+            finally:
+                self.qcond.release()
+
+            # Already completed/canceled/timed out elsewhere...
+            if not known:
+                continue
+
+            if work.excinfo is not None:
+                if self.callback:
+                    self.callback.workFailed(self, work)
+                continue
+
+            work.done()
+            if self.callback:
+                self.callback.workDone(self, work)
+
+        works = self.getWorkBatch(count, workerid=workerid)
+
+        self.qcond.acquire()
+        try:
+            # Checking in means the worker is alive; keep the work
+            # still sitting in its window from timing out.
+            window = self.windows.get(workerid, ())
+            for workid in window:
+                self.inprog[workid].touch()
+
+            revoked = list(self.revoked.pop(workerid, ()))
+            if not window:
+                self.windows.pop(workerid, None)
+
+        finally:
+            self.qcond.release()
+
+        return works, revoked
+
+
+    def releaseWork(self, workerid, workids):
+        """
+        Used by batch clients which are exiting early to hand back the
+        (not yet started) work units in their window so they are queued
+        for another worker.
+        """
+        self.qcond.acquire()
+        try:
+            for workid in workids:
+                if self.owners.get(workid) != workerid:
+                    continue
+                work = self.__cleanWork(workid)
+                if work is not None:
+                    self.queue.append(work)
+
+            self.revoked.pop(workerid, None)
+            if not self.windows.get(workerid):
+                self.windows.pop(workerid, None)
+
+            self.qcond.notifyAll()
+
+        finally:
+            self.qcond.release()
 
     def doneWork(self, work):
         """
@@ -430,6 +643,8 @@ class ClusterServer:
         if inprog:
             p = self.inprog
             self.inprog = {}
+            self.owners = {}
+            self.windows = {}
             qlist.extend(p.values())
 
         self.qcond.notifyAll()
@@ -449,14 +664,7 @@ class ClusterServer:
         # (if we didn't find in inprog)
         if cwork is None:
             self.qcond.acquire()
-            qlist = list(self.queue)
-            self.queue.clear()
-            for work in qlist:
-                if work.id != workid:
-                    self.queue.append(work)
-                else:
-                    cwork = work
-
+            cwork = self.queue.remove(workid)
             self.qcond.notifyAll()
             self.qcond.release()
 
@@ -490,14 +698,17 @@ class ClusterClient:
 
     maxwidth is the number of work units to do in parallel
     docode will enable code sharing with the server
+    prefetch (if set) makes each worker process stay alive and fetch
+             work units in batches of up to prefetch at a time
     """
 
-    def __init__(self, name, maxwidth=multiprocessing.cpu_count(), docode=False):
+    def __init__(self, name, maxwidth=multiprocessing.cpu_count(), docode=False, prefetch=None):
         self.go = True
         self.name = name
         self.width = 0
         self.maxwidth = maxwidth
         self.docode = docode
+        self.prefetch = prefetch
 
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -545,7 +756,10 @@ class ClusterClient:
 
     def threadForker(self, uri):
         self.width += 1
-        cmd = sub_cmd % (uri, self.docode)
+        if self.prefetch:
+            cmd = batch_cmd % (uri, self.docode, self.prefetch)
+        else:
+            cmd = sub_cmd % (uri, self.docode)
         try:
             sub = subprocess.Popen([sys.executable, '-c', cmd], stdin=subprocess.PIPE)
             sub.wait()
@@ -587,7 +801,9 @@ def getHostPortFromUri(uri):
         port = int(hparts[1])
     return host,port
 
-def workThread(server, work):
+def workThread(server, work, results=None):
+    # If results is a list, finished work is appended to it (to be
+    # streamed back by the caller) rather than reported individually.
     try:
         work.server = server
         work.starttime = time.time()
@@ -595,6 +811,9 @@ def workThread(server, work):
         work.work()
         work.endtime = time.time()
         work.server = None
+        if results is not None:
+            results.append(work)
+            return
         server.doneWork(work)
 
     except InvalidInProgWorkId: # the work was canceled
@@ -604,13 +823,17 @@ def workThread(server, work):
         # Tell the server that the work unit failed
         formatted = traceback.format_exc()
         work.excinfo = formatted
+        work.server = None
         logger.error(formatted)
+        if results is not None:
+            results.append(work)
+            return
         server.failWork(work)
 
-def runAndWaitWork(server, work):
+def runAndWaitWork(server, work, results=None):
 
     work.touch()
-    thr = threading.Thread(target=workThread, args=(server, work))
+    thr = threading.Thread(target=workThread, args=(server, work, results))
     thr.setDaemon(True)
     thr.start()
 
@@ -628,7 +851,10 @@ def runAndWaitWork(server, work):
         if sys.stdin.closed:
             break
 
-        time.sleep(2)
+        thr.join(2)
+
+    # (False if the work thread is still running)
+    return not thr.isAlive()
 
 def getAndDoWork(uri, docode=False):
 
@@ -655,3 +881,63 @@ def getAndDoWork(uri, docode=False):
     gc.collect() # Try to call destructors
     sys.exit(0)  # GTFO
 
+def doWorkBatch(proxy, workerid, prefetch=4):
+    """
+    Run work units from the server until it has no more to give us.
+
+    Work is fetched to keep up to prefetch units in a local window and
+    results are streamed back whenever the window is refilled (once it
+    drains to half full), so each round trip to the server both returns
+    finished work and fetches more.
+
+    If a work unit times out (its thread is left running) it is reported
+    to the server as timed out, the rest of the window is handed back and
+    this returns so the caller may exit (rather than keep running work
+    alongside the hung thread).
+    """
+    window = collections.deque()
+    results = []
+    revoked = set()
+    lowmark = prefetch // 2
+
+    while True:
+
+        if len(window) <= lowmark:
+            done = results
+            results = []
+            works, rev = proxy.exchangeWork(workerid, done, prefetch - len(window))
+            revoked.update(rev)
+            window.extend(works)
+
+            if not window:
+                break
+
+        work = window.popleft()
+        if work.id in revoked:
+            revoked.discard(work.id)
+            continue
+
+        if not runAndWaitWork(proxy, work, results=results):
+            done = results
+            results = []
+            proxy.exchangeWork(workerid, done, 0, timedout=[work.id])
+            proxy.releaseWork(workerid, [w.id for w in window if w.id not in revoked])
+            break
+
+def getAndDoWorkBatch(uri, docode=False, prefetch=4):
+
+    try:
+        if docode:
+            host,port = getHostPortFromUri(uri)
+            cobra.dcode.addDcodeServer(host, port=port)
+
+        proxy = cobra.CobraProxy(uri, timeout=60, retrymax=3)
+
+        workerid = '%s:%d' % (socket.gethostname(), os.getpid())
+        doWorkBatch(proxy, workerid, prefetch=prefetch)
+
+    except Exception:
+        logger.error(traceback.format_exc())
+
+    gc.collect() # Try to call destructors
+    sys.exit(0)  # GTFO
@@ -0,0 +1,174 @@
+import unittest
+import threading
+
+import cobra.cluster as c_cluster
+
+
+class CountWork(c_cluster.ClusterWork):
+
+    def __init__(self, priority=0):
+        c_cluster.ClusterWork.__init__(self, priority=priority)
+        self.ran = False
+
+    def work(self):
+        self.ran = True
+
+
+class HookWork(CountWork):
+    '''
+    A work unit which calls hook (once) when it is touched.
+    '''
+    def __init__(self):
+        CountWork.__init__(self)
+        self.hook = None
+
+    def touch(self):
+        CountWork.touch(self)
+        hook = self.hook
+        self.hook = None
+        if hook is not None:
+            hook()
+
+
+class HangWork(CountWork):
+    '''
+    A work unit which runs (past its timeout) until release is set.
+    '''
+    def __init__(self, timeout=None, priority=0):
+        CountWork.__init__(self, priority=priority)
+        self.timeout = timeout
+        self.release = threading.Event()
+
+    def work(self):
+        self.release.wait(10)
+
+
+class DoneCallback(c_cluster.ClusterCallback):
+
+    def __init__(self):
+        self.done = []
+        self.timeouts = []
+
+    def workDone(self, server, work):
+        self.done.append(work.id)
+
+    def workTimeout(self, server, work):
+        self.timeouts.append(work.id)
+
+
+class CobraClusterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = c_cluster.ClusterServer('clustertest')
+
+    def tearDown(self):
+        self.server.shutdownServer()
+
+    def test_cluster_priority(self):
+        works = [CountWork(priority=p) for p in (0, 5, 0, 9)]
+        for work in works:
+            self.server.addWork(work)
+
+        ids = [w.id for w in self.server.getWorkBatch(4)]
+        self.assertEqual(ids, [works[3].id, works[1].id, works[0].id, works[2].id])
+        self.assertEqual(self.server.inProgressCount(), 4)
+        self.assertEqual(self.server.getWork(), None)
+
+    def test_cluster_cancel_queued(self):
+        works = [CountWork() for i in range(3)]
+        for work in works:
+            self.server.addWork(work)
+
+        self.server.cancelWork(works[1].id)
+        ids = [w.id for w in self.server.getWorkBatch(10)]
+        self.assertEqual(ids, [works[0].id, works[2].id])
+
+    def test_cluster_steal(self):
+        for i in range(8):
+            self.server.addWork(CountWork())
+
+        busy = self.server.getWorkBatch(8, workerid='busy')
+        self.assertEqual(len(busy), 8)
+
+        # The idle worker takes from the tail of the busy window
+        stolen, revoked = self.server.exchangeWork('idle', count=8)
+        self.assertEqual(len(stolen), 4)
+        self.assertEqual([w.id for w in stolen], [w.id for w in busy[-4:]][::-1])
+
+        # The busy worker finishes one which was stolen from it...
+        cb = DoneCallback()
+        self.server.callback = cb
+        works, revoked = self.server.exchangeWork('busy', results=[busy[-1]], count=0)
+        self.assertEqual(cb.done, [busy[-1].id])
+        self.assertEqual(set(revoked), set(w.id for w in busy[-3:-1]) | set([busy[-4].id]))
+
+        # ... so the thief is told not to run it, and a late result is ignored
+        works, revoked = self.server.exchangeWork('idle', results=[busy[-1]], count=0)
+        self.assertEqual(revoked, [busy[-1].id])
+        self.assertEqual(cb.done, [busy[-1].id])
+
+    def test_cluster_batch_worker(self):
+        cb = DoneCallback()
+        self.server.callback = cb
+
+        works = [CountWork() for i in range(10)]
+        for work in works:
+            self.server.addWork(work)
+
+        c_cluster.doWorkBatch(self.server, 'local', prefetch=4)
+
+        self.assertEqual(sorted(cb.done), sorted(w.id for w in works))
+        self.assertEqual(self.server.inQueueCount(), 0)
+        self.assertEqual(self.server.inProgressCount(), 0)
+        self.assertEqual(self.server.windows, {})
+
+    def checkCleanDuring(self, clean):
+        # Clean up a windowed work unit (from another thread) while
+        # exchangeWork() is touching the units in the same window
+        works = [HookWork() for i in range(4)]
+        for work in works:
+            self.server.addWork(work)
+        self.server.getWorkBatch(4, workerid='w')
+
+        thr = threading.Thread(target=clean, args=(works[2],))
+        def hook():
+            thr.start()
+            # (it should have to wait for exchangeWork to finish)
+            thr.join(0.2)
+        works[0].hook = hook
+
+        got, revoked = self.server.exchangeWork('w', count=0)
+        thr.join()
+
+        self.assertEqual(got, [])
+        self.assertEqual(revoked, [])
+        self.assertEqual(list(self.server.windows['w']), [w.id for w in (works[0], works[1], works[3])])
+        self.assertEqual(self.server.inProgressCount(), 3)
+
+    def test_cluster_timeout_during_exchange(self):
+        self.checkCleanDuring(self.server.timeoutWork)
+
+    def test_cluster_done_during_exchange(self):
+        self.checkCleanDuring(self.server.doneWork)
+
+    def test_cluster_batch_worker_hang(self):
+        cb = DoneCallback()
+        self.server.callback = cb
+
+        hang = HangWork(timeout=0.1, priority=9)
+        works = [CountWork() for i in range(3)]
+        self.server.addWork(hang)
+        for work in works:
+            self.server.addWork(work)
+
+        try:
+            c_cluster.doWorkBatch(self.server, 'local', prefetch=4)
+        finally:
+            hang.release.set()
+
+        # the hung unit is timed out and the rest are handed back
+        self.assertEqual(set(cb.timeouts), set([hang.id]))
+        self.assertEqual(cb.done, [])
+        self.assertEqual(self.server.inProgressCount(), 0)
+        self.assertEqual(self.server.windows, {})
+        self.assertEqual(sorted(w.id for w in self.server.getWorkBatch(4)), sorted(w.id for w in works))
@@ -0,0 +1,136 @@
+'''
+Measure cluster scheduling throughput (work units/sec) on the local host.
+
+A ClusterServer is started on localhost and loaded with short work units,
+then worker processes are started directly (the same way ClusterClient
+would start them, minus the multicast announcement) either in the legacy
+one-unit-per-process mode or in batch mode with a prefetch window.
+
+Example:
+    python -m cobra.tools.clusterbench --units 2000 --workers 4 --prefetch 1 8 32
+'''
+import sys
+import time
+import argparse
+import threading
+import subprocess
+
+import cobra.cluster as c_cluster
+
+
+class BenchWork(c_cluster.ClusterWork):
+    '''
+    A (very) short work unit which just burns a few cycles.
+    '''
+    def __init__(self, spin=1000, priority=0):
+        c_cluster.ClusterWork.__init__(self, priority=priority)
+        self.spin = spin
+        self.result = None
+
+    def work(self):
+        x = 0
+        for i in xrange(self.spin):
+            x += i
+        self.result = x
+
+
+class BenchCallback(c_cluster.ClusterCallback):
+
+    def __init__(self, total):
+        self.total = total
+        self.count = 0
+        self.event = threading.Event()
+
+    def _tally(self):
+        self.count += 1
+        if self.count >= self.total:
+            self.event.set()
+
+    def workDone(self, server, work):
+        self._tally()
+
+    def workFailed(self, server, work):
+        self._tally()
+
+
+def legacyWorker(uri, server):
+    # Mimic ClusterClient.threadForker: one process per work unit
+    cmd = c_cluster.sub_cmd % (uri, False)
+    while server.inQueueCount():
+        subprocess.Popen([sys.executable, '-c', cmd]).wait()
+
+
+def batchWorker(uri, prefetch):
+    cmd = c_cluster.batch_cmd % (uri, False, prefetch)
+    subprocess.Popen([sys.executable, '-c', cmd]).wait()
+
+
+def runBench(units, workers, prefetch=None, spin=1000):
+    '''
+    Run units work units through workers local worker processes and
+    return the achieved units/sec.  If prefetch is None, the legacy
+    one-process-per-unit getAndDoWork() path is used.
+    '''
+    server = c_cluster.ClusterServer('clusterbench')
+    server.cobrad.fireThread()
+
+    cb = BenchCallback(units)
+    server.callback = cb
+
+    for i in xrange(units):
+        server.addWork(BenchWork(spin=spin))
+
+    uri = 'cobra://localhost:%d/%s' % (server.cobrad.port, server.cobraname)
+
+    start = time.time()
+    thrs = []
+    for i in xrange(workers):
+        if prefetch is None:
+            thr = threading.Thread(target=legacyWorker, args=(uri, server))
+        else:
+            thr = threading.Thread(target=batchWorker, args=(uri, prefetch))
+        thr.setDaemon(True)
+        thr.start()
+        thrs.append(thr)
+
+    cb.event.wait()
+    elapsed = time.time() - start
+
+    for thr in thrs:
+        thr.join()
+
+    server.shutdownServer()
+    server.cobrad.stopServer()
+    return units / elapsed
+
+
+def setup():
+    ap = argparse.ArgumentParser('Cluster scheduling benchmark')
+    ap.add_argument('--units', type=int, default=1000, help='Number of work units')
+    ap.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+    ap.add_argument('--spin', type=int, default=1000, help='Loop iterations per work unit')
+    ap.add_argument('--legacy', action='store_true', help='Also measure the one-process-per-unit mode')
+    ap.add_argument('--prefetch', type=int, nargs='*', default=[1, 8, 32],
+                    help='Prefetch window sizes to measure')
+    return ap
+
+
+def main(argv):
+    # Work units must be picklable by reference to a real module (not
+    # __main__) for the worker processes to load them.
+    import cobra.tools.clusterbench as c_bench
+
+    opts = setup().parse_args(argv)
+
+    modes = list(opts.prefetch)
+    if opts.legacy:
+        modes.insert(0, None)
+
+    for prefetch in modes:
+        rate = c_bench.runBench(opts.units, opts.workers, prefetch=prefetch, spin=opts.spin)
+        name = 'legacy' if prefetch is None else 'prefetch=%d' % prefetch
+        print('%-16s %10.1f units/sec' % (name, rate))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -7,12 +7,14 @@ import cobra.cluster as c_cluster
 def setup():
     ap = argparse.ArgumentParser('Cluster worker tool')
     ap.add_argument('cluster', help='Name of the cluster to attach to')
+    ap.add_argument('--prefetch', type=int, default=None,
+                    help='Keep worker processes alive and fetch up to this many work units at a time')
     return ap
 
 
 def main(argv):
     opts = setup().parse_args(argv)
-    worker = c_cluster.ClusterClient(opts.cluster, docode=True)
+    worker = c_cluster.ClusterClient(opts.cluster, docode=True, prefetch=opts.prefetch)
     worker.processWork()
 
 
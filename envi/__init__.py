@@ -152,6 +152,32 @@ class ArchitectureModule:
         '''
         raise ArchNotImplemented('archParseOpcode')
 
+    def archParseOpcodes(self, bytez, offset=0, va=0, count=None):
+        '''
+        Parse up to count (or all) consecutive Opcode objects from the given
+        bytes, stopping early at the first invalid or truncated instruction.
+        Architectures with a batch decoder may override this for speed.
+
+        Example:
+            ops = a.archParseOpcodes(bytez, va=0x41414141, count=100)
+        '''
+        ret = []
+        end = len(bytez)
+        if count is None:
+            count = end - offset
+
+        while offset < end and len(ret) < count:
+            try:
+                op = self.archParseOpcode(bytez, offset, va)
+            except (InvalidInstruction, IndexError):
+                break
+
+            ret.append(op)
+            offset += op.size
+            va += op.size
+
+        return ret
+
     def archGetRegisterGroups(self):
         '''
         Returns a tuple of tuples of registers for different register groups.
@@ -501,6 +527,15 @@ class Opcode:
     def getOperands(self):
         return list(self.opers)
 
+# Instructions with these flags end a compiled block (see Emulator.compileBlock)
+BLOCK_END_FLAGS = IF_NOFALL | IF_CALL | IF_BRANCH | IF_RET | IF_REPEAT
+# The most instructions in one compiled block
+MAX_BLOCK_OPS = 64
+# How many compiled blocks an emulator keeps (before clearing them all)
+MAX_EMU_BLOCKS = 0x4000
+# Compiled blocks are tracked by (1 << BLOCK_PAGE_SHIFT) sized pages
+BLOCK_PAGE_SHIFT = 12
+
 class Emulator(e_reg.RegisterContext, e_mem.MemoryObject):
     """
     The Emulator class is mostly "Abstract" in the java
@@ -526,6 +561,11 @@ class Emulator(e_reg.RegisterContext, e_mem.MemoryObject):
         self._emu_opts = {}
         self._emu_optdocs = {}
 
+        # Compiled basic blocks (see compileBlock())
+        self._emu_blocks = {}       # block key -> [ (op, step), ... ]
+        self._emu_blkpages = {}     # page -> set( block keys )
+        self._emu_blksmc = False    # set once a write changed compiled code
+
         # Automagically setup an instruction mnemonic handler dict
         # by finding all methods starting with i_ and assume they
         # implement an instruction by mnemonic
@@ -623,6 +663,147 @@ class Emulator(e_reg.RegisterContext, e_mem.MemoryObject):
         op = self.parseOpcode(pc)
         self.executeOpcode(op)
 
+    def stepBlock(self):
+        """
+        Execute the (compiled) basic block at the program counter and
+        return the number of instructions executed.  Execution stops early
+        if an instruction changes the flow of execution or writes to the
+        code of the block.
+        """
+        count = 0
+        for op, step in self.getBlock(self.getProgramCounter()):
+            count += 1
+            if step():
+                break
+        return count
+
+    def getBlock(self, va):
+        """
+        Return the list of (op, step) tuples for the basic block starting
+        at va (compiling it if needed).
+        """
+        blk = self._emu_blocks.get(self._blockKey(va))
+        if blk is None:
+            blk = self.compileBlock(va)
+        return blk
+
+    def compileBlock(self, va):
+        """
+        Decode the instructions from va up to (and including) the first
+        one which may change the flow of execution and compile each of
+        them into a "step" callable which executes the instruction and
+        returns True if the program counter did not simply move on to the
+        next instruction.  Returns (and caches) the list of (op, step)
+        tuples.
+
+        Compiled blocks are dropped when the emulator writes to them.
+        """
+        key = self._blockKey(va)
+        blk = []
+        opva = key
+        while len(blk) < MAX_BLOCK_OPS:
+            try:
+                op = self.parseOpcode(opva)
+            except Exception:
+                # let the failure happen when (if) execution gets there
+                if not blk:
+                    raise
+                break
+
+            blk.append((op, self._compileStep(op)))
+            if op.iflags & BLOCK_END_FLAGS:
+                break
+
+            opva += op.size
+
+        if len(self._emu_blocks) >= MAX_EMU_BLOCKS:
+            self._emu_blocks.clear()
+            self._emu_blkpages.clear()
+
+        self._emu_blocks[key] = blk
+
+        first = blk[0][0]
+        last = blk[-1][0]
+        pages = self._emu_blkpages
+        for page in range(first.va >> BLOCK_PAGE_SHIFT, ((last.va + last.size - 1) >> BLOCK_PAGE_SHIFT) + 1):
+            keys = pages.get(page)
+            if keys is None:
+                keys = pages[page] = set()
+            keys.add(key)
+
+        return blk
+
+    def _blockKey(self, va):
+        """
+        Return the compiled block cache key for va (archs with more than
+        one instruction set include the current one).
+        """
+        return va
+
+    def _compileStep(self, op):
+        """
+        Return the step callable for op (see compileBlock()).  Emulators
+        override this to bind their instruction handler for op up front,
+        this version just runs executeOpcode().
+        """
+        nextva = op.va + op.size
+
+        def step():
+            self.executeOpcode(op)
+            return self.getProgramCounter() != nextva
+
+        return step
+
+    def flushBlocks(self, va=None, size=1):
+        """
+        Drop the compiled blocks (all of them, or the ones which overlap
+        size bytes at va).  Blocks which are executing stop after the
+        current instruction.
+        """
+        if va is None:
+            for blk in self._emu_blocks.values():
+                del blk[:]
+            self._emu_blocks.clear()
+            self._emu_blkpages.clear()
+            return
+
+        end = va + size
+        pages = self._emu_blkpages
+        for page in range(va >> BLOCK_PAGE_SHIFT, ((end - 1) >> BLOCK_PAGE_SHIFT) + 1):
+            for key in list(pages.get(page, ())):
+                blk = self._emu_blocks.get(key)
+                first = blk[0][0]
+                last = blk[-1][0]
+                if first.va >= end or last.va + last.size <= va:
+                    continue
+
+                self._emu_blksmc = True
+                del self._emu_blocks[key]
+                for bpage in range(first.va >> BLOCK_PAGE_SHIFT, ((last.va + last.size - 1) >> BLOCK_PAGE_SHIFT) + 1):
+                    keys = pages.get(bpage)
+                    keys.discard(key)
+                    if not keys:
+                        pages.pop(bpage)
+
+                # (emptying the list also stops it if it is running)
+                del blk[:]
+
+    def writeMemory(self, va, bytez):
+        pages = self._emu_blkpages
+        if pages:
+            size = len(bytez)
+            if (va >> BLOCK_PAGE_SHIFT) in pages or ((va + size - 1) >> BLOCK_PAGE_SHIFT) in pages or size > (1 << BLOCK_PAGE_SHIFT):
+                self.flushBlocks(va, size)
+
+        return e_mem.MemoryObject.writeMemory(self, va, bytez)
+
+    def setMemorySnap(self, snap):
+        # once the code has been written to, restoring memory may change it
+        # back out from under the compiled blocks
+        if self._emu_blksmc:
+            self.flushBlocks()
+        e_mem.MemoryObject.setMemorySnap(self, snap)
+
     def getSegmentInfo(self, op):
         idx = self.getSegmentIndex(op)
         return self._emu_segments[idx]
@@ -104,6 +104,18 @@ class Amd64Emulator(Amd64RegisterContext, e_i386.IntelEmulator):
         self.addCallingConvention("sysvamd64systemcall", sysvamd64systemcall)
         self.addCallingConvention("msx64call", msx64call)
 
+    # Amd64RegisterContext comes first in our bases, so pick up the
+    # (lazy flags aware) register accessors from IntelEmulator
+    getRegister = e_i386.IntelEmulator.__dict__['getRegister']
+    getRegisterSnap = e_i386.IntelEmulator.__dict__['getRegisterSnap']
+    setRegisterSnap = e_i386.IntelEmulator.__dict__['setRegisterSnap']
+    _rctx_Export = e_i386.IntelEmulator.__dict__['_rctx_Export']
+
+    def setRegister(self, index, value):
+        # See Amd64RegisterContext.setRegister
+        if (index & 0xffff0000) == RMETA_LOW32:
+            index = index & 0xffff
+        e_i386.IntelEmulator.setRegister(self, index, value)
 
     def doPush(self, val):
         rsp = self.getRegister(REG_RSP)
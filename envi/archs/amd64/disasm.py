@@ -11,7 +11,7 @@ from envi.const import RMETA_NMASK
 from envi.archs.i386.disasm import iflag_lookup, operand_range, priv_lookup, \
         i386Opcode, i386ImmOper, i386RegOper, i386ImmMemOper, i386RegMemOper, \
         i386SibOper, PREFIX_REPNZ, PREFIX_REP, PREFIX_OP_SIZE, PREFIX_ADDR_SIZE, \
-        MANDATORY_PREFIXES, PREFIX_REP_MASK, RMETA_LOW8, RMETA_LOW16
+        MANDATORY_PREFIXES, PREFIX_REP_MASK, RMETA_LOW8, RMETA_LOW16, MAX_INTERNED
 
 from envi.archs.amd64.regs import *
 from envi.archs.i386.opconst import OP_EXTRA_MEMSIZES, OP_MEM_B, OP_MEM_W, OP_MEM_D, \
@@ -208,6 +208,9 @@ class Amd64Disasm(e_i386.i386Disasm):
         # st registers, so we use getRegisterIndex instead
         self.ROFFSETMMX   = self._dis_regctx.getRegisterIndex("mm0")
 
+        # Flattened opcode tables (see _dis_buildTable)
+        self._dis_tables = [None for x in all_tables]
+
     # NOTE: Technically, the REX must be the *last* prefix specified
     # NOTE: Technically, the VEX must be the *last* prefix specified (REX be damned)
 
@@ -237,6 +240,81 @@ class Amd64Disasm(e_i386.i386Disasm):
 
         return sizelist[mode]
 
+    def _dis_buildTable(self, tabnum):
+        '''
+        Flatten the given opcode table into a 256 entry list indexed by the
+        opcode byte (see i386Disasm._dis_buildTable).
+        '''
+        ftab = []
+        for obyte in range(256):
+            tabdesc = all_tables[tabnum]
+            if obyte > tabdesc[5]:
+                tabdesc = all_tables[tabdesc[6]]
+                if tabdesc is None:
+                    ftab.append(None)
+                    continue
+
+            tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
+            if tabidx >= len(tabdesc[0]):
+                ftab.append(None)
+                continue
+
+            opdesc = tabdesc[0][tabidx]
+            if opdesc[0] != 0:
+                ftab.append((opdesc[0], None))
+            else:
+                ftab.append((0, self._dis_compileOpcode(tabdesc, opdesc)))
+
+        self._dis_tables[tabnum] = ftab
+        return ftab
+
+    def _dis_compileOpcode(self, tabdesc, opdesc):
+        '''
+        Precompute everything about an opcode table entry which does not
+        depend on the prefixes or operand bytes, returning a tuple of
+        (optype, mnem, final opcode byte size, iflags, operands) where
+        operands is a tuple of (operflags, sizelist, default mode, addrmeth,
+        ameth, immoffs, ameth_0 arg, memsz) for each operand.
+        '''
+        tbl_opercnt = tabdesc[1]
+        optype = opdesc[1]
+        mnem = opdesc[3 + tbl_opercnt]
+
+        # Pull in the envi generic instruction flags
+        iflags = iflag_lookup.get(optype & 0xFFFF, 0) | self._dis_oparch
+        if priv_lookup.get(mnem, False):
+            iflags |= envi.IF_PRIV
+
+        opers = []
+        for i in range(operands_index, operands_index + tbl_opercnt):
+            operflags = opdesc[i]
+            # If there are no more operands, we're done
+            if operflags == 0:
+                break
+
+            addrmeth = operflags & opcode86.ADDRMETH_MASK
+            sizelist = opcode86.OPERSIZE.get(operflags & opcode86.OPTYPE_MASK, None)
+            memsz = OP_EXTRA_MEMSIZES[(operflags & OP_MEMMASK) >> 4]
+
+            # The size mode used when there is no REX.W/VEX.L/66 prefix
+            mode = MODE_32
+            if operflags & opcode86.OP_64AUTO:
+                mode = MODE_64
+
+            if addrmeth == 0:
+                # Operands embedded in the opcode (see ameth_0)
+                opers.append((operflags, sizelist, mode, 0, None, False, opdesc[2+tbl_opercnt+i], memsz))
+                continue
+
+            ameth = self._dis_amethods[(addrmeth >> 16) & 0x7F]
+            opers.append((operflags, sizelist, mode, addrmeth, ameth, addrmeth in IMM_REQOFFS, None, memsz))
+
+        osize = 0
+        if tabdesc[3] == 0xff:
+            osize = 1   # For our final opcode byte
+
+        return (optype, mnem, osize, iflags, tuple(opers))
+
     def disasm(self, bytez, offset, va):
         '''
         The main amd64 decoder function. The inital steps it takes are determining what
@@ -274,6 +352,7 @@ class Amd64Disasm(e_i386.i386Disasm):
 
         # Stuff for opcode parsing
         tabdesc = all_tables[opcode86.TBL_Main]  # A tuple (optable, shiftbits, mask byte, sub, max)
+        tabnum = opcode86.TBL_Main
         startoff = offset  # Use startoff as a size knob if needed
         isvex = False
         vexw = None
@@ -351,7 +430,8 @@ class Amd64Disasm(e_i386.i386Disasm):
                     if tabidx is None:
                         continue
                     opdesc = tabdesc[0][tabidx]
-                    tabdesc = all_tables[opdesc[0]]
+                    tabnum = opdesc[0]
+                    tabdesc = all_tables[tabnum]
                 # So VEX and mandatory prefixes don't really intermingle
                 offset += 1
                 break
@@ -370,13 +450,15 @@ class Amd64Disasm(e_i386.i386Disasm):
         decodings = []
         mainbyte = offset
         all_prefixes = prefixes
+        tables = self._dis_tables
+
+        ogtabnum = tabnum
 
-        ogtabdesc = tabdesc
         # onehot in this case refers to the their prefixes that are defined in i386/disasm.py where only
         # on bit of the entire integer is set. We use that to quickly pop things in and out of the prefixes
         # list
         for pref, onehot in ppref:
-            tabdesc = ogtabdesc
+            tabnum = ogtabnum
             offset = mainbyte
             if pref is not None:
                 # our mandatory prefix is not none, which means that we have to jump through the tables
@@ -395,70 +477,65 @@ class Amd64Disasm(e_i386.i386Disasm):
                 all_prefixes = prefixes | pho_prefixes
 
             while True:
-                if (obyte > tabdesc[5]):
-                    tabdesc = all_tables[tabdesc[6]]
+                ftab = tables[tabnum]
+                if ftab is None:
+                    ftab = self._dis_buildTable(tabnum)
 
-                tabidx = ((obyte - tabdesc[4]) >> tabdesc[2]) & tabdesc[3]
-                opdesc = tabdesc[0][tabidx]
+                opent = ftab[obyte]
+                if opent is None:
+                    break
 
                 # Hunt down multi-byte opcodes
-                nexttable = opdesc[0]
-                if nexttable != 0:  # If we have a sub-table specified, use it.
-                    tabdesc = all_tables[nexttable]
-
+                tabnum, desc = opent
+                if tabnum != 0:
                     # Account for the table jump we made
                     offset += 1
                     obyte = ord(bytez[offset])
                     continue
 
                 # We are now on the final table...
-                tbl_opercnt = tabdesc[1]
-                mnem = opdesc[3 + tbl_opercnt]
-                optype = opdesc[1]
-                if tabdesc[3] == 0xff:
-                    offset += 1  # For our final opcode byte
-                break
+                optype = desc[0]
+                if optype & INS_VEXREQ and not isvex:
+                    break
 
-            if optype & INS_VEXREQ and not isvex:
-                continue
-
-            if optype != 0:
-                decodings.append((tabdesc, opdesc, offset, all_prefixes))
+                if optype != 0:
+                    decodings.append((desc, offset + desc[2], all_prefixes))
+                break
 
         if not len(decodings):
             raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
 
-        tabdesc, opdesc, offset, prefixes = decodings.pop()
-        optype = opdesc[1]
-        tbl_opercnt = tabdesc[1]
-        mnem = opdesc[3 + tbl_opercnt]
+        desc, offset, prefixes = decodings.pop()
+        optype, mnem, osize, iflags, opers = desc
 
-        if optype == 0:
-            raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
+        # handles tsize calculations including new REX prefixes
+        # NOTE: REX takes precedence over 66
+        # (see section 2.2.1.2 in Intel 2a)
+        pmode = None
+        if prefixes & PREFIX_SIZE_BOTH:
+            pmode = MODE_64
+        elif prefixes & e_i386.PREFIX_OP_SIZE:
+            pmode = MODE_16
 
+        operands = []
         operoffset = 0
+        interned = self._dis_interned
         # Begin parsing operands based off address method
-        for i in range(operands_index, operands_index + tbl_opercnt):
+        for operflags, sizelist, mode, addrmeth, ameth, immoffs, arg, memsz in opers:
 
             oper = None  # Set this if we end up with an operand
             osize = 0
 
-            # Pull out the operand description from the table
-            operflags = opdesc[i]
-            opertype = operflags & opcode86.OPTYPE_MASK
-            addrmeth = operflags & opcode86.ADDRMETH_MASK
+            if sizelist is None:
+                raise Exception("OPERSIZE FAIL")
 
-            # If there are no more operands, break out of the loop!
-            if operflags == 0:
-                break
-
-            # handles tsize calculations including new REX prefixes
-            tsize = self._dis_calc_tsize(opertype, prefixes, operflags)
+            if pmode is not None:
+                mode = pmode
+            tsize = sizelist[mode]
 
             # If addrmeth is zero, we have operands embedded in the opcode
             if addrmeth == 0:
-                osize = 0
-                oper = self.ameth_0(operflags, opdesc[2+tbl_opercnt+i], tsize, prefixes)
+                oper = self.ameth_0(operflags, arg, tsize, prefixes)
 
             else:
                 # So the 0x7f is here to help us deal with an issue between VEX and non-VEX
@@ -469,9 +546,7 @@ class Amd64Disasm(e_i386.i386Disasm):
                 # addressing methods, so we can have ADDRMETH_V be skipped outside of VEX mode too, and not
                 # just things like ADDRMETH_H. Hence, we need a new flag that I stash in the upper bits of
                 # instruction operand definition so we can know when to skip operands
-                ameth = self._dis_amethods[(addrmeth >> 16) & 0x7F]
-                vex_skip = addrmeth & opcode86.ADDRMETH_VEXSKIP
-                if not isvex and vex_skip:
+                if not isvex and addrmeth & opcode86.ADDRMETH_VEXSKIP:
                     continue
 
                 if ameth is None:
@@ -479,7 +554,7 @@ class Amd64Disasm(e_i386.i386Disasm):
 
                 # NOTE: Depending on your addrmethod you may get beginning of operands, or offset
                 try:
-                    if addrmeth in IMM_REQOFFS:
+                    if immoffs:
                         osize, oper = ameth(bytez, offset+operoffset, tsize, prefixes, operflags)
 
                         # If we are a sign extended immediate and not the same as the other operand,
@@ -496,10 +571,8 @@ class Amd64Disasm(e_i386.i386Disasm):
                     else:
                         # see same code section in i386 for this rationale
                         osize, oper = ameth(bytez, offset, tsize, prefixes, operflags)
-                        if getattr(oper, "_is_deref", False):
-                            memsz = OP_EXTRA_MEMSIZES[(operflags & OP_MEMMASK) >> 4]
-                            if memsz is not None:
-                                oper.tsize = memsz
+                        if memsz is not None and getattr(oper, "_is_deref", False):
+                            oper.tsize = memsz
 
                 except struct.error:
                     # Catch struct unpack errors due to insufficient data length
@@ -508,22 +581,22 @@ class Amd64Disasm(e_i386.i386Disasm):
             if oper is not None:
                 # This is a filty hack for now...
                 oper._dis_regctx = self._dis_regctx
+                # Share the common register/immediate operands (see i386)
+                ocls = oper.__class__
+                if ocls is i386RegOper:
+                    oper = interned.setdefault((ocls, oper.reg, oper.tsize), oper)
+                elif ocls is i386ImmOper and len(interned) < MAX_INTERNED:
+                    oper = interned.setdefault((ocls, type(oper.imm), oper.imm, oper.tsize), oper)
                 operands.append(oper)
 
             operoffset += osize
 
-        typemask = optype & 0xFFFF
-        # Pull in the envi generic instruction flags
-        iflags = iflag_lookup.get(typemask, 0) | self._dis_oparch
-
         if prefixes & PREFIX_REP_MASK:
             iflags |= envi.IF_REPEAT
 
-        if priv_lookup.get(mnem, False):
-            iflags |= envi.IF_PRIV
-
         # Lea will have a reg-mem/sib operand with _is_deref True, but should be false
-        if typemask == opcode86.INS_LEA:
+        # (only the memory operands, register operands are shared)
+        if (optype & 0xFFFF) == opcode86.INS_LEA and operands[1].isDeref():
             operands[1]._is_deref = False
 
         ret = Amd64Opcode(va, optype, mnem, prefixes, (offset-startoff)+operoffset, operands, iflags)
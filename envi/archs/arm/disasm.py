@@ -1,4 +1,6 @@
 import sys
+import copy
+import types
 import struct
 import traceback
 
@@ -5334,6 +5336,90 @@ class ArmCPSFlagsOper(ArmOperand):
 
 AIF_FLAGS = ('a','i','f')[::-1]
 
+# Max number of instruction words in each disassembler's decode cache
+DECODE_CACHE_MAX = 0x10000
+
+def makeDecodeTemplate(op, op2):
+    '''
+    Compare two decodings of the same instruction word at different
+    addresses and return a position independent template of it for
+    bindDecodeTemplate() (or False if the decoding depends on the va in
+    any way other than the operand "va" fields).
+    '''
+    delta = op2.va - op.va
+    if (op.__class__ is not op2.__class__ or
+            op.opcode != op2.opcode or
+            op.mnem != op2.mnem or
+            op.prefixes != op2.prefixes or
+            op.size != op2.size or
+            op.iflags != op2.iflags or
+            op.simdflags != op2.simdflags or
+            len(op.opers) != len(op2.opers)):
+        return False
+
+    opers = []
+    for oper, oper2 in zip(op.opers, op2.opers):
+        if oper.__class__ is not oper2.__class__:
+            return False
+
+        odict = oper.__dict__
+        odict2 = oper2.__dict__
+        if len(odict) != len(odict2):
+            return False
+
+        for name, val in odict.items():
+            if name != 'va' and (name not in odict2 or odict2[name] != val):
+                return False
+
+        ova = odict.get('va')
+        if ova == odict2.get('va'):
+            # no va (or a va independent one) so the operand may be shared
+            opers.append((oper, None))
+
+        elif odict2.get('va') == ova + delta:
+            opers.append((oper, ova - op.va))
+
+        else:
+            return False
+
+    return (op.__class__, op.opcode, op.mnem, op.prefixes, op.size,
+            op.iflags, op.simdflags, type(op.opers), tuple(opers))
+
+def bindDecodeTemplate(tmpl, va):
+    '''
+    Create an opcode at va from a template made by makeDecodeTemplate().
+    '''
+    opclass, opcode, mnem, prefixes, size, iflags, simdflags, otype, opers = tmpl
+    olist = []
+    for oper, delta in opers:
+        if delta is not None:
+            if type(oper) is types.InstanceType:
+                odict = oper.__dict__.copy()
+                odict['va'] = va + delta
+                oper = types.InstanceType(oper.__class__, odict)
+            else:
+                oper = copy.copy(oper)
+                oper.va = va + delta
+        olist.append(oper)
+
+    return opclass(va, opcode, mnem, prefixes, size, otype(olist), iflags, simdflags)
+
+def cacheDecode(cache, key, op):
+    '''
+    Update a disassembler's decode cache after a cache miss for the given
+    instruction word (which must not be marked uncacheable).  The first decoding of a word is kept until the word
+    is seen at a second address which proves (or disproves) that it can be
+    re-bound to any address.
+    '''
+    first = cache.get(key)
+    if first is None:
+        if len(cache) >= DECODE_CACHE_MAX:
+            cache.clear()
+        cache[key] = op
+
+    elif first.va != op.va:
+        cache[key] = makeDecodeTemplate(first, op)
+
 class ArmDisasm:
     _optype = envi.ARCH_ARMV7
     _opclass = ArmOpcode
@@ -5342,6 +5428,8 @@ class ArmDisasm:
     _archVersionMask = ARCH_REVS['ARMv7A']
 
     def __init__(self, endian=envi.ENDIAN_LSB, mask = 'ARMv7A'):
+        # opval -> decode template, first decoded opcode or False (see cacheDecode)
+        self._dis_cache = {}
         self.setArchMask(mask)
         self.setEndian(endian)
 
@@ -5350,6 +5438,7 @@ class ArmDisasm:
         set arch version mask 
         '''
         self._archVersionMask = ARCH_REVS.get(key,0)
+        self._dis_cache = {}
 
     def getArchMask(self):
         ''' 
@@ -5379,6 +5468,16 @@ class ArmDisasm:
         opbytes = bytez[offset:offset+4]
         opval, = struct.unpack(self.fmt, opbytes)
 
+        tmpl = self._dis_cache.get(opval)
+        if tmpl.__class__ is tuple:
+            return bindDecodeTemplate(tmpl, va)
+
+        op = self._disasm(opval, bytez, offset, va)
+        if tmpl is not False:
+            cacheDecode(self._dis_cache, opval, op)
+        return op
+
+    def _disasm(self, opval, bytez, offset, va):
         cond = opval >> 28
 
         #Get opcode, base mnem, operator list and flags
@@ -352,6 +352,45 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
         finally:
             self.setMeta('forrealz', False)
 
+    def _blockKey(self, va):
+        # the same bytes are different blocks in ARM and Thumb mode
+        return va | self.getFlag(PSR_T_bit)
+
+    def _compileStep(self, op):
+        # Conditional instructions (and anything inside an IT block) take
+        # the executeOpcode() path.  A block doesn't change mode before its
+        # last instruction, so the T flag is already right for op.
+        meth = self.op_methods.get(op.mnem)
+        if meth is None or op.prefixes < COND_AL:
+            return envi.Emulator._compileStep(self, op)
+
+        slowstep = envi.Emulator._compileStep(self, op)
+        opva = op.va
+        nextva = opva + op.size
+        meta = self.metadata
+
+        def step():
+            if (self.getCPSR() >> PSR_IT_BASE) & 7:
+                return slowstep()
+
+            meta['forrealz'] = True
+            try:
+                newpc = meth(op)
+            finally:
+                meta['forrealz'] = False
+
+            if self.getProgramCounter() != opva:
+                return True
+
+            if newpc is None:
+                self.setProgramCounter(nextva)
+                return False
+
+            self.setProgramCounter(newpc)
+            return True
+
+        return step
+
     def doPush(self, val):
         esp = self.getRegister(REG_SP)
         esp -= 4
@@ -393,8 +432,10 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
         '''
         set the CPSR for the current ARM processor mode
         '''
-        psr = self._rctx_vals[REG_CPSR] & (~mask) | (psr & mask)
-        self._rctx_vals[REG_CPSR] = psr
+        vals = self._rctx_vals
+        if vals.__class__ is tuple:
+            vals = self._rctx_Writable()
+        vals[REG_CPSR] = vals[REG_CPSR] & (~mask) | (psr & mask)
 
     def setAPSR(self, psr):
         '''
@@ -414,8 +455,8 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
         set the SPSR for the given ARM processor mode
         '''
         ridx = _getRegIdx(REG_OFFSET_CPSR, mode)
-        psr = self._rctx_vals[ridx] & (~mask) | (psr & mask)
-        self._rctx_vals[ridx] = psr
+        vals = self._rctx_Writable()
+        vals[ridx] = vals[ridx] & (~mask) | (psr & mask)
 
     def setProcMode(self, mode):
         '''
@@ -423,13 +464,14 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
         '''
         # write current psr to the saved psr register for target mode
         # but not for USR or SYS modes, which don't have their own SPSR
+        vals = self._rctx_Writable()
         if mode not in (PM_usr, PM_sys):
             curSPSRidx = proc_modes[mode]
-            self._rctx_vals[curSPSRidx] = self.getCPSR()
+            vals[curSPSRidx] = self.getCPSR()
 
         # set current processor mode
-        cpsr = self._rctx_vals[REG_CPSR] & 0xffffffe0
-        self._rctx_vals[REG_CPSR] = cpsr | mode
+        cpsr = vals[REG_CPSR] & 0xffffffe0
+        vals[REG_CPSR] = cpsr | mode
 
     def getRegister(self, index, mode=None):
         """
@@ -445,11 +487,11 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
         if idx == index:
             return self._rctx_vals[ridx]
 
-        offset = (index >> 24) & 0xff
-        width  = (index >> 16) & 0xff
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
 
-        mask = (2**width)-1
-        return (self._rctx_vals[ridx] >> offset) & mask
+        return (self._rctx_vals[ridx] >> info[1]) & info[2]
 
     def setRegister(self, index, value, mode=None):
         """
@@ -461,6 +503,9 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
             mode &= 0xf
 
         self._rctx_dirty = True
+        vals = self._rctx_vals
+        if vals.__class__ is tuple:
+            vals = self._rctx_Writable()
 
         # the raw index (in case index is a metaregister)
         idx = (index & 0xffff)
@@ -472,27 +517,18 @@ class ArmEmulator(ArmRegisterContext, envi.Emulator):
             ridx = _getRegIdx(idx, mode)
 
         if idx == index:    # not a metaregister
-            self._rctx_vals[ridx] = (value & self._rctx_masks[ridx])      # FIXME: hack.  should look up index in proc_modes dict?
+            vals[ridx] = (value & self._rctx_masks[ridx])      # FIXME: hack.  should look up index in proc_modes dict?
             return
 
         # If we get here, it's a meta register index.
-        # NOTE: offset/width are in bits...
-        offset = (index >> 24) & 0xff
-        width  = (index >> 16) & 0xff
-
-        mask = e_bits.b_masks[width]
-        mask = mask << offset
-
-        # NOTE: basewidth is in *bits*
-        basewidth = self._rctx_widths[ridx]
-        basemask  = (2**basewidth)-1
-
-        # cut a whole in basemask at the size/offset of mask
-        finalmask = basemask ^ mask
-
-        curval = self._rctx_vals[ridx]
-
-        self._rctx_vals[ridx] = (curval & finalmask) | (value << offset)
+        # NOTE: the banked registers share the width of the one we
+        #       looked up the meta info for.
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
+
+        xidx, offset, mask, finalmask = info
+        vals[ridx] = (vals[ridx] & finalmask) | (value << offset)
 
     def integerSubtraction(self, op):
         """
@@ -35,6 +35,9 @@ class i386Module(envi.ArchitectureModule):
     def archParseOpcode(self, bytes, offset=0, va=0):
         return self._arch_dis.disasm(bytes, offset, va)
 
+    def archParseOpcodes(self, bytes, offset=0, va=0, count=None):
+        return self._arch_dis.disasmMany(bytes, offset, va, count)
+
     def getEmulator(self):
         return IntelEmulator()
 
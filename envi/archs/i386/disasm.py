@@ -654,6 +654,9 @@ MODE_16 = 0
 MODE_32 = 1
 MODE_64 = 2
 
+# Cap on the number of distinct interned immediate operands per decoder
+MAX_INTERNED = 0x10000
+
 # used in coinjunction with the MODE_* values above
 MODESIZE=[
     2,
@@ -705,6 +708,10 @@ class i386Disasm:
         # st registers, so we use getRegisterIndex instead
         self.ROFFSETMMX   = self._dis_regctx.getRegisterIndex("mm0")
 
+        # Flattened opcode tables (see _dis_buildTable) and interned operands
+        self._dis_tables = [None for x in all_tables]
+        self._dis_interned = {}
+
     def parse_modrm(self, byte, prefixes=0):
         # Pass in a string with an offset for speed rather than a new string
         mod = (byte >> 6) & 0x3
@@ -849,18 +856,82 @@ class i386Disasm:
 
         return sizelist[mode]
 
+    def _dis_buildTable(self, tabnum):
+        '''
+        Flatten the given opcode table (including the jump to its overflow
+        table for bytes above its max) into a 256 entry list indexed by the
+        opcode byte.  Each entry is None (no decoding), (nexttable, None)
+        for a multi-byte opcode or (0, desc) for a final opcode where desc
+        comes from _dis_compileOpcode().  Tables are built on first use.
+        '''
+        ftab = []
+        for obyte in range(256):
+            tabdesc = all_tables[tabnum]
+            if obyte > tabdesc[4]:
+                tabdesc = all_tables[tabdesc[5]]
+
+            tabidx = ((obyte - tabdesc[3]) >> tabdesc[1]) & tabdesc[2]
+            if tabidx >= len(tabdesc[0]):
+                ftab.append(None)
+                continue
+
+            opdesc = tabdesc[0][tabidx]
+            if opdesc[0] != 0:
+                ftab.append((opdesc[0], None))
+            else:
+                ftab.append((0, self._dis_compileOpcode(tabdesc, opdesc)))
+
+        self._dis_tables[tabnum] = ftab
+        return ftab
+
+    def _dis_compileOpcode(self, tabdesc, opdesc):
+        '''
+        Precompute everything about an opcode table entry which does not
+        depend on the prefixes or operand bytes, returning a tuple of
+        (optype, mnem, final opcode byte size, iflags, operands) where
+        operands is a tuple of (operflags, sizelist, addrmeth, ameth,
+        immoffs, ameth_0 arg, memsz) for each operand.
+        '''
+        optype = opdesc[1]
+        mnem = opdesc[6]
+
+        # Pull in the envi generic instruction flags
+        iflags = iflag_lookup.get(optype & 0xFFFF, 0) | self._dis_oparch
+        if priv_lookup.get(mnem, False):
+            iflags |= envi.IF_PRIV
+
+        opers = []
+        for i in operand_range:
+            operflags = opdesc[i]
+            # If there are no more operands, we're done
+            if operflags == 0:
+                break
+
+            addrmeth = operflags & opcode86.ADDRMETH_MASK
+            sizelist = opcode86.OPERSIZE.get(operflags & opcode86.OPTYPE_MASK, None)
+            memsz = OP_EXTRA_MEMSIZES[(operflags & OP_MEMMASK) >> 4]
+
+            if addrmeth == 0:
+                # Operands embedded in the opcode (see ameth_0)
+                opers.append((operflags, sizelist, 0, None, False, opdesc[5+i], memsz))
+                continue
+
+            ameth = self._dis_amethods[addrmeth >> 16]
+            immoffs = addrmeth == opcode86.ADDRMETH_I or addrmeth == opcode86.ADDRMETH_J
+            opers.append((operflags, sizelist, addrmeth, ameth, immoffs, None, memsz))
+
+        osize = 0
+        if tabdesc[2] == 0xff:
+            osize = 1   # For our final opcode byte
+
+        return (optype, mnem, osize, iflags, tuple(opers))
+
     def disasm(self, bytez, offset, va):
         # Stuff for opcode parsing
-        tabdesc = all_tables[0] # A tuple (optable, shiftbits, mask byte, sub, max)
         startoff = offset # Use startoff as a size knob if needed
-
-        # Stuff we'll be putting in the opcode object
-        optype = None # This gets set if we successfully decode below
-        mnem = None
-        operands = []
+        tables = self._dis_tables
 
         all_prefixes = 0
-        prefix_len = 0
         last_pref = 0
 
         while True:
@@ -874,18 +945,14 @@ class i386Disasm:
             all_prefixes |= p
             last_pref = obyte
             offset += 1
-            continue
 
         # At this point we should have all the possible prefixes, but some may be mandatory ones that we
         # need to not use as display prefixes and use as jumps in the table instead.
         # So we're going to lie to the rest of the code in order to use them as we want
-        obyte = ord(bytez[offset])
         ppref = [(None, None)]
         if obyte == 0x0f and MANDATORY_PREFIXES[last_pref]:
-            obyte = last_pref
             ppref.append((last_pref, i386_prefixes[last_pref]))
 
-        #pdone = False
         decodings = []
         mainbyte = offset
         prefixes = all_prefixes
@@ -896,83 +963,68 @@ class i386Disasm:
         # that modifies the instruction semantics entirely. Either way, the mandatory prefix
         # takes precedence and whichever one wins will be at the end of the list <decodings>
         for pref, onehot in ppref:
+            offset = mainbyte
             if pref is not None:
                 obyte = pref
-                offset = mainbyte
                 prefixes = all_prefixes & (~onehot)
             else:
-                offset = mainbyte
                 obyte = ord(bytez[offset])
 
-            tabdesc = all_tables[0]
+            tabnum = 0
             while True:
-                if (obyte > tabdesc[4]):
-                    tabdesc = all_tables[tabdesc[5]]
+                ftab = tables[tabnum]
+                if ftab is None:
+                    ftab = self._dis_buildTable(tabnum)
 
-                tabidx = ((obyte - tabdesc[3]) >> tabdesc[1]) & tabdesc[2]
-                if tabidx > len(tabdesc[0]):
+                opent = ftab[obyte]
+                if opent is None:
                     break
-                opdesc = tabdesc[0][tabidx]
 
                 # Hunt down multi-byte opcodes
-                nexttable = opdesc[0]
-                if nexttable != 0: # If we have a sub-table specified, use it.
-                    tabdesc = all_tables[nexttable]
-
+                tabnum, desc = opent
+                if tabnum != 0:
                     offset += 1
                     obyte = ord(bytez[offset])
-
                     continue
 
                 # We are now on the final table...
-                mnem = opdesc[6]
-                optype = opdesc[1]
-                if tabdesc[2] == 0xff:
-                    offset += 1  # For our final opcode byte
+                if desc[0] != 0:
+                    decodings.append((desc, offset + desc[2], prefixes))
                 break
-            if optype != 0:
-                decodings.append((opdesc, offset, prefixes))
 
         if not len(decodings):
             raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
 
-        opdesc, offset, all_prefixes = decodings.pop()
-        optype = opdesc[1]
-        mnem = opdesc[6]
+        desc, offset, all_prefixes = decodings.pop()
+        optype, mnem, osize, iflags, opers = desc
 
-        if optype == 0:
-            raise envi.InvalidInstruction(bytez=bytez[startoff:startoff+16], va=va)
+        mode = MODE_32
+        if all_prefixes & PREFIX_OP_SIZE:
+            mode = MODE_16
 
+        operands = []
         operoffset = 0
+        interned = self._dis_interned
         # Begin parsing operands based off address method
-        for i in operand_range:
+        for operflags, sizelist, addrmeth, ameth, immoffs, arg, memsz in opers:
 
             oper = None # Set this if we end up with an operand
             osize = 0
 
-            # Pull out the operand description from the table
-            operflags = opdesc[i]
-            opertype = operflags & opcode86.OPTYPE_MASK
-            addrmeth = operflags & opcode86.ADDRMETH_MASK
-
-            # If there are no more operands, break out of the loop!
-            if operflags == 0:
-                break
-
-            tsize = self._dis_calc_tsize(opertype, all_prefixes, operflags)
+            if sizelist is None:
+                raise Exception("OPERSIZE FAIL: %.8x" % (operflags & opcode86.OPTYPE_MASK))
+            tsize = sizelist[mode]
 
             # If addrmeth is zero,we have operands embedded in the opcode
             if addrmeth == 0:
-                osize = 0
-                oper = self.ameth_0(operflags, opdesc[5+i], tsize, all_prefixes)
+                oper = self.ameth_0(operflags, arg, tsize, all_prefixes)
             else:
-                ameth = self._dis_amethods[addrmeth >> 16]
                 if ameth is None:
                     raise Exception("Implement Addressing Method 0x%.8x" % addrmeth)
 
                 # NOTE: Depending on your addrmethod you may get beginning of operands, or offset
                 try:
-                    if addrmeth == opcode86.ADDRMETH_I or addrmeth == opcode86.ADDRMETH_J:
+                    if immoffs:
                         osize, oper = ameth(bytez, offset+operoffset, tsize, all_prefixes, operflags)
 
                         # If we are a sign extended immediate and not the same as the other operand,
@@ -993,10 +1045,8 @@ class i386Disasm:
                         # size, with no rhyme or reason as to which it is. So we directly embed
                         # that knowledge into the opcodes mappings we maintain and pluck it out
                         # here.
-                        if getattr(oper, "_is_deref", False):
-                            memsz = OP_EXTRA_MEMSIZES[(operflags & OP_MEMMASK) >> 4]
-                            if memsz is not None:
-                                oper.tsize = memsz
+                        if memsz is not None and getattr(oper, "_is_deref", False):
+                            oper.tsize = memsz
 
                 except struct.error as e:
                     # Catch struct unpack errors due to insufficient data length
@@ -1005,27 +1055,56 @@ class i386Disasm:
             if oper is not None:
                 # This is a filty hack for now...
                 oper._dis_regctx = self._dis_regctx
+                # Nothing modifies operands once decoded, so share the
+                # common register/immediate ones between instructions
+                ocls = oper.__class__
+                if ocls is i386RegOper:
+                    oper = interned.setdefault((ocls, oper.reg, oper.tsize), oper)
+                elif ocls is i386ImmOper and len(interned) < MAX_INTERNED:
+                    oper = interned.setdefault((ocls, type(oper.imm), oper.imm, oper.tsize), oper)
                 operands.append(oper)
 
             operoffset += osize
 
-        # Pull in the envi generic instruction flags
-        iflags = iflag_lookup.get(optype & 0xFFFF, 0) | self._dis_oparch
-
         if all_prefixes & PREFIX_REP_MASK:
             iflags |= envi.IF_REPEAT
 
-        if priv_lookup.get(mnem, False):
-            iflags |= envi.IF_PRIV
-
         # Lea will have a reg-mem/sib operand with _is_deref True, but should be false
-        if optype == opcode86.INS_LEA:
+        # (only the memory operands, register operands are shared)
+        if optype == opcode86.INS_LEA and operands[1].isDeref():
             operands[1]._is_deref = False
 
         ret = i386Opcode(va, optype, mnem, all_prefixes, (offset-startoff)+operoffset, operands, iflags)
 
         return ret
 
+    def disasmMany(self, bytez, offset, va, count=None):
+        '''
+        Decode up to count (or all) consecutive instructions starting at
+        offset (for va) and return a list of opcodes.  The sweep stops
+        early at the first invalid or truncated instruction.
+
+        Example:
+            ops = d.disasmMany(bytez, 0, 0x401000, 100)
+        '''
+        ret = []
+        end = len(bytez)
+        disasm = self.disasm
+        if count is None:
+            count = end - offset
+
+        while offset < end and len(ret) < count:
+            try:
+                op = disasm(bytez, offset, va)
+            except (envi.InvalidInstruction, IndexError):
+                break
+
+            ret.append(op)
+            offset += op.size
+            va += op.size
+
+        return ret
+
     # Declare all the address method parsers here!
 
     def ameth_0(self, operflags, operval, tsize, prefixes):
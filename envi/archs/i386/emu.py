@@ -39,6 +39,78 @@ def yieldPacked(valu, size, subsize):
         yield (sub & mask)
 
 
+# Lazy EFLAGS (see the i386:lazyflags emu option)
+#
+# In lazy mode the common arithmetic instructions only record a flag
+# calculator, the mask of flags it defines, and its arguments.  The flags
+# are computed when something reads them:  a single flag for getFlag()
+# (conditional jumps, setcc, cmovcc, adc...) or all of them (folded into
+# the real register) for anything which reads the eflags register itself.
+#
+# NOTE: each calculator must give *exactly* what the eager code for the
+#       instruction sets (see test_emu_lazyflags).
+ARITH_FLAGS = EFLAGS_CF | EFLAGS_PF | EFLAGS_AF | EFLAGS_ZF | EFLAGS_SF | EFLAGS_OF
+ARITH_FLAG_BITS = (EFLAGS_CF, EFLAGS_PF, EFLAGS_AF, EFLAGS_ZF, EFLAGS_SF, EFLAGS_OF)
+
+def _lazyflags_add(which, src, dst, ures, sres, dsize):
+    if which == EFLAGS_ZF:
+        return not ures
+    if which == EFLAGS_CF:
+        return e_bits.is_unsigned_carry(ures, dsize)
+    if which == EFLAGS_SF:
+        return e_bits.is_signed(ures, dsize)
+    if which == EFLAGS_OF:
+        return e_bits.is_signed_overflow(sres, dsize)
+    if which == EFLAGS_PF:
+        return e_bits.is_parity_byte(ures)
+    return e_bits.is_aux_carry(src, dst)
+
+def _lazyflags_sub(which, usrc, udst, ures, sres, dsize):
+    if which == EFLAGS_ZF:
+        return not sres
+    if which == EFLAGS_CF:
+        return e_bits.is_unsigned_carry(ures, dsize)
+    if which == EFLAGS_SF:
+        return e_bits.is_signed(ures, dsize)
+    if which == EFLAGS_OF:
+        return e_bits.is_signed_overflow(sres, dsize)
+    if which == EFLAGS_PF:
+        return e_bits.is_parity_byte(ures)
+    return e_bits.is_aux_carry_sub(usrc, udst)
+
+def _lazyflags_logic(which, res, dsize):
+    # and/or/xor/test (CF, OF and AF are cleared)
+    if which == EFLAGS_ZF:
+        return not res
+    if which == EFLAGS_SF:
+        return e_bits.is_signed(res, dsize)
+    if which == EFLAGS_PF:
+        return e_bits.is_parity_byte(res)
+    return False
+
+def _lazyflags_inc(which, sval, size):
+    if which == EFLAGS_ZF:
+        return not sval
+    if which == EFLAGS_SF:
+        return e_bits.is_signed(sval, size)
+    if which == EFLAGS_OF:
+        return e_bits.is_signed_overflow(sval, size)
+    if which == EFLAGS_PF:
+        return e_bits.is_parity_byte(sval)
+    return (sval & 0xf == 0)
+
+def _lazyflags_dec(which, val, uval, size):
+    if which == EFLAGS_ZF:
+        return not val
+    if which == EFLAGS_SF:
+        return e_bits.is_signed(val, size)
+    if which == EFLAGS_PF:
+        return e_bits.is_parity_byte(val)
+    if which == EFLAGS_AF:
+        return e_bits.is_aux_carry_sub(1, uval)
+    return False
+
+
 # The indexes for the list of segments in the emulator
 SEG_CS = 0
 SEG_DS = 1
@@ -113,8 +185,12 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         if archmod is None:
             archmod = i386Module()
 
+        # (calc, mask, args) for the pending flags in lazy flags mode
+        self._lazy_flags = None
+
         envi.Emulator.__init__(self, archmod=archmod)
         self.initEmuOpt('i386:reponce',False,'Set to True to short circuit rep prefix')
+        self.initEmuOpt('i386:lazyflags',False,'Set to True to only compute arithmetic flags when they are read')
 
         for i in range(6):
             self.setSegmentInfo(i, 0, 0xffffffff)
@@ -159,9 +235,99 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         self.setRegister(self.flagidx, flags)
 
     def getFlag(self, which):
+        lazy = self._lazy_flags
+        if lazy is not None and lazy[1] & which:
+            # A single pending flag is computed on its own
+            if not which & (which - 1):
+                return bool(lazy[0](which, *lazy[2]))
+            self._flushLazyFlags()
+
         flags = self.getRegister(self.flagidx)
         return bool(flags & which)
 
+    def _setLazyFlags(self, calc, mask, args):
+        '''
+        Record the flag calculator for the current instruction (see the
+        i386:lazyflags emu option).
+        '''
+        lazy = self._lazy_flags
+        if lazy is not None and lazy[1] & ~mask:
+            # The pending flags which we don't redefine must be kept
+            self._flushLazyFlags()
+        self._lazy_flags = (calc, mask, args)
+
+    def _flushLazyFlags(self):
+        '''
+        Compute any pending (lazy) flags into the eflags register.
+        '''
+        calc, mask, args = self._lazy_flags
+        self._lazy_flags = None
+
+        vals = self._rctx_Writable()
+        flags = vals[self.flagidx] & ~mask
+        for bit in ARITH_FLAG_BITS:
+            if mask & bit and calc(bit, *args):
+                flags |= bit
+
+        vals[self.flagidx] = flags
+        self._rctx_dirty = True
+
+    # The register context accessors must see the pending flags...
+
+    def getRegister(self, index):
+        ridx = index & 0xffff
+        if self._lazy_flags is not None and ridx == self.flagidx:
+            self._flushLazyFlags()
+
+        if ridx == index:
+            return self._rctx_vals[index]
+
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
+
+        ridx, shift, mask, clear = info
+        return (self._rctx_vals[ridx] >> shift) & mask
+
+    def setRegister(self, index, value):
+        self._rctx_dirty = True
+
+        ridx = index & 0xffff
+        if self._lazy_flags is not None and ridx == self.flagidx:
+            if ridx == index:
+                self._lazy_flags = None
+            else:
+                self._flushLazyFlags()
+
+        vals = self._rctx_vals
+        if vals.__class__ is tuple:
+            vals = self._rctx_vals = list(vals)
+
+        if ridx == index:
+            vals[index] = value & self._rctx_masks[index]
+            return
+
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
+
+        ridx, shift, mask, clear = info
+        vals[ridx] = ((value << shift) | (vals[ridx] & clear)) & self._rctx_masks[ridx]
+
+    def getRegisterSnap(self):
+        if self._lazy_flags is not None:
+            self._flushLazyFlags()
+        return envi.Emulator.getRegisterSnap(self)
+
+    def setRegisterSnap(self, snap):
+        self._lazy_flags = None
+        envi.Emulator.setRegisterSnap(self, snap)
+
+    def _rctx_Export(self, sobj):
+        if self._lazy_flags is not None:
+            self._flushLazyFlags()
+        envi.Emulator._rctx_Export(self, sobj)
+
     def readMemValue(self, addr, size):
         bytes = self.readMemory(addr, size)
         if bytes is None:
@@ -247,6 +413,28 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         newpc = pc+op.size
         self.setProgramCounter(newpc)
 
+    def _compileStep(self, op):
+        # The handler is looked up once per compiled instruction.  Blocks
+        # only start steps with the program counter at op.va, so unlike
+        # executeOpcode() there is no need to set it first.
+        meth = self.op_methods.get(op.mnem)
+        if meth is None or op.prefixes & PREFIX_REP:
+            return envi.Emulator._compileStep(self, op)
+
+        nextva = op.va + op.size
+        setpc = self.setProgramCounter
+
+        def step():
+            newpc = meth(op)
+            if newpc is not None:
+                setpc(newpc)
+                return True
+
+            setpc(nextva)
+            return False
+
+        return step
+
     ###### Conditional Callbacks #####
 
     # NOTE: for ease of validation, these are in the same order as the Jcc
@@ -378,6 +566,10 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         ures = udst - usrc
         sres = sdst - ssrc
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_sub, ARITH_FLAGS, (usrc, udst, ures, sres, dsize))
+            return ures
+
         self.setFlag(EFLAGS_OF, e_bits.is_signed_overflow(sres, dsize))
         self.setFlag(EFLAGS_AF, e_bits.is_aux_carry_sub(usrc, udst))
         self.setFlag(EFLAGS_CF, e_bits.is_unsigned_carry(ures, dsize))
@@ -405,6 +597,10 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
 
         res = src & dst
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_logic, ARITH_FLAGS, (res, dsize))
+            return res
+
         self.setFlag(EFLAGS_AF, 0) # AF is undefined, but it seems like it is zeroed
         self.setFlag(EFLAGS_OF, 0)
         self.setFlag(EFLAGS_CF, 0)
@@ -481,6 +677,11 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         ures = udst + usrc
         sres = sdst + ssrc
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_add, ARITH_FLAGS, (src, dst, ures, sres, dsize))
+            self.setOperValue(op, 0, ures)
+            return
+
         self.setFlag(EFLAGS_CF, e_bits.is_unsigned_carry(ures, dsize))
         self.setFlag(EFLAGS_PF, e_bits.is_parity_byte(ures))
         self.setFlag(EFLAGS_AF, e_bits.is_aux_carry(src, dst))
@@ -821,6 +1022,10 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         self.setOperValue(op, 0, val)
         #FIXME change over to integer subtraction
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_dec, ARITH_FLAGS & ~EFLAGS_CF, (val, uval, op.opers[0].tsize))
+            return
+
         self.setFlag(EFLAGS_OF, 0) #FIXME OF
         self.setFlag(EFLAGS_SF, e_bits.is_signed(val, op.opers[0].tsize))
         self.setFlag(EFLAGS_ZF, not val)
@@ -1004,6 +1209,9 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         self.setOperValue(op, 0, sval)
 
         # Another arithmetic op where doing signed and unsigned is easier ;)
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_inc, ARITH_FLAGS & ~EFLAGS_CF, (sval, size))
+            return
 
         self.setFlag(EFLAGS_OF, e_bits.is_signed_overflow(sval, size))
         self.setFlag(EFLAGS_SF, e_bits.is_signed(sval, size))
@@ -1314,6 +1522,10 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
         res = dst | src
         self.setOperValue(op, 0, res)
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_logic, ARITH_FLAGS & ~EFLAGS_AF, (res, dsize))
+            return
+
         self.setFlag(EFLAGS_OF, 0)
         self.setFlag(EFLAGS_CF, 0)
         self.setFlag(EFLAGS_SF, e_bits.is_signed(res, dsize))
@@ -1850,6 +2062,10 @@ class IntelEmulator(i386RegisterContext, envi.Emulator):
 
         self.setOperValue(op, 0, ret)
 
+        if self._emu_opts['i386:lazyflags']:
+            self._setLazyFlags(_lazyflags_logic, ARITH_FLAGS, (ret, dsize))
+            return
+
         self.setFlag(EFLAGS_CF, 0)
         self.setFlag(EFLAGS_OF, 0)
         self.setFlag(EFLAGS_SF, e_bits.is_signed(ret, dsize))
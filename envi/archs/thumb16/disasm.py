@@ -2440,6 +2440,9 @@ class ThumbDisasm:
 
     def __init__(self, doModeSwitch=True, endian=envi.ENDIAN_LSB):
         self._doModeSwitch = doModeSwitch
+        # (first halfword | second halfword << 16 | va & 2 << 31) -> decode template,
+        # first decoded opcode or False (see cacheDecode)
+        self._dis_cache = {}
         self.setEndian(endian)
 
     def setEndian(self, endian):
@@ -2450,13 +2453,31 @@ class ThumbDisasm:
         return self.endian
 
     def disasm(self, bytez, offset, va, trackMode=True):
-        oplen = None
-        flags = 0
-        simdflags = 0
         va &= -2
         offset &= -2
         val, = struct.unpack_from(self.hfmt, bytez, offset)
 
+        # (pc relative operands use the word aligned pc, so a halfword
+        # aligned va may decode differently)
+        key = val | ((va & 2) << 31)
+        if is_thumb32(val) and len(bytez) >= offset + 4:
+            val2, = struct.unpack_from(self.hfmt, bytez, offset+2)
+            key |= val2 << 16
+
+        tmpl = self._dis_cache.get(key)
+        if tmpl.__class__ is tuple:
+            return bindDecodeTemplate(tmpl, va)
+
+        op = self._disasm(val, bytez, offset, va)
+        if tmpl is not False:
+            cacheDecode(self._dis_cache, key, op)
+        return op
+
+    def _disasm(self, val, bytez, offset, va):
+        oplen = None
+        flags = 0
+        simdflags = 0
+
         try:
             opcode, mnem, opermkr, flags = self._tree.getInt(val, 16)
         except TypeError:
@@ -8,10 +8,14 @@ import logging
 import binascii
 import traceback
 
+import envi.exc as e_exc
 import envi.symstore.resolver as e_resolv
 
 logger = logging.getLogger(__name__)
 
+# RenderCache entries are dropped (all at once) at this many cached vas
+RENDER_CACHE_MAX = 0x10000
+
 class MemoryRenderer(object):
     """
     A top level object for all memory renderers
@@ -45,6 +49,14 @@ class MemoryRenderer(object):
         """
         raise Exception("Implement render!")
 
+    def getPrevVa(self, mcanv, va):
+        """
+        Return the va of the "unit" which ends at va (or None if the
+        renderer can't tell).  Used by renderMemoryWindow() to render a
+        margin before the requested va.
+        """
+        return None
+
 
 class MemoryCanvas(object):
     """
@@ -354,27 +366,226 @@ class MemoryCanvas(object):
         # Canvas callback for render completion (or error...)
         self._endRenderMemory(va, size, rend)
 
+    def renderMemoryWindow(self, va, count, margin=0, rend=None):
+        '''
+        Render count "units" (one call to the renderer each) starting at
+        va plus (up to) margin units before and after them.  Unlike
+        renderMemory() the cost depends only on the size of the window,
+        not on the size of the memory map.  The render stops at the end
+        of the memory map and may be extended with renderMemoryAppend()
+        and renderMemoryPrepend().
+
+        Returns the list of (va, size) tuples rendered.
+        '''
+        if rend is None:
+            rend = self.currend
+
+        self.currend = rend
+
+        vmap = self.mem.getMemoryMap(va)
+        if vmap is None:
+            raise e_exc.InvalidAddress(va)
+
+        mapva, mapsize = vmap[:2]
+        maxva = mapva + mapsize
+
+        units = count + margin
+        for i in xrange(margin):
+            prevva = rend.getPrevVa(self, va)
+            if prevva is None or prevva < mapva or prevva >= va:
+                break
+            va = prevva
+            units += 1
+
+        if not self._canv_scrolled:
+            self.clearCanvas()
+
+        self._canv_beginva = va
+        self._canv_endva = va
+        self._canv_rendvas = []
+
+        self._beginRenderMemory(va, maxva - va, rend)
+        try:
+            while units and va < maxva:
+                self._beginRenderVa(va)
+                try:
+                    rsize = rend.render(self, va)
+                    self._canv_rendvas.append((va, rsize))
+                    self._endRenderVa(va)
+                    va += rsize
+                    units -= 1
+                except Exception as e:
+                    logger.error(traceback.format_exc())
+                    self.addText("\nRender Exception At %s: %s\n" % (hex(va), str(e)))
+                    self._endRenderVa(va)
+                    break
+
+        except Exception as e:
+            self.addText("\nException At %s: %s\n" % (hex(va), str(e)))
+
+        self._canv_endva = va
+        self._endRenderMemory(self._canv_beginva, va - self._canv_beginva, rend)
+        return self._canv_rendvas
+
 
 class StringMemoryCanvas(MemoryCanvas):
 
     def __init__(self, mem, syms=None):
         MemoryCanvas.__init__(self, mem, syms=syms)
-        self.strval = ''
+        # text is joined on demand (see strval) rather than on every add
+        self._canv_strs = []
 
         # we perform manual clearing of the canvas.
         # we don't want it cleared every renderMemory call.
         self.setScrolledCanvas(True)
 
+    def _getStrVal(self):
+        if len(self._canv_strs) > 1:
+            self._canv_strs = [''.join(self._canv_strs)]
+        if not self._canv_strs:
+            return ''
+        return self._canv_strs[0]
+
+    def _setStrVal(self, strval):
+        self._canv_strs = [strval]
+
+    strval = property(_getStrVal, _setStrVal)
+
     def clearCanvas(self):
-        self.strval = ''
+        self._canv_strs = []
 
     def addText(self, text, tag=None):
-        self.strval += text
+        self._canv_strs.append(text)
 
     def __str__(self):
         return self.strval
 
 
+class CanvasRecorder(MemoryCanvas):
+    '''
+    A canvas which records the text (and abstract tags) added to it so
+    that a render may be replayed onto any other canvas with replay().
+
+    The va of every va tag is collected in "vas" so a cache may drop the
+    render when something about one of those addresses changes.
+    '''
+    def __init__(self, mem, syms=None):
+        MemoryCanvas.__init__(self, mem, syms=syms)
+        self.ops = []
+        self.vas = set()
+
+    def getTag(self, typename):
+        return ('tag', typename)
+
+    def getNameTag(self, name, typename='name'):
+        return ('name', name, typename)
+
+    def getVaTag(self, va):
+        self.vas.add(va)
+        return ('va', va)
+
+    def addText(self, text, tag=None):
+        # coalesce runs of untagged text
+        if tag is None and self.ops and self.ops[-1][1] is None:
+            self.ops[-1] = (self.ops[-1][0] + text, None)
+            return
+        self.ops.append((text, tag))
+
+    def replay(self, mcanv):
+        replayCanvasOps(mcanv, self.ops)
+
+
+def replayCanvasOps(mcanv, ops):
+    '''
+    Add the (text, tag) tuples recorded by a CanvasRecorder to mcanv,
+    resolving each abstract tag with the canvas' own getTag() methods.
+    '''
+    for text, tag in ops:
+        if tag is not None:
+            ttype = tag[0]
+            if ttype == 'va':
+                tag = mcanv.getVaTag(tag[1])
+            elif ttype == 'name':
+                tag = mcanv.getNameTag(tag[1], typename=tag[2])
+            else:
+                tag = mcanv.getTag(tag[1])
+        mcanv.addText(text, tag=tag)
+
+
+class RenderCache(object):
+    '''
+    A cache of recorded renders (see CanvasRecorder) by va.
+
+    Each entry is indexed by the addresses it rendered and by every va
+    it linked to (va tags) so invalidate() drops only the renders which
+    could now come out differently.  A render which was in progress when
+    something was invalidated is not cached (see put()).
+    '''
+    def __init__(self, maxsize=RENDER_CACHE_MAX):
+        self.maxsize = maxsize
+        self.gen = 0
+        self._rend_cache = {}
+        self._rend_deps = {}
+
+    def __len__(self):
+        return len(self._rend_cache)
+
+    def get(self, va):
+        '''
+        Return the cached (size, ops) tuple for va or None.
+        '''
+        return self._rend_cache.get(va)
+
+    def put(self, va, size, ops, deps, gen):
+        '''
+        Cache the (size, ops) render of va which depends on the addresses
+        in deps.  The gen argument is the value of self.gen from *before*
+        the render began; if anything was invalidated since, the render
+        is discarded.
+        '''
+        if gen != self.gen:
+            return
+
+        if len(self._rend_cache) >= self.maxsize:
+            self._rend_cache.clear()
+            self._rend_deps.clear()
+
+        self._rend_cache[va] = (size, ops)
+        for dva in deps:
+            rvas = self._rend_deps.get(dva)
+            if rvas is None:
+                rvas = set()
+                self._rend_deps[dva] = rvas
+            rvas.add(va)
+
+    def invalidate(self, va, size=1):
+        '''
+        Drop every cached render which depends on va:va+size.
+        '''
+        self.gen += 1
+        if not self._rend_deps:
+            return
+
+        if size > len(self._rend_deps):
+            maxva = va + size
+            dvas = [dva for dva in self._rend_deps if va <= dva < maxva]
+        else:
+            dvas = xrange(va, va + size)
+
+        for dva in dvas:
+            rvas = self._rend_deps.pop(dva, None)
+            if rvas is None:
+                continue
+
+            for rva in rvas:
+                self._rend_cache.pop(rva, None)
+
+    def clear(self):
+        self.gen += 1
+        self._rend_cache.clear()
+        self._rend_deps.clear()
+
+
 class CanvasMethodProxy(object):
     '''
     Target for teecanvas.
@@ -51,6 +51,9 @@ class ByteRend(e_canvas.MemoryRenderer):
 
         return len(bytez)
 
+    def getPrevVa(self, mcanv, va, numbytes=16):
+        return va - numbytes
+
 class ShortRend(ByteRend):
 
     __fmt_char__ = 'H'
@@ -21,6 +21,10 @@ MM_READ_WRITE = MM_READ | MM_WRITE
 MM_READ_EXEC = MM_READ | MM_EXEC
 MM_RWX = MM_READ | MM_WRITE | MM_EXEC
 
+# Chunk size and regex overlap used by IMemory.searchMemoryMulti()
+SEARCH_CHUNK = 0x100000
+SEARCH_OVERLAP = 0x1000
+
 pnames = ['No Access', 'Execute', 'Write', None, 'Read']
 def getPermName(perm):
     '''
@@ -54,6 +58,26 @@ def parsePerms(pstr):
         ret |= MM_EXEC
     return ret
 
+def getMaskedRegex(needle, mask):
+    '''
+    Return a regular expression (string) matching the bytes of needle
+    where only the bits set in the corresponding mask byte must match.
+    '''
+    if len(needle) != len(mask):
+        raise Exception('mask length (%d) does not match needle (%d)' % (len(mask), len(needle)))
+
+    parts = []
+    for nbyte, mbyte in zip(needle, mask):
+        m = ord(mbyte)
+        n = ord(nbyte) & m
+        if m == 0xff:
+            parts.append(re.escape(nbyte))
+        elif m == 0:
+            parts.append('.')
+        else:
+            parts.append('[%s]' % ''.join(re.escape(chr(b)) for b in range(256) if b & m == n))
+    return ''.join(parts)
+
 class IMemory:
     """
     This is the interface spec (and a few helper utils)
@@ -311,6 +335,96 @@ class IMemory:
 
         return results
 
+    def searchMemoryMulti(self, needles, masks=None, ranges=None,
+                          chunksize=SEARCH_CHUNK, overlap=SEARCH_OVERLAP):
+        """
+        Search memory for any of the given needles while reading each
+        memory map (or (va, size) tuple in ranges) only once, in chunks of
+        chunksize bytes.  Needles may be strings or compiled regular
+        expressions (see re.compile).  If specified, masks is a list
+        (parallel to needles) of mask strings (or None) where only the bits
+        set in each mask byte must match the corresponding needle byte.
+
+        Returns a list of (needle, va) tuples in address order (per map).
+        As with searchMemory(), matches of one needle do not overlap.
+
+        NOTE: regex matches longer than overlap bytes may be missed where
+              they span a chunk boundary.
+
+        Example:
+            for needle, va in mem.searchMemoryMulti(['VISI', re.compile('fo+')]):
+                print('0x%.8x: %r' % (va, needle))
+        """
+        if masks is None:
+            masks = [None] * len(needles)
+
+        if len(masks) != len(needles):
+            raise Exception('searchMemoryMulti: %d masks for %d needles' % (len(masks), len(needles)))
+
+        matchers = []
+        maxlen = 1
+        for needle, mask in zip(needles, masks):
+            if mask is not None:
+                regex = re.compile(getMaskedRegex(needle, mask), re.DOTALL)
+                matchers.append((needle, regex, len(needle)))
+                maxlen = max(maxlen, len(needle))
+
+            elif hasattr(needle, 'finditer'):
+                matchers.append((needle, needle, None))
+                maxlen = max(maxlen, overlap + 1)
+
+            else:
+                matchers.append((needle, None, len(needle)))
+                maxlen = max(maxlen, len(needle))
+
+        if ranges is None:
+            ranges = [(va, size) for va, size, perm, fname in self.getMemoryMaps()]
+
+        results = []
+        for va, size in ranges:
+            self._searchRangeMulti(matchers, va, size, chunksize, maxlen - 1, results)
+
+        return results
+
+    def _searchRangeMulti(self, matchers, va, size, chunksize, overlap, results):
+        # Each chunk is read with overlap extra bytes so matches which start
+        # in the chunk but end in the next one are found.  Matches starting
+        # in the overlap are left for the next chunk.
+        nextva = [va] * len(matchers)
+        end = va + size
+        offset = va
+        while offset < end:
+            csize = min(chunksize, end - offset)
+            try:
+                memory = self.readMemory(offset, min(csize + overlap, end - offset))
+            except Exception:
+                break # Some platforms dont let debuggers read non-readable mem
+
+            hits = []
+            for i, (needle, regex, nlen) in enumerate(matchers):
+                pos = max(nextva[i] - offset, 0)
+                if regex is None:
+                    while True:
+                        loc = memory.find(needle, pos)
+                        if loc == -1 or loc >= csize:
+                            break
+                        hits.append((offset + loc, i))
+                        pos = loc + max(nlen, 1)
+
+                else:
+                    for match in regex.finditer(memory, pos):
+                        loc = match.start()
+                        if loc >= csize:
+                            break
+                        hits.append((offset + loc, i))
+                        pos = max(match.end(), loc + 1)
+
+                nextva[i] = max(nextva[i], offset + pos)
+
+            hits.sort()
+            results.extend((matchers[i][0], hva) for hva, i in hits)
+            offset += csize
+
     def parseOpcode(self, va, arch=envi.ARCH_DEFAULT):
         '''
         Parse an opcode from the specified virtual address.
@@ -347,7 +461,7 @@ class MemoryCache(IMemory):
             chunksize = min( self.pagesize - pageoff, size )
             page = self.pagecache.get( pageva )
             if page is None:
-                page = self.mem.readMemory(pageva, self.pagesize)
+                page = self._cachePage(pageva)
                 self.pagecache[pageva] = page
             ret += page[ pageoff : pageoff + chunksize ]
 
@@ -365,7 +479,7 @@ class MemoryCache(IMemory):
 
             page = self.pagecache.get(pageva)
             if page is None:
-                page = self.mem.readMemory(pageva, self.pagesize)
+                page = self._cachePage(pageva)
                 self.pagecache[pageva] = page
 
             self.pagedirty[pageva] = True
@@ -22,8 +22,15 @@ class RegisterContext:
     def getRegisterSnap(self):
         """
         Use this to bulk save off the register state.
+
+        NOTE: Snapshots are (immutable) tuples which the context shares
+              until the next register write (copy on write), so taking
+              and restoring snapshots is cheap.
         """
-        return list(self._rctx_vals)
+        vals = self._rctx_vals
+        if vals.__class__ is not tuple:
+            vals = self._rctx_vals = tuple(vals)
+        return vals
 
     def setRegisterSnap(self, snap):
         """
@@ -33,7 +40,18 @@ class RegisterContext:
               RegisterContext has been initialized the same way
               (like context switches in tracers, or emulaction snaps)
         """
-        self._rctx_vals = list(snap)
+        self._rctx_vals = tuple(snap)
+
+    def _rctx_Writable(self):
+        """
+        Return the register value list for writing (copying it if it is
+        currently shared with a snapshot).  Code which writes _rctx_vals
+        directly *must* use this.
+        """
+        vals = self._rctx_vals
+        if vals.__class__ is tuple:
+            vals = self._rctx_vals = list(vals)
+        return vals
 
     def isDirty(self):
         """
@@ -64,6 +82,8 @@ class RegisterContext:
         self._rctx_widths = []
         self._rctx_vals  = []
         self._rctx_masks = []
+        # meta register index -> (ridx, shift, mask, clearmask)
+        self._rctx_xlate = {}
 
         for i, (name, width) in enumerate(regdef):
             self._rctx_names[name] = i
@@ -110,10 +130,29 @@ class RegisterContext:
         newidx = (offset << 24) + (width << 16) + idx
         self._rctx_names[name] = newidx
         self._rctx_ids[newidx] = name
+        if idx < len(self._rctx_widths):
+            self._rctx_MetaXlate(newidx)
 
     def isMetaRegister(self, index):
         return (index & 0xffff) != index
 
+    def _rctx_MetaXlate(self, index):
+        """
+        Return (and cache) the (ridx, shift, mask, clearmask) accessor
+        info for a meta register index.  The clearmask is the real
+        register mask with a hole cut where the meta register lives.
+        """
+        ridx = index & 0xffff
+        shift = (index >> 24) & 0xff
+        width = (index >> 16) & 0xff
+
+        mask = (1 << width) - 1
+        basemask = (1 << self._rctx_widths[ridx]) - 1
+        info = (ridx, shift, mask, basemask ^ (mask << shift))
+
+        self._rctx_xlate[index] = info
+        return info
+
     def _rctx_Import(self, sobj):
         """
         Given an object with attributes with the same names as
@@ -123,13 +162,14 @@ class RegisterContext:
         """
         # On import from a structure, we are clean again.
         self._rctx_dirty = False
+        vals = self._rctx_Writable()
         for name,idx in self._rctx_names.items():
             # Skip meta registers
             if (idx & 0xffff) != idx:
                 continue
             x = getattr(sobj, name, None)
             if x is not None:
-                self._rctx_vals[idx] = x
+                vals[idx] = x
 
     def _rctx_Export(self, sobj):
         """
@@ -296,11 +336,15 @@ class RegisterContext:
         """
         Return the current value of the specified register index.
         """
-        ridx = index & 0xffff
-        value = self._rctx_vals[ridx]
-        if ridx != index:
-            value = self._xlateToMetaReg(index, value)
-        return value
+        if (index & 0xffff) == index:
+            return self._rctx_vals[index]
+
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
+
+        ridx, shift, mask, clear = info
+        return (self._rctx_vals[ridx] >> shift) & mask
 
     def getMetaRegInfo(self, index):
         '''
@@ -311,58 +355,38 @@ class RegisterContext:
         Example:
             real_reg, lshift, mask = r.getMetaRegInfo(x)
         '''
-        ridx = index & 0xffff
-        if ridx == index:
+        if (index & 0xffff) == index:
             return None
 
-        offset = (index >> 24) & 0xff
-        width  = (index >> 16) & 0xff
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
 
-        mask = (2**width)-1
-        return ridx, offset, mask
+        return info[:3]
 
     def _xlateToMetaReg(self, index, value):
         '''
         Translate a register value to the meta register value
         (used when getting a meta register)
         '''
-        ridx = index & 0xffff
-        offset = (index >> 24) & 0xff
-        width  = (index >> 16) & 0xff
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
 
-        mask = (2**width)-1
-
-        if offset != 0:
-            value >>= offset
-
-        return value & mask
+        ridx, shift, mask, clear = info
+        return (value >> shift) & mask
 
     def _xlateToNativeReg(self, index, value):
         '''
         Translate a register value to the native register value
         (used when setting a meta register)
         '''
-        ridx = index & 0xffff
-        width = (index >> 16) & 0xff
-        offset = (index >> 24) & 0xff
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
 
-        # FIXME is it faster to generate or look these up?
-        mask = (2 ** width) - 1
-        mask = mask << offset
-
-        # NOTE: basewidth is in *bits*
-        basewidth = self._rctx_widths[ridx]
-        basemask = (2 ** basewidth) - 1
-
-        # cut a whole in basemask at the size/offset of mask
-        finalmask = basemask ^ mask
-
-        curval = self._rctx_vals[ridx]
-
-        if offset:
-            value <<= offset
-
-        return value | (curval & finalmask)
+        ridx, shift, mask, clear = info
+        return (value << shift) | (self._rctx_vals[ridx] & clear)
 
     def setRegister(self, index, value):
         """
@@ -370,14 +394,22 @@ class RegisterContext:
         """
         self._rctx_dirty = True
 
-        ridx = index & 0xffff
+        vals = self._rctx_vals
+        if vals.__class__ is tuple:
+            vals = self._rctx_vals = list(vals)
+
+        if (index & 0xffff) == index:
+            vals[index] = value & self._rctx_masks[index]
+            return
 
         # If it's a meta register index, lets mask it into
         # the real thing...
-        if ridx != index:
-            value = self._xlateToNativeReg(index, value)
+        info = self._rctx_xlate.get(index)
+        if info is None:
+            info = self._rctx_MetaXlate(index)
 
-        self._rctx_vals[ridx] = (value & self._rctx_masks[ridx])
+        ridx, shift, mask, clear = info
+        vals[ridx] = ((value << shift) | (vals[ridx] & clear)) & self._rctx_masks[ridx]
 
     def getRealRegisterNameByIdx(self, regidx):
         """
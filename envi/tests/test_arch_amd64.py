@@ -1420,6 +1420,27 @@ class Amd64InstructionSet(unittest.TestCase):
         opercheck = [{'disp': 32, 'index': 12, 'tsize': 8, 'scale': 8, 'imm': None, '_is_deref': True, 'reg': 4}, {'tsize': 8, 'reg': 7}]
         self.checkOpcode( opbytez, 0x4000, oprepr, opcheck, opercheck, oprepr )
 
+    def test_envi_amd64_disasm_Many(self):
+        # push rbp; mov rbp,rsp; push rbp; add rsp,8; truncated mov eax,imm32
+        bytez = binascii.unhexlify('554889e5554883c408b801')
+        ops = self._arch.archParseOpcodes(bytez, 0, 0x4000)
+        self.assertEqual([repr(op) for op in ops], ['push rbp', 'mov rbp,rsp', 'push rbp', 'add rsp,8'])
+        self.assertEqual([op.va for op in ops], [0x4000, 0x4001, 0x4004, 0x4005])
+        for op in ops:
+            self.assertEqual(repr(op), repr(self._arch.archParseOpcode(bytez, op.va - 0x4000, op.va)))
+
+        self.assertEqual(len(self._arch.archParseOpcodes(bytez, 1, 0x4001, count=2)), 2)
+
+        # Register/immediate operands are shared between instructions
+        self.assertIs(ops[0].opers[0], ops[2].opers[0])
+
+        # (so lea reg,reg must not change its shared register operand)
+        lea = self._arch.archParseOpcode(binascii.unhexlify('488dc1'), 0, 0x4000)
+        mov = self._arch.archParseOpcode(binascii.unhexlify('4889c8'), 0, 0x4000)
+        self.assertIs(lea.opers[1], mov.opers[1])
+        self.assertNotIn('_is_deref', mov.opers[1].__dict__)
+        self.assertFalse(self._arch.archParseOpcode(binascii.unhexlify('488d01'), 0, 0x4000).opers[1].isDeref())
+
 
 def generateTestInfo(ophexbytez='6e'):
     a64 = e_amd64.Amd64Module()
@@ -1789,6 +1789,38 @@ class ArmInstructionSet(unittest.TestCase):
     def test_envi_arm_thumb_switches(self):
         pass
 
+    def test_envi_arm_decode_cache(self):
+        a = arm.ArmModule()
+        # ldr r3, [pc, #8] / b #0x48 / thumb b #0 / thumb bl #4 / thumb ldr r0, [pc, #4]
+        vas = (0x1000, 0x1000, 0x2000, 0x8000, 0xbfb00000)
+        halfvas = (0x3002, 0x3002, 0x4006, 0x1000, 0x2000, 0x2000, 0x5002)
+        for hexbytes, dis, tvas, tmpls in (('08309fe5', a._arch_dis, vas, 1),
+                                           ('100000ea', a._arch_dis, vas, 1),
+                                           ('fee7', a._arch_thumb_dis, vas, 1),
+                                           ('00f000f8', a._arch_thumb_dis, vas, 1),
+                                           ('0148', a._arch_thumb_dis, halfvas, 2)):
+            opbytes = binascii.unhexlify(hexbytes)
+            thumb = int(dis is a._arch_thumb_dis)
+            for va in tvas:
+                op = a.archParseOpcode(opbytes, 0, va | thumb)
+                val, = struct.unpack_from(('<I', '<H')[thumb], opbytes)
+                ref = dis._disasm(val, opbytes, 0, va)
+                self.assertEqual(op.va, va)
+                self.assertEqual(repr(op), repr(ref))
+                self.assertEqual(op.getBranches(), ref.getBranches())
+                for oper, roper in zip(op.opers, ref.opers):
+                    self.assertEqual(oper.__dict__, roper.__dict__)
+
+            # the words should be cached (as templates) by now
+            self.assertEqual(len([tmpl for tmpl in dis._dis_cache.values() if type(tmpl) is tuple]), tmpls)
+            dis._dis_cache.clear()
+
+        # (the literal is at the word aligned pc + 4 + 4)
+        for va, lva in ((0x3002, 0x3008), (0x4006, 0x400c), (0x5000, 0x5008)):
+            op = a.archParseOpcode(binascii.unhexlify('0148'), 0, va | 1)
+            self.assertEqual(op.opers[1].getOperAddr(op), lva)
+        a._arch_thumb_dis._dis_cache.clear()
+
     def validateEmulation(self, emu, op, setters, tests, tidx=0):
         # first set any environment stuff necessary
         ## defaults
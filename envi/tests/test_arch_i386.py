@@ -476,3 +476,24 @@ class i386InstructionSet(unittest.TestCase):
         opcheck = {'iflags': 65536, 'va': 16384, 'repr': None, 'prefixes': 0, 'mnem': 'cvttps2pi', 'opcode': 61440}
         opercheck = [{'tsize': 8, 'reg': 4194355}, {'disp': -287454021, 'tsize': 8, '_is_deref': True, 'reg': 2}]
         self.checkOpcode(opbytez, 0x4000, oprepr, opcheck, opercheck, oprepr)
+
+    def test_envi_i386_disasm_Many(self):
+        # push ebp; mov ebp,esp; push ebp; add esp,8; truncated mov eax,imm32
+        bytez = binascii.unhexlify('5589e55583c408b801')
+        ops = self._arch.archParseOpcodes(bytez, 0, 0x4000)
+        self.assertEqual([repr(op) for op in ops], ['push ebp', 'mov ebp,esp', 'push ebp', 'add esp,8'])
+        self.assertEqual([op.va for op in ops], [0x4000, 0x4001, 0x4003, 0x4004])
+        for op in ops:
+            self.assertEqual(repr(op), repr(self._arch.archParseOpcode(bytez, op.va - 0x4000, op.va)))
+
+        self.assertEqual(len(self._arch.archParseOpcodes(bytez, 1, 0x4001, count=2)), 2)
+
+        # Register/immediate operands are shared between instructions
+        self.assertIs(ops[0].opers[0], ops[2].opers[0])
+
+        # (so lea reg,reg must not change its shared register operand)
+        lea = self._arch.archParseOpcode(binascii.unhexlify('8dc1'), 0, 0x4000)
+        mov = self._arch.archParseOpcode(binascii.unhexlify('89c8'), 0, 0x4000)
+        self.assertIs(lea.opers[1], mov.opers[1])
+        self.assertNotIn('_is_deref', mov.opers[1].__dict__)
+        self.assertFalse(self._arch.archParseOpcode(binascii.unhexlify('8d01'), 0, 0x4000).opers[1].isDeref())
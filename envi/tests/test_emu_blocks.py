@@ -0,0 +1,105 @@
+'''
+Tests for compiled block execution (Emulator.stepBlock()) against single
+stepping the same code.
+'''
+import random
+import struct
+import binascii
+import unittest
+
+import envi
+import envi.memory as e_mem
+
+import envi.tests.test_emu_lazyflags as t_lazyflags
+
+codeva = 0x10000
+
+loops = {
+    # mov ecx,1000; add eax,ecx; xor edx,eax; mov ebx,edx; dec ecx; jnz
+    'i386': 'b9e803000001c831c289d34975f7',
+    # mov ecx,1000; add eax,ecx; xor edx,eax; mov ebx,edx; dec ecx; jnz
+    'amd64': 'b9e803000001c831c289d3ffc975f6',
+    # mov r1,#0x400; add r0,r0,r1; eor r2,r2,r0; subs r1,r1,#1; bne
+    'arm': '011ba0e3010080e0002022e0011051e2fbffff1a',
+    # movs r1,#0xff; adds r0,r0,r1; eors r2,r0; subs r1,#1; bne
+    'thumb': 'ff21401842400139fbd1',
+}
+
+
+def getEmu(archname, code):
+    emu = envi.getArchModule(archname).getEmulator()
+    emu.addMemoryMap(codeva, e_mem.MM_RWX, 'code', code + '\x00' * 16)
+    emu.setProgramCounter(codeva)
+    return emu
+
+
+def runCode(archname, code, blocks, regs=None):
+    '''
+    Run the code to its end and return (emu, instruction count).
+    '''
+    emu = getEmu(archname, code)
+    if regs is not None:
+        emu.setRegisters(regs)
+        emu.setProgramCounter(codeva)
+
+    count = 0
+    endva = codeva + len(code)
+    while emu.getProgramCounter() != endva:
+        if blocks:
+            count += emu.stepBlock()
+        else:
+            emu.stepi()
+            count += 1
+
+    return emu, count
+
+
+class EmuBlocksTest(unittest.TestCase):
+
+    def checkSame(self, archname, code, regs=None):
+        emu, count = runCode(archname, code, False, regs=regs)
+        bemu, bcount = runCode(archname, code, True, regs=regs)
+        self.assertEqual(bcount, count, binascii.hexlify(code))
+        self.assertEqual(bemu.getRegisters(), emu.getRegisters(), binascii.hexlify(code))
+        return bemu
+
+    def test_envi_blocks_loops(self):
+        for archname, loop in sorted(loops.items()):
+            emu = self.checkSame(archname, binascii.unhexlify(loop))
+            # (the entry block and the loop body)
+            self.assertEqual(len(emu._emu_blocks), 2)
+
+    def test_envi_blocks_random(self):
+        rnd = random.Random(0xb10c)
+        for archname in ('i386', 'amd64'):
+            for i in range(50):
+                # (ending with a jmp $+2 so the last block ends there)
+                code = ''.join([t_lazyflags.genInstr(rnd, archname) for j in range(40)]) + '\xeb\x00'
+                regs = getEmu(archname, code).getRegisters()
+                for name in regs:
+                    if name.startswith('e') or name.startswith('r'):
+                        regs[name] = rnd.getrandbits(32)
+                self.checkSame(archname, code, regs=regs)
+
+    def test_envi_blocks_selfmod(self):
+        # mov byte [inc], 0x48 (dec eax); inc eax; inc eax; jmp $+2
+        code = '\xc6\x05' + struct.pack('<I', codeva + 7) + '\x48\x40\x40\xeb\x00'
+        emu = self.checkSame('i386', code)
+        self.assertEqual(emu.getRegisterByName('eax'), 0)
+
+        # the rest of the block was compiled again (from the new code)
+        blk = emu.getBlock(codeva + 7)
+        self.assertEqual([op.mnem for op, step in blk], ['dec', 'inc', 'jmp'])
+
+        emu.writeMemory(codeva + 8, '\x48')
+        self.assertEqual(blk, [])
+        self.assertEqual([op.mnem for op, step in emu.getBlock(codeva + 7)], ['dec', 'dec', 'jmp'])
+
+        # restoring memory (after code was written) drops the blocks too
+        emu.setMemorySnap(emu.getMemorySnap())
+        self.assertEqual(emu._emu_blocks, {})
+        emu.getBlock(codeva)
+
+        emu.flushBlocks()
+        self.assertEqual(emu._emu_blocks, {})
+        self.assertEqual(emu._emu_blkpages, {})
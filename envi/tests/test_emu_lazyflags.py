@@ -0,0 +1,175 @@
+'''
+Differential tests for the i386/amd64 lazy flags emulation mode
+(i386:lazyflags) against the eager flags code.
+'''
+import random
+import binascii
+import unittest
+
+import envi
+import envi.memory as e_mem
+import envi.archs.i386 as e_i386
+
+codeva = 0x10000
+
+conds = ('a', 'ae', 'b', 'be', 'e', 'g', 'ge', 'l', 'le', 'ne', 'no', 'np', 'ns', 'o', 'p', 's')
+
+# (opcode, modrm digit) for the "op r/m, r" and "op r/m, imm8" forms
+alu_ops = {
+    'add': (0x01, 0), 'or': (0x09, 1), 'adc': (0x11, 2), 'sbb': (0x19, 3),
+    'and': (0x21, 4), 'sub': (0x29, 5), 'xor': (0x31, 6), 'cmp': (0x39, 7),
+}
+
+# jcc/setcc/cmovcc condition codes supported by the emulator
+cc_codes = (0x0, 0x1, 0x2, 0x3, 0x4, 0x5, 0x6, 0x7, 0x8, 0x9, 0xa, 0xb, 0xc, 0xd, 0xe, 0xf)
+
+
+def genInstr(rnd, archname):
+    '''
+    Return the bytes for a random flags setting/consuming instruction.
+    '''
+    sizes = ['', '\x66', 'b']
+    if archname == 'amd64':
+        sizes.append('\x48')
+
+    size = rnd.choice(sizes)
+    prefix = ''
+    if size != 'b':
+        prefix = size
+
+    dst = rnd.randrange(8)
+    src = rnd.randrange(8)
+    modrm = chr(0xc0 | (src << 3) | dst)
+
+    kind = rnd.randrange(7)
+    if kind == 0:
+        # op r/m, r
+        opcode, digit = alu_ops[rnd.choice(sorted(alu_ops))]
+        if size == 'b':
+            opcode -= 1
+        return prefix + chr(opcode) + modrm
+
+    if kind == 1:
+        # op r/m, imm8
+        opcode, digit = alu_ops[rnd.choice(sorted(alu_ops))]
+        imm = chr(rnd.choice((0, 1, 0x7f, 0x80, 0xff, rnd.randrange(256))))
+        if size == 'b':
+            return '\x80' + chr(0xc0 | (digit << 3) | dst) + imm
+        return prefix + '\x83' + chr(0xc0 | (digit << 3) | dst) + imm
+
+    if kind == 2:
+        # test r/m, r
+        if size == 'b':
+            return '\x84' + modrm
+        return prefix + '\x85' + modrm
+
+    if kind == 3:
+        # inc/dec r/m
+        digit = rnd.randrange(2)
+        if size == 'b':
+            return '\xfe' + chr(0xc0 | (digit << 3) | dst)
+        return prefix + '\xff' + chr(0xc0 | (digit << 3) | dst)
+
+    if kind == 4:
+        # setcc r8
+        return '\x0f' + chr(0x90 + rnd.choice(cc_codes)) + chr(0xc0 | dst)
+
+    if kind == 5:
+        # cmovcc r, r/m
+        if size == 'b':
+            size = ''
+        return size + '\x0f' + chr(0x40 + rnd.choice(cc_codes)) + modrm
+
+    # jcc +0 (only reads the flags)
+    return chr(0x70 + rnd.choice(cc_codes)) + '\x00'
+
+
+def getEmu(archname, code, lazy):
+    emu = envi.getArchModule(archname).getEmulator()
+    emu.setEmuOpt('i386:lazyflags', lazy)
+    emu.addMemoryMap(codeva, e_mem.MM_RWX, 'code', code + '\x00' * 16)
+    emu.setProgramCounter(codeva)
+    return emu
+
+
+class LazyFlagsTest(unittest.TestCase):
+
+    def checkRandomCode(self, archname, seed, count=100, instrs=40):
+        rnd = random.Random(seed)
+        for i in range(count):
+            code = ''.join([genInstr(rnd, archname) for j in range(instrs)])
+
+            eager = getEmu(archname, code, False)
+            lazy = getEmu(archname, code, True)
+
+            regs = eager.getRegisters()
+            for name in regs:
+                if name.startswith('e') or name.startswith('r'):
+                    regs[name] = rnd.choice((0, 1, 0x7f, 0x80, 0xffffffff, rnd.getrandbits(64)))
+            regs.pop('eip', None)
+            regs.pop('rip', None)
+            eager.setRegisters(regs)
+            lazy.setRegisters(regs)
+
+            flush = rnd.random() < 0.5
+            endva = codeva + len(code)
+            while eager.getProgramCounter() != endva:
+                pc = eager.getProgramCounter()
+                op = eager.parseOpcode(pc)
+                msg = '%s %s @ %d (%s)' % (archname, op, pc - codeva, binascii.hexlify(code))
+
+                eager.stepi()
+                lazy.stepi()
+
+                self.assertEqual(lazy.getProgramCounter(), eager.getProgramCounter(), msg)
+                for cond in conds:
+                    meth = 'cond_' + cond
+                    self.assertEqual(getattr(lazy, meth)(), getattr(eager, meth)(), '%s cond_%s' % (msg, cond))
+
+                if flush:
+                    self.assertEqual(lazy.getRegisterSnap(), eager.getRegisterSnap(), msg)
+
+            self.assertEqual(lazy.getRegisters(), eager.getRegisters(), binascii.hexlify(code))
+
+    def test_envi_lazyflags_i386(self):
+        self.checkRandomCode('i386', 0x386)
+
+    def test_envi_lazyflags_amd64(self):
+        self.checkRandomCode('amd64', 0x64)
+
+    def test_envi_lazyflags_regctx(self):
+        # cmp eax,ecx; inc edx
+        code = binascii.unhexlify('39c8ffc2')
+        for archname in ('i386', 'amd64'):
+            emu = getEmu(archname, code, True)
+            emu.setRegisterByName('ecx', 1)
+            emu.setRegisterByName('edx', 0x7fffffff)
+            emu.stepi()
+            emu.stepi()
+
+            # inc keeps the (pending) carry from the cmp
+            self.assertIsNotNone(emu._lazy_flags)
+            self.assertEqual(emu.getRegisterByName('CF'), 1)
+            self.assertEqual(emu.getRegisterByName('OF'), 1)
+            self.assertIsNone(emu._lazy_flags)
+
+            emu.setProgramCounter(codeva)
+            emu.stepi()
+            snap = emu.getEmuSnap()
+            self.assertIsNone(emu._lazy_flags)
+
+            # setting a single flag keeps the rest of the pending ones
+            emu.setProgramCounter(codeva)
+            emu.stepi()
+            emu.setRegisterByName('ZF', 1)
+            self.assertEqual(emu.getFlag(e_i386.EFLAGS_ZF), True)
+            self.assertEqual(emu.getFlag(e_i386.EFLAGS_CF), True)
+
+            # setting eflags drops them
+            emu.stepi()
+            emu.setStatusRegister(0)
+            self.assertEqual(emu.getStatusRegister(), 0)
+            self.assertFalse(emu.cond_o())
+
+            emu.setEmuSnap(snap)
+            self.assertEqual(emu.getEmuSnap()[0], snap[0])
@@ -1,3 +1,4 @@
+import re
 import unittest
 
 import envi.memory as e_mem
@@ -18,3 +19,38 @@ class EnviMemoryTest(unittest.TestCase):
         self.assertEqual(mem.readMemory(0x41410040, 3), 'BBB')
         # Test a cross page read
         self.assertEqual(mem.readMemory(0x41410000 + (cache.pagesize - 2), 4), 'BBBB')
+
+    def test_envi_memory_search_multi(self):
+        mem = e_mem.MemoryObject()
+        mem.addMemoryMap(0x41410000, e_mem.MM_RWX, 'one', 'A' * 61 + 'VISI' + 'B' * 30 + 'VIVI' * 3)
+        mem.addMemoryMap(0x42420000, e_mem.MM_RWX, 'two', 'VISIxVIXIfooooo' + 'C' * 100 + 'VISI')
+
+        needles = ['VISI', 'VIVI', re.compile('fo+')]
+        hits = mem.searchMemoryMulti(needles)
+        self.assertEqual(hits, [
+            ('VISI', 0x4141003d),
+            ('VIVI', 0x4141005f),
+            ('VIVI', 0x41410063),
+            ('VIVI', 0x41410067),
+            ('VISI', 0x42420000),
+            (needles[2], 0x42420009),
+            ('VISI', 0x42420073),
+        ])
+
+        # small chunks must give the same (and non-overlapping) results
+        for chunksize in (1, 3, 7, 16):
+            self.assertEqual(mem.searchMemoryMulti(needles, chunksize=chunksize), hits)
+
+        # they should match the single needle searches
+        for needle in ('VISI', 'VIVI', 'B'):
+            vas = [va for n, va in mem.searchMemoryMulti([needle], chunksize=5)]
+            self.assertEqual(vas, mem.searchMemory(needle))
+
+        # masked needles match "VI?I" (and VIVI/VISI/VIXI are all upper case)
+        hits = mem.searchMemoryMulti(['VI\x00I', 'vi\x00i'], masks=['\xff\xff\x00\xff', '\xdf\xdf\x00\xdf'])
+        self.assertEqual([va for n, va in hits if n == 'VI\x00I'],
+                         [0x4141003d, 0x4141005f, 0x41410063, 0x41410067, 0x42420000, 0x42420005, 0x42420073])
+        self.assertEqual(len([n for n, va in hits if n == 'vi\x00i']), 7)
+
+        # ranges limit the search
+        self.assertEqual(mem.searchMemoryMulti(['VISI'], ranges=[(0x42420001, 0x200)]), [('VISI', 0x42420073)])
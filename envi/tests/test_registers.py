@@ -0,0 +1,89 @@
+import unittest
+
+import envi
+import envi.archs.i386 as e_i386
+import envi.archs.amd64 as e_amd64
+
+archnames = ('amd64', 'arm', 'h8', 'i386', 'msp430')
+
+
+def refMetaGet(ctx, index, value):
+    offset = (index >> 24) & 0xff
+    width = (index >> 16) & 0xff
+    return (value >> offset) & ((2 ** width) - 1)
+
+
+def refMetaSet(ctx, index, value, curval):
+    ridx = index & 0xffff
+    offset = (index >> 24) & 0xff
+    width = (index >> 16) & 0xff
+    basemask = (2 ** ctx.getRegisterWidth(ridx)) - 1
+    finalmask = basemask ^ (((2 ** width) - 1) << offset)
+    return ((value << offset) | (curval & finalmask)) & basemask
+
+
+class RegisterContextTest(unittest.TestCase):
+
+    def test_envi_registers_metas(self):
+        for archname in archnames:
+            ctx = envi.getArchModule(archname).archGetRegCtx()
+            for name, idx in ctx._rctx_names.items():
+                if not ctx.isMetaRegister(idx):
+                    continue
+
+                # (setting these zero extends, see below)
+                if archname == 'amd64' and (idx & 0xffff0000) == e_amd64.RMETA_LOW32:
+                    continue
+
+                ridx = idx & 0xffff
+                for curval in (0, 0x4142434445464748, -1):
+                    for value in (0, 1, 0x1234, -1):
+                        ctx.setRegister(ridx, curval)
+                        curval = ctx.getRegister(ridx)
+                        self.assertEqual(ctx.getRegister(idx), refMetaGet(ctx, idx, curval), name)
+
+                        ctx.setRegister(idx, value)
+                        self.assertEqual(ctx.getRegister(ridx), refMetaSet(ctx, idx, value, curval), name)
+
+    def test_envi_registers_adhoc_meta(self):
+        # meta indexes which were never registered (like the i386 emulator
+        # builds for sized general purpose registers) work too
+        ctx = envi.getArchModule('i386').archGetRegCtx()
+        ctx.setRegister(e_i386.REG_EBX, 0x41424344)
+        idx = e_i386.REG_EBX + 0x00100000
+        self.assertEqual(ctx.getRegister(idx), 0x4344)
+        ctx.setRegister(idx, 0xffff)
+        self.assertEqual(ctx.getRegister(e_i386.REG_EBX), 0x4142ffff)
+
+        ctx = envi.getArchModule('amd64').archGetRegCtx()
+        ctx.setRegister(e_amd64.REG_RAX, 0xffffffffffffffff)
+        ctx.setRegister(e_amd64.REG_EAX, 1)
+        self.assertEqual(ctx.getRegister(e_amd64.REG_RAX), 1)
+
+    def test_envi_registers_snaps(self):
+        for archname in archnames:
+            ctx = envi.getArchModule(archname).archGetRegCtx()
+            pcidx = ctx._rctx_pcindex
+
+            ctx.setRegister(pcidx, 0x1000)
+            snap = ctx.getRegisterSnap()
+            # no writes since, so the same snapshot comes back
+            self.assertIs(ctx.getRegisterSnap(), snap)
+
+            ctx.setRegister(pcidx, 0x2000)
+            self.assertEqual(snap[pcidx], 0x1000)
+            self.assertEqual(ctx.getProgramCounter(), 0x2000)
+
+            ctx.setRegisterSnap(snap)
+            self.assertEqual(ctx.getProgramCounter(), 0x1000)
+            ctx.setRegister(pcidx, 0x3000)
+            self.assertEqual(snap[pcidx], 0x1000)
+
+            # lists (eg. from old snapshots) work as well
+            ctx.setRegisterSnap(list(snap))
+            self.assertEqual(ctx.getProgramCounter(), 0x1000)
+
+            info = ctx.getRegisterInfo()
+            ctx.setRegister(pcidx, 0x4000)
+            ctx.setRegisterInfo(info)
+            self.assertEqual(ctx.getProgramCounter(), 0x1000)
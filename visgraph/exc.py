@@ -16,3 +16,8 @@ class EdgeNonExistant(VisGraphException):
     def __init__(self, edgeid):
         self.edgeid = edgeid
         Exception.__init__(self, 'Edge %d does not exist!' % edgeid)
+
+class DuplicateEdge(VisGraphException):
+    def __init__(self, eid):
+        Exception.__init__(self, repr(eid))
+        self.eid = eid
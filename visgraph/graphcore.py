@@ -3,6 +3,7 @@ Graphcore contains all the base graph manipulation objects.
 '''
 import os
 import json
+import array
 import threading
 import collections
 
@@ -109,14 +110,13 @@ class Graph:
         self.metadata.update(graph.metadata)
         self.formnodes.update(graph.formnodes)
 
-        for nid,nprops in graph.nodes.values():
+        for nid,nprops in graph.getNodes():
             self.addNode(nid=nid, nprops=nprops)
 
-        for eid, n1, n2, eprops in graph.edges.values():
+        for eid, n1, n2, eprops in graph.getEdges():
             node1 = graph.getNode(n1)
             node2 = graph.getNode(n2)
-            self.addEdge(node1, node2, eid=eid, eprops=eprops)
-        
+            self.addEdge(node1, node2, eid=eid, eprops=dict(eprops))
 
     def wipeGraph(self):
         '''
@@ -274,6 +274,16 @@ class Graph:
 
         return node
 
+    def addNodes(self, nodes):
+        '''
+        Add a sequence of (nid, nprops) tuples (nprops may be None) to
+        the graph.
+
+        Example: g.addNodes( (va, {'cbsize':size}) for va,size in blocks )
+        '''
+        for nid, nprops in nodes:
+            self.addNode(nid=nid, nprops=nprops)
+
     def formNode(self, prop, value, ctor=None):
         '''
         Retrieve or create a node with the given prop=value.
@@ -427,6 +437,19 @@ class Graph:
 
         return edge
 
+    def addEdges(self, edges):
+        '''
+        Add a sequence of (n1, n2) or (n1, n2, eprops) tuples (by node id)
+        to the graph.
+
+        Example: g.addEdges( (fromva, tova) for fromva,tova in calls )
+        '''
+        for edge in edges:
+            eprops = None
+            if len(edge) > 2:
+                eprops = edge[2]
+            self.addEdgeByNids(edge[0], edge[1], eprops=eprops)
+
     def delEdge(self, edge):
         '''
         Delete an edge from the graph (by eid).
@@ -666,12 +689,68 @@ class HierGraph(Graph):
 
         # NOTE: This will also set the 'weight' property on the nodes
         '''
-        weights = {}
-
         rootnodes = self.getHierRootNodes()
         if not len(rootnodes):
             raise Exception('getHierNodeWeights() with no root nodes!')
 
+        weights = self._getHierDagWeights(rootnodes)
+        if weights is None:
+            weights = self._getHierPathWeights(rootnodes)
+
+        for nid,weight in weights.items():
+            node = self.getNode(nid)
+            self.setNodeProp(node,'weight',weight)
+
+        return weights
+
+    def _getHierDagWeights(self, rootnodes):
+        '''
+        Return the longest path weights (in one topological pass) or None if
+        the graph reachable from the root nodes has a cycle.
+        '''
+        # post order DFS (watching for edges back into the current path)
+        order = []
+        done = set()
+        for root in rootnodes:
+
+            if root[0] in done:
+                continue
+
+            done.add(root[0])
+            onpath = set([root[0]])
+            todo = [ (root[0], iter(self.getRefsFromByNid(root[0]))) ]
+            while todo:
+
+                nid, efrom = todo[-1]
+                for eid, n1, n2, eprops in efrom:
+                    if n2 in onpath:
+                        return None
+
+                    if n2 in done:
+                        continue
+
+                    done.add(n2)
+                    onpath.add(n2)
+                    todo.append( (n2, iter(self.getRefsFromByNid(n2))) )
+                    break
+
+                else:
+                    todo.pop()
+                    onpath.discard(nid)
+                    order.append(nid)
+
+        weights = dict( (root[0], 0) for root in rootnodes )
+        for nid in reversed(order):
+            weight = weights[nid] + 1
+            for eid, n1, n2, eprops in self.getRefsFromByNid(nid):
+                if weights.get(n2, -1) < weight:
+                    weights[n2] = weight
+
+        return weights
+
+    def _getHierPathWeights(self, rootnodes):
+        weights = {}
+
         todo = [ (root[0], {}) for root in rootnodes ]
         while len(todo):
 
@@ -688,10 +767,6 @@ class HierGraph(Graph):
                 if not path.get(n2):
                     todo.append((n2, dict(path)))
 
-        for nid,weight in weights.items():
-            node = self.getNode(nid)
-            self.setNodeProp(node,'weight',weight)
-
         return weights
 
     def getHierPathCount(self):
@@ -861,3 +936,470 @@ class HierGraph(Graph):
                 newnids.append(etoid)
 
                 todo.append((nnode,newpath,newnids))
+
+class CompactProps(collections.MutableMapping):
+    '''
+    A dictionary like view of the properties of a single node (or edge)
+    in a CompactGraph.  Properties are stored in per-property columns so
+    reads and writes through the view go straight to the graph (writes
+    through the graph's _setProp so any value index is kept up to date).
+    '''
+    __slots__ = ('_cols', '_idx', '_vals', '_graph')
+
+    def __init__(self, cols, idx, vals=None, graph=None):
+        self._cols = cols
+        self._idx = idx
+        self._vals = vals
+        self._graph = graph
+
+    def get(self, prop, default=None):
+        col = self._cols.get(prop)
+        if col is None or self._idx >= len(col):
+            return default
+        val = col[self._idx]
+        if val is None:
+            return default
+        return val
+
+    def __getitem__(self, prop):
+        val = self.get(prop)
+        if val is None:
+            raise KeyError(prop)
+        return val
+
+    def __contains__(self, prop):
+        return self.get(prop) is not None
+
+    def __setitem__(self, prop, value):
+        if self._graph is not None:
+            self._graph._setProp(self._cols, self._vals, self._idx, prop, value)
+            return
+
+        col = self._cols.get(prop)
+        if col is None:
+            col = []
+            self._cols[prop] = col
+        if self._idx >= len(col):
+            col.extend([None] * (self._idx + 1 - len(col)))
+        col[self._idx] = value
+
+    def __delitem__(self, prop):
+        if self.get(prop) is None:
+            raise KeyError(prop)
+        if self._graph is not None:
+            self._graph._setProp(self._cols, self._vals, self._idx, prop, None)
+            return
+        self._cols[prop][self._idx] = None
+
+    def __iter__(self):
+        idx = self._idx
+        for prop, col in self._cols.items():
+            if idx < len(col) and col[idx] is not None:
+                yield prop
+
+    def __len__(self):
+        return len(list(self.__iter__()))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def copy(self):
+        return dict(self.items())
+
+
+class CompactGraph(Graph):
+    '''
+    A Graph with the same API but a compact storage model for very large
+    graphs (such as the workspace call graph).
+
+    Nodes and edges are numbered (in order of creation) and anonymous
+    nodes and edges use their number as their id.  Properties are kept in
+    columns (lists indexed by node/edge number) which are only created
+    when a property is first set, adjacency is kept as arrays of edge
+    numbers and only the properties named in indexprops are indexed by
+    value (getNodesByProp/getEdgesByProp scan the column otherwise).
+
+    The (nid, nprops) and (eid, n1, n2, eprops) tuples are created on
+    request and the props are CompactProps views rather than dictionaries
+    (so a None value is the same as an absent property).
+
+    Example:
+        g = CompactGraph(indexprops=('rootnode',))
+        g.addNodes( (va, None) for va in funcvas )
+        g.addEdges( calls )
+    '''
+    def __init__(self, indexprops=()):
+        self.indexprops = frozenset(indexprops)
+        Graph.__init__(self)
+
+    def wipeGraph(self):
+        '''
+        Re-initialize the graph structures and start clean again.
+        '''
+        self.metadata = {}
+        self.formnodes = {}     # (prop, value) -> nid
+
+        self._nidx = {}         # nid -> node number
+        self._nids = []         # node number -> nid (None if deleted)
+        self._ncols = {}        # prop -> [ value per node number ]
+        self._nvals = {}        # indexed prop -> value -> set(node numbers)
+        self._eout = []         # node number -> array of edge numbers (or None)
+        self._ein = []
+
+        self._eidx = {}         # (non-anonymous) eid -> edge number
+        self._eids = []         # edge number -> eid (None if anonymous)
+        self._efrom = array.array('i')  # edge number -> node number (-1 if deleted)
+        self._eto = array.array('i')
+        self._ecols = {}
+        self._evals = {}
+
+    def _mkNode(self, i):
+        return (self._nids[i], CompactProps(self._ncols, i, self._nvals, self))
+
+    def _mkEdge(self, i):
+        eid = self._eids[i]
+        if eid is None:
+            eid = i
+        nids = self._nids
+        return (eid, nids[self._efrom[i]], nids[self._eto[i]], CompactProps(self._ecols, i, self._evals, self))
+
+    def _mkEdges(self, idxs):
+        nids = self._nids
+        eids = self._eids
+        efrom = self._efrom
+        eto = self._eto
+        ecols = self._ecols
+        evals = self._evals
+        ret = []
+        for i in idxs:
+            eid = eids[i]
+            if eid is None:
+                eid = i
+            ret.append((eid, nids[efrom[i]], nids[eto[i]], CompactProps(ecols, i, evals, self)))
+        return ret
+
+    def _getEdgeIdx(self, eid):
+        i = self._eidx.get(eid)
+        if i is not None:
+            return i
+        if type(eid) in (int, long) and 0 <= eid < len(self._eids):
+            if self._eids[eid] is None and self._efrom[eid] != -1:
+                return eid
+        return None
+
+    def _setProp(self, cols, vals, i, prop, value):
+        # set a node/edge property (maintaining any value index) and return
+        # the old value
+        col = cols.get(prop)
+        if col is None:
+            col = []
+            cols[prop] = col
+        if i >= len(col):
+            col.extend([None] * (i + 1 - len(col)))
+
+        curval = col[i]
+        col[i] = value
+
+        if prop in self.indexprops:
+            pvals = vals.setdefault(prop, {})
+            try:
+                if curval is not None:
+                    idxs = pvals.get(curval)
+                    idxs.discard(i)
+                    if not idxs:
+                        pvals.pop(curval)
+                if value is not None:
+                    pvals.setdefault(value, set()).add(i)
+            except TypeError:
+                pass # no value indexing for un-hashable values
+
+        return curval
+
+    def _getByProp(self, cols, vals, prop, val):
+        # return the node/edge numbers with the given prop (and value)
+        if val is not None and prop in self.indexprops:
+            return sorted(vals.get(prop, {}).get(val, ()))
+
+        col = cols.get(prop)
+        if col is None:
+            return []
+
+        if val is None:
+            return [i for i, v in enumerate(col) if v is not None]
+        return [i for i, v in enumerate(col) if v is not None and v == val]
+
+    def toJson(self):
+        graph = {}
+        graph['nodes'] = {node[0]: dict(node[1]) for node in self.getNodes()}
+        graph['edges'] = [(e[0], e[1], e[2], dict(e[3])) for e in self.getEdges()]
+        return json.dumps(graph)
+
+    def getEdges(self):
+        efrom = self._efrom
+        return [self._mkEdge(i) for i in range(len(efrom)) if efrom[i] != -1]
+
+    def getEdge(self, eid):
+        i = self._getEdgeIdx(eid)
+        if i is None:
+            return None
+        return self._mkEdge(i)
+
+    def getEdgeProps(self, eid):
+        i = self._getEdgeIdx(eid)
+        if i is None:
+            raise Exception('Invalid edge id')
+        return CompactProps(self._ecols, i, self._evals, self)
+
+    def getEdgesByProp(self, prop, val=None):
+        return [self._mkEdge(i) for i in self._getByProp(self._ecols, self._evals, prop, val)]
+
+    def setEdgeProp(self, edge, prop, value):
+        i = self._getEdgeIdx(edge[0])
+        if i is None:
+            raise EdgeNonExistant(edge[0])
+
+        if edge[3].get(prop) == value:
+            return False
+
+        self._setProp(self._ecols, self._evals, i, prop, value)
+        return True
+
+    def setNodeProp(self, node, prop, value):
+        if value is None:
+            raise Exception('graph prop values may not be None! %r' % (node,))
+
+        i = self._nidx[node[0]]
+        if self._setProp(self._ncols, self._nvals, i, prop, value) == value:
+            return False
+        return True
+
+    def getNodesByProp(self, prop, val=None):
+        return [self._mkNode(i) for i in self._getByProp(self._ncols, self._nvals, prop, val)]
+
+    def _addNode(self, nid, nprops):
+        # add a node and return its number
+        i = len(self._nids)
+        if nid is None:
+            nid = i
+            if nid in self._nidx:
+                # our number is already taken as the id of another node
+                nid = guid()
+
+        if nid in self._nidx:
+            raise DuplicateNode(nid)
+
+        self._nidx[nid] = i
+        self._nids.append(nid)
+        self._eout.append(None)
+        self._ein.append(None)
+
+        if nprops:
+            for k, v in nprops.items():
+                if v is not None:
+                    self._setProp(self._ncols, self._nvals, i, k, v)
+
+        return i
+
+    def addNode(self, nid=None, nprops=None, **kwargs):
+        '''
+        Add a Node object to the graph.  Returns the node. (nid,nprops)
+
+        NOTE: If nid is unspecified, the node number is used as its id.
+        '''
+        if kwargs:
+            myprops = dict(kwargs)
+            if nprops is not None:
+                myprops.update(nprops)
+            nprops = myprops
+
+        return self._mkNode(self._addNode(nid, nprops))
+
+    def addNodes(self, nodes):
+        for nid, nprops in nodes:
+            self._addNode(nid, nprops)
+
+    def formNode(self, prop, value, ctor=None):
+        with self.formlock:
+            nid = self.formnodes.get((prop, value))
+            if nid is not None:
+                return self.getNode(nid)
+
+            node = self.addNode(nprops={prop: value})
+            self.formnodes[(prop, value)] = node[0]
+
+            # fire ctor with lock to prevent an un-initialized retrieve.
+            if ctor is not None:
+                ctor(node)
+            return node
+
+    def delNodeProp(self, node, prop):
+        i = self._nidx.get(node[0])
+        if i is None:
+            return None
+        return self._setProp(self._ncols, self._nvals, i, prop, None)
+
+    def delNode(self, node):
+        i = self._nidx[node[0]]
+        for edge in self.getRefsFrom(node):
+            self.delEdge(edge)
+        for edge in self.getRefsTo(node):
+            self.delEdge(edge)
+
+        ret = (node[0], dict(self._mkNode(i)[1]))
+        for prop, value in ret[1].items():
+            self._setProp(self._ncols, self._nvals, i, prop, None)
+            try:
+                if self.formnodes.get((prop, value)) == node[0]:
+                    self.formnodes.pop((prop, value))
+            except TypeError:
+                pass # un-hashable values can't be form node keys
+
+        self._nidx.pop(node[0])
+        self._nids[i] = None
+        return ret
+
+    def getNode(self, nid):
+        i = self._nidx.get(nid)
+        if i is None:
+            return None
+        return self._mkNode(i)
+
+    def getNodeProps(self, nid):
+        return CompactProps(self._ncols, self._nidx[nid], self._nvals, self)
+
+    def getNodes(self):
+        ncols = self._ncols
+        nvals = self._nvals
+        return [(nid, CompactProps(ncols, i, nvals, self)) for i, nid in enumerate(self._nids) if nid is not None]
+
+    def getNodeCount(self):
+        return len(self._nidx)
+
+    def isLeafNode(self, node):
+        return not self._eout[self._nidx[node[0]]]
+
+    def isRootNode(self, node):
+        return not self._ein[self._nidx[node[0]]]
+
+    def hasEdge(self, edgeid):
+        return self._getEdgeIdx(edgeid) is not None
+
+    def hasNode(self, nid):
+        return nid in self._nidx
+
+    def _addEdge(self, i1, i2, eid, eprops):
+        # add an edge (between node numbers) and return its number
+        i = len(self._eids)
+        if eid is None and i in self._eidx:
+            # our number is already taken as the id of another edge
+            eid = guid()
+
+        if eid is not None:
+            if self._getEdgeIdx(eid) is not None:
+                raise DuplicateEdge(eid)
+            self._eidx[eid] = i
+
+        self._eids.append(eid)
+        self._efrom.append(i1)
+        self._eto.append(i2)
+
+        eout = self._eout[i1]
+        if eout is None:
+            eout = array.array('i')
+            self._eout[i1] = eout
+        eout.append(i)
+
+        ein = self._ein[i2]
+        if ein is None:
+            ein = array.array('i')
+            self._ein[i2] = ein
+        ein.append(i)
+
+        if eprops:
+            for k, v in eprops.items():
+                if v is not None:
+                    self._setProp(self._ecols, self._evals, i, k, v)
+
+        return i
+
+    def addEdge(self, node1, node2, eid=None, eprops=None, **kwargs):
+        '''
+        Add an edge to the graph.  Edges are directional.
+
+        NOTE: If eid is unspecified, the edge number is used as its id.
+        '''
+        if kwargs:
+            myprops = dict(kwargs)
+            if eprops is not None:
+                myprops.update(eprops)
+            eprops = myprops
+
+        i = self._addEdge(self._nidx[node1[0]], self._nidx[node2[0]], eid, eprops)
+        return self._mkEdge(i)
+
+    def addEdgeByNids(self, n1, n2, eid=None, eprops=None, **kwargs):
+        if kwargs:
+            myprops = dict(kwargs)
+            if eprops is not None:
+                myprops.update(eprops)
+            eprops = myprops
+
+        i = self._addEdge(self._nidx[n1], self._nidx[n2], eid, eprops)
+        return self._mkEdge(i)
+
+    def addEdges(self, edges):
+        nidx = self._nidx
+        for edge in edges:
+            eprops = None
+            if len(edge) > 2:
+                eprops = edge[2]
+            self._addEdge(nidx[edge[0]], nidx[edge[1]], None, eprops)
+
+    def delEdge(self, edge):
+        i = self._getEdgeIdx(edge[0])
+        if i is None:
+            raise EdgeNonExistant(edge[0])
+
+        for prop in list(CompactProps(self._ecols, i)):
+            self._setProp(self._ecols, self._evals, i, prop, None)
+
+        eid = self._eids[i]
+        if eid is not None:
+            self._eidx.pop(eid)
+
+        self._eout[self._efrom[i]].remove(i)
+        self._ein[self._eto[i]].remove(i)
+        self._efrom[i] = -1
+        self._eto[i] = -1
+
+    def delEdgeProp(self, edge, prop):
+        i = self._getEdgeIdx(edge[0])
+        if i is None:
+            return None
+        return self._setProp(self._ecols, self._evals, i, prop, None)
+
+    def getRefsFrom(self, node):
+        return self.getRefsFromByNid(node[0])
+
+    def getRefsFromByNid(self, nid):
+        i = self._nidx.get(nid)
+        if i is None or not self._eout[i]:
+            return []
+        return self._mkEdges(self._eout[i])
+
+    def getRefsTo(self, node):
+        return self.getRefsToByNid(node[0])
+
+    def getRefsToByNid(self, nid):
+        i = self._nidx.get(nid)
+        if i is None or not self._ein[i]:
+            return []
+        return self._mkEdges(self._ein[i])
+
+
+class CompactHierGraph(CompactGraph, HierGraph):
+    '''
+    A HierGraph using the CompactGraph storage model.
+    '''
+    def __init__(self, indexprops=('rootnode',)):
+        CompactGraph.__init__(self, indexprops=indexprops)
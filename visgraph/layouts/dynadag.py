@@ -1,7 +1,13 @@
-
 '''
 A dynadag-ish graph layout calculator...
+
+Nodes are placed in layers by their hierarchical weight ("ghost" nodes
+are added where an edge passes through a layer), ordered within their
+layer by barycenter (or median) layer sweeps which stop once they no
+longer reduce the edge crossings, and then given x coordinates by
+repeatedly pulling each layer toward the neighbors of its nodes.
 '''
+import bisect
 
 import visgraph
 import visgraph.layouts as vg_layout
@@ -11,11 +17,88 @@ import visgraph.drawing.catmullrom as vg_catmullrom
 
 zero_zero = (0,0)
 
-def revenumerate(l):
-    return zip(range(len(l)-1, -1, -1), reversed(l))
-
-SCOOCH_LEFT     = 0
-SCOOCH_RIGHT    = 1
+# Long edges stop getting ghost nodes (they are drawn directly) once a
+# layout has this many ghost nodes.
+GHOST_MAX = 20000
+
+
+def countCrossings(edges, lowcount):
+    '''
+    Count the edge crossings between two adjacent layers given a list of
+    (upperpos, lowerpos) tuples (one per edge) and the number of nodes in
+    the lower layer.
+
+    (the accumulator tree method of Barth, Juenger and Mutzel: O(E log V))
+    '''
+    tsize = 1
+    while tsize < lowcount:
+        tsize <<= 1
+
+    tree = [0] * (2 * tsize)
+    cross = 0
+    for upos, lpos in sorted(edges):
+        # count the edges already seen which end right of this one
+        i = lpos + tsize
+        tree[i] += 1
+        while i > 1:
+            if not i & 1:
+                cross += tree[i + 1]
+            i >>= 1
+            tree[i] += 1
+
+    return cross
+
+
+def medianPos(poss):
+    '''
+    Return the (weighted) median of a sorted list of neighbor positions.
+    '''
+    cnt = len(poss)
+    mid = cnt // 2
+    if cnt & 1:
+        return float(poss[mid])
+
+    if cnt == 2:
+        return (poss[0] + poss[1]) / 2.0
+
+    left = poss[mid - 1] - poss[0]
+    right = poss[-1] - poss[mid]
+    if left + right == 0:
+        return (poss[mid - 1] + poss[mid]) / 2.0
+    return (poss[mid - 1] * right + poss[mid] * left) / float(left + right)
+
+
+def placeLayer(targets, widths, weights, pad):
+    '''
+    Return the x position for each node of a layer (in layer order) which
+    is closest (by weighted least squares) to its target x while leaving
+    at least pad between neighbors.
+
+    (pool adjacent violators over the target minus the packed offset: O(n))
+    '''
+    offs = []
+    blocks = []     # [ weighted sum, total weight, node count ]
+    off = 0
+    for targ, width, weight in zip(targets, widths, weights):
+        offs.append(off)
+        off += width + pad
+
+        wsum = (targ - offs[-1]) * weight
+        wtot = weight
+        cnt = 1
+        while blocks and blocks[-1][0] * wtot > wsum * blocks[-1][1]:
+            pwsum, pwtot, pcnt = blocks.pop()
+            wsum += pwsum
+            wtot += pwtot
+            cnt += pcnt
+        blocks.append((wsum, wtot, cnt))
+
+    ret = []
+    for wsum, wtot, cnt in blocks:
+        x = int(round(wsum / wtot))
+        for i in range(cnt):
+            ret.append(x + offs[len(ret)])
+    return ret
 
 class DynadagLayout(vg_layout.GraphLayout):
 
@@ -23,9 +106,13 @@ class DynadagLayout(vg_layout.GraphLayout):
 
         vg_layout.GraphLayout.__init__(self, graph)
 
+        self._ghost_max = GHOST_MAX
         self._addGhostNodes()
 
-        self._barry_count = 10
+        self._barry_count = 10      # Max down/up ordering sweeps
+        self._barry_median = False  # Order by median rather than barycenter
+        self._swap_max = 100000     # Max adjacent node swaps tried by transpose
+        self._coord_count = 8       # X coordinate sweeps
         self.width_pad = 20
         self.height_pad = 40
 
@@ -43,146 +130,201 @@ class DynadagLayout(vg_layout.GraphLayout):
             for nid,ninfo in layer:
                 xsize, ysize = ninfo.get('size', zero_zero)
                 lheight = max(lheight, ysize + self.height_pad)
-                lwidth += xsize + self.width_pad
+
+                xpos, ypos = ninfo.get('position', zero_zero)
+                lwidth = max(lwidth, xpos + xsize + self.width_pad)
 
             height += lheight
             width = max(lwidth, width)
 
         return width, height
 
-    def _baryCenter(self, nid, ninfo):
-        tot = 0
-        cnt = 0
-        for eid, n1, n2, einfo in self.graph.getRefsFromByNid(nid):
-            node2 = self.graph.getNode(n2)
-            tot += node2[1].get('layerpos')
-            cnt += 1
-
-        for eid, n1, n2, einfo in self.graph.getRefsToByNid(nid):
-            node1 = self.graph.getNode(n1)
-            tot += node1[1].get('layerpos')
-            cnt += 1
-        barry = 0
-        if cnt:
-            barry = tot / float(cnt)
-        ninfo['barycenter'] = barry
-
-    def _cmpBaryCenter(self, node1, node2):
-        n1bary = node1[1].get('barycenter')
-        n2bary = node2[1].get('barycenter')
-        return cmp(n1bary, n2bary)
-
-    # Try out "barycenter" averaging and re-ordering.
-    def _orderNodesByBary(self):
-        # Go through the layers and do barycenter calcs first.
-        # FIXME how do we tell when we're done?
-        for i in range(self._barry_count):
-            for layer in self.layers:
-                for nid,ninfo in layer:
-                    self._baryCenter(nid, ninfo)
-
-            for layer in self.layers:
-                layer.sort(cmp=self._cmpBaryCenter)
-                for i,(nid,ninfo) in enumerate(layer):
-                    ninfo['layerpos'] = i
-
-    def _getNodeRelPos(self, nid, ninfo):
-
-        weight = ninfo['weight']
+    def getCrossingCount(self):
+        '''
+        Return the number of edge crossings between adjacent layers for
+        the current node order.
+        '''
+        pos = self._layerpos
+        cross = 0
+        for i in range(len(self._order) - 1):
+            edges = [ (pos[n1], pos[n2]) for n1 in self._order[i] for n2 in self._below[n1] ]
+            cross += countCrossings(edges, len(self._order[i + 1]))
+        return cross
+
+    def _initLayers(self):
+        '''
+        Roll through all the nodes and assign them positions in their
+        layer (based on weight)
+        '''
+        self.layers = [ [] for i in range(self.maxweight + 1) ]
 
-        abovepos = []
-        for eid, n1, n2, einfo in self.graph.getRefsToByNid(nid):
-            fprops = self.graph.getNodeProps(n1)
-            if fprops['weight'] != weight-1:
-                continue
-            abovepos.append(fprops['layerpos'])
-        abovepos.sort()
+        done = set()
+        for rootnode in self.graph.getHierRootNodes():
 
-        belowpos = []
-        for eid, n1, n2, einfo in self.graph.getRefsFromByNid(nid):
-            tprops = self.graph.getNodeProps(n2)
-            if tprops['weight'] != weight+1:
+            if rootnode[0] in done:
                 continue
-            belowpos.append(tprops['layerpos'])
-        belowpos.sort()
-
-        return abovepos, belowpos
 
-    def _getLayerCross(self, layernum):
-        ccount = 0
+            done.add(rootnode[0])
+            todo = [ (rootnode, iter(self.graph.getRefsFrom(rootnode))) ]
+            while todo:
 
-        layer = self.layers[layernum]
-        for i in range(1, len(layer)):
+                node, efrom = todo[-1]
+                for eid, n1, n2, einfo in efrom:
+                    if n2 in done:
+                        continue
 
-            myabove, mybelow = self._getNodeRelPos(*layer[i])
-            hisabove, hisbelow = self._getNodeRelPos(*layer[i-1])
+                    done.add(n2)
+                    tonode = self.graph.getNode(n2)
+                    todo.append( (tonode, iter(self.graph.getRefsFrom(tonode))) )
+                    break
 
-            # If I have any nodes above with position lower
-            # than any of his, those are cross overs...
-            for mya in myabove:
-                for hisa in hisabove:
-                    if mya < hisa:
-                        ccount += 1
+                else:
+                    todo.pop()
+                    layer = self.layers[ node[1].get('weight', 0) ]
+                    layer.append(node)
+
+        # The order / adjacency we work on is kept by nid (edges within a
+        # layer or which skip layers don't take part)
+        self._order = [ [ nid for nid, ninfo in layer ] for layer in self.layers ]
+        self._layerpos = {}
+        self._above = {}
+        self._below = {}
+
+        weights = {}
+        for i, layer in enumerate(self._order):
+            for j, nid in enumerate(layer):
+                weights[nid] = i
+                self._layerpos[nid] = j
+
+        for nid, weight in weights.items():
+            self._above[nid] = [ n1 for eid, n1, n2, einfo in self.graph.getRefsToByNid(nid) if weights.get(n1) == weight - 1 ]
+            self._below[nid] = [ n2 for eid, n1, n2, einfo in self.graph.getRefsFromByNid(nid) if weights.get(n2) == weight + 1 ]
+
+    def _sweepLayers(self, layernums, adjacent, fixedoff):
+        '''
+        Sort the given layers (in order) by the barycenter (or median) of
+        each node's neighbors in the adjacent (fixed) layer.
+        '''
+        pos = self._layerpos
+        for i in layernums:
 
-            # If I have any nodes below with position lower
-            # than any of his, those acre cross overs...
-            for myb in mybelow:
-                for hisb in hisbelow:
-                    if myb < hisb:
-                        ccount += 1
+            layer = self._order[i]
+            if not layer:
+                continue
 
-        return ccount
+            # Nodes with no neighbors in the fixed layer keep their
+            # (scaled) position
+            scale = len(self._order[i + fixedoff]) / float(len(layer))
 
-    def _bubSortNodes(self):
+            keys = []
+            for j, nid in enumerate(layer):
+                poss = [ pos[n] for n in adjacent[nid] ]
+                if not poss:
+                    keys.append( (j * scale, j, nid) )
+                    continue
 
-        # Go through nodes and see if we can re-order children to
-        # reduce crossovers...
+                if self._barry_median:
+                    poss.sort()
+                    keys.append( (medianPos(poss), j, nid) )
+                    continue
 
-        for i in range(len(self.layers)):
+                keys.append( (sum(poss) / float(len(poss)), j, nid) )
 
-            layer = self.layers[i]
+            keys.sort()
+            for j, (key, oldj, nid) in enumerate(keys):
+                layer[j] = nid
+                pos[nid] = j
 
-            reduced = True
-            while reduced:
+    def _orderLayers(self):
+        '''
+        Alternate down and up layer sweeps keeping the order with the
+        fewest crossings (until a sweep fails to improve on it twice or the
+        sweep budget is spent).
+        '''
+        best = self.getCrossingCount()
+        bestorder = [ list(layer) for layer in self._order ]
 
-                reduced = False
+        stall = 0
+        for i in range(self._barry_count):
 
-                # Get the current crossover count for this layer
-                score = self._getLayerCross(i)
+            if best == 0 or stall >= 2:
+                break
 
-                # TODO should we do this multipliciative rather than
-                # neighbors only?
-                for j in range(len(layer)-1):
+            self._sweepLayers(range(1, len(self._order)), self._above, -1)
+            self._sweepLayers(range(len(self._order) - 2, -1, -1), self._below, 1)
 
-                    n1 = layer[j]
-                    n2 = layer[j+1]
+            cross = self.getCrossingCount()
+            if cross < best:
+                best = cross
+                bestorder = [ list(layer) for layer in self._order ]
+                stall = 0
+            else:
+                stall += 1
 
-                    layer[j] = n2
-                    layer[j+1] = n1
+        self._order = bestorder
+        for layer in self._order:
+            for j, nid in enumerate(layer):
+                self._layerpos[nid] = j
 
-                    newscore = self._getLayerCross(i)
-                    # If this was optimal, keep it and continue
-                    if newscore < score:
-                        reduced = True
-                        n1[1]['layerpos'] = j+1
-                        n2[1]['layerpos'] = j
-                        break
+    def _getPairCross(self, nid1, nid2):
+        '''
+        Return the crossings (with both adjacent layers) among the edges of
+        two nodes in the same layer as a (nid1 left, nid2 left) tuple.
+        '''
+        pos = self._layerpos
+        lcross = 0
+        rcross = 0
+        for adjacent in (self._above, self._below):
+            poss1 = sorted( pos[n] for n in adjacent[nid1] )
+            poss2 = sorted( pos[n] for n in adjacent[nid2] )
+            for p in poss2:
+                lcross += len(poss1) - bisect.bisect_right(poss1, p)
+                rcross += bisect.bisect_left(poss1, p)
+        return lcross, rcross
+
+    def _transposeLayers(self):
+        '''
+        Swap adjacent nodes within layers while that removes crossings
+        (until no swap helps or the swap budget is spent).
+        '''
+        pos = self._layerpos
+        budget = self._swap_max
+
+        swapped = True
+        while swapped and budget > 0:
+
+            swapped = False
+            for layer in self._order:
+                for j in range(len(layer) - 1):
+
+                    budget -= 1
+                    nid1 = layer[j]
+                    nid2 = layer[j + 1]
+                    lcross, rcross = self._getPairCross(nid1, nid2)
+                    if rcross < lcross:
+                        layer[j] = nid2
+                        layer[j + 1] = nid1
+                        pos[nid1] = j + 1
+                        pos[nid2] = j
+                        swapped = True
 
-                    # Nope, put it back...
-                    layer[j] = n1
-                    layer[j+1] = n2
-                    
     def _addGhostNodes(self):
         '''
         Translate the hierarchical graph we are given into dynadag
         friendly graph with ghost nodes....
         '''
         weights = self.graph.getHierNodeWeights()
+        ghosts = 0
+
+        # Walk the edges by node (rather than by eid) so the ghosts (and
+        # so the layout) come out the same every time
+        nids = [ nid for nid, ninfo in self.graph.getNodes() ]
+        edges = [ edge for nid in nids for edge in self.graph.getRefsFromByNid(nid) ]
 
         # First lets take care of any loop edges
         # (These will be nodes in the graph which are marked "reverse=True"
         # but have been added with src/dst swapped to make graphing easier)
-        for eid, n1, n2, einfo in self.graph.getEdges():
+        for eid, n1, n2, einfo in edges:
 
             if not einfo.get('reverse'):
                 continue
@@ -196,6 +338,8 @@ class DynadagLayout(vg_layout.GraphLayout):
             if topweight == botweight:
                 bridgenode = self.graph.addNode(ghost=True, weight=topweight)
                 weights[bridgenode[0]] = topweight
+                nids.append(bridgenode[0])
+                ghosts += 1
 
                 self.graph.delEdgeByEid(eid)
                 self.graph.addEdgeByNids(n1, bridgenode[0], looptop=True)
@@ -209,6 +353,8 @@ class DynadagLayout(vg_layout.GraphLayout):
 
             botnode = self.graph.addNode(ghost=True, weight=botweight)
             weights[botnode[0]] = botweight
+            nids.extend([topnode[0], botnode[0]])
+            ghosts += 2
 
             self.graph.addEdge(topnode, botnode) # For rendering, these will be normal!
 
@@ -218,10 +364,17 @@ class DynadagLayout(vg_layout.GraphLayout):
             self.graph.addEdgeByNids(botnode[0], n2, loopbot=True)
 
         # Create ghost nodes for edges which pass through a weight layer
-        for eid, n1, n2, einfo in self.graph.getEdges():
+        # (until we have as many ghosts as we are willing to lay out)
+        edges = [ edge for nid in nids for edge in self.graph.getRefsFromByNid(nid) ]
+        for eid, n1, n2, einfo in edges:
             xweight = weights.get(n1, 0)
             yweight = weights.get(n2)
             if xweight + 1 < yweight:
+
+                ghosts += yweight - xweight - 1
+                if ghosts > self._ghost_max:
+                    continue
+
                 self.graph.delEdgeByEid(eid)
                 while xweight + 1 < yweight:
                     xweight += 1
@@ -230,6 +383,66 @@ class DynadagLayout(vg_layout.GraphLayout):
                     n1 = ghostid
                 self.graph.addEdgeByNids(n1, n2)
 
+    def _assignXCoords(self):
+        '''
+        Start with each layer packed (and centered) and then alternately
+        pull each layer (top down then bottom up) toward the neighbors of
+        its nodes in the layer above/below without overlapping nodes.
+        '''
+        sizes = {}
+        ghosts = set()
+        for layer in self.layers:
+            for nid, ninfo in layer:
+                sizes[nid] = ninfo.get('size', zero_zero)[0]
+                if ninfo.get('ghost'):
+                    ghosts.add(nid)
+
+        lwidths = [ sum( sizes[nid] + self.width_pad for nid in layer ) for layer in self._order ]
+        maxwidth = max(lwidths) if lwidths else 0
+
+        xpos = {}
+        for layer, lwidth in zip(self._order, lwidths):
+            x = (maxwidth - lwidth) / 2
+            for nid in layer:
+                xpos[nid] = x
+                x += sizes[nid] + self.width_pad
+
+        # Ghost nodes pull harder (to keep long edges straight) and nodes
+        # with no neighbors on the fixed side hardly at all.
+        for i in range(self._coord_count):
+
+            layernums = range(1, len(self._order))
+            adjacent = self._above
+            if i & 1:
+                layernums = range(len(self._order) - 2, -1, -1)
+                adjacent = self._below
+
+            for j in layernums:
+
+                layer = self._order[j]
+                widths = [ sizes[nid] for nid in layer ]
+                targets = []
+                weights = []
+                for nid in layer:
+
+                    nbrs = adjacent[nid]
+                    if not nbrs:
+                        targets.append(xpos[nid])
+                        weights.append(0.01)
+                        continue
+
+                    mid = sum( xpos[n] + sizes[n] / 2.0 for n in nbrs ) / len(nbrs)
+                    targets.append(mid - sizes[nid] / 2.0)
+                    weights.append(4 if nid in ghosts else 1)
+
+                for nid, x in zip(layer, placeLayer(targets, widths, weights, self.width_pad)):
+                    xpos[nid] = x
+
+        xmin = min(xpos.values()) if xpos else 0
+        for nid, x in xpos.items():
+            xpos[nid] = x - xmin + self.width_pad
+        return xpos
+
     def layoutGraph(self):
 
         self.maxweight = 0
@@ -237,244 +450,52 @@ class DynadagLayout(vg_layout.GraphLayout):
         for nid, ninfo in self.graph.getNodes():
             self.maxweight = max(ninfo.get('weight', 0), self.maxweight)
 
-        self.layers = [ [] for i in range(self.maxweight + 1) ]
-
-        done = set()
-        def doit(node):
-            '''
-            Roll through all the nodes and assign them positions in their layer (based on weight)
-            '''
-
-            if node[0] in done:
-                return
-
-            done.add(node[0])
-            efrom = self.graph.getRefsFrom(node)
-
-            for eid, n1, n2, einfo in efrom:
-                tonode = self.graph.getNode(n2)
-                doit(tonode)
-
-            w = node[1].get('weight', 0)
-
-            layer = self.layers[w]
-            self.graph.setNodeProp(node,'layerpos',len(layer))
-            layer.append(node)
-
-        # FIXME support more than one root!
-        for rootnode in self.graph.getHierRootNodes():
-            doit(rootnode)
+        self._initLayers()
 
         # Now lets use positional averaging to order nodes in the layer
-        self._orderNodesByBary()
-        self._bubSortNodes()
+        self._orderLayers()
+        self._transposeLayers()
 
-        self.maxwidth = 0
+        nodes = {}
+        for layer in self.layers:
+            for node in layer:
+                nodes[node[0]] = node
 
-        # Calculate the width / height of each layer...
-        lwidths = []        # The width of this total layer
-        self.lheights = []       # The tallest node in this layer
+        self.layers = [ [ nodes[nid] for nid in layer ] for layer in self._order ]
         for layer in self.layers:
-            x = self.width_pad
-            y = 0
+            for i, node in enumerate(layer):
+                self.graph.setNodeProp(node, 'layerpos', i)
 
+        # Calculate the height of each layer...
+        self.lheights = []       # The tallest node in this layer
+        for layer in self.layers:
             heightmax = 0
             for nid,ninfo in layer:
-                size = ninfo.get('size', zero_zero)
-                xx,yy = size
-
+                xx,yy = ninfo.get('size', zero_zero)
                 heightmax = max(heightmax, yy)
 
-                x += xx
-                y += yy
-
-            lwidths.append(x)
             self.lheights.append(heightmax)
 
-            self.maxwidth = max(self.maxwidth, x)
+        xpos = self._assignXCoords()
 
         # Now that we have them sorted, lets set their individual positions...
+        self.maxwidth = 0
         vpad = 0
         for i,layer in enumerate(self.layers):
-            hpad = (self.maxwidth - lwidths[i]) / 2
-            hpad += self.width_pad
             for nid,ninfo in layer:
-                xpos = hpad
-                ypos = vpad
-
                 xsize, ysize = ninfo.get('size', zero_zero)
 
-                ninfo['position'] = (xpos,ypos)
+                ninfo['position'] = (xpos[nid], vpad)
                 ninfo['vert_pad'] = self.lheights[i] - ysize
 
-                hpad += xsize
-
-                hpad += self.width_pad
+                self.maxwidth = max(self.maxwidth, xpos[nid] + xsize + self.width_pad)
 
             vpad += self.lheights[i]
             vpad += self.height_pad
 
-
-        # Optimize the positions of nodes by moving them outward to align
-
-        # First from top to bottom
-        for i, layer in enumerate(self.layers):
-
-            layermid = len(layer) / 2
-
-            # From the left side, scooch kids out...
-            for j, (nid,ninfo) in enumerate(layer):
-
-                if not ninfo.get('ghost'):
-                    break
-
-                self._scoochXKids(nid, ninfo, SCOOCH_LEFT)
-
-            # From the right side, scooch kids out...
-            for j, (nid, ninfo) in revenumerate(layer):
-
-                if not ninfo.get('ghost'):
-                    break
-
-                self._scoochXKids(nid, ninfo, SCOOCH_RIGHT)
-
-        # From the bottom to the top!
-        for i, layer in revenumerate(self.layers):
-
-            layermid = len(layer) / 2
-
-            # From the left side, scooch kids out...
-            for j, (nid,ninfo) in enumerate(layer):
-
-                if not ninfo.get('ghost'):
-                    break
-
-                self._scoochXParents(nid, ninfo, SCOOCH_LEFT)
-
-            # From the right side, scooch kids out...
-            for j, (nid, ninfo) in revenumerate(layer):
-
-                if not ninfo.get('ghost'):
-                    break
-
-                self._scoochXParents(nid, ninfo, SCOOCH_RIGHT)
-
         # Finally, we calculate the drawing for the edge lines
         self._calcEdgeLines()
 
-    def _scoochXParents(self, nid, ninfo, lr=None):
-
-        weight = ninfo['weight']
-
-        for eid, n1, n2, einfo in self.graph.getRefsToByNid(nid):
-
-            pinfo = self.graph.getNodeProps(n1)
-
-            # Only do ghost nodes (for now...)
-            if not pinfo.get('ghost'):
-                continue
-
-            # Only do this to parents in the layer above us...
-            if pinfo['weight'] != weight-1:
-                continue
-
-            self._scoochXAlign(ninfo, pinfo, lr=lr)
-
-    def _scoochXKids(self, nid, ninfo, lr=None):
-
-        weight = ninfo['weight']
-
-        for eid, n1, n2, einfo in self.graph.getRefsFromByNid(nid):
-
-            kinfo = self.graph.getNodeProps(n2)
-
-            # Only do ghost nodes (for now...)
-            if not kinfo.get('ghost'):
-                continue
-
-            # Only do this to kids in the layer beneath us...
-            if kinfo['weight'] != weight+1:
-                continue
-
-            self._scoochXAlign(ninfo, kinfo, lr=lr)
-
-    def _scoochXAlign(self, ninfo, kinfo, lr=None):
-        '''
-        If possible, move the "kidinfo" node toward ninfo
-        along the X axis...  If "lr" is specified, only move
-        the "kidnode" (which may be "above" you...) if it is
-        moving either SCOOCH_LEFT or SCOOCH_RIGHT as specified.
-        '''
-        xpos, ypos = ninfo['position']
-        xsize, ysize = ninfo.get('size', zero_zero)
-        xmid = xpos + ( xsize / 2 )
-
-        kxpos, kypos = kinfo['position']
-        kxsize, kysize = kinfo.get('size', zero_zero)
-        kxmid = kxpos + ( kxsize / 2 )
-
-        xdelta = xmid - kxmid
-
-        # If they only want us to go left, and the delta
-        # is right, bail...
-        if lr == SCOOCH_LEFT and xdelta >= 0:
-            return
-
-        # If they only want us to go right, and the delta
-        # is left, bail...
-        if lr == SCOOCH_RIGHT and xdelta <= 0:
-            return
-
-        self._scoochX(kinfo, xdelta)
-
-    def _scoochX(self, ninfo, xdelta):
-
-        layerpos = ninfo.get('layerpos')
-        x, y = ninfo['position']
-        xsize, ysize = ninfo.get('size', zero_zero)
-        layer = self.layers[ninfo['weight']]
-        layermax = len(layer) - 1
-
-        # There's always room on the left if we're the first...
-        if layerpos == 0 and xdelta < 0:
-            ninfo['position'] = (x+xdelta, y)
-            return
-
-        # Always room on the right if we're last!
-        if layerpos == layermax and xdelta > 0:
-            ninfo['position'] = (x+xdelta, y)
-            return
-
-        # Sigh... now we have to get fancy...
-
-        # If they're asking us to go left, find out about our
-        # left sibling
-        if xdelta < 0:
-            snid, sinfo = layer[layerpos - 1]
-            sx, sy = sinfo['position']
-            sxsize, sysize = sinfo.get('size', zero_zero)
-
-            sright = (sx + sxsize) + self.width_pad
-
-            #leftroom = sright - x
-            # "greater" is less movement here...
-            xdelta = max(xdelta, sright - x)
-            ninfo['position'] = (x+xdelta, y)
-            return
-
-        # If they're asking us to go right, find out about our
-        # right sibling
-        if xdelta > 0:
-            snid, sinfo = layer[layerpos + 1]
-            sx, sy = sinfo['position']
-            sxsize, sysize = sinfo.get('size', zero_zero)
-
-            myright = x + xsize + self.width_pad
-
-            xdelta = min(xdelta, sx-myright)
-            ninfo['position'] = (x+xdelta, y)
-            return
-
     def _calcEdgeLines(self):
 
         h_hpad = self.width_pad / 2
@@ -4,6 +4,11 @@ import logging
 import itertools
 import traceback
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import visgraph.layouts as vg_layouts
 
 logger = logging.getLogger(__name__)
@@ -41,6 +46,118 @@ class vector:
             dy = min(dy,maxmov)
         return x+dx,y+dy
 
+def exactRepulsion(pos, query, k):
+    '''
+    Return the (len(query), 2) array of coulomb repulsion on each of the
+    query nodes (indexes into pos) from every other node.
+    '''
+    delta = pos[query][:, None, :] - pos[None, :, :]
+    dist2 = numpy.maximum((delta ** 2).sum(axis=2), 1.0)
+    force = k / (dist2 * numpy.sqrt(dist2))
+    force[numpy.arange(len(query)), query] = 0
+    return (delta * force[:, :, None]).sum(axis=1)
+
+
+def bhRepulsion(pos, query, k, theta=0.8):
+    '''
+    Like exactRepulsion() but using the Barnes-Hut approximation: nodes are
+    binned into a quadtree and a cell whose size is less than theta times
+    its distance to the query node repels as one node (of the cell's total
+    charge at its center of mass).  This is O(N log N) rather than O(N**2).
+
+    The tree is walked a level at a time for all the query nodes at once.
+    '''
+    count = len(pos)
+    depth = min(16, int(math.ceil(math.log(max(count, 2), 4))) + 3)
+
+    mins = pos.min(axis=0)
+    span = max((pos.max(axis=0) - mins).max(), 1.0) * 1.000001
+    cells = ((pos - mins) * ((1 << depth) / span)).astype(numpy.int64)
+    cells = numpy.minimum(cells, (1 << depth) - 1)
+    cx = cells[:, 0]
+    cy = cells[:, 1]
+
+    # per level: (sorted cell ids, node count, x sum, y sum, cell id per node)
+    levels = [None]
+    for lvl in range(1, depth + 1):
+        shift = depth - lvl
+        ids = ((cx >> shift) << lvl) | (cy >> shift)
+        uniq, inv = numpy.unique(ids, return_inverse=True)
+        levels.append((
+            uniq,
+            numpy.bincount(inv).astype(float),
+            numpy.bincount(inv, weights=pos[:, 0]),
+            numpy.bincount(inv, weights=pos[:, 1]),
+            ids,
+        ))
+
+    qcount = len(query)
+    fx = numpy.zeros(qcount)
+    fy = numpy.zeros(qcount)
+
+    # Start with each query node against the 4 children of the root
+    qidx = numpy.repeat(numpy.arange(qcount), 4)
+    cids = numpy.tile(numpy.arange(4, dtype=numpy.int64), qcount)
+    theta2 = theta * theta
+
+    for lvl in range(1, depth + 1):
+
+        uniq, cnts, xsums, ysums, ids = levels[lvl]
+
+        # drop empty cells
+        idx = numpy.minimum(numpy.searchsorted(uniq, cids), len(uniq) - 1)
+        mask = uniq[idx] == cids
+        qidx = qidx[mask]
+        cids = cids[mask]
+        idx = idx[mask]
+
+        nodes = query[qidx]
+        mass = cnts[idx]
+        xsum = xsums[idx]
+        ysum = ysums[idx]
+
+        # the query node's own cell repels with everything *but* it
+        own = ids[nodes] == cids
+        mass = mass - own
+        xsum = xsum - own * pos[nodes, 0]
+        ysum = ysum - own * pos[nodes, 1]
+
+        mask = mass > 0
+        qidx = qidx[mask]
+        cids = cids[mask]
+        nodes = nodes[mask]
+        mass = mass[mask]
+        own = own[mask]
+
+        dx = pos[nodes, 0] - xsum[mask] / mass
+        dy = pos[nodes, 1] - ysum[mask] / mass
+        dist2 = numpy.maximum(dx * dx + dy * dy, 1.0)
+
+        size = span / (1 << lvl)
+        done = (mass == 1) | (~own & (size * size < theta2 * dist2))
+        if lvl == depth:
+            done[:] = True
+
+        force = k * mass[done] / (dist2[done] * numpy.sqrt(dist2[done]))
+        fx += numpy.bincount(qidx[done], weights=force * dx[done], minlength=qcount)
+        fy += numpy.bincount(qidx[done], weights=force * dy[done], minlength=qcount)
+
+        # open the rest of the cells into their children
+        qidx = qidx[~done]
+        cids = cids[~done]
+        if not len(qidx):
+            break
+
+        px = (cids >> lvl) << 1
+        py = (cids & ((1 << lvl) - 1)) << 1
+        qidx = numpy.repeat(qidx, 4)
+        px = numpy.repeat(px, 4) + numpy.tile([0, 0, 1, 1], len(cids))
+        py = numpy.repeat(py, 4) + numpy.tile([0, 1, 0, 1], len(cids))
+        cids = (px << (lvl + 1)) | py
+
+    return numpy.column_stack((fx, fy))
+
+
 class ForceLayout(vg_layouts.GraphLayout):
 
     def __init__(self, graph):
@@ -55,6 +172,9 @@ class ForceLayout(vg_layouts.GraphLayout):
         #self._f_minforce = 4        # When is the graph "stable enough"
         self._f_springrate = 0.1    # Used in hooke calcs
         self._f_minavgforce = 0.25
+        self._f_theta = 0.8         # Barnes-Hut cell size / distance cutoff
+        self._f_exactmax = 256      # Use exact repulsion up to this many nodes
+        self._f_amax = 2000         # Max array engine ticks (if no _f_imax)
 
     def setMaxTickMove(self, mmax):
         '''
@@ -91,6 +211,11 @@ class ForceLayout(vg_layouts.GraphLayout):
         # Setup a random layout to start with
         self.setRandomLayout( self.graph )
 
+        if numpy is not None:
+            self._layoutArrays()
+            self._setEdgePoints()
+            return
+
         # Layout each contiguous cluster seperately
         cgraphs = self.graph.getClusterGraphs()
         for graph in cgraphs:
@@ -163,6 +288,12 @@ class ForceLayout(vg_layouts.GraphLayout):
 
         '''
         self.setRandomLayout( self.graph )
+
+        if numpy is not None:
+            needmore = self._layoutArrays(maxtick=1)
+            self._setEdgePoints()
+            return needmore
+
         cgraphs = self.graph.getClusterGraphs()
 
         needmore = False
@@ -196,6 +327,228 @@ class ForceLayout(vg_layouts.GraphLayout):
         self._setEdgePoints()
         return needmore
 
+    def relaxLayout(self, nids, hops=2, maxtick=500):
+        '''
+        Incrementally update the layout after the given nodes were added
+        (or their edges changed) by only moving the nodes within hops
+        edges of them.  Everything else stays where it is (but still
+        repels the nodes being moved).  Returns the list of moved nids.
+
+        Example:
+            g.addNode(nid=fva)
+            g.addEdgeByNids(caller, fva)
+            layout.relaxLayout([fva])
+
+        NOTE: without numpy this is a full layoutGraph()
+        '''
+        if numpy is None:
+            self.layoutGraph()
+            return [ nid for nid, nprops in self.graph.getNodes() ]
+
+        nodes = self.graph.getNodes()
+        nidx, pos, drag, src, dst = self._getLayoutArrays(nodes)
+
+        adj = [ [] for i in range(len(nodes)) ]
+        for n1, n2 in zip(src.tolist(), dst.tolist()):
+            adj[n1].append(n2)
+            adj[n2].append(n1)
+
+        # collect the nodes near the change
+        active = set( nidx[nid] for nid in nids )
+        todo = list(active)
+        for i in range(hops):
+            nexttodo = []
+            for n in todo:
+                for n2 in adj[n]:
+                    if n2 not in active:
+                        active.add(n2)
+                        nexttodo.append(n2)
+            todo = nexttodo
+
+        # new nodes start out next to a placed neighbor (if they have one)
+        placed = numpy.array([ nprops.get('position') is not None for nid, nprops in nodes ])
+        for n in active:
+            if placed[n]:
+                continue
+            nbrs = [ n2 for n2 in adj[n] if placed[n2] ]
+            if nbrs:
+                pos[n] = pos[nbrs].mean(axis=0) + [ self._f_randint(-50, 50), self._f_randint(-50, 50) ]
+            else:
+                pos[n] = [ self._f_randint(1, len(nodes) * 10), self._f_randint(1, len(nodes) * 10) ]
+            placed[n] = True
+
+        query = numpy.array(sorted(active), dtype=numpy.int64)
+        self._runArrays(pos, drag, src, dst, query, maxtick)
+
+        moved = []
+        for n in query.tolist():
+            nid, nprops = nodes[n]
+            nprops['position'] = (float(pos[n, 0]), float(pos[n, 1]))
+            moved.append(nid)
+
+        self._setEdgePoints()
+        return moved
+
+    def _getLayoutArrays(self, nodes):
+        '''
+        Return (nidx, pos, drag, src, dst) for the given nodes where nidx is
+        a dictionary of nid to index in the position (N, 2) and drag arrays
+        and src/dst are the node indexes of the (non-loop) edges.
+        '''
+        nidx = dict( (nid, i) for i, (nid, nprops) in enumerate(nodes) )
+        pos = numpy.array([ nprops.get('position') or (0, 0) for nid, nprops in nodes ], dtype=float).reshape(-1, 2)
+        drag = numpy.array([ nprops.get('drag', self._f_drag) for nid, nprops in nodes ], dtype=float)
+
+        src = []
+        dst = []
+        for eid, n1, n2, einfo in self.graph.getEdges():
+            if n1 == n2:
+                continue
+            src.append(nidx[n1])
+            dst.append(nidx[n2])
+
+        return nidx, pos, drag, numpy.array(src, dtype=numpy.int64), numpy.array(dst, dtype=numpy.int64)
+
+    def _tickArrays(self, pos, drag, src, dst, query, scale=1.0):
+        '''
+        Move the query nodes one tick (in place in pos) and return the total
+        force on them.  The scale "cools" the movement (see _runArrays).
+        '''
+        count = len(pos)
+        charge = ke * self._f_charge * self._f_charge
+        if count <= self._f_exactmax:
+            vect = exactRepulsion(pos, query, charge)
+        else:
+            vect = bhRepulsion(pos, query, charge, theta=self._f_theta)
+
+        # hooke attraction along each edge (both ways)
+        delta = (pos[dst] - pos[src]) * self._f_springrate
+        spring = numpy.column_stack((
+            numpy.bincount(src, weights=delta[:, 0], minlength=count) - numpy.bincount(dst, weights=delta[:, 0], minlength=count),
+            numpy.bincount(src, weights=delta[:, 1], minlength=count) - numpy.bincount(dst, weights=delta[:, 1], minlength=count),
+        ))
+        vect += spring[query]
+
+        # Highly connected nodes take smaller steps (their springs would
+        # otherwise overshoot and never settle)
+        degree = numpy.bincount(src, minlength=count) + numpy.bincount(dst, minlength=count)
+        step = scale * drag[query] / numpy.maximum(1.0, degree[query] * self._f_springrate)
+        vect *= step[:, None]
+
+        mmax = self._f_mmax
+        if mmax:
+            pos[query] += numpy.clip(vect, -mmax, mmax)
+        else:
+            pos[query] += vect
+
+        return numpy.hypot(vect[:, 0], vect[:, 1]).sum()
+
+    def _runArrays(self, pos, drag, src, dst, query, maxtick):
+        '''
+        Tick the query nodes until the average force on them is less than
+        _f_minavgforce (returns True) or maxtick ticks pass (returns False).
+
+        The Barnes-Hut forces are slightly "noisy" (nodes crossing quadtree
+        cells) so movement is cooled while the total force stops falling.
+        '''
+        scale = 1.0
+        last = None
+        progress = 0
+        for i in range(maxtick):
+            totforce = self._tickArrays(pos, drag, src, dst, query, scale=scale)
+            if totforce / len(query) < self._f_minavgforce:
+                return True
+
+            # compare the un-cooled force to the last tick
+            totforce /= scale
+            if last is not None and totforce >= last:
+                scale = max(scale * 0.9, 0.01)
+                progress = 0
+            else:
+                progress += 1
+                if progress >= 5:
+                    scale = min(scale / 0.9, 1.0)
+                    progress = 0
+            last = totforce
+
+        return False
+
+    def _layoutArrays(self, maxtick=None):
+        '''
+        The numpy physics engine for layoutGraph() (or incLayoutGraph() with
+        maxtick=1): each cluster of connected nodes is laid out separately
+        and then they are stacked (largest first).  Returns True if any
+        cluster has not yet settled.
+        '''
+        nodes = self.graph.getNodes()
+        if not nodes:
+            return False
+
+        nidx, pos, drag, src, dst = self._getLayoutArrays(nodes)
+        sizes = numpy.array([ nprops.get('size') or (0, 0) for nid, nprops in nodes ], dtype=float).reshape(-1, 2)
+
+        # label the clusters
+        adj = [ [] for i in range(len(nodes)) ]
+        for n1, n2 in zip(src.tolist(), dst.tolist()):
+            adj[n1].append(n2)
+            adj[n2].append(n1)
+
+        clusters = []
+        done = numpy.zeros(len(nodes), dtype=bool)
+        for i in range(len(nodes)):
+            if done[i]:
+                continue
+            done[i] = True
+            todo = [i]
+            members = []
+            while todo:
+                n = todo.pop()
+                members.append(n)
+                for n2 in adj[n]:
+                    if not done[n2]:
+                        done[n2] = True
+                        todo.append(n2)
+            clusters.append(numpy.array(sorted(members), dtype=numpy.int64))
+
+        if maxtick is None:
+            maxtick = self._f_imax or self._f_amax
+
+        needmore = False
+        for members in clusters:
+
+            if len(members) == 1:
+                continue
+
+            # re-number the cluster's edges into its own arrays
+            remap = numpy.full(len(nodes), -1, dtype=numpy.int64)
+            remap[members] = numpy.arange(len(members))
+            emask = remap[src] != -1
+            csrc = remap[src[emask]]
+            cdst = remap[dst[emask]]
+
+            cpos = pos[members]
+            query = numpy.arange(len(members))
+            needmore |= not self._runArrays(cpos, drag[members], csrc, cdst, query, maxtick)
+            pos[members] = cpos
+
+        # Now, in order from largest to smallest, shift them back toward 0,0
+        clusters.sort(key=len, reverse=True)
+
+        offset = 0
+        half = sizes / 2
+        for members in clusters:
+            lo = (pos[members] - half[members]).min(axis=0)
+            hi = (pos[members] + half[members]).max(axis=0)
+            pos[members] -= lo
+            pos[members, 1] += offset
+            offset += hi[1] - lo[1]
+
+        # (like setRandomLayout, positions are not value indexed)
+        for i, (nid, nprops) in enumerate(nodes):
+            nprops['position'] = (float(pos[i, 0]), float(pos[i, 1]))
+
+        return needmore
+
     def _setEdgePoints(self):
         for eid,n1,n2,einfo in self.graph.getEdges():
             n1pos = self.graph.getNodeProps(n1)['position']
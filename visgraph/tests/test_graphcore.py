@@ -14,9 +14,15 @@ s2paths = [
 
 class GraphCoreTest(unittest.TestCase):
 
+    def newGraph(self):
+        return v_graphcore.Graph()
+
+    def newHierGraph(self):
+        return v_graphcore.HierGraph()
+
     def getSampleGraph1(self):
         # simple branching/merging graph
-        g = v_graphcore.HierGraph()
+        g = self.newHierGraph()
 
         g.addHierRootNode('a')
         for c in ('b','c','d','e','f'):
@@ -34,7 +40,7 @@ class GraphCoreTest(unittest.TestCase):
 
     def getSampleGraph2(self):
         # primitive loop graph
-        g = v_graphcore.HierGraph()
+        g = self.newHierGraph()
 
         g.addHierRootNode('a')
         for c in ('b','c'):
@@ -48,7 +54,7 @@ class GraphCoreTest(unittest.TestCase):
 
     def getSampleGraph3(self):
         # flat loop graph
-        g = v_graphcore.HierGraph()
+        g = self.newHierGraph()
 
         g.addHierRootNode('a')
         for c in ('b','c','d'):
@@ -113,7 +119,7 @@ class GraphCoreTest(unittest.TestCase):
         self.assertPathsThru( self.getSampleGraph2(),'b',[('a','b'),('a','b','c'),])
 
     def test_visgraph_nodeprops(self):
-        g = v_graphcore.Graph()
+        g = self.newGraph()
         a = g.addNode('a')
 
         g.setNodeProp(a,'foo','bar')
@@ -131,7 +137,7 @@ class GraphCoreTest(unittest.TestCase):
         self.assertIsNone(a[1].get('foo'))
 
     def test_visgraph_edgeprops(self):
-        g = v_graphcore.Graph()
+        g = self.newGraph()
         a = g.addNode('a')
         b = g.addNode('b')
 
@@ -151,7 +157,7 @@ class GraphCoreTest(unittest.TestCase):
 
     def test_visgraph_subcluster(self):
 
-        g = v_graphcore.Graph()
+        g = self.newGraph()
 
         a = g.addNode('a')
         b = g.addNode('b')
@@ -199,7 +205,7 @@ class GraphCoreTest(unittest.TestCase):
 
 
     def test_visgraph_formnode(self):
-        g = v_graphcore.Graph()
+        g = self.newGraph()
 
         def wootctor(n):
             g.setNodeProp(n,'lul',1)
@@ -218,3 +224,91 @@ class GraphCoreTest(unittest.TestCase):
         self.assertEqual( n3[1].get('foo'), 'bar')
         self.assertNotEqual( n1[0], n2[0])
 
+    def test_visgraph_bulk(self):
+        g = self.newGraph()
+        g.addNodes((i, {'va': 0x1000 + i}) for i in range(10))
+        g.addEdges([(0, 1), (1, 2, {'foo': 'bar'}), (2, 0)])
+
+        self.assertEqual(g.getNodeCount(), 10)
+        self.assertEqual(g.getNodeProps(3).get('va'), 0x1003)
+        self.assertEqual([e[2] for e in g.getRefsFromByNid(1)], [2])
+        self.assertEqual([e[1] for e in g.getEdgesByProp('foo', 'bar')], [1])
+        self.assertTrue(g.isRootNode(g.getNode(5)))
+        self.assertFalse(g.isLeafNode(g.getNode(2)))
+
+        g.delNode(g.getNode(1))
+        self.assertIsNone(g.getNode(1))
+        self.assertEqual(len(g.getEdges()), 1)
+        self.assertEqual(g.getRefsToByNid(2), [])
+        self.assertEqual(g.getNodeCount(), 9)
+
+
+class CompactGraphCoreTest(GraphCoreTest):
+
+    def newGraph(self):
+        return v_graphcore.CompactGraph()
+
+    def newHierGraph(self):
+        return v_graphcore.CompactHierGraph()
+
+    def test_visgraph_compact_props(self):
+        g = v_graphcore.CompactGraph(indexprops=('color',))
+        a = g.addNode('a', color='red', size=(10, 20))
+        b = g.addNode(nprops={'color': 'blue'})
+        self.assertEqual(b[0], 1)
+
+        # node props are views which may be modified directly
+        a[1]['width'] = 30
+        self.assertEqual(g.getNodeProps('a'), {'color': 'red', 'size': (10, 20), 'width': 30})
+        self.assertEqual(g.getNodesByProp('width'), [a])
+
+        g.setNodeProp(b, 'color', 'red')
+        self.assertEqual(sorted(n[0] for n in g.getNodesByProp('color', 'red')), [1, 'a'])
+        self.assertEqual(g.getNodesByProp('color', 'blue'), [])
+
+        e = g.addEdge(a, b, eprops={'weight': 2})
+        self.assertEqual(g.getEdge(e[0])[3]['weight'], 2)
+        self.assertRaises(v_graphcore.DuplicateEdge, g.addEdge, a, b, eid=e[0])
+
+        g.delNode(b)
+        g2 = v_graphcore.Graph.fromJsonBuf(g.toJson())
+        self.assertEqual(g2.getNodeProps('a').get('width'), 30)
+
+    def test_visgraph_compact_index(self):
+        g = v_graphcore.CompactGraph(indexprops=('color',))
+        a = g.addNode('a', color='red')
+        b = g.addNode(nprops={'color': 'blue'})
+
+        # direct writes through the props view keep the value index
+        b[1]['color'] = 'red'
+        self.assertEqual(sorted(n[0] for n in g.getNodesByProp('color', 'red')), [1, 'a'])
+        self.assertEqual(g.getNodesByProp('color', 'blue'), [])
+
+        del a[1]['color']
+        self.assertEqual(g.getNodesByProp('color', 'red'), [b])
+
+        e = g.addEdge(a, b)
+        g.getEdgeProps(e[0])['color'] = 'green'
+        self.assertEqual([x[0] for x in g.getEdgesByProp('color', 'green')], [e[0]])
+
+    def test_visgraph_compact_anon_nid(self):
+        g = v_graphcore.CompactGraph()
+        g.addNode(2)
+        g.addNode('x')
+
+        # the node number (2) is already used as an id
+        n = g.addNode(nprops={'foo': 'bar'})
+        self.assertNotEqual(n[0], 2)
+        self.assertEqual(g.getNodeProps(n[0]).get('foo'), 'bar')
+        self.assertEqual(g.getNodeCount(), 3)
+
+    def test_visgraph_compact_delform(self):
+        g = v_graphcore.CompactGraph()
+        n1 = g.formNode('woot', 10)
+        g.delNode(n1)
+        self.assertEqual(g.formnodes, {})
+
+        n2 = g.formNode('woot', 10)
+        self.assertIsNotNone(g.getNode(n2[0]))
+        self.assertEqual(g.getNodeProps(n2[0]).get('woot'), 10)
+
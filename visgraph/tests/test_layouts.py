@@ -1,6 +1,9 @@
+import random
 import unittest
+import itertools
 
 import visgraph.graphcore as v_graphcore
+import visgraph.layouts.force as v_force
 import visgraph.layouts.dynadag as v_dynadag
 
 class GraphLayoutTest(unittest.TestCase):
@@ -68,18 +71,118 @@ class GraphLayoutTest(unittest.TestCase):
         lyt = v_dynadag.DynadagLayout(g1)
         lyt.layoutGraph()
 
-        self.assertEqual(g1.getNode('a')[1].get('position'),(20,0))
+        self.assertEqual(g1.getNode('a')[1].get('position'),(30,0))
         self.assertEqual(g1.getNode('b')[1].get('position'),(20,40))
         self.assertEqual(g1.getNode('c')[1].get('position'),(40,40))
-        self.assertEqual(g1.getNode('d')[1].get('position'),(20,80))
+        self.assertEqual(g1.getNode('d')[1].get('position'),(40,80))
 
         g2 = self.sampGraph2()
         lyt = v_dynadag.DynadagLayout(g2)
         lyt.layoutGraph()
 
-        self.assertEqual(g2.getNode('a')[1].get('position'),(20,0))
+        self.assertEqual(g2.getNode('a')[1].get('position'),(40,0))
         self.assertEqual(g2.getNode('b')[1].get('position'),(20,40))
         self.assertEqual(g2.getNode('c')[1].get('position'),(40,120))
-        self.assertEqual(g2.getNode('d')[1].get('position'),(20,80))
-        self.assertEqual(g2.getNode('e')[1].get('position'),(20,120))
+        self.assertEqual(g2.getNode('d')[1].get('position'),(60,80))
+        self.assertEqual(g2.getNode('e')[1].get('position'),(60,120))
+        self.assertEqual(lyt.getCrossingCount(), 0)
+
+    def test_visgraph_dynadag_crossings(self):
+        rand = random.Random(1)
+        for i in range(50):
+            edges = [ (rand.randrange(8), rand.randrange(8)) for j in range(rand.randrange(20)) ]
+            slow = 0
+            for (u1, l1), (u2, l2) in itertools.combinations(edges, 2):
+                if (u1 - u2) * (l1 - l2) < 0:
+                    slow += 1
+            self.assertEqual(v_dynadag.countCrossings(edges, 8), slow)
+
+        self.assertEqual(v_dynadag.medianPos([1, 5, 7]), 5)
+        self.assertEqual(v_dynadag.medianPos([2, 4]), 3)
+
+        # pack to the right of the first and pull the pair apart evenly
+        self.assertEqual(v_dynadag.placeLayer([100, 0], [10, 10], [1, 1], 10), [40, 60])
+        self.assertEqual(v_dynadag.placeLayer([0, 0, 100], [10, 10, 10], [1, 1, 1], 10), [-10, 10, 100])
+
+    def test_visgraph_dynadag_large(self):
+        # a ladder of diamonds with every other rung laid out backward
+        g = v_graphcore.HierGraph()
+        g.addNode(0, rootnode=True, size=(50, 10))
+        for i in range(1, 298):
+            g.addNode(i, size=(30 + i % 40, 10))
+        for i in range(0, 297, 3):
+            if i % 2:
+                g.addEdgeByNids(i, i + 2)
+                g.addEdgeByNids(i, i + 1)
+            else:
+                g.addEdgeByNids(i, i + 1)
+                g.addEdgeByNids(i, i + 2)
+            g.addEdgeByNids(i + 1, i + 3)
+            g.addEdgeByNids(i + 2, i + 3)
+        g.addEdgeByNids(0, 297) # long edge (ghosts)
+
+        lyt = v_dynadag.DynadagLayout(g)
+        lyt.layoutGraph()
+
+        self.assertEqual(lyt.getCrossingCount(), 0)
+        for layer in lyt.layers:
+            right = None
+            for nid, ninfo in layer:
+                x, y = ninfo.get('position')
+                if right is not None:
+                    self.assertGreaterEqual(x, right + lyt.width_pad)
+                right = x + ninfo.get('size', (0, 0))[0]
+
+        width, height = lyt.getLayoutSize()
+        for nid, ninfo in g.getNodes():
+            x, y = ninfo.get('position')
+            self.assertLessEqual(x + ninfo.get('size', (0, 0))[0], width)
+
+
+    @unittest.skipIf(v_force.numpy is None, 'numpy not installed')
+    def test_visgraph_force_repulsion(self):
+        numpy = v_force.numpy
+        rand = numpy.random.RandomState(1)
+        pos = rand.rand(600, 2) * 1000
+        query = numpy.arange(600)
+
+        exact = v_force.exactRepulsion(pos, query, 100.0)
+        approx = v_force.bhRepulsion(pos, query, 100.0, theta=0.8)
+        err = numpy.hypot(*(exact - approx).T) / numpy.hypot(*exact.T)
+        self.assertLess(numpy.median(err), 0.1)
+
+        # only query nodes are calculated
+        approx = v_force.bhRepulsion(pos, query[:10], 100.0, theta=0.01)
+        self.assertEqual(approx.shape, (10, 2))
+        self.assertLess(numpy.abs(exact[:10] - approx).max(), 1e-3)
+
+    @unittest.skipIf(v_force.numpy is None, 'numpy not installed')
+    def test_visgraph_force(self):
+        g = v_graphcore.Graph()
+        for i in range(40):
+            g.addNode(nid=i, size=(10, 10))
+        for i in range(1, 30):
+            g.addEdgeByNids(i // 3, i)
+        # a second cluster
+        for i in range(31, 40):
+            g.addEdgeByNids(30, i)
+
+        lyt = v_force.ForceLayout(g)
+        lyt.layoutGraph()
+
+        ys = [ g.getNodeProps(i)['position'][1] for i in range(40) ]
+        self.assertTrue(max(ys[:30]) < min(ys[30:]))
+        for eid, n1, n2, einfo in g.getEdges():
+            self.assertEqual(einfo['edge_points'], [g.getNodeProps(n1)['position'], g.getNodeProps(n2)['position']])
+
+        before = dict( (nid, nprops['position']) for nid, nprops in g.getNodes() )
+
+        g.addNode(nid=40, size=(10, 10))
+        g.addEdgeByNids(29, 40)
+        moved = lyt.relaxLayout([40], hops=1)
 
+        self.assertEqual(sorted(moved), [29, 40])
+        self.assertIsNotNone(g.getNodeProps(40).get('position'))
+        for nid, pos in before.items():
+            if nid not in moved:
+                self.assertEqual(g.getNodeProps(nid)['position'], pos)
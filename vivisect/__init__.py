@@ -41,7 +41,10 @@ import vstruct.primitives as vs_prims
 import vivisect.base as viv_base
 import vivisect.parsers as viv_parsers
 import vivisect.codegraph as viv_codegraph
+import vivisect.instrument as viv_instrument
+import vivisect.scheduler as viv_scheduler
 import vivisect.impemu.lookup as viv_imp_lookup
+import vivisect.impemu.summary as viv_imp_summary
 
 from vivisect.exc import *
 from vivisect.const import *
@@ -52,6 +55,9 @@ import vivisect.analysis.generic.emucode as v_emucode
 
 logger = logging.getLogger(__name__)
 
+# reanalyze() gives up if analysis keeps changing things after this many passes
+REANALYZE_MAX_PASSES = 8
+
 STOP_LOCS = (LOC_STRING, LOC_UNI, LOC_STRUCT, LOC_CLSID, LOC_VFTABLE, LOC_IMPORT, LOC_PAD, LOC_NUMBER)
 
 
@@ -150,6 +156,9 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
         self._cached_emus = {}
 
+        # The extended analysis timing report (see getAnalysisReport())
+        self._sched_report = None
+
         # The function entry signature decision tree
         # FIXME add to export
         self.sigtree = e_bytesig.SignatureTree()
@@ -216,6 +225,7 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         self.setMeta("StorageName", wsname)
         # The event list thusfar came *only* from the load...
         self._createSaveMark()
+        self._clearDirty()
         # Snapin our analysis modules
         self._snapInAnalysisModules()
 
@@ -387,6 +397,8 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
 
     def addNoReturnVa(self, va):
         noretva = self.getMeta('NoReturnApisVa', {})
+        if not noretva.get(va):
+            self._dirty_callees.add(va)
         noretva[va] = True
         self.cfctx.addNoReturnAddr(va)
         self.setMeta('NoReturnApisVa', noretva)
@@ -712,29 +724,160 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         self.vprint('Beginning analysis...')
 
         starttime = time.time()
-        # Now lets engage any analysis modules.  If any modules return
-        # true, they managed to change things and we should run again...
-        for mname in self.amodlist:
-            mod = self.amods.get(mname)
-            self.vprint("Extended Analysis: %s" % mod.__name__)
-            try:
-                mod.analyze(self)
-            except Exception as e:
-                self.vprint("Extended Analysis Exception %s: %s" % (mod.__name__, e))
+        # Now lets engage any analysis modules (in dependency order, see
+        # vivisect.scheduler, skipping any whose inputs are unchanged)
+        workers = self.config.viv.analysis.workers
+        if self._instr is not None:
+            # (instrumentation follows one module at a time)
+            workers = 1
+
+        sched = viv_scheduler.AnalysisScheduler(self)
+        sched.run(workers=workers)
+        self._sched_report = sched.getReport()
 
         endtime = time.time()
         self.vprint('...analysis complete! (%d sec)' % (endtime-starttime))
+        self.vprint('   Critical path: %.1f sec (%s)' % (self._sched_report['critical'],
+                                                        ', '.join(self._sched_report['critical_path'])))
         self.printDiscoveredStats()
         self._fireEvent(VWE_AUTOANALFIN, (endtime, starttime))
+        self._clearDirty()
 
     def analyzeFunction(self, fva):
+        instr = self._instr
         for fmname in self.fmodlist:
             fmod = self.fmods.get(fmname)
+            if instr is not None:
+                instr.enter(fmname, fva)
             try:
                 fmod.analyzeFunction(self, fva)
             except Exception as e:
                 self.vprint("Function Analysis Exception for 0x%x %s: %s" % (fva, fmod.__name__, e))
                 self.setFunctionMeta(fva, "%s fail" % fmod.__name__, traceback.format_exc())
+            finally:
+                if instr is not None:
+                    instr.leave()
+
+    def getAnalysisReport(self):
+        '''
+        Return the timing report of the extended analysis modules from the
+        last analyze() (see AnalysisScheduler.getReport()) or None.
+
+        Example:
+            vw.analyze()
+            rep = vw.getAnalysisReport()
+            print('%.2f of %.2f sec' % (rep['critical'], rep['wall']))
+        '''
+        return self._sched_report
+
+    def reanalyze(self, maxpasses=REANALYZE_MAX_PASSES):
+        '''
+        Re-run analysis on only the functions affected by changes to the
+        workspace since the last analyze() (or reanalyze()), such as an
+        analyst's makeFunction(), delFunction(), makeCode() or
+        setFunctionApi().
+
+        The function analysis modules are run on the functions containing
+        added/removed locations and on the callers of functions which were
+        added, deleted, or given a new api/thunk/noreturn.  Extended
+        analysis modules which define reanalyze(vw, fvas, vas) are then
+        given the dirty functions and locations.  Whatever that changes is
+        analyzed again, until nothing is left dirty (or maxpasses is hit).
+
+        Returns the set of function addresses which were analyzed.
+
+        Example:
+            vw.makeFunction(va)
+            vw.setFunctionApi(fva, apidef)
+            vw.reanalyze()
+        '''
+        done = set()
+        instr = self._instr
+        for i in range(maxpasses):
+            vas = self._dirty_vas
+            fvas = self._getDirtyFuncs(vas, self._dirty_callees)
+            self._clearDirty()
+            if not fvas and not vas:
+                break
+
+            for fva in sorted(fvas):
+                self.analyzeFunction(fva)
+                done.add(fva)
+
+            for mname in self.amodlist:
+                mod = self.amods.get(mname)
+                hook = getattr(mod, 'reanalyze', None)
+                if hook is None:
+                    continue
+
+                if instr is not None:
+                    instr.enter(mname)
+                try:
+                    hook(self, fvas, vas)
+                except Exception as e:
+                    self.vprint("Extended Reanalysis Exception %s: %s" % (mod.__name__, e))
+                finally:
+                    if instr is not None:
+                        instr.leave()
+
+        else:
+            if self._dirty_vas or self._dirty_callees:
+                self.vprint('reanalysis still changing after %d passes' % maxpasses)
+
+        return done
+
+    def _getDirtyFuncs(self, vas, callees):
+        # The (existing) functions whose analysis depends on the given
+        # locations or on the given functions (as callees)
+        fvas = set()
+        for va in vas:
+            fva = self.getFunction(va)
+            if fva is not None:
+                fvas.add(fva)
+                continue
+
+            # new code which is not yet in a block of the function(s)
+            # which branch to it
+            for fromva, tova, rtype, rflags in self.getXrefsTo(va, REF_CODE):
+                if not rflags & envi.BR_PROC:
+                    fvas.add(self.getFunction(fromva))
+
+        for cva in callees:
+            for fromva, tova, rtype, rflags in self.getXrefsTo(cva, REF_CODE):
+                fvas.add(self.getFunction(fromva))
+
+        fvas.discard(None)
+        return set(fva for fva in fvas if self.isFunction(fva))
+
+    def _clearDirty(self):
+        self._dirty_vas = set()
+        self._dirty_callees = set()
+
+    def enableInstrumentation(self, enable=True):
+        '''
+        Enable (or disable) recording of per analysis module and per function
+        timing, event counts and emulated instruction counts during analysis.
+
+        Returns the vivisect.instrument.AnalysisInstrument (or None).
+        '''
+        if not enable:
+            self._instr = None
+        elif self._instr is None:
+            self._instr = viv_instrument.AnalysisInstrument()
+        return self._instr
+
+    def getInstrumentation(self):
+        '''
+        Return the vivisect.instrument.AnalysisInstrument recording analysis
+        stats (or None if instrumentation is not enabled).
+
+        Example:
+            vw.enableInstrumentation()
+            vw.analyze()
+            for modname, stats in vw.getInstrumentation().getModuleStats().items():
+                print('%s: %.2f sec' % (modname, stats['wall']))
+        '''
+        return self._instr
 
     def getStats(self):
         stats = {
@@ -1225,6 +1368,10 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         # Add our opcode location first (op flags become ldata)
         loc = self.addLocation(va, op.size, LOC_OP, op.iflags)
 
+        # We already have the opcode, so index it now
+        self._feat_index.addOpcode(va, op)
+        self._feat_pending.discard(va)
+
         # This takes care of all normal indirect immediates
 
         brdone = {}
@@ -1491,6 +1638,32 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         '''
         self.setFunctionMeta(fva, 'api', apidef)
 
+    def getFunctionSummary(self, fva):
+        '''
+        Retrieve the emulation summary (see vivisect.impemu.summary) for the
+        given function or None if it has not been (or is no longer) known.
+
+        Example:
+            summ = vw.getFunctionSummary(fva)
+            if summ is not None and summ.noret:
+                print('0x%.8x never returns' % fva)
+        '''
+        return self._fsummaries.get(fva)
+
+    def setFunctionSummary(self, fva, summ):
+        '''
+        Set (or with None, drop) the emulation summary for a function.
+
+        NOTE: summaries are not saved with the workspace.
+        '''
+        if summ is None:
+            self._fsummaries.pop(fva, None)
+            return
+
+        if len(self._fsummaries) >= viv_imp_summary.MAX_SUMMARIES:
+            self._fsummaries.clear()
+        self._fsummaries[fva] = summ
+
     def getFunctionLocals(self, fva):
         '''
         Retrieve the list of (fva,spdelta,symtype,syminfo) tuples which
@@ -1648,6 +1821,123 @@ class VivWorkspace(e_mem.MemoryObject, viv_base.VivWorkspaceCore):
         '''
         return viv_codegraph.FuncBlockGraph(self,fva)
 
+    def _flushFeatureIndex(self):
+        # Index the opcode locations we only know about from events
+        # (ie, a loaded workspace or one made by a remote client)
+        while self._feat_pending:
+            va = self._feat_pending.pop()
+            try:
+                op = self.parseOpcode(va)
+            except Exception as e:
+                logger.warning('Failed to index instruction at 0x%.8x: %s', va, e)
+                continue
+            self._feat_index.addOpcode(va, op)
+
+    def findImmediate(self, imm):
+        '''
+        Return a sorted list of the instruction vas which use the given
+        immediate value as an operand.
+
+        Example:
+            for va in vw.findImmediate(0x67452301):
+                print(vw.getFunction(va))
+        '''
+        self._flushFeatureIndex()
+        return self._feat_index.findImmediate(imm)
+
+    def findMnemonic(self, mnem):
+        '''
+        Return a sorted list of the instruction vas with the given mnemonic.
+
+        Example:
+            cpuids = vw.findMnemonic('cpuid')
+        '''
+        self._flushFeatureIndex()
+        return self._feat_index.findMnemonic(mnem)
+
+    def findReference(self, va):
+        '''
+        Return a sorted list of the instruction vas with an operand which
+        dereferences the given address (resolvable without emulation).
+        Unlike xrefs, the address need not be a valid pointer.
+        '''
+        self._flushFeatureIndex()
+        return self._feat_index.findReference(va)
+
+    def findFunctionsUsingAll(self, imms=(), mnems=(), refs=()):
+        '''
+        Return a sorted list of the functions which contain (at least one)
+        instruction using each of the given immediate values, mnemonics and
+        dereferenced addresses.
+
+        Example:
+            md5 = vw.findFunctionsUsingAll(imms=(0x67452301, 0xefcdab89))
+        '''
+        queries = [(self.findImmediate, imms), (self.findMnemonic, mnems), (self.findReference, refs)]
+
+        ret = None
+        for find, feats in queries:
+            for feat in feats:
+                fvas = set()
+                for va in find(feat):
+                    fva = self.getFunction(va)
+                    if fva is not None:
+                        fvas.add(fva)
+
+                if ret is None:
+                    ret = fvas
+                else:
+                    ret &= fvas
+
+                if not ret:
+                    return []
+
+        if ret is None:
+            return []
+        return sorted(ret)
+
+    def getFunctionCfg(self, fva):
+        '''
+        Retrieve the compact control flow graph (a codegraph.FunctionCfg)
+        for the function at fva.  Graphs are cached until a code block,
+        location or xref they were built from changes.
+
+        Example:
+            cfg = vw.getFunctionCfg(fva)
+            for cbva, cbsize in cfg.getBlocks():
+                print(cfg.getSuccessors(cbva))
+        '''
+        cfg = self._cfg_cache.get(fva)
+        if cfg is not None:
+            return cfg
+
+        gen = self._cfg_gen
+        cfg = viv_codegraph.buildFunctionCfg(self, fva)
+
+        # Don't cache a graph if the workspace changed while we built it
+        if gen == self._cfg_gen:
+            self._cfg_cache[fva] = cfg
+            for va in cfg.deps:
+                fvas = self._cfg_deps.get(va)
+                if fvas is None:
+                    fvas = set()
+                    self._cfg_deps[va] = fvas
+                fvas.add(fva)
+
+        return cfg
+
+    def addRenderCache(self, cache):
+        '''
+        Register an envi.memcanvas.RenderCache to be invalidated as
+        workspace events change the locations, names, comments, xrefs
+        (etc) it rendered.  The workspace only keeps a weak reference.
+
+        Example:
+            cache = e_canvas.RenderCache()
+            vw.addRenderCache(cache)
+        '''
+        self._rend_caches.add(cache)
+
     def getImportCallers(self, name):
         """
         Get a list of all the callers who reference the specified import
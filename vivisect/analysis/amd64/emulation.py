@@ -1,6 +1,7 @@
 import vivisect.exc as v_exc
 import vivisect.impemu as viv_imp
 import vivisect.impemu.monitor as viv_monitor
+import vivisect.impemu.summary as viv_summary
 
 import envi
 import envi.archs.amd64 as e_amd64
@@ -146,4 +147,5 @@ def analyzeFunction(vw, fva):
         vw.setFunctionLocal(fva, baseoff + ( i * 8 ), LSYM_FARG, i+stackidx)
 
     emumon.addAnalysisResults(vw, emu)
+    viv_summary.analyzeFunction(vw, fva, emu, emumon, api)
 
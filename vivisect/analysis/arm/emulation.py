@@ -3,6 +3,7 @@ import logging
 import vivisect
 import vivisect.exc as v_exc
 import vivisect.impemu.monitor as viv_monitor
+import vivisect.impemu.summary as viv_summary
 import vivisect.analysis.generic.codeblocks as viv_cb
 
 import envi
@@ -124,6 +125,7 @@ class AnalysisMonitor(viv_monitor.AnalysisMonitor):
             logger.warning("0x%x: (%r)  ERROR: %s", op.va, op, e)
 
     def posthook(self, emu, op, starteip):
+        viv_monitor.AnalysisMonitor.posthook(self, emu, op, starteip)
         if op.opcode == INS_BLX:
             emu.setFlag(PSR_T_bit, self.last_tmode)
 
@@ -211,6 +213,7 @@ def analyzeFunction(vw, fva):
         vw.setFunctionLocal(fva, baseoff + ( i * 4 ), LSYM_FARG, i+stackidx)
 
     emumon.addAnalysisResults(vw, emu)
+    viv_summary.analyzeFunction(vw, fva, emu, emumon, api)
 
     # handle infinite loops (actually, while 1;)
 
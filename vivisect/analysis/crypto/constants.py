@@ -33,46 +33,18 @@ def analyze(vw):
 
     rows = []
 
-    for fva in vw.getFunctions():
-        md5_init_score = 0
-        md5_xform_score = 0
-        for va, size, funcva in vw.getFunctionBlocks(fva):
-            maxva = va + size
-            while va < maxva:
-                loctup = vw.getLocation(va)
-                if loctup is None:
-                    logger.warning("error parsing through function 0x%x at 0x%x", fva, va)
-                    va += 1
-                    continue
-                lva, lsize, ltype, tinfo = loctup
-
-                op = vw.parseOpcode(va, arch=tinfo)
-                for o in op.opers:
-
-                    if not o.isImmed():
-                        continue
-
-                    imm = o.getOperValue(op)
-
-                    if imm in md5_inits:
-                        md5_init_score += 1
-
-                    if imm in md5_xform:
-                        md5_xform_score += 1
-
-                va += len(op)
-
-        if md5_init_score == len(md5_inits):
-            rows.append((fva, "MD5 Init"))
-
-        if md5_xform_score == len(md5_xform):
-            rows.append((fva, "MD5 Transform"))
-
-    for va in vw.searchMemory(dh_group1):
-        rows.append((va, "DH Well-Known MODP Group 1"))
-
-    for va in vw.searchMemory(dh_group2):
-        rows.append((va, "DH Well-Known MODP Group 2"))
+    for fva in vw.findFunctionsUsingAll(imms=md5_inits):
+        rows.append((fva, "MD5 Init"))
+
+    for fva in vw.findFunctionsUsingAll(imms=md5_xform):
+        rows.append((fva, "MD5 Transform"))
+
+    dh_names = {
+        dh_group1: "DH Well-Known MODP Group 1",
+        dh_group2: "DH Well-Known MODP Group 2",
+    }
+    for needle, va in vw.searchMemoryMulti(dh_names.keys()):
+        rows.append((va, dh_names[needle]))
 
     if len(rows):
         vw.vprint("Adding VA Set: %s" % vlname)
@@ -4,6 +4,9 @@ import envi.bits as e_bits
 
 logger = logging.getLogger(__name__)
 
+consumes = ('memory', 'locations')
+produces = ('codeflow',)
+
 
 def ffTermFptrArray(vw, va, max=100):
     ret = []
@@ -1,3 +1,5 @@
+consumes = ('vasets', 'functions', 'memory')
+produces = ('codeflow',)
 
 def analyze(vw):
     '''
@@ -15,6 +15,9 @@ import vivisect
 
 logger = logging.getLogger(__name__)
 
+consumes = ('memory', 'locations')
+produces = ('codeflow',)
+
 
 def analyze(vw):
     """
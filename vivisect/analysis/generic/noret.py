@@ -14,7 +14,6 @@ import logging
 
 import envi
 import vivisect.const as v_const
-import vivisect.tools.graphutil as v_t_graph
 
 
 logger = logging.getLogger(__name__)
@@ -28,27 +27,25 @@ def analyzeFunction(vw, fva):
             if loc and loc[v_const.L_LTYPE] == v_const.LOC_IMPORT:
                 return
 
-    g = v_t_graph.buildFunctionGraph(vw, fva)
-    _, _, leaves = v_t_graph.getNodeWeightHisto(g)
+    cfg = vw.getFunctionCfg(fva)
 
     hasret = False
-    for weight, nodes in leaves.items():
-        for node in nodes:
-            cbstart, cbsize, cbfunc = vw.getCodeBlock(node[0])
-            cbend = cbstart + cbsize - 1
-
-            lva, lsize, ltype, linfo = vw.getLocation(cbend)
-            if ltype != v_const.LOC_OP:
-                pass
-            if vw.isNoReturnVa(lva):
-                continue
-            if linfo & envi.IF_RET:
-                hasret = True
-                break
-            # be wary of dynamic branches we couldn't resolve
-            if linfo & envi.IF_BRANCH:
-                hasret = True
-                break
+    for cbstart in cfg.getLeaves():
+        cbsize = cfg.sizes[cfg.blockidx[cbstart]]
+        cbend = cbstart + cbsize - 1
+
+        lva, lsize, ltype, linfo = vw.getLocation(cbend)
+        if ltype != v_const.LOC_OP:
+            pass
+        if vw.isNoReturnVa(lva):
+            continue
+        if linfo & envi.IF_RET:
+            hasret = True
+            break
+        # be wary of dynamic branches we couldn't resolve
+        if linfo & envi.IF_BRANCH:
+            hasret = True
+            break
 
     # 0x14006ba90 out of omnetpp.exe at O2, 64bit is a good counter example (that shouldn't be no ret
     if not hasret:
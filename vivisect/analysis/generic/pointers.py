@@ -6,7 +6,7 @@ in a previous life, this analysis code lived inside VivWorkspace.analyze()
 """
 import sys
 import logging
-from vivisect.const import RTYPE_BASEPTR, LOC_POINTER, L_LTYPE
+from vivisect.const import RTYPE_BASEPTR, LOC_POINTER, L_VA, L_LTYPE
 
 logger = logging.getLogger(__name__)
 
@@ -37,20 +37,7 @@ def analyze(vw):
             done.append((pva, tva))
 
     for lva, lsz, lt, li in vw.getLocations(LOC_POINTER):
-        tva = vw.readMemoryPtr(lva)
-        if not vw.isValidPointer(tva):
-            continue
-
-        if vw.getLocation(tva) is not None:
-            continue
-
-        logger.info('following previously discovered pointer 0x%x -> 0x%x', lva, tva)
-        try:
-            logger.info('pointer(3): 0x%x -> 0x%x', lva, tva)
-            vw.followPointer(tva)
-            done.append((lva, tva))
-        except Exception as e:
-            logger.error('followPointer() failed for 0x%.8x (pval: 0x%.8x) (err: %s)', lva, tva, e)
+        followPointer(vw, lva, done)
 
     # Now, lets find likely free-hanging pointers
     for addr, pval in vw.findPointers():
@@ -63,6 +50,41 @@ def analyze(vw):
         except Exception as e:
             logger.error('makePointer() failed for 0x%.8x (pval: 0x%.8x) (err: %s)', addr, pval, e)
 
+    namePointers(vw, done)
+
+
+def reanalyze(vw, fvas, vas):
+    '''
+    Follow (and name) only the pointers among the added locations.
+    '''
+    done = []
+    for va in vas:
+        loc = vw.getLocation(va)
+        if loc is None or loc[L_VA] != va or loc[L_LTYPE] != LOC_POINTER:
+            continue
+        followPointer(vw, va, done)
+
+    namePointers(vw, done)
+
+
+def followPointer(vw, lva, done):
+    tva = vw.readMemoryPtr(lva)
+    if not vw.isValidPointer(tva):
+        return
+
+    if vw.getLocation(tva) is not None:
+        return
+
+    logger.info('following previously discovered pointer 0x%x -> 0x%x', lva, tva)
+    try:
+        logger.info('pointer(3): 0x%x -> 0x%x', lva, tva)
+        vw.followPointer(tva)
+        done.append((lva, tva))
+    except Exception as e:
+        logger.error('followPointer() failed for 0x%.8x (pval: 0x%.8x) (err: %s)', lva, tva, e)
+
+
+def namePointers(vw, done):
     # Now let's see what these guys should be named (if anything)
     for ptr, tgt in done:
         try:
@@ -5,6 +5,9 @@ point to valid locations.
 
 import vivisect
 
+consumes = ('relocations', 'files', 'locations')
+produces = ('codeflow',)
+
 
 def analyze(vw):
     for fname, vaoff, rtype, data in vw.getRelocations():
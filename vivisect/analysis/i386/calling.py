@@ -6,6 +6,7 @@ attempt to detect the calling convention.
 import collections
 
 import vivisect.impemu.monitor as viv_imp_monitor
+import vivisect.impemu.summary as viv_imp_summary
 
 import vivisect.exc as v_exc
 from vivisect.const import *
@@ -141,3 +142,4 @@ def analyzeFunction(vw, fva):
         vw.setFunctionLocal(fva, baseoff + ( i * 4 ), LSYM_FARG, i+stackidx)
 
     emumon.addAnalysisResults(vw, emu)
+    viv_imp_summary.analyzeFunction(vw, fva, emu, emumon, api)
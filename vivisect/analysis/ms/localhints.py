@@ -2,6 +2,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+consumes = ('files', 'functions')
+produces = ('codeflow',)
+
 
 def analyze(vw):
 
@@ -1,4 +1,8 @@
 import envi.archs.i386.opcode86 as e_opcode86
+
+consumes = ('functions', 'names', 'xrefs', 'codeblocks')
+produces = ('codeflow',)
+
 def analyze(vw):
 
     for fva in vw.getFunctions():
@@ -5,6 +5,9 @@ PE Extended analysis module.
 import vivisect
 import envi.bits as e_bits
 
+consumes = ('memory', 'files')
+produces = ('locations', 'names')
+
 def analyze(vw):
     """
     """
@@ -1,4 +1,5 @@
 import Queue
+import weakref
 import logging
 import traceback
 import threading
@@ -19,6 +20,7 @@ import vivisect.const as viv_const
 import vivisect.impapi as viv_impapi
 import vivisect.analysis as viv_analysis
 import vivisect.codegraph as viv_codegraph
+import vivisect.featindex as viv_featindex
 
 from envi.threads import firethread
 
@@ -27,6 +29,9 @@ from vivisect.const import *
 
 logger = logging.getLogger(__name__)
 
+# function meta which the analysis of the function's callers depends on
+callee_meta = ('api', 'Thunk')
+
 """
 Mostly this is a place to scuttle away some of the inner workings
 of a workspace, so the outer facing API is a little cleaner.
@@ -179,6 +184,39 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         self._event_list = []
         self._event_saved = 0 # The index of the last "save" event...
 
+        # Analysis instrumentation (see enableInstrumentation())
+        self._instr = None
+
+        # Cached function control flow graphs (see getFunctionCfg()) and
+        # the va -> set(fva) index of what each cached graph depends on
+        self._cfg_cache = {}
+        self._cfg_deps = {}
+        self._cfg_gen = 0
+
+        # Instruction feature index (see findImmediate()) and the opcode
+        # locations (from events) which still need to be added to it
+        self._feat_index = viv_featindex.FeatureIndex()
+        self._feat_pending = set()
+
+        # What changed since the last analysis (see reanalyze()): locations
+        # added or removed and functions whose callers may now analyze
+        # differently (added, deleted or a new api/thunk/noret)
+        self._dirty_vas = set()
+        self._dirty_callees = set()
+
+        # Function emulation summaries (see vivisect.impemu.summary)
+        self._fsummaries = {}
+
+        # Event counts (what changed, for the analysis scheduler), the
+        # counts each extended analysis module last ran with and the lock
+        # serializing events while modules run concurrently
+        self._event_counts = [0] * VWE_MAX
+        self._amod_inputs = {}
+        self._event_lock = None
+
+        # Render caches (see addRenderCache()) kept in sync by the events
+        self._rend_caches = weakref.WeakSet()
+
         # Give ourself a structure namespace!
         self.vsbuilder = vs_builder.VStructBuilder()
         self.vsconsts  = vs_const.VSConstResolver()
@@ -207,10 +245,42 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         yield
         self._supervisor = False
 
+    def _invalidateCfgs(self, va, size=1):
+        # Drop the cached function graphs which depend on va:va+size
+        self._cfg_gen += 1
+        if not self._cfg_deps:
+            return
+
+        for dva in xrange(va, va + size):
+            fvas = self._cfg_deps.pop(dva, None)
+            if fvas is None:
+                continue
+
+            for fva in fvas:
+                self._cfg_cache.pop(fva, None)
+
+    def _invalidateRender(self, va, size=1):
+        # Drop the cached renders which depend on va:va+size
+        if not self._rend_caches:
+            return
+
+        for cache in list(self._rend_caches):
+            cache.invalidate(va, size)
+
+    def _clearRender(self):
+        for cache in list(self._rend_caches):
+            cache.clear()
+
     def _handleADDLOCATION(self, loc):
         lva, lsize, ltype, linfo = loc
         self.locmap.setMapLookup(lva, lsize, loc)
         self.loclist.append(loc)
+        self._invalidateCfgs(lva, lsize)
+        self._invalidateRender(lva, lsize)
+        self._dirty_vas.add(lva)
+
+        if ltype == LOC_OP:
+            self._feat_pending.add(lva)
 
         # A few special handling cases...
         if ltype == LOC_IMPORT:
@@ -223,9 +293,17 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         lva, lsize, ltype, linfo = loc
         self.locmap.setMapLookup(lva, lsize, None)
         self.loclist.remove(loc)
+        self._invalidateCfgs(lva, lsize)
+        self._invalidateRender(lva, lsize)
+        self._dirty_vas.add(lva)
+
+        if ltype == LOC_OP:
+            self._feat_pending.discard(lva)
+            self._feat_index.delOpcode(lva)
 
     def _handleADDSEGMENT(self, einfo):
         self.segments.append(einfo)
+        self._invalidateRender(einfo[SEG_VA], einfo[SEG_SIZE])
 
     def _handleADDRELOC(self, einfo):
         if len(einfo) == 2:     # FIXME: legacy: remove after 02/13/2020
@@ -255,6 +333,7 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
             if ptr != self.readMemoryPtr(rva):
                 with self.getAdminRights():
                     self.writeMemoryPtr(rva, ptr)
+                self._invalidateRender(rva, self.psize)
 
         if rtype == RTYPE_BASEPTR:
             # make it like a pointer (but one that could move with each load)
@@ -291,6 +370,8 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         self.cfctx.addFunctionDef(va, calls_from)
 
         self.funcmeta[va] = meta
+        self._invalidateRender(va)
+        self._dirty_callees.add(va)
 
         for name, value in meta.items():
             mcbname = "_fmcb_%s" % name.split(':')[0]
@@ -309,10 +390,14 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
 
         self.funcmeta.pop(fva)
         self.func_args.pop(fva, None)
+        self._cfg_cache.pop(fva, None)
+        self._invalidateRender(fva)
         self.codeblocks_by_funcva.pop(fva)
         node = self._call_graph.getNode(fva)
         self._call_graph.delNode(node)
         self.cfctx.flushFunction(fva)
+        self._dirty_callees.add(fva)
+        self._fsummaries.pop(fva, None)
 
         # FIXME: do we want to now seek the function we *should* be in?
         # if xrefs_to, look for non-PROC code xrefs and take their function
@@ -324,7 +409,11 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         funcva, name, value = einfo
         m = self.funcmeta.get(funcva)
         if m is not None:
+            if name in callee_meta and m.get(name) != value:
+                self._dirty_callees.add(funcva)
+                self._fsummaries.pop(funcva, None)
             m[name] = value
+        self._invalidateRender(funcva)
         mcbname = "_fmcb_%s" % name.split(':')[0]
         mcb = getattr(self, mcbname, None)
         if mcb is not None:
@@ -335,12 +424,16 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         self.blockmap.setMapLookup(va, size, einfo)
         self.codeblocks_by_funcva.get(funcva).append(einfo)
         self.codeblocks.append(einfo)
+        self._cfg_cache.pop(funcva, None)
+        self._invalidateCfgs(va, size)
 
     def _handleDELCODEBLOCK(self, cb):
         va,size,funcva = cb
         self.codeblocks.remove(cb)
         self.codeblocks_by_funcva.get(cb[CB_FUNCVA]).remove(cb)
         self.blockmap.setMapLookup(va, size, None)
+        self._cfg_cache.pop(funcva, None)
+        self._invalidateCfgs(va, size)
 
     def _handleADDXREF(self, einfo):
         fromva, tova, reftype, rflags = einfo
@@ -358,11 +451,17 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
             xr_to.append(einfo)
             xr_from.append(einfo)
             self.xrefs.append(einfo)
+            self._invalidateCfgs(fromva)
+            self._invalidateRender(fromva)
+            self._invalidateRender(tova)
 
     def _handleDELXREF(self, einfo):
         fromva, tova, reftype, refflags = einfo
         self.xrefs_by_to[tova].remove(einfo)
         self.xrefs_by_from[fromva].remove(einfo)
+        self._invalidateCfgs(fromva)
+        self._invalidateRender(fromva)
+        self._invalidateRender(tova)
 
     def _handleSETNAME(self, einfo):
         va,name = einfo
@@ -379,6 +478,8 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
             self.va_by_name[name] = va
             self.name_by_va[va] = name
 
+        self._invalidateRender(va)
+
         if self.isFunction(va):
             fnode = self._call_graph.getFunctionNode(va)
             if name is None:
@@ -394,6 +495,9 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         self.locmap.initMapLookup(va, blen)
         self.blockmap.initMapLookup(va, blen)
 
+        # New memory changes which operands render as pointers
+        self._clearRender()
+
         # On loading a new memory map, we need to crush a few
         # transmeta items...
         self.transmeta.pop('findPointers',None)
@@ -413,6 +517,7 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         if mcb is not None:
             mcb(name, value)
         self.metadata[name] = value
+        self._clearRender()
 
     def _handleCOMMENT(self, einfo):
         va,comment = einfo
@@ -420,6 +525,7 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
             self.comments.pop(va, None)
         else:
             self.comments[va] = comment
+        self._invalidateRender(va)
 
     def _handleADDFILE(self, einfo):
         normname, imagebase, md5sum = einfo
@@ -483,10 +589,12 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
             self.symhints.pop((va,idx), None)
         else:
             self.symhints[(va,idx)] = hint
+        self._invalidateRender(va)
 
     def _handleSETFUNCARGS(self, einfo):
         fva, args = einfo
         self.func_args[fva] = args
+        self._invalidateRender(fva)
 
     def _handleAUTOANALFIN(self, einfo):
         '''
@@ -561,11 +669,18 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         skip is used to tell the server to bypass our channelid when
         putting the event into channel queues (we took care of our own).
         '''
+        lock = self._event_lock
+        if lock is not None:
+            lock.acquire()
 
         try:
             if event & VTE_MASK:
                 return self._fireTransEvent(event, einfo)
 
+            self._event_counts[event] += 1
+            if self._instr is not None:
+                self._instr.event(event)
+
             # Do our main event processing
             self.ehand[event](einfo)
 
@@ -588,6 +703,10 @@ class VivWorkspaceCore(object, viv_impapi.ImportApi):
         except Exception as e:
             logger.error(traceback.format_exc())
 
+        finally:
+            if lock is not None:
+                lock.release()
+
     def _fireTransEvent(self, event, einfo):
         for q in self.chan_lookup.values():
             q.put((event, einfo))
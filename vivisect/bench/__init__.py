@@ -0,0 +1,195 @@
+'''
+Reproducible performance benchmarks for vivisect/envi.
+
+Benchmarks are plain functions registered with the @benchmark decorator
+which return a dictionary of metric name -> value.  Metric names carry
+their direction:  "*_per_sec" metrics are better when higher, "*_sec" and
+"*_kb" metrics are better when lower and anything else (eg. a count of
+functions found) is informational.
+
+Benchmarks which need the sample binaries from the vivtestfiles repo use
+the VIVTESTFILES environment variable (like the unit tests) and are
+skipped when it is not set.
+
+Example:
+    python -m vivisect.bench -o before.json
+    ... hack hack hack ...
+    python -m vivisect.bench -o after.json -c before.json
+'''
+import os
+import sys
+import time
+import fnmatch
+import logging
+import platform
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+benchmarks = []
+
+bench_modules = (
+    'vivisect.bench.disasm',
+    'vivisect.bench.emulate',
+    'vivisect.bench.regctx',
+    'vivisect.bench.analysis',
+    'vivisect.bench.elfparse',
+    'vivisect.bench.demangle',
+    'vivisect.bench.graph',
+    'vivisect.bench.layout',
+    'vivisect.bench.render',
+    'vivisect.bench.tracer',
+)
+
+
+class BenchSkip(Exception):
+    pass
+
+
+def benchmark(name):
+    '''
+    Decorator to register a benchmark function under the given name.
+    Names are dotted (<area>.<what>.<detail>) to allow glob selection.
+    '''
+    def regbench(f):
+        benchmarks.append((name, f))
+        return f
+    return regbench
+
+
+def getTestPath(*paths):
+    '''
+    Return the path to a file in the vivtestfiles repo (or raise BenchSkip).
+    '''
+    testdir = os.getenv('VIVTESTFILES')
+    if not testdir:
+        raise BenchSkip('VIVTESTFILES env var not found!')
+
+    fpath = os.path.join(testdir, *paths)
+    if not os.path.isfile(fpath):
+        raise BenchSkip('missing test file: %s' % fpath)
+    return fpath
+
+
+def peakRss():
+    '''
+    Return the peak resident set size (in KB) of the current process.
+    '''
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return rss
+
+
+def isRate(metric):
+    return metric.endswith('_per_sec')
+
+
+def isCost(metric):
+    return not isRate(metric) and metric.endswith(('_sec', '_kb'))
+
+
+def bestOf(results):
+    '''
+    Merge the per-iteration metric dictionaries keeping the best value of
+    each metric.
+    '''
+    ret = {}
+    for res in results:
+        for metric, val in res.items():
+            if val is None:
+                continue
+            best = ret.get(metric)
+            if best is None:
+                ret[metric] = val
+            elif isRate(metric):
+                ret[metric] = max(best, val)
+            elif isCost(metric):
+                ret[metric] = min(best, val)
+    return ret
+
+
+def loadBenchmarks():
+    for modname in bench_modules:
+        __import__(modname)
+    return list(benchmarks)
+
+
+def getGitRevision():
+    try:
+        dirn = os.path.dirname(os.path.abspath(__file__))
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=dirn, stderr=subprocess.STDOUT)
+        return out.strip()
+    except Exception:
+        return None
+
+
+def runBenchmarks(patterns=None, repeat=3):
+    '''
+    Run the registered benchmarks (optionally only those whose names match
+    one of the given glob patterns) and return a results dictionary
+    suitable for saving as JSON and passing to compareResults().
+    '''
+    results = {}
+    for name, func in loadBenchmarks():
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+
+        runs = []
+        try:
+            for i in range(repeat):
+                runs.append(func())
+        except BenchSkip as e:
+            logger.warning('%s: skipped (%s)', name, e)
+            continue
+        except Exception as e:
+            logger.error('%s: failed (%s)', name, e, exc_info=True)
+            continue
+
+        results[name] = bestOf(runs)
+        logger.info('%s: %r', name, results[name])
+
+    return {
+        'meta': {
+            'time': time.time(),
+            'repeat': repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'revision': getGitRevision(),
+            'testfiles': os.getenv('VIVTESTFILES'),
+        },
+        'results': results,
+    }
+
+
+def compareResults(old, new):
+    '''
+    Compare two results dictionaries (from runBenchmarks) returning a list
+    of (name, metric, oldval, newval, change) tuples for metrics present in
+    both, where change is the fractional improvement (positive is better)
+    or None for informational metrics.
+    '''
+    ret = []
+    oldres = old.get('results', {})
+    newres = new.get('results', {})
+    for name in sorted(set(oldres) & set(newres)):
+        for metric in sorted(set(oldres[name]) & set(newres[name])):
+            oldval = oldres[name][metric]
+            newval = newres[name][metric]
+            if not (isRate(metric) or isCost(metric)):
+                change = None
+            elif not oldval or not newval:
+                change = 0.0
+            elif isRate(metric):
+                change = (newval - oldval) / float(oldval)
+            else:
+                change = (oldval - newval) / float(oldval)
+            ret.append((name, metric, oldval, newval, change))
+    return ret
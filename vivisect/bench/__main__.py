@@ -0,0 +1,76 @@
+import sys
+import json
+import logging
+import argparse
+
+import envi.common as e_common
+import vivisect.bench as v_bench
+
+logger = logging.getLogger('vivisect.bench')
+e_common.setLogging(logger, 'INFO')
+
+
+def setup():
+    ap = argparse.ArgumentParser('python -m vivisect.bench')
+    ap.add_argument('-k', '--select', dest='patterns', default=[], action='append',
+                    help='Only run benchmarks matching this glob (eg. "disasm.*")')
+    ap.add_argument('-r', '--repeat', dest='repeat', default=3, type=int,
+                    help='Run each benchmark this many times and keep the best')
+    ap.add_argument('-o', '--output', dest='output', default=None,
+                    help='Save the results as JSON to this file')
+    ap.add_argument('-c', '--compare', dest='compare', default=None,
+                    help='Compare the results against a previously saved JSON file')
+    ap.add_argument('-l', '--list', dest='list', default=False, action='store_true',
+                    help='List the available benchmarks')
+    ap.add_argument('results', nargs='*',
+                    help='Compare saved results (old.json new.json) rather than running')
+    return ap
+
+
+def printCompare(old, new):
+    for name, metric, oldval, newval, change in v_bench.compareResults(old, new):
+        if change is None:
+            print('%-40s %-28s %14.3f %14.3f' % (name, metric, oldval, newval))
+        else:
+            print('%-40s %-28s %14.3f %14.3f %+8.1f%%' % (name, metric, oldval, newval, change * 100))
+
+
+def main(argv):
+    opts = setup().parse_args(argv)
+
+    if opts.list:
+        for name, func in v_bench.loadBenchmarks():
+            print(name)
+        return 0
+
+    if opts.results:
+        if len(opts.results) != 2:
+            logger.error('Comparing requires exactly two result files')
+            return 1
+        with open(opts.results[0], 'rb') as f:
+            old = json.load(f)
+        with open(opts.results[1], 'rb') as f:
+            new = json.load(f)
+        printCompare(old, new)
+        return 0
+
+    results = v_bench.runBenchmarks(patterns=opts.patterns, repeat=opts.repeat)
+
+    if opts.output is not None:
+        with open(opts.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if opts.compare is not None:
+        with open(opts.compare, 'rb') as f:
+            old = json.load(f)
+        printCompare(old, results)
+    else:
+        for name, metrics in sorted(results['results'].items()):
+            for metric, val in sorted(metrics.items()):
+                print('%-40s %-28s %14.3f' % (name, metric, val))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
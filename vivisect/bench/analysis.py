@@ -0,0 +1,122 @@
+'''
+Full workspace analysis benchmarks over the vivtestfiles samples.
+
+Each sample is loaded and analyzed in a fresh process (so peak RSS is
+meaningful) with analysis instrumentation enabled, and the resulting
+workspace is saved and re-loaded with each storage module.
+'''
+import os
+import time
+import shutil
+import tempfile
+import multiprocessing
+
+import vivisect
+import vivisect.bench as v_bench
+
+from vivisect.bench import benchmark, getTestPath
+
+samples = (
+    ('linux', 'amd64', 'ls'),
+    ('linux', 'i386', 'chgrp.llvm'),
+    ('linux', 'arm', 'sh'),
+    ('windows', 'i386', 'helloworld.exe'),
+)
+
+storage_modules = (
+    'vivisect.storage.basicfile',
+    'vivisect.storage.mpfile',
+)
+
+emulation_modules = (
+    'vivisect.analysis.i386.emulation',
+    'vivisect.analysis.amd64.emulation',
+    'vivisect.analysis.arm.emulation',
+)
+
+
+def analyzeSample(fpath):
+    '''
+    Load, analyze, save and reload the given sample returning a metrics
+    dictionary (run this in a child process to get a meaningful peak RSS).
+    '''
+    ret = {}
+    vw = vivisect.VivWorkspace()
+    instr = vw.enableInstrumentation()
+
+    start = time.time()
+    vw.loadFromFile(fpath)
+    ret['load_sec'] = time.time() - start
+
+    start = time.time()
+    vw.analyze()
+    ret['analyze_sec'] = time.time() - start
+    ret['peak_rss_kb'] = v_bench.peakRss()
+    ret['functions'] = len(vw.getFunctions())
+
+    emuinsns = 0
+    emutime = 0.0
+    for modname, mstats in instr.getModuleStats().items():
+        if modname in emulation_modules:
+            emuinsns += mstats['emu_insns']
+            emutime += mstats['wall']
+    if emutime:
+        ret['emulation_insns_per_sec'] = emuinsns / emutime
+
+    vw.enableInstrumentation(False)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for modname in storage_modules:
+            short = modname.split('.')[-1]
+            fname = os.path.join(tmpdir, 'bench.%s' % short)
+
+            vw.setMeta('StorageModule', modname)
+            vw.setMeta('StorageName', fname)
+
+            start = time.time()
+            vw.saveWorkspace()
+            ret['%s_save_sec' % short] = time.time() - start
+            ret['%s_size_kb' % short] = os.path.getsize(fname) / 1024
+
+            newvw = vivisect.VivWorkspace()
+            newvw.setMeta('StorageModule', modname)
+            start = time.time()
+            newvw.loadWorkspace(fname)
+            ret['%s_load_sec' % short] = time.time() - start
+
+    finally:
+        shutil.rmtree(tmpdir)
+
+    return ret
+
+
+def _analyzeChild(conn, fpath):
+    conn.send(analyzeSample(fpath))
+    conn.close()
+
+
+def analyzeSampleProc(fpath):
+    '''
+    Run analyzeSample() in a child process and return its metrics.
+    '''
+    pconn, cconn = multiprocessing.Pipe(False)
+    proc = multiprocessing.Process(target=_analyzeChild, args=(cconn, fpath))
+    proc.start()
+    cconn.close()
+    try:
+        return pconn.recv()
+    except EOFError:
+        raise Exception('analysis process died (%r)' % proc.exitcode)
+    finally:
+        proc.join()
+
+
+def sampleBench(*path):
+    def bench():
+        return analyzeSampleProc(getTestPath(*path))
+    return bench
+
+
+for path in samples:
+    benchmark('analysis.%s' % '.'.join(path))(sampleBench(*path))
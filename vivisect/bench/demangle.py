@@ -0,0 +1,59 @@
+'''
+Demangling benchmarks over the vivtestfiles libstdc++ samples.
+
+"names_per_sec" is the bulk demangle rate for every symbol, dynamic symbol
+and relocation name in the file (with a cold cache), "load_sec" is the time
+to load the file into a workspace with a cold cache and "reload_sec" with
+the cache left warm by the first load (like a multi file workspace).
+'''
+import time
+
+import Elf
+import vivisect
+import vivisect.demangle as v_demangle
+import vivisect.parsers.elf as v_elf
+
+from vivisect.bench import benchmark, getTestPath
+
+samples = (
+    ('linux', 'amd64', 'libstdc++.so.6.0.25'),
+    ('linux', 'i386', 'libstdc++.so.6.0.25'),
+)
+
+
+def loadTime(fpath):
+    vw = vivisect.VivWorkspace()
+    start = time.time()
+    vw.loadFromFile(fpath)
+    return time.time() - start
+
+
+def demangleBench(*path):
+    def bench():
+        fpath = getTestPath(*path)
+
+        elf = Elf.Elf(open(fpath, 'rb'))
+        names = set()
+        for tbl in (elf.getDynSyms(), elf.getSymbols(), elf.getRelocs()):
+            for i in range(len(tbl)):
+                names.add(v_elf.normName(tbl.getName(i)))
+
+        start = time.time()
+        v_demangle.Demangler().demangleMany(names)
+        elapsed = time.time() - start
+
+        v_demangle.demangler.clearCache()
+        loadsec = loadTime(fpath)
+        reloadsec = loadTime(fpath)
+
+        return {
+            'names': len(names),
+            'names_per_sec': len(names) / elapsed,
+            'load_sec': loadsec,
+            'reload_sec': reloadsec,
+        }
+    return bench
+
+
+for path in samples:
+    benchmark('demangle.%s' % '.'.join(path))(demangleBench(*path))
@@ -0,0 +1,224 @@
+'''
+Disassembly throughput (archParseOpcode) per architecture.
+
+The "vectors" benchmarks decode the instruction test vectors from the envi
+unit tests (always available), the "batch" benchmarks decode the same
+vectors laid end to end with archParseOpcodes(), the "relocated" benchmarks
+decode the vectors at a new address on every pass (as firmware repeats the
+same instruction words at many addresses) and the "sweep" benchmarks do a
+linear sweep over the executable segments of sample binaries from
+vivtestfiles.
+'''
+import time
+import binascii
+
+import envi
+import envi.memory as e_mem
+
+import vivisect
+
+from vivisect.bench import benchmark, getTestPath
+
+# Linear sweeps are cut off after this many bytes per sample
+sweep_max = 0x40000
+
+
+def _getI386Vectors():
+    import envi.tests.test_arch_i386 as t_i386
+    for opdef in t_i386.i386SingleByteOpcodes + t_i386.i386MultiByteOpcodes:
+        yield opdef[1], opdef[2]
+
+
+def _getAmd64Vectors():
+    import envi.tests.test_arch_amd64 as t_amd64
+    for opdef in t_amd64.amd64SingleByteOpcodes + t_amd64.amd64MultiByteOpcodes:
+        yield opdef[1], 0x400
+
+
+def _getArmVectors():
+    import envi.tests.test_arch_arm as t_arm
+    for opdef in t_arm.instrs:
+        yield opdef[1], opdef[2]
+
+
+def _getH8Vectors():
+    import envi.tests.test_arch_h8 as t_h8
+    for opdef in t_h8.instrs:
+        yield opdef[0], opdef[1]
+
+
+def _getMsp430Vectors():
+    import envi.tests.test_arch_msp430 as t_msp430
+    for name in dir(t_msp430):
+        mod = getattr(t_msp430, name)
+        for check in getattr(mod, 'checks', ()):
+            yield check[1]['code'], 0x4400
+
+
+def getVectors(archname, vectors):
+    '''
+    Return a list of (bytes, va) tuples for the test vectors which the
+    given architecture can actually decode.
+    '''
+    arch = envi.getArchModule(archname)
+    ret = []
+    for hexbytes, va in vectors:
+        buf = binascii.unhexlify(hexbytes)
+        try:
+            arch.archParseOpcode(buf, 0, va)
+        except Exception:
+            continue
+        ret.append((buf, va))
+    return ret
+
+
+def timeVectors(archname, vectors, mintime=1.0):
+    '''
+    Decode the given (bytes, va) vectors repeatedly for at least mintime
+    seconds and return the instructions/sec.
+    '''
+    arch = envi.getArchModule(archname)
+    parse = arch.archParseOpcode
+    count = 0
+    start = time.time()
+    while True:
+        for buf, va in vectors:
+            parse(buf, 0, va)
+        count += len(vectors)
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            return count / elapsed
+
+
+def timeBatch(archname, vectors, mintime=1.0):
+    '''
+    Decode the given (bytes, va) vectors laid end to end with one call to
+    archParseOpcodes() repeatedly for at least mintime seconds and return
+    the instructions/sec.
+    '''
+    arch = envi.getArchModule(archname)
+    buf = ''.join(b[:arch.archParseOpcode(b, 0, va).size] for b, va in vectors)
+    parse = arch.archParseOpcodes
+    count = 0
+    start = time.time()
+    while True:
+        count += len(parse(buf, 0, 0x400000))
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            return count / elapsed
+
+
+def timeRelocated(archname, vectors, mintime=1.0):
+    '''
+    Like timeVectors() but each pass decodes the vectors at a new address
+    and returns the instructions/sec.
+    '''
+    arch = envi.getArchModule(archname)
+    parse = arch.archParseOpcode
+    count = 0
+    delta = 0
+    start = time.time()
+    while True:
+        delta += 0x1000
+        for buf, va in vectors:
+            parse(buf, 0, va + delta)
+        count += len(vectors)
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            return count / elapsed
+
+
+def sweepSample(fpath, archname=None):
+    '''
+    Linear sweep the executable segments of the given sample and return
+    the instructions/sec.
+    '''
+    vw = vivisect.VivWorkspace()
+    vw.loadFromFile(fpath)
+    if archname is None:
+        archname = vw.getMeta('Architecture')
+
+    arch = envi.getArchModule(archname)
+    parse = arch.archParseOpcode
+
+    count = 0
+    elapsed = 0.0
+    remain = sweep_max
+    for mva, msize, mperm, mname in vw.getMemoryMaps():
+        if not mperm & e_mem.MM_EXEC:
+            continue
+
+        mbytes = vw.readMemory(mva, msize)
+        end = min(len(mbytes), remain)
+        remain -= end
+        offset = 0
+
+        start = time.time()
+        while offset < end:
+            try:
+                op = parse(mbytes, offset, mva + offset)
+                offset += op.size
+                count += 1
+            except Exception:
+                offset += 1
+        elapsed += time.time() - start
+
+        if remain <= 0:
+            break
+
+    return count / elapsed
+
+
+def vectorBench(archname, getvecs):
+    cache = []
+
+    def bench():
+        if not cache:
+            cache.extend(getVectors(archname, getvecs()))
+        return {'insns_per_sec': timeVectors(archname, cache)}
+
+    return bench
+
+
+def batchBench(archname, getvecs):
+    cache = []
+
+    def bench():
+        if not cache:
+            cache.extend(getVectors(archname, getvecs()))
+        return {'insns_per_sec': timeBatch(archname, cache)}
+
+    return bench
+
+
+def relocatedBench(archname, getvecs):
+    cache = []
+
+    def bench():
+        if not cache:
+            cache.extend(getVectors(archname, getvecs()))
+        return {'insns_per_sec': timeRelocated(archname, cache)}
+
+    return bench
+
+
+def sweepBench(*path):
+    def bench():
+        return {'insns_per_sec': sweepSample(getTestPath(*path))}
+    return bench
+
+
+benchmark('disasm.i386.vectors')(vectorBench('i386', _getI386Vectors))
+benchmark('disasm.amd64.vectors')(vectorBench('amd64', _getAmd64Vectors))
+benchmark('disasm.arm.vectors')(vectorBench('arm', _getArmVectors))
+benchmark('disasm.h8.vectors')(vectorBench('h8', _getH8Vectors))
+benchmark('disasm.msp430.vectors')(vectorBench('msp430', _getMsp430Vectors))
+
+benchmark('disasm.i386.batch')(batchBench('i386', _getI386Vectors))
+benchmark('disasm.amd64.batch')(batchBench('amd64', _getAmd64Vectors))
+
+benchmark('disasm.arm.relocated')(relocatedBench('arm', _getArmVectors))
+
+benchmark('disasm.i386.sweep')(sweepBench('linux', 'i386', 'chgrp.llvm'))
+benchmark('disasm.amd64.sweep')(sweepBench('linux', 'amd64', 'ls'))
+benchmark('disasm.arm.sweep')(sweepBench('linux', 'arm', 'sh'))
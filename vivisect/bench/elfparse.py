@@ -0,0 +1,46 @@
+'''
+Elf parser benchmarks over the (larger) vivtestfiles shared objects.
+
+"parse_sec" is the time to build the Elf object, "records_sec" is the time
+to build every symbol, dynamic symbol and relocation object from it
+afterward and "total_sec" is both (records may be built either way).
+'''
+import time
+
+import Elf
+
+from vivisect.bench import benchmark, getTestPath
+
+samples = (
+    ('linux', 'amd64', 'libc-2.27.so'),
+    ('linux', 'amd64', 'libstdc++.so.6.0.25'),
+    ('linux', 'i386', 'libc-2.13.so'),
+    ('linux', 'i386', 'libstdc++.so.6.0.25'),
+)
+
+
+def elfBench(*path):
+    def bench():
+        fpath = getTestPath(*path)
+
+        start = time.time()
+        elf = Elf.Elf(open(fpath, 'rb'))
+        parsed = time.time()
+
+        count = 0
+        for table in (elf.getSymbols(), elf.getDynSyms(), elf.getRelocs()):
+            for rec in table:
+                count += 1
+        done = time.time()
+
+        return {
+            'parse_sec': parsed - start,
+            'records_sec': done - parsed,
+            'total_sec': done - start,
+            'records': count,
+        }
+    return bench
+
+
+for path in samples:
+    benchmark('elfparse.%s' % '.'.join(path))(elfBench(*path))
@@ -0,0 +1,145 @@
+'''
+Emulation throughput (instructions/sec) for the envi emulators.
+
+Each loop benchmark runs a small hand assembled arithmetic loop (a
+mov/add/xor/mov/dec/jnz style loop) until it falls out the bottom, single
+stepping it and then running it as compiled blocks (stepBlock()).
+
+The workspace benchmarks run the workspace emulator (as the emulation
+analysis passes do) over every function of a generated i386/amd64
+workspace, with the eager and the lazy (i386:lazyflags) flags code.
+'''
+import time
+import binascii
+
+import envi
+import envi.memory as e_mem
+
+import vivisect
+import vivisect.impemu.monitor as viv_imp_monitor
+
+from vivisect.bench import benchmark
+
+loops = {
+    # mov ecx,1000; add eax,ecx; xor edx,eax; mov ebx,edx; dec ecx; jnz
+    'i386': 'b9e803000001c831c289d34975f7',
+    # mov ecx,1000; add eax,ecx; xor edx,eax; mov ebx,edx; dec ecx; jnz
+    'amd64': 'b9e803000001c831c289d3ffc975f6',
+    # mov r1,#0x400; add r0,r0,r1; eor r2,r2,r0; subs r1,r1,#1; bne
+    'arm': '011ba0e3010080e0002022e0011051e2fbffff1a',
+    # movs r1,#0xff; adds r0,r0,r1; eors r2,r0; subs r1,#1; bne
+    'thumb': 'ff21401842400139fbd1',
+}
+
+codeva = 0x10000
+
+
+def emulateLoop(archname, loop=None, blocks=False):
+    '''
+    Run the loop for the given architecture in a fresh emulator and return
+    a (count, elapsed) tuple.
+    '''
+    if loop is None:
+        loop = loops[archname]
+
+    code = binascii.unhexlify(loop)
+    emu = envi.getArchModule(archname).getEmulator()
+    emu.addMemoryMap(codeva, e_mem.MM_RWX, 'code', code + b'\x00' * 16)
+    emu.setProgramCounter(codeva)
+
+    endva = codeva + len(code)
+    count = 0
+    start = time.time()
+    while emu.getProgramCounter() != endva:
+        if blocks:
+            count += emu.stepBlock()
+        else:
+            emu.stepi()
+            count += 1
+
+    return count, time.time() - start
+
+
+def loopBench(archname):
+    def bench():
+        count, elapsed = emulateLoop(archname)
+        bcount, belapsed = emulateLoop(archname, blocks=True)
+        return {
+            'insns_per_sec': count / elapsed,
+            'block_insns_per_sec': bcount / belapsed,
+        }
+    return bench
+
+
+for archname in sorted(loops):
+    benchmark('emulate.%s.loop' % archname)(loopBench(archname))
+
+
+# xor eax,eax; xor edx,edx; test edi,edi; jz 1f; inc eax; add eax,ecx
+# 2: cmp eax,16; jl 3f; sub edx,eax; 3: inc edx; and edx,127; or ebx,edx
+# 1: dec edi; jnz 2b; ret
+func_bytes = binascii.unhexlify('31c031d285ff7412ffc001c883f8107c0229c2ffc283e27f09d3ffcf75eec3')
+func_size = 0x20
+func_count = 500
+
+
+class CountMonitor(viv_imp_monitor.EmulationMonitor):
+
+    def __init__(self):
+        viv_imp_monitor.EmulationMonitor.__init__(self)
+        self.count = 0
+
+    def prehook(self, emu, op, starteip):
+        self.count += 1
+
+
+def genWorkspace(archname, funcs):
+    baseva = 0x400000
+    mbytes = func_bytes.ljust(func_size, '\x90') * funcs
+
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture', archname)
+    vw.setMeta('Platform', 'linux')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'bench', mbytes)
+    vw.addSegment(baseva, len(mbytes), '.text', 'bench')
+    for i in xrange(funcs):
+        vw.addEntryPoint(baseva + (i * func_size))
+    return vw, [baseva + (i * func_size) for i in xrange(funcs)]
+
+
+def emulateFuncs(vw, fvas, lazy):
+    mon = CountMonitor()
+    emu = vw.getEmulator()
+    emu.setEmuOpt('i386:lazyflags', lazy)
+    emu.setEmulationMonitor(mon)
+
+    # The disassembler builds its opcode tables on first use (which would
+    # swamp the emulation itself), so warm it up first...
+    for fva in fvas:
+        emu.runFunction(fva, maxhit=1)
+    mon.count = 0
+
+    start = time.time()
+    for fva in fvas:
+        emu.runFunction(fva, maxhit=1)
+    return mon.count / (time.time() - start)
+
+
+def workspaceBench(archname):
+    cache = []
+
+    def bench():
+        if not cache:
+            cache.append(genWorkspace(archname, func_count))
+
+        vw, fvas = cache[0]
+        return {
+            'eager_insns_per_sec': emulateFuncs(vw, fvas, False),
+            'lazy_insns_per_sec': emulateFuncs(vw, fvas, True),
+        }
+
+    return bench
+
+
+for archname in ('amd64', 'i386'):
+    benchmark('emulate.%s.workspace' % archname)(workspaceBench(archname))
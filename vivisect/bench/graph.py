@@ -0,0 +1,110 @@
+'''
+visgraph backend build/traversal cost on a synthetic call graph.
+
+Each benchmark builds a call graph shaped like the one vivisect keeps for
+a large binary (graph_nodes functions with graph_edges calls each, every
+node carrying the props the workspace sets) and then walks the refs from
+every node.  The build runs in a child process so the reported RSS is
+the graph's alone.
+'''
+import time
+import random
+import multiprocessing
+
+import visgraph.graphcore as v_graphcore
+
+from vivisect.bench import benchmark
+
+graph_nodes = 100000
+graph_edges = 5
+
+
+def getGraphSpec(nodes=graph_nodes, edges=graph_edges, seed=0):
+    '''
+    Return (nids, edges) for a reproducible random call graph.
+    '''
+    rand = random.Random(seed)
+    nids = [0x400000 + (i * 0x40) for i in xrange(nodes)]
+    calls = []
+    for fva in nids:
+        for i in xrange(edges):
+            calls.append((fva, nids[rand.randrange(nodes)]))
+    return nids, calls
+
+
+def statmRss():
+    '''
+    Return the current resident set size (in KB) or None where /proc is
+    not available.
+    '''
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, ValueError):
+        return None
+    import resource
+    return pages * resource.getpagesize() / 1024
+
+
+def buildGraph(cls, nids, calls, bulk=False):
+    g = cls()
+    if bulk:
+        g.addNodes((fva, {'cbva': fva, 'repr': 'sub_%.8x' % fva}) for fva in nids)
+        g.addEdges(calls)
+        for fva in nids:
+            g.setNodeProp(g.getNode(fva), 'rootnode', True)
+        return g
+
+    for fva in nids:
+        node = g.addNode(nid=fva, cbva=fva, repr='sub_%.8x' % fva)
+        g.setNodeProp(node, 'rootnode', True)
+    for fromva, tova in calls:
+        g.addEdgeByNids(fromva, tova)
+    return g
+
+
+def walkGraph(g, nids):
+    count = 0
+    for fva in nids:
+        for eid, n1, n2, eprops in g.getRefsFromByNid(fva):
+            count += 1
+        count += len(g.getRefsToByNid(fva))
+    return count
+
+
+def _graphChild(clsname, bulk, pipe):
+    nids, calls = getGraphSpec()
+    cls = getattr(v_graphcore, clsname)
+
+    base = statmRss()
+    start = time.time()
+    g = buildGraph(cls, nids, calls, bulk=bulk)
+    build = time.time() - start
+
+    start = time.time()
+    walkGraph(g, nids)
+    walk = time.time() - start
+
+    rss = statmRss()
+    if rss is not None and base is not None:
+        rss -= base
+
+    pipe.send({'build_sec': build, 'walk_sec': walk, 'rss_kb': rss})
+    pipe.close()
+
+
+def graphBench(clsname, bulk=False):
+    def bench():
+        parent, child = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=_graphChild, args=(clsname, bulk, child))
+        proc.start()
+        ret = parent.recv()
+        proc.join()
+        return ret
+    return bench
+
+
+benchmark('graph.callgraph.dict')(graphBench('HierGraph'))
+benchmark('graph.callgraph.dict_bulk')(graphBench('HierGraph', bulk=True))
+benchmark('graph.callgraph.compact')(graphBench('CompactHierGraph'))
+benchmark('graph.callgraph.compact_bulk')(graphBench('CompactHierGraph', bulk=True))
@@ -0,0 +1,163 @@
+'''
+Graph layout cost for function and call graphs.
+
+The dynadag "gen" benchmarks lay out generated function graphs (nested
+if/else, switch and loop constructs with random block sizes) and the
+"real" benchmarks lay out the largest function of a sample from
+vivtestfiles.  The force benchmarks lay out generated call graphs (and
+then incrementally add a function) with the numpy physics engine.
+'''
+import time
+import random
+
+import vivisect
+import vivisect.tools.graphutil as viv_graphutil
+import visgraph.graphcore as v_graphcore
+import visgraph.layouts.force as v_force
+import visgraph.layouts.dynadag as v_dynadag
+
+from vivisect.bench import benchmark, getTestPath, BenchSkip
+
+
+def genFunctionGraph(blocks, seed=0):
+    '''
+    Generate a HierGraph shaped like a function graph built with
+    buildFunctionGraph(revloop=True) with (about) the given number of
+    blocks.  Every node is given a random "size".
+    '''
+    rand = random.Random(seed)
+    g = v_graphcore.HierGraph()
+
+    nids = [0, 1]
+    edges = [(0, 1)]
+    revs = []
+    while len(nids) < blocks:
+        # replace a random edge with a construct
+        a, b = edges.pop(rand.randrange(len(edges)))
+        kind = rand.randrange(4)
+        if kind == 0:
+            # if
+            x = len(nids)
+            nids.append(x)
+            edges.extend([(a, x), (x, b), (a, b)])
+        elif kind == 1:
+            # if/else
+            x = len(nids)
+            y = x + 1
+            nids.extend([x, y])
+            edges.extend([(a, x), (a, y), (x, b), (y, b)])
+        elif kind == 2:
+            # loop (head, body) with the back edge reversed
+            h = len(nids)
+            x = h + 1
+            nids.extend([h, x])
+            edges.extend([(a, h), (h, x), (h, b)])
+            revs.append((h, x))
+        else:
+            # switch
+            cnt = rand.randrange(3, 8)
+            for i in range(cnt):
+                x = len(nids)
+                nids.append(x)
+                edges.extend([(a, x), (x, b)])
+
+    for nid in nids:
+        size = (rand.randrange(100, 400), rand.randrange(20, 200))
+        g.addNode(nid=nid, size=size)
+    g.setNodeProp(g.getNode(0), 'rootnode', True)
+
+    for n1, n2 in edges:
+        g.addEdgeByNids(n1, n2)
+    for n1, n2 in revs:
+        g.addEdgeByNids(n1, n2, reverse=True)
+
+    return g
+
+
+def timeLayout(g):
+    ret = {'nodes': g.getNodeCount()}
+
+    start = time.time()
+    lyt = v_dynadag.DynadagLayout(g)
+    lyt.layoutGraph()
+    ret['layout_sec'] = time.time() - start
+
+    crossings = getattr(lyt, 'getCrossingCount', None)
+    if crossings is not None:
+        ret['crossings'] = crossings()
+    return ret
+
+
+def genBench(blocks):
+    def bench():
+        return timeLayout(genFunctionGraph(blocks))
+    return bench
+
+
+def realBench(*path):
+    cache = []
+
+    def bench():
+        if not cache:
+            vw = vivisect.VivWorkspace()
+            vw.loadFromFile(getTestPath(*path))
+            vw.analyze()
+            fva = max(vw.getFunctions(), key=lambda fva: len(vw.getFunctionCfg(fva).blocks))
+            cache.append((vw, fva))
+
+        vw, fva = cache[0]
+        g = viv_graphutil.buildFunctionGraph(vw, fva, revloop=True)
+        for nid, nprops in g.getNodes():
+            # roughly what the function graph view renders for a block
+            g.setNodeProp((nid, nprops), 'size', (300, 14 * max(1, nprops.get('cbsize') / 4)))
+        return timeLayout(g)
+
+    return bench
+
+
+def genCallGraph(funcs, seed=0):
+    '''
+    Generate a Graph shaped like a call graph (a random call tree plus
+    20% extra calls) with the given number of functions.
+    '''
+    rand = random.Random(seed)
+    g = v_graphcore.Graph()
+    for i in range(funcs):
+        g.addNode(nid=i, size=(rand.randrange(60, 200), 20))
+    for i in range(1, funcs):
+        g.addEdgeByNids(rand.randrange(i), i)
+    for i in range(funcs // 5):
+        g.addEdgeByNids(rand.randrange(funcs), rand.randrange(funcs))
+    return g
+
+
+def forceBench(funcs):
+    def bench():
+        if v_force.numpy is None:
+            raise BenchSkip('numpy not installed')
+
+        g = genCallGraph(funcs)
+        lyt = v_force.ForceLayout(g)
+
+        start = time.time()
+        lyt.layoutGraph()
+        ret = {'nodes': funcs, 'layout_sec': time.time() - start}
+
+        g.addNode(nid=funcs, size=(100, 20))
+        g.addEdgeByNids(funcs // 2, funcs)
+
+        start = time.time()
+        lyt.relaxLayout([funcs])
+        ret['relax_sec'] = time.time() - start
+        return ret
+
+    return bench
+
+
+benchmark('layout.dynadag.gen100')(genBench(100))
+benchmark('layout.dynadag.gen1000')(genBench(1000))
+benchmark('layout.dynadag.gen5000')(genBench(5000))
+benchmark('layout.dynadag.real')(realBench('linux', 'amd64', 'ls'))
+
+benchmark('layout.force.gen200')(forceBench(200))
+benchmark('layout.force.gen2000')(forceBench(2000))
@@ -0,0 +1,69 @@
+'''
+RegisterContext access micro-benchmarks.
+
+For each architecture's register context:  get/set of the real
+registers, get/set of the meta registers (eax -> al etc) and register
+snapshot/restore pairs (as used by the emulator snapshots).
+'''
+import time
+
+import envi
+
+from vivisect.bench import benchmark
+
+archnames = ('amd64', 'arm', 'h8', 'i386', 'msp430')
+
+# accesses per timed loop
+access_count = 200000
+snap_count = 50000
+
+
+def timeLoop(func, idxs, count, best=3):
+    # best of a few runs (these are short enough to be noisy)
+    reps = count / len(idxs)
+    ret = 0
+    for b in xrange(best):
+        start = time.time()
+        for i in xrange(reps):
+            for idx in idxs:
+                func(idx)
+        ret = max(ret, (reps * len(idxs)) / (time.time() - start))
+    return ret
+
+
+def regctxBench(archname):
+    def bench():
+        ctx = envi.getArchModule(archname).archGetRegCtx()
+
+        reals = []
+        metas = []
+        for name, idx in sorted(ctx._rctx_names.items()):
+            if ctx.isMetaRegister(idx):
+                metas.append(idx)
+            else:
+                reals.append(idx)
+
+        ret = {}
+        ret['get_per_sec'] = timeLoop(ctx.getRegister, reals, access_count)
+        ret['set_per_sec'] = timeLoop(lambda idx: ctx.setRegister(idx, 0x41), reals, access_count)
+        if metas:
+            ret['meta_get_per_sec'] = timeLoop(ctx.getRegister, metas, access_count)
+            ret['meta_set_per_sec'] = timeLoop(lambda idx: ctx.setRegister(idx, 1), metas, access_count)
+
+        # a snapshot, a register write and a restore (like a branch in
+        # the workspace emulator)
+        pcidx = ctx._rctx_pcindex
+
+        def snap(i):
+            s = ctx.getRegisterSnap()
+            ctx.setRegister(pcidx, i)
+            ctx.setRegisterSnap(s)
+
+        ret['snap_per_sec'] = timeLoop(snap, range(100), snap_count)
+        return ret
+
+    return bench
+
+
+for archname in archnames:
+    benchmark('regctx.%s' % archname)(regctxBench(archname))
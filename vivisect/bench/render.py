@@ -0,0 +1,84 @@
+'''
+Listing render cost for the workspace renderer.
+
+The benchmarks build an in-memory amd64 workspace of generated functions
+and render it with a StringMemoryCanvas:  a full render of the segment
+(with and without the render cache), a windowed render of a screenful of
+locations from the middle of the segment (renderMemoryWindow()) and a
+re-render after commenting one location (which only re-renders that one
+location when cached).
+'''
+import time
+import binascii
+
+import envi.memory as e_mem
+import envi.memcanvas as e_memcanvas
+
+import vivisect
+import vivisect.renderers as viv_rend
+
+from vivisect.bench import benchmark
+
+# xor eax,eax; test edi,edi; jz +3; inc eax; nop; dec edi; jnz -11; ret
+func_bytes = binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3')
+func_size = 0x10
+
+# A "screenful" of locations for the windowed render
+window_count = 60
+window_margin = 30
+
+
+def genWorkspace(funcs):
+    baseva = 0x400000
+    mbytes = ''.join(func_bytes.ljust(func_size, '\x90') for i in xrange(funcs))
+
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture', 'amd64')
+    vw.setMeta('Platform', 'linux')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'bench', mbytes)
+    vw.addSegment(baseva, len(mbytes), '.text', 'bench')
+    for i in xrange(funcs):
+        vw.makeFunction(baseva + (i * func_size))
+    return vw, baseva, len(mbytes)
+
+
+def timeRender(vw, rend, va, size):
+    canv = e_memcanvas.StringMemoryCanvas(vw)
+    start = time.time()
+    canv.renderMemory(va, size, rend)
+    return time.time() - start
+
+
+def renderBench(funcs):
+    cache = []
+
+    def bench():
+        if not cache:
+            cache.append(genWorkspace(funcs))
+
+        vw, va, size = cache[0]
+        ret = {'locations': len(vw.getLocations())}
+
+        plain = viv_rend.WorkspaceRenderer(vw, cache=False)
+        ret['full_sec'] = timeRender(vw, plain, va, size)
+
+        rend = viv_rend.WorkspaceRenderer(vw)
+        timeRender(vw, rend, va, size)
+        ret['full_cached_sec'] = timeRender(vw, rend, va, size)
+
+        vw.setComment(va + (size / 2), 'bench')
+        ret['update_cached_sec'] = timeRender(vw, rend, va, size)
+        vw.setComment(va + (size / 2), None)
+
+        canv = e_memcanvas.StringMemoryCanvas(vw)
+        start = time.time()
+        canv.renderMemoryWindow(va + (size / 2), window_count, margin=window_margin, rend=plain)
+        ret['window_sec'] = time.time() - start
+
+        return ret
+
+    return bench
+
+
+benchmark('render.workspace.funcs1000')(renderBench(1000))
+benchmark('render.workspace.funcs5000')(renderBench(5000))
@@ -0,0 +1,188 @@
+'''
+vtrace memory access cost against a local gdbserver stand-in.
+
+A thread serves the memory of an emulator over a socket with gdb remote
+protocol "m"/"M" packets and a TraceEmulator uses the gdbstub client code
+to read and write it, so every platform read/write is a packet round
+trip (as for a gdbstub target).  The benchmarks time a stalker-like
+workload:  activating/clearing a few thousand block breakpoints (one by
+one and batched) and disassembling through the trace (with and without
+the CacheMemory mode).
+'''
+import time
+import socket
+import binascii
+import threading
+
+import envi.memory as e_mem
+
+import vivisect
+import vtrace
+import vtrace.envitools as v_envitools
+import vtrace.platforms.gdbstub as v_gdbstub
+
+from vivisect.bench import benchmark
+
+# xor eax,eax; test edi,edi; jz +3; inc eax; nop; dec edi; jnz -11; ret
+code_bytes = binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3')
+code_pages = 16
+# the basic blocks of the code above
+block_offs = (0, 6, 9, 13)
+
+# The stand-in answers each packet after this many seconds (roughly a
+# local gdbserver stopping to ptrace the target)
+stub_delay = 0.0001
+
+bp_count = 2000
+bp_cycles = 5
+disasm_count = 4000
+
+
+class GdbStandIn(threading.Thread):
+    '''
+    A minimal gdbserver stand-in which serves the memory of an emulator
+    ("m" and "M" packets) on the given socket.
+    '''
+    def __init__(self, emu, sock):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.emu = emu
+        self.sock = sock
+
+    def _recvUntil(self, c):
+        ret = ''
+        while not ret.endswith(c):
+            x = self.sock.recv(1)
+            if not x:
+                return None
+            ret += x
+        return ret
+
+    def handle(self, cmd):
+        time.sleep(stub_delay)
+        try:
+            if cmd.startswith('m'):
+                va, size = [int(x, 16) for x in cmd[1:].split(',')]
+                return binascii.hexlify(self.emu.readMemory(va, size))
+
+            if cmd.startswith('M'):
+                args, hexbytes = cmd[1:].split(':')
+                va = int(args.split(',')[0], 16)
+                self.emu.writeMemory(va, binascii.unhexlify(hexbytes))
+                return 'OK'
+
+        except Exception:
+            return 'E01'
+
+        return ''
+
+    def run(self):
+        while True:
+            if self._recvUntil('$') is None:
+                return
+            cmd = self._recvUntil('#')
+            if cmd is None or len(self.sock.recv(2)) != 2:
+                return
+            self.sock.sendall('+')
+            self.sock.sendall(v_gdbstub.pkt(self.handle(cmd[:-1])))
+
+
+def _gdbmeth(name):
+    return v_gdbstub.GdbStubMixin.__dict__[name]
+
+
+class GdbStandInTrace(v_envitools.TraceEmulator):
+    '''
+    A TraceEmulator which reads and writes memory through the gdbstub
+    client code (and a GdbStandIn serving the emulator's memory).
+    '''
+    def __init__(self, emu):
+        v_envitools.TraceEmulator.__init__(self, emu)
+        self._gdb_tx_lock = threading.Lock()
+        self._gdb_rx_lock = threading.Lock()
+        self._gdb_tns_lock = threading.Lock()
+
+        self._gdb_sock, ssock = socket.socketpair()
+        self._gdb_server = GdbStandIn(emu, ssock)
+        self._gdb_server.start()
+        self.packets = 0
+
+    def _cmdTransact(self, cmd):
+        self.packets += 1
+        return _gdbmeth('_cmdTransact')(self, cmd)
+
+    _recvUntil = _gdbmeth('_recvUntil')
+    _recvPkt = _gdbmeth('_recvPkt')
+    _sendPkt = _gdbmeth('_sendPkt')
+    _raiseIfError = _gdbmeth('_raiseIfError')
+    _runLengthDecode = _gdbmeth('_runLengthDecode')
+
+    platformReadMemory = _gdbmeth('platformReadMemory')
+    platformWriteMemory = _gdbmeth('platformWriteMemory')
+
+    def close(self):
+        self.release()
+        self._gdb_sock.close()
+
+
+def getStandInTrace():
+    baseva = 0x400000
+    mbytes = code_bytes * ((code_pages * 4096) / len(code_bytes))
+
+    vw = vivisect.VivWorkspace()
+    vw.setMeta('Architecture', 'amd64')
+    vw.setMeta('Platform', 'linux')
+    vw.addMemoryMap(baseva, e_mem.MM_RWX, 'bench', mbytes)
+
+    trace = GdbStandInTrace(vw.getEmulator())
+
+    # stalker style breakpoints on every basic block
+    blocks = [baseva + (i * len(code_bytes)) + off
+              for i in xrange(len(mbytes) / len(code_bytes))
+              for off in block_offs]
+    for va in blocks[:bp_count]:
+        trace.addBreakpoint(vtrace.Breakpoint(va))
+
+    return trace, baseva
+
+
+def timeBreaks(trace, batched):
+    bps = trace.getBreakpoints()
+    trace.packets = 0
+    start = time.time()
+    for i in xrange(bp_cycles):
+        if batched:
+            trace._activBreakpoints()
+            trace._clearBreakpoints()
+        else:
+            for bp in bps:
+                bp.activate(trace)
+            for bp in bps:
+                bp.deactivate(trace)
+    return time.time() - start, trace.packets
+
+
+def timeDisasm(trace, va, cached):
+    trace.setMode('CacheMemory', cached)
+    trace.memcache = None
+    trace.packets = 0
+    start = time.time()
+    for i in xrange(disasm_count):
+        va += trace.parseOpcode(va).size
+    return time.time() - start, trace.packets
+
+
+def standInBench():
+    trace, baseva = getStandInTrace()
+    try:
+        ret = {}
+        ret['bp_sec'], ret['bp_packets'] = timeBreaks(trace, False)
+        ret['bp_batched_sec'], ret['bp_batched_packets'] = timeBreaks(trace, True)
+        ret['disasm_sec'], ret['disasm_packets'] = timeDisasm(trace, baseva, False)
+        ret['disasm_cached_sec'], ret['disasm_cached_packets'] = timeDisasm(trace, baseva, True)
+        return ret
+    finally:
+        trace.close()
+
+
+benchmark('trace.gdbstub.stalker')(standInBench)
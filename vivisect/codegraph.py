@@ -1,17 +1,24 @@
 '''
 Various codeflow oriented graph constructs.
 '''
+import logging
+
 import envi
 import visgraph.graphcore as v_graphcore
 
 from vivisect.const import *
 
-class CallGraph(v_graphcore.HierGraph):
+logger = logging.getLogger(__name__)
+
+class CallGraph(v_graphcore.CompactHierGraph):
     '''
     A graph which represents procedural branches.
+
+    (Uses the compact graph storage because it has a node for every
+    function in the workspace.)
     '''
     def __init__(self):
-        v_graphcore.Graph.__init__(self)
+        v_graphcore.CompactHierGraph.__init__(self)
 
     def getFunctionNode(self, va):
         node = self.getNode(va)
@@ -209,3 +216,196 @@ class FuncBlockGraph(CodeBlockGraph):
     def _getCodeBranches(self, va):
         return [ x for x in CodeBlockGraph._getCodeBranches(self,va) if not x[1] & envi.BR_PROC ]
 
+
+class FunctionCfg:
+    '''
+    A compact control flow graph for a function (see buildFunctionCfg).
+
+    Blocks are numbered in discovery order (block 0 is the function entry)
+    and held in parallel tuples of block vas and sizes.  The edges are kept
+    (in discovery order) as a tuple of (fromidx, toidx) pairs with a
+    parallel tuple of "loop" flags (the edge targets one of the blocks on
+    the discovery path to its source) along with CSR style successor and
+    predecessor indexes:  the successors of block i are
+    succ[succoff[i]:succoff[i+1]] (and likewise for pred/predoff).
+
+    Instances are cached by the workspace (see VivWorkspace.getFunctionCfg)
+    and must be treated as read-only.
+    '''
+    def __init__(self, fva, blocks, sizes, edges, loops, deps=()):
+        self.fva = fva
+        self.blocks = tuple(blocks)
+        self.sizes = tuple(sizes)
+        self.edges = tuple(edges)
+        self.loops = tuple(loops)
+        # Every va whose code block, location or xrefs the graph depends on
+        self.deps = frozenset(deps)
+
+        self.blockidx = dict((cbva, i) for i, cbva in enumerate(self.blocks))
+
+        self.succoff, self.succ = self._buildIndex(0, 1)
+        self.predoff, self.pred = self._buildIndex(1, 0)
+
+    def _buildIndex(self, keyidx, validx):
+        counts = [0 for i in range(len(self.blocks) + 1)]
+        for edge in self.edges:
+            counts[edge[keyidx] + 1] += 1
+
+        for i in range(len(self.blocks)):
+            counts[i + 1] += counts[i]
+
+        offs = tuple(counts)
+        vals = [0 for i in range(len(self.edges))]
+        for edge in self.edges:
+            i = edge[keyidx]
+            vals[counts[i]] = edge[validx]
+            counts[i] += 1
+
+        return offs, tuple(vals)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def getBlocks(self):
+        '''
+        Return a list of (cbva, cbsize) tuples in discovery order.
+        '''
+        return zip(self.blocks, self.sizes)
+
+    def getEdges(self):
+        '''
+        Return a list of (fromva, tova, isloop) tuples in discovery order.
+        '''
+        blocks = self.blocks
+        return [(blocks[f], blocks[t], loop) for (f, t), loop in zip(self.edges, self.loops)]
+
+    def getLeaves(self):
+        '''
+        Return the list of block vas with no successors.
+        '''
+        succoff = self.succoff
+        return [cbva for i, cbva in enumerate(self.blocks) if succoff[i] == succoff[i+1]]
+
+    def getSuccessors(self, cbva):
+        i = self.blockidx[cbva]
+        return [self.blocks[s] for s in self.succ[self.succoff[i]:self.succoff[i+1]]]
+
+    def getPredecessors(self, cbva):
+        i = self.blockidx[cbva]
+        return [self.blocks[p] for p in self.pred[self.predoff[i]:self.predoff[i+1]]]
+
+
+def buildFunctionCfg(vw, fva):
+    '''
+    Walk the code blocks, locations and xrefs of the given function and
+    return a FunctionCfg for it.  The graph does not cross function
+    boundaries (procedural or deref branches are skipped).
+    '''
+    fcb = vw.getCodeBlock(fva)
+    if fcb is None:
+        t = (fva, vw.isFunction(fva))
+        raise Exception('Invalid initial code block for 0x%.8x isfunc: %s' % t)
+
+    fcbva, fcbsize, fcbfunc = fcb
+
+    blocks = [fva]
+    sizes = [fcbsize]
+    parents = [-1]
+    blockidx = {fva: 0}
+    edges = []
+    loops = []
+    deps = set([fva, fcbva])
+
+    def addBlock(cbva, cbsize, parent):
+        blockidx[cbva] = len(blocks)
+        blocks.append(cbva)
+        sizes.append(cbsize)
+        parents.append(parent)
+        return blockidx[cbva]
+
+    def onPath(tidx, idx):
+        # Is block tidx on the discovery path to (or is) block idx?
+        while idx != -1:
+            if idx == tidx:
+                return True
+            idx = parents[idx]
+        return False
+
+    def addEdge(idx, tidx):
+        edges.append((idx, tidx))
+        loops.append(onPath(tidx, idx))
+
+    todo = [(fcbva, fcbsize)]
+    while todo:
+
+        cbva, cbsize = todo.pop()
+
+        idx = blockidx.get(cbva)
+        if idx is None:
+            idx = addBlock(cbva, cbsize, -1)
+
+        # Grab the location for the last instruction in the block
+        nextva = cbva + cbsize - 1
+        loc = vw.getLocation(nextva)
+        if loc is None:
+            raise Exception("buildFunctionCfg: Attempt to get location at 0x%x" % nextva)
+
+        lva, lsize, ltype, linfo = loc
+        deps.add(cbva)
+        deps.add(nextva)
+        deps.add(lva)
+
+        for xrfrom, xrto, xrtype, xrflags in vw.getXrefsFrom(lva, REF_CODE):
+
+            # For now, the graph doesn't cross function boundaries
+            # or indirects.
+            if xrflags & (envi.BR_PROC | envi.BR_DEREF):
+                continue
+
+            tidx = blockidx.get(xrto)
+            if tidx is None:
+                deps.add(xrto)
+                cblock = vw.getCodeBlock(xrto)
+                if cblock is None:
+                    logger.warning('CB is None in graph building?!?! (0x%x)', xrto)
+                    logger.warning('(fva: 0x%.8x cbva: 0x%.8x)', fva, xrto)
+                    continue
+
+                tova, tosize, tofunc = cblock
+                if tova != xrto:
+                    logger.warning('CBVA != XREFTO in graph building!?')
+                    logger.warning('(cbva: 0x%.8x xrto: 0x%.8x)', tova, xrto)
+                    continue
+
+                # Since we haven't seen this block, lets add it to todo
+                tidx = addBlock(tova, tosize, idx)
+                todo.append((tova, tosize))
+
+            addEdge(idx, tidx)
+
+        if ltype == LOC_OP and linfo & envi.IF_NOFALL:
+            continue
+
+        # If this codeblock can fall through into another, add it to
+        # todo!
+        fallva = lva + lsize
+        tidx = blockidx.get(fallva)
+        if tidx is None:
+            deps.add(fallva)
+            fallblock = vw.getCodeBlock(fallva)
+            if fallblock is None:
+                logger.warning('FB is None in graph building!??!')
+                logger.warning('(fva: 0x%.8x  fallva: 0x%.8x', fva, fallva)
+            elif fallva != fallblock[0]:
+                logger.warning('FALLVA != CBVA in graph building!??!')
+                logger.warning('(fallva: 0x%.8x CBVA: 0x%.8x', fallva, fallblock[0])
+            else:
+                fbva, fbsize, fbfunc = fallblock
+                tidx = addBlock(fbva, fbsize, idx)
+                todo.append((fbva, fbsize))
+
+        # If we ended up with a destination block, make the edge
+        if tidx is not None:
+            addEdge(idx, tidx)
+
+    return FunctionCfg(fva, blocks, sizes, edges, loops, deps=deps)
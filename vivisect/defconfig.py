@@ -12,6 +12,7 @@ defconfig = {
                 'nx':False,
             },
             'elf':{
+                'demangle_workers':0,
             },
             'blob':{
                 'arch':'',
@@ -27,10 +28,15 @@ defconfig = {
             },
         },
         'analysis':{
+            'workers':1,
             'pointertables':{
                 'table_min_len':4,
             },
         },
+        'emulation':{
+            'trace_spill_rows':0,
+            'trace_spill_dir':'',
+        },
     },
     'cli':vdb.defconfig.get('cli'), # FIXME make our own...
     'vdb':vdb.defconfig.get('vdb'),
@@ -52,6 +58,7 @@ docconfig = {
                 'nx':'Should we truly treat sections that dont execute as non executable?'
             },
             'elf':{
+                'demangle_workers':'How many worker processes to demangle symbol names with while loading (0 to demangle in process)',
             },
             'blob':{
                 'arch':'What architecture is the blob?',
@@ -67,11 +74,17 @@ docconfig = {
         },
 
         'analysis':{
+            'workers':'How many independent extended analysis modules may run at once',
             'pointertables':{
                 'table_min_len':'How many pointers must be in a row to make a table?',
             },
         },
 
+        'emulation':{
+            'trace_spill_rows':'How many logread/logwrite trace rows an emulator keeps in memory before spilling them to a temp file (0 to keep them all in memory)',
+            'trace_spill_dir':'Directory for the emulation trace spill files (empty for the system temp dir)',
+        },
+
     },
 
     'vdb':vdb.docconfig.get('vdb'),
@@ -0,0 +1,139 @@
+'''
+C++ symbol demangling for the file parsers.
+
+The same mangled names show up over and over while loading (symbols, dynamic
+symbols, relocations, PLT entries and again in the other files of a multi
+file workspace), so demangled names are cached.  Loaders which know all
+their names up front may demangle them in bulk with demangleMany() (which
+can farm the work out to worker processes) and then use demangle() as a
+cache lookup.
+
+The cxxfilt module is used when it is available, otherwise the pure python
+Itanium demangler in vivisect.demangle.itanium is used.
+'''
+import logging
+import multiprocessing
+
+from vivisect.demangle import itanium
+
+logger = logging.getLogger(__name__)
+
+try:
+    import cxxfilt
+except Exception:
+    # (not installed, or a version which does not import here)
+    cxxfilt = None
+
+# bounded like the other name caches (cleared when it fills)
+DEMANGLE_CACHE_MAX = 0x10000
+
+# below this many names (per worker) a pool isn't worth starting
+WORKER_MIN_NAMES = 256
+
+def demangleName(name):
+    '''
+    Demangle a single name without any caching.  Names which are not
+    mangled (or fail to demangle) are returned as is.
+    '''
+    if not name.startswith('_Z'):
+        return name
+
+    try:
+        if cxxfilt is not None:
+            return cxxfilt.demangle(name)
+        return itanium.demangle(name)
+    except Exception as e:
+        logger.debug('failed to demangle name (%r): %r', name, e)
+        return name
+
+class Demangler:
+    '''
+    A caching demangler.
+
+    Example:
+        dmgl = Demangler()
+        dmgl.demangleMany(names, workers=4)
+        print(dmgl.demangle(names[0]))
+    '''
+    def __init__(self, maxcache=DEMANGLE_CACHE_MAX):
+        self.maxcache = maxcache
+        self.cache = {}
+
+    def demangle(self, name):
+        '''
+        Return the demangled form of the given name (or the name itself if
+        it is not a mangled name).
+        '''
+        ret = self.cache.get(name)
+        if ret is None:
+            ret = demangleName(name)
+            self._cacheName(name, ret)
+        return ret
+
+    def demangleMany(self, names, workers=0):
+        '''
+        Demangle a list of names, returning a dict of name: demangled name.
+
+        Each distinct name is only demangled once (and is added to the
+        cache).  If workers is non-zero and there are enough names which
+        are not already cached, a pool of that many processes is used.
+        '''
+        ret = {}
+        todo = []
+        for name in names:
+            if name in ret:
+                continue
+
+            dname = self.cache.get(name)
+            if dname is not None:
+                ret[name] = dname
+                continue
+
+            if not name.startswith('_Z'):
+                ret[name] = name
+                continue
+
+            ret[name] = None
+            todo.append(name)
+
+        if workers and len(todo) >= workers * WORKER_MIN_NAMES:
+            dnames = self._demanglePool(todo, workers)
+        else:
+            dnames = [demangleName(name) for name in todo]
+
+        for name, dname in zip(todo, dnames):
+            ret[name] = dname
+            self._cacheName(name, dname)
+
+        return ret
+
+    def _demanglePool(self, names, workers):
+        try:
+            pool = multiprocessing.Pool(workers)
+        except Exception as e:
+            logger.warning('demangle worker pool failed (%s), demangling in process', e)
+            return [demangleName(name) for name in names]
+
+        try:
+            chunk = max(1, len(names) // (workers * 4))
+            return pool.map(demangleName, names, chunk)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _cacheName(self, name, dname):
+        if len(self.cache) >= self.maxcache:
+            self.cache.clear()
+        self.cache[name] = dname
+
+    def clearCache(self):
+        self.cache.clear()
+
+# the process wide demangler (shared by all the files in a workspace)
+demangler = Demangler()
+
+def demangle(name):
+    return demangler.demangle(name)
+
+def demangleMany(names, workers=0):
+    return demangler.demangleMany(names, workers=workers)
@@ -0,0 +1,2173 @@
+'''
+A pure python demangler for Itanium C++ ABI mangled names (the g++/clang
+"_Z" scheme used on ELF and Mach-O targets).
+
+This follows the libiberty (cp-demangle.c) parser and printer closely so
+that the output matches __cxa_demangle / c++filt for the names we actually
+encounter in binaries.  It is used when the cxxfilt module is unavailable.
+'''
+import sys
+
+if sys.version_info[0] >= 3:
+    xrange = range
+
+class DemangleError(Exception):
+    pass
+
+# builtin type print classes (for literals)
+PRINT_DEFAULT = 0
+PRINT_INT = 1
+PRINT_UNSIGNED = 2
+PRINT_LONG = 3
+PRINT_UNSIGNED_LONG = 4
+PRINT_LONG_LONG = 5
+PRINT_UNSIGNED_LONG_LONG = 6
+PRINT_BOOL = 7
+PRINT_FLOAT = 8
+PRINT_VOID = 9
+
+builtin_types = {
+    'a': ('signed char', PRINT_DEFAULT),
+    'b': ('bool', PRINT_BOOL),
+    'c': ('char', PRINT_DEFAULT),
+    'd': ('double', PRINT_FLOAT),
+    'e': ('long double', PRINT_FLOAT),
+    'f': ('float', PRINT_FLOAT),
+    'g': ('__float128', PRINT_FLOAT),
+    'h': ('unsigned char', PRINT_DEFAULT),
+    'i': ('int', PRINT_INT),
+    'j': ('unsigned int', PRINT_UNSIGNED),
+    'l': ('long', PRINT_LONG),
+    'm': ('unsigned long', PRINT_UNSIGNED_LONG),
+    'n': ('__int128', PRINT_DEFAULT),
+    'o': ('unsigned __int128', PRINT_DEFAULT),
+    's': ('short', PRINT_DEFAULT),
+    't': ('unsigned short', PRINT_DEFAULT),
+    'v': ('void', PRINT_VOID),
+    'w': ('wchar_t', PRINT_DEFAULT),
+    'x': ('long long', PRINT_LONG_LONG),
+    'y': ('unsigned long long', PRINT_UNSIGNED_LONG_LONG),
+    'z': ('...', PRINT_DEFAULT),
+}
+
+# D<x> builtin types
+dbuiltin_types = {
+    'f': ('decimal32', PRINT_DEFAULT),
+    'd': ('decimal64', PRINT_DEFAULT),
+    'e': ('decimal128', PRINT_DEFAULT),
+    'h': ('half', PRINT_FLOAT),
+    'u': ('char8_t', PRINT_DEFAULT),
+    's': ('char16_t', PRINT_DEFAULT),
+    'i': ('char32_t', PRINT_DEFAULT),
+    'n': ('decltype(nullptr)', PRINT_DEFAULT),
+}
+
+# code: (name, arg count)
+operators = {
+    'aN': ('&=', 2), 'aS': ('=', 2), 'aa': ('&&', 2), 'ad': ('&', 1),
+    'an': ('&', 2), 'at': ('alignof ', 1), 'aw': ('co_await ', 1),
+    'az': ('alignof ', 1), 'cc': ('const_cast', 2), 'cl': ('()', 2),
+    'cm': (',', 2), 'co': ('~', 1), 'dV': ('/=', 2), 'dX': ('[...]=', 3),
+    'da': ('delete[] ', 1), 'dc': ('dynamic_cast', 2), 'de': ('*', 1),
+    'di': ('=', 2), 'dl': ('delete ', 1), 'ds': ('.*', 2), 'dt': ('.', 2),
+    'dv': ('/', 2), 'dx': (']=', 2), 'eO': ('^=', 2), 'eo': ('^', 2),
+    'eq': ('==', 2), 'fL': ('...', 3), 'fR': ('...', 3), 'fl': ('...', 2),
+    'fr': ('...', 2), 'ge': ('>=', 2), 'gs': ('::', 1), 'gt': ('>', 2),
+    'ix': ('[]', 2), 'lS': ('<<=', 2), 'le': ('<=', 2),
+    'li': ('operator"" ', 1), 'ls': ('<<', 2), 'lt': ('<', 2),
+    'mI': ('-=', 2), 'mL': ('*=', 2), 'mi': ('-', 2), 'ml': ('*', 2),
+    'mm': ('--', 1), 'na': ('new[]', 3), 'ne': ('!=', 2), 'ng': ('-', 1),
+    'nt': ('!', 1), 'nw': ('new', 3), 'oR': ('|=', 2), 'oo': ('||', 2),
+    'or': ('|', 2), 'pL': ('+=', 2), 'pl': ('+', 2), 'pm': ('->*', 2),
+    'pp': ('++', 1), 'ps': ('+', 1), 'pt': ('->', 2), 'qu': ('?', 3),
+    'rM': ('%=', 2), 'rS': ('>>=', 2), 'rc': ('reinterpret_cast', 2),
+    'rm': ('%', 2), 'rs': ('>>', 2), 'sP': ('sizeof...', 1),
+    'sZ': ('sizeof...', 1), 'sc': ('static_cast', 2), 'ss': ('<=>', 2),
+    'st': ('sizeof ', 1), 'sz': ('sizeof ', 1), 'tr': ('throw', 0),
+    'tw': ('throw ', 1),
+}
+
+# code: (simple expansion, full expansion, ctor/dtor name)
+standard_subs = {
+    't': ('std', 'std', None),
+    'a': ('std::allocator', 'std::allocator', 'allocator'),
+    'b': ('std::basic_string', 'std::basic_string', 'basic_string'),
+    's': ('std::string',
+          'std::basic_string<char, std::char_traits<char>, std::allocator<char> >',
+          'basic_string'),
+    'i': ('std::istream', 'std::basic_istream<char, std::char_traits<char> >',
+          'basic_istream'),
+    'o': ('std::ostream', 'std::basic_ostream<char, std::char_traits<char> >',
+          'basic_ostream'),
+    'd': ('std::iostream', 'std::basic_iostream<char, std::char_traits<char> >',
+          'basic_iostream'),
+}
+
+# special names: T<x> / G<x> prefixes
+special_prefixes = {
+    'VTABLE': 'vtable for ',
+    'VTT': 'VTT for ',
+    'TYPEINFO': 'typeinfo for ',
+    'TYPEINFO_NAME': 'typeinfo name for ',
+    'TYPEINFO_FN': 'typeinfo fn for ',
+    'THUNK': 'non-virtual thunk to ',
+    'VIRTUAL_THUNK': 'virtual thunk to ',
+    'COVARIANT_THUNK': 'covariant return thunk to ',
+    'JAVA_CLASS': 'java Class for ',
+    'GUARD': 'guard variable for ',
+    'TLS_INIT': 'TLS init function for ',
+    'TLS_WRAPPER': 'TLS wrapper function for ',
+    'HIDDEN_ALIAS': 'hidden alias for ',
+    'TRANSACTION_CLONE': 'transaction clone for ',
+    'NONTRANSACTION_CLONE': 'non-transaction clone for ',
+    'TPARM_OBJ': 'template parameter object for ',
+    'GLOBAL_CONSTRUCTORS': 'global constructors keyed to ',
+    'GLOBAL_DESTRUCTORS': 'global destructors keyed to ',
+}
+
+# qualifiers which apply to "this" (member functions)
+fnquals = frozenset(('RESTRICT_THIS', 'VOLATILE_THIS', 'CONST_THIS',
+                     'REFERENCE_THIS', 'RVALUE_REFERENCE_THIS',
+                     'TRANSACTION_SAFE', 'NOEXCEPT', 'THROW_SPEC'))
+
+cvquals = frozenset(('RESTRICT', 'VOLATILE', 'CONST'))
+
+def isdigit(c):
+    return '0' <= c <= '9'
+
+def islower(c):
+    return 'a' <= c <= 'z'
+
+def isupper(c):
+    return 'A' <= c <= 'Z'
+
+class Comp(object):
+    '''
+    A node in the demangled name tree.  The meaning of left/right (and of
+    the extra value) depends on the kind (see the libiberty components).
+    '''
+    __slots__ = ('kind', 'left', 'right', 'val', 'printing')
+
+    def __init__(self, kind, left=None, right=None, val=None):
+        self.kind = kind
+        self.left = left
+        self.right = right
+        self.val = val
+        self.printing = 0
+
+    def __repr__(self):
+        return 'Comp(%s, %r, %r, %r)' % (self.kind, self.left, self.right, self.val)
+
+def name(s):
+    return Comp('NAME', val=s)
+
+class Parser(object):
+
+    def __init__(self, mangled, unresolved=1):
+        self.s = mangled + '\0'
+        self.end = len(mangled)
+        self.n = 0
+        self.subs = []
+        self.last_name = None
+        self.is_expression = False
+        self.is_conversion = False
+        self.unresolved = unresolved
+
+    def fail(self):
+        raise DemangleError('invalid mangled name: %r (at %d)' % (self.s[:-1], self.n))
+
+    def peek(self):
+        return self.s[self.n]
+
+    def peeknext(self):
+        if self.n >= self.end:
+            return '\0'
+        return self.s[self.n + 1]
+
+    def next(self):
+        c = self.s[self.n]
+        if c == '\0':
+            self.fail()
+        self.n += 1
+        return c
+
+    def check(self, c):
+        if self.s[self.n] != c:
+            return False
+        self.n += 1
+        return True
+
+    def expect(self, c):
+        if self.s[self.n] != c:
+            self.fail()
+        self.n += 1
+
+    def addSub(self, dc):
+        self.subs.append(dc)
+
+    def mangledName(self, toplevel):
+        '''
+        <mangled-name> ::= _Z <encoding> [<clone-suffix>]*
+        '''
+        if not self.check('_') and toplevel:
+            self.fail()
+        self.expect('Z')
+        dc = self.encoding(toplevel)
+        if toplevel:
+            while self.peek() == '.':
+                c = self.peeknext()
+                if not (islower(c) or c == '_' or isdigit(c)):
+                    break
+                dc = self.cloneSuffix(dc)
+        return dc
+
+    def cloneSuffix(self, encoding):
+        s = self.s
+        start = pend = self.n
+        c = s[pend + 1]
+        if s[pend] == '.' and (islower(c) or isdigit(c) or c == '_'):
+            pend += 2
+            while islower(s[pend]) or isdigit(s[pend]) or s[pend] == '_':
+                pend += 1
+        while s[pend] == '.' and isdigit(s[pend + 1]):
+            pend += 2
+            while isdigit(s[pend]):
+                pend += 1
+        self.n = pend
+        return Comp('CLONE', encoding, name(s[start:pend]))
+
+    def encoding(self, toplevel):
+        peek = self.peek()
+        if peek in 'GT':
+            return self.specialName()
+
+        dc = self.name()
+        peek = self.peek()
+        if peek != '\0' and peek != 'E':
+            ftype = self.bareFunctionType(hasReturnType(dc))
+            # drop the return type of a nested local function
+            if not toplevel and dc.kind == 'LOCAL_NAME' and ftype.kind == 'FUNCTION_TYPE':
+                ftype.left = None
+            dc = Comp('TYPED_NAME', dc, ftype)
+        return dc
+
+    def name(self):
+        peek = self.peek()
+        if peek == 'N':
+            return self.nestedName()
+
+        if peek == 'Z':
+            return self.localName()
+
+        if peek == 'U':
+            return self.unqualifiedName()
+
+        if peek == 'S':
+            if self.peeknext() != 't':
+                dc = self.substitution(False)
+                subst = True
+            else:
+                self.n += 2
+                dc = Comp('QUAL_NAME', name('std'), self.unqualifiedName())
+                subst = False
+
+            if self.peek() == 'I':
+                # <unscoped-template-name> is a substitution candidate
+                # unless it came from one
+                if not subst:
+                    self.addSub(dc)
+                dc = Comp('TEMPLATE', dc, self.templateArgs())
+            return dc
+
+        dc = self.unqualifiedName()
+        if self.peek() == 'I':
+            self.addSub(dc)
+            dc = Comp('TEMPLATE', dc, self.templateArgs())
+        return dc
+
+    def nestedName(self):
+        self.expect('N')
+        quals = self.cvQualifiers(True)
+        rqual = self.refQualifier(None)
+        dc = chain(quals, self.prefix())
+        if rqual is not None:
+            rqual.left = dc
+            dc = rqual
+        self.expect('E')
+        return dc
+
+    def prefix(self):
+        ret = None
+        while True:
+            peek = self.peek()
+            if peek == '\0':
+                self.fail()
+
+            kind = 'QUAL_NAME'
+            if peek == 'D':
+                if self.peeknext() in 'Tt':
+                    dc = self.type()
+                else:
+                    dc = self.unqualifiedName()
+
+            elif isdigit(peek) or islower(peek) or peek in 'CUL':
+                dc = self.unqualifiedName()
+
+            elif peek == 'S':
+                dc = self.substitution(True)
+
+            elif peek == 'I':
+                if ret is None:
+                    self.fail()
+                kind = 'TEMPLATE'
+                dc = self.templateArgs()
+
+            elif peek == 'T':
+                dc = self.templateParam()
+
+            elif peek == 'E':
+                return ret
+
+            elif peek == 'M':
+                # initializer scope for a lambda
+                if ret is None:
+                    self.fail()
+                self.n += 1
+                continue
+
+            else:
+                self.fail()
+
+            if ret is None:
+                ret = dc
+            else:
+                ret = Comp(kind, ret, dc)
+
+            if peek != 'S' and self.peek() != 'E':
+                self.addSub(ret)
+
+    def unqualifiedName(self):
+        peek = self.peek()
+        if isdigit(peek):
+            ret = self.sourceName()
+
+        elif islower(peek):
+            wasexpr = self.is_expression
+            if peek == 'o' and self.peeknext() == 'n':
+                self.n += 2
+                self.is_expression = False
+            ret = self.operatorName()
+            self.is_expression = wasexpr
+            if ret.kind == 'OPERATOR' and ret.val[0] == 'li':
+                ret = Comp('UNARY', ret, self.sourceName())
+
+        elif peek in 'CD':
+            ret = self.ctorDtorName()
+
+        elif peek == 'L':
+            self.n += 1
+            ret = self.sourceName()
+            self.discriminator()
+
+        elif peek == 'U':
+            c = self.peeknext()
+            if c == 'l':
+                ret = self.lambdaName()
+            elif c == 't':
+                ret = self.unnamedType()
+            else:
+                self.fail()
+
+        else:
+            self.fail()
+
+        if self.peek() == 'B':
+            ret = self.abiTags(ret)
+        return ret
+
+    def abiTags(self, dc):
+        hold = self.last_name
+        while self.peek() == 'B':
+            self.n += 1
+            dc = Comp('TAGGED_NAME', dc, self.sourceName())
+        self.last_name = hold
+        return dc
+
+    def number(self):
+        neg = False
+        if self.peek() == 'n':
+            neg = True
+            self.n += 1
+
+        start = self.n
+        s = self.s
+        while isdigit(s[self.n]):
+            self.n += 1
+
+        if start == self.n:
+            ret = 0
+        else:
+            ret = int(s[start:self.n])
+        if neg:
+            return -ret
+        return ret
+
+    def compactNumber(self):
+        '''
+        <number> _ (biased by one) or just _ for zero
+        '''
+        peek = self.peek()
+        if peek == '_':
+            num = 0
+        elif peek == 'n':
+            self.fail()
+        else:
+            num = self.number() + 1
+        self.expect('_')
+        return num
+
+    def sourceName(self):
+        size = self.number()
+        if size <= 0:
+            self.fail()
+        ret = self.identifier(size)
+        self.last_name = ret
+        return ret
+
+    def identifier(self, size):
+        start = self.n
+        if self.end - start < size:
+            self.fail()
+        self.n += size
+        ident = self.s[start:self.n]
+        # gcc's encoding of the anonymous namespace
+        if size >= 10 and ident.startswith('_GLOBAL_') and ident[8] in '._$' and ident[9] == 'N':
+            return name('(anonymous namespace)')
+        return name(ident)
+
+    def discriminator(self):
+        if self.peek() != '_':
+            return
+        self.n += 1
+        underscores = 1
+        if self.peek() == '_':
+            underscores += 1
+            self.n += 1
+        num = self.number()
+        if num < 0:
+            self.fail()
+        if underscores > 1 and num >= 10:
+            self.expect('_')
+
+    def operatorName(self):
+        c1 = self.next()
+        c2 = self.next()
+        if c1 == 'v' and isdigit(c2):
+            return Comp('EXTENDED_OPERATOR', self.sourceName(), val=int(c2))
+
+        if c1 == 'c' and c2 == 'v':
+            wasconv = self.is_conversion
+            self.is_conversion = not self.is_expression
+            typ = self.type()
+            if self.is_conversion:
+                ret = Comp('CONVERSION', typ)
+            else:
+                ret = Comp('CAST', typ)
+            self.is_conversion = wasconv
+            return ret
+
+        code = c1 + c2
+        op = operators.get(code)
+        if op is None:
+            self.fail()
+        return Comp('OPERATOR', val=(code, op[0], op[1]))
+
+    def ctorDtorName(self):
+        peek = self.peek()
+        if peek == 'C':
+            inheriting = False
+            if self.peeknext() == 'I':
+                inheriting = True
+                self.n += 1
+            if self.peeknext() not in '12345':
+                self.fail()
+            kind = self.peeknext()
+            self.n += 2
+            if inheriting:
+                self.type()
+            if self.last_name is None:
+                self.fail()
+            return Comp('CTOR', self.last_name, val=kind)
+
+        if self.peeknext() not in '01245':
+            self.fail()
+        kind = self.peeknext()
+        self.n += 2
+        if self.last_name is None:
+            self.fail()
+        return Comp('DTOR', self.last_name, val=kind)
+
+    def lambdaName(self):
+        self.n += 2
+        params = self.parmList()
+        self.expect('E')
+        num = self.compactNumber()
+        return Comp('LAMBDA', params, val=num)
+
+    def unnamedType(self):
+        self.n += 2
+        num = self.compactNumber()
+        return Comp('UNNAMED_TYPE', val=num)
+
+    def localName(self):
+        self.expect('Z')
+        func = self.encoding(False)
+        self.expect('E')
+
+        if self.peek() == 's':
+            self.n += 1
+            self.discriminator()
+            nm = name('string literal')
+
+        else:
+            num = -1
+            if self.peek() == 'd':
+                # default argument scope
+                self.n += 1
+                num = self.compactNumber()
+
+            nm = self.name()
+            if nm.kind not in ('LAMBDA', 'UNNAMED_TYPE'):
+                self.discriminator()
+
+            if num >= 0:
+                nm = Comp('DEFAULT_ARG', nm, val=num)
+
+        # elide the return type of the containing function
+        if func.kind == 'TYPED_NAME' and func.right.kind == 'FUNCTION_TYPE':
+            func.right.left = None
+
+        return Comp('LOCAL_NAME', func, nm)
+
+    def callOffset(self, c):
+        if c is None:
+            c = self.next()
+        if c == 'h':
+            self.number()
+        elif c == 'v':
+            self.number()
+            self.expect('_')
+            self.number()
+        else:
+            self.fail()
+        self.expect('_')
+
+    def specialName(self):
+        if self.check('T'):
+            c = self.next()
+            if c == 'V':
+                return Comp('VTABLE', self.type())
+            if c == 'T':
+                return Comp('VTT', self.type())
+            if c == 'I':
+                return Comp('TYPEINFO', self.type())
+            if c == 'S':
+                return Comp('TYPEINFO_NAME', self.type())
+            if c == 'h':
+                self.callOffset('h')
+                return Comp('THUNK', self.encoding(False))
+            if c == 'v':
+                self.callOffset('v')
+                return Comp('VIRTUAL_THUNK', self.encoding(False))
+            if c == 'c':
+                self.callOffset(None)
+                self.callOffset(None)
+                return Comp('COVARIANT_THUNK', self.encoding(False))
+            if c == 'C':
+                derived = self.type()
+                if self.number() < 0:
+                    self.fail()
+                self.expect('_')
+                base = self.type()
+                return Comp('CONSTRUCTION_VTABLE', base, derived)
+            if c == 'F':
+                return Comp('TYPEINFO_FN', self.type())
+            if c == 'J':
+                return Comp('JAVA_CLASS', self.type())
+            if c == 'H':
+                return Comp('TLS_INIT', self.name())
+            if c == 'W':
+                return Comp('TLS_WRAPPER', self.name())
+            if c == 'A':
+                return Comp('TPARM_OBJ', self.templateArg())
+            self.fail()
+
+        if self.check('G'):
+            c = self.next()
+            if c == 'V':
+                return Comp('GUARD', self.name())
+            if c == 'R':
+                nm = self.name()
+                return Comp('REFTEMP', nm, Comp('NUMBER', val=self.number()))
+            if c == 'A':
+                return Comp('HIDDEN_ALIAS', self.encoding(False))
+            if c == 'T':
+                if self.next() == 'n':
+                    return Comp('NONTRANSACTION_CLONE', self.encoding(False))
+                return Comp('TRANSACTION_CLONE', self.encoding(False))
+
+        self.fail()
+
+    def substitution(self, prefix):
+        self.expect('S')
+        c = self.next()
+        if c == '_' or isdigit(c) or isupper(c):
+            idx = 0
+            if c != '_':
+                while c != '_':
+                    if isdigit(c):
+                        idx = idx * 36 + ord(c) - 48
+                    elif isupper(c):
+                        idx = idx * 36 + ord(c) - 55
+                    else:
+                        self.fail()
+                    c = self.next()
+                idx += 1
+
+            if idx >= len(self.subs):
+                self.fail()
+            return self.subs[idx]
+
+        std = standard_subs.get(c)
+        if std is None:
+            self.fail()
+
+        simple, full, lastname = std
+        if lastname is not None:
+            self.last_name = Comp('SUB_STD', val=lastname)
+
+        # ctors/dtors of the abbreviations print the full name
+        if prefix and self.peek() in 'CD':
+            dc = Comp('SUB_STD', val=full)
+        else:
+            dc = Comp('SUB_STD', val=simple)
+
+        if self.peek() == 'B':
+            dc = self.abiTags(dc)
+            self.addSub(dc)
+        return dc
+
+    def cvQualifiers(self, memberfn):
+        '''
+        Returns a list of qualifier nodes (outermost first), each one
+        already chained to the next through left.
+        '''
+        quals = []
+        while nextIsTypeQual(self):
+            peek = self.next()
+            right = None
+            if peek == 'r':
+                kind = 'RESTRICT_THIS' if memberfn else 'RESTRICT'
+            elif peek == 'V':
+                kind = 'VOLATILE_THIS' if memberfn else 'VOLATILE'
+            elif peek == 'K':
+                kind = 'CONST_THIS' if memberfn else 'CONST'
+            else:
+                peek = self.next()
+                if peek == 'x':
+                    kind = 'TRANSACTION_SAFE'
+                elif peek in 'oO':
+                    kind = 'NOEXCEPT'
+                    if peek == 'O':
+                        right = self.expression()
+                        self.expect('E')
+                elif peek == 'w':
+                    kind = 'THROW_SPEC'
+                    right = self.parmList()
+                    self.expect('E')
+                else:
+                    self.fail()
+
+            q = Comp(kind, None, right)
+            if quals:
+                quals[-1].left = q
+            quals.append(q)
+
+        if not memberfn and self.peek() == 'F':
+            for q in quals:
+                if q.kind in cvquals:
+                    q.kind += '_THIS'
+
+        return quals
+
+    def refQualifier(self, sub):
+        peek = self.peek()
+        if peek == 'R':
+            self.n += 1
+            return Comp('REFERENCE_THIS', sub)
+        if peek == 'O':
+            self.n += 1
+            return Comp('RVALUE_REFERENCE_THIS', sub)
+        return sub
+
+    def type(self):
+        if nextIsTypeQual(self):
+            quals = self.cvQualifiers(False)
+            if self.peek() == 'F':
+                # qualifiers on a function type apply to this
+                inner = self.functionType()
+            else:
+                inner = self.type()
+
+            ret = chain(quals, inner)
+            if inner.kind in ('REFERENCE_THIS', 'RVALUE_REFERENCE_THIS'):
+                # move the ref-qualifier outside the cv-qualifiers
+                quals[-1].left = inner.left
+                inner.left = ret
+                ret = inner
+
+            self.addSub(ret)
+            return ret
+
+        cansub = True
+        peek = self.peek()
+        if peek in builtin_types:
+            ret = Comp('BUILTIN_TYPE', val=builtin_types[peek])
+            self.n += 1
+            cansub = False
+
+        elif peek == 'u':
+            self.n += 1
+            ret = Comp('VENDOR_TYPE', self.sourceName())
+
+        elif peek == 'F':
+            ret = self.functionType()
+
+        elif isdigit(peek) or peek in 'NZ':
+            ret = self.name()
+
+        elif peek == 'A':
+            ret = self.arrayType()
+
+        elif peek == 'M':
+            ret = self.ptrmemType()
+
+        elif peek == 'T':
+            ret = self.templateParam()
+            if self.peek() == 'I':
+                if not self.is_conversion:
+                    self.addSub(ret)
+                    ret = Comp('TEMPLATE', ret, self.templateArgs())
+
+                else:
+                    # only template args of a template template param if
+                    # another set of args follows (see cp-demangle.c)
+                    n = self.n
+                    nsubs = len(self.subs)
+                    try:
+                        args = self.templateArgs()
+                    except DemangleError:
+                        args = None
+
+                    if args is not None and self.peek() == 'I':
+                        self.addSub(ret)
+                        ret = Comp('TEMPLATE', ret, args)
+                    else:
+                        self.n = n
+                        del self.subs[nsubs:]
+
+        elif peek == 'S':
+            c = self.peeknext()
+            if isdigit(c) or c == '_' or isupper(c):
+                ret = self.substitution(False)
+                if self.peek() == 'I':
+                    ret = Comp('TEMPLATE', ret, self.templateArgs())
+                else:
+                    cansub = False
+            else:
+                ret = self.name()
+                if ret.kind == 'SUB_STD':
+                    cansub = False
+
+        elif peek == 'O':
+            self.n += 1
+            ret = Comp('RVALUE_REFERENCE', self.type())
+
+        elif peek == 'P':
+            self.n += 1
+            ret = Comp('POINTER', self.type())
+
+        elif peek == 'R':
+            self.n += 1
+            ret = Comp('REFERENCE', self.type())
+
+        elif peek == 'C':
+            self.n += 1
+            ret = Comp('COMPLEX', self.type())
+
+        elif peek == 'G':
+            self.n += 1
+            ret = Comp('IMAGINARY', self.type())
+
+        elif peek == 'U':
+            self.n += 1
+            ret = self.sourceName()
+            if self.peek() == 'I':
+                ret = Comp('TEMPLATE', ret, self.templateArgs())
+            ret = Comp('VENDOR_TYPE_QUAL', self.type(), ret)
+
+        elif peek == 'D':
+            cansub = False
+            self.n += 1
+            peek = self.next()
+            if peek in 'Tt':
+                ret = Comp('DECLTYPE', self.expression())
+                self.expect('E')
+                cansub = True
+
+            elif peek == 'p':
+                ret = Comp('PACK_EXPANSION', self.type())
+                cansub = True
+
+            elif peek == 'a':
+                ret = name('auto')
+
+            elif peek == 'c':
+                ret = name('decltype(auto)')
+
+            elif peek in dbuiltin_types:
+                ret = Comp('BUILTIN_TYPE', val=dbuiltin_types[peek])
+
+            elif peek == 'F':
+                # fixed point types
+                accum = isdigit(self.peek())
+                if accum:
+                    self.number()
+                length = self.type()
+                self.number()
+                sat = self.next() == 's'
+                ret = Comp('FIXED_TYPE', length, val=(accum, sat))
+
+            elif peek == 'v':
+                ret = self.vectorType()
+                cansub = True
+
+            else:
+                self.fail()
+
+        else:
+            self.fail()
+
+        if cansub:
+            self.addSub(ret)
+        return ret
+
+    def functionType(self):
+        self.expect('F')
+        if self.peek() == 'Y':
+            # extern "C" (not printed)
+            self.n += 1
+        ret = self.bareFunctionType(True)
+        ret = self.refQualifier(ret)
+        self.expect('E')
+        return ret
+
+    def parmList(self):
+        args = []
+        while True:
+            peek = self.peek()
+            if peek in '\0E.':
+                break
+            # a function ref-qualifier (rather than a parameter)
+            if peek in 'RO' and self.peeknext() == 'E':
+                break
+            args.append(self.type())
+
+        if not args:
+            self.fail()
+
+        # (void) is printed as ()
+        if len(args) == 1 and args[0].kind == 'BUILTIN_TYPE' and args[0].val[1] == PRINT_VOID:
+            args[0] = None
+
+        return makeList('ARGLIST', args)
+
+    def bareFunctionType(self, hasret):
+        if self.peek() == 'J':
+            self.n += 1
+            hasret = True
+
+        rettype = None
+        if hasret:
+            rettype = self.type()
+
+        return Comp('FUNCTION_TYPE', rettype, self.parmList())
+
+    def arrayType(self):
+        self.expect('A')
+        peek = self.peek()
+        if peek == '_':
+            dim = None
+        elif isdigit(peek):
+            start = self.n
+            while isdigit(self.s[self.n]):
+                self.n += 1
+            dim = name(self.s[start:self.n])
+        else:
+            dim = self.expression()
+        self.expect('_')
+        return Comp('ARRAY_TYPE', dim, self.type())
+
+    def vectorType(self):
+        if self.peek() == '_':
+            self.n += 1
+            dim = self.expression()
+        else:
+            dim = Comp('NUMBER', val=self.number())
+        self.expect('_')
+        return Comp('VECTOR_TYPE', dim, self.type())
+
+    def ptrmemType(self):
+        self.expect('M')
+        cls = self.type()
+        mem = self.type()
+        return Comp('PTRMEM_TYPE', cls, mem)
+
+    def templateParam(self):
+        self.expect('T')
+        return Comp('TEMPLATE_PARAM', val=self.compactNumber())
+
+    def templateArgs(self):
+        hold = self.last_name
+        if self.peek() not in 'IJ':
+            self.fail()
+        self.n += 1
+        ret = self.templateArgsList()
+        self.last_name = hold
+        return ret
+
+    def templateArgsList(self):
+        if self.peek() == 'E':
+            # an empty argument pack
+            self.n += 1
+            return Comp('TEMPLATE_ARGLIST')
+
+        args = []
+        while True:
+            args.append(self.templateArg())
+            if self.peek() == 'E':
+                self.n += 1
+                break
+        return makeList('TEMPLATE_ARGLIST', args)
+
+    def templateArg(self):
+        peek = self.peek()
+        if peek == 'X':
+            self.n += 1
+            ret = self.expression()
+            self.expect('E')
+            return ret
+        if peek == 'L':
+            return self.exprPrimary()
+        if peek in 'IJ':
+            # an argument pack
+            return self.templateArgs()
+        return self.type()
+
+    def exprList(self, term):
+        if self.peek() == term:
+            self.n += 1
+            return Comp('ARGLIST')
+
+        args = []
+        while True:
+            args.append(self.expression())
+            if self.peek() == term:
+                self.n += 1
+                break
+        return makeList('ARGLIST', args)
+
+    def expression(self):
+        wasexpr = self.is_expression
+        self.is_expression = True
+        ret = self.expression1()
+        self.is_expression = wasexpr
+        return ret
+
+    def expression1(self):
+        peek = self.peek()
+        nextc = self.peeknext()
+        if peek == 'L':
+            return self.exprPrimary()
+
+        if peek == 'T':
+            return self.templateParam()
+
+        if peek == 's' and nextc == 'r':
+            return self.unresolvedName()
+
+        if peek == 's' and nextc == 'p':
+            self.n += 2
+            return Comp('PACK_EXPANSION', self.expression1())
+
+        if peek == 'f' and nextc == 'p':
+            # function parameter used in a late-specified return type
+            self.n += 2
+            if self.peek() == 'T':
+                self.n += 1
+                idx = 0
+            else:
+                idx = self.compactNumber() + 1
+            return Comp('FUNCTION_PARAM', val=idx)
+
+        if isdigit(peek) or (peek == 'o' and nextc == 'n'):
+            if peek == 'o':
+                self.n += 2
+            nm = self.unqualifiedName()
+            if self.peek() == 'I':
+                return Comp('TEMPLATE', nm, self.templateArgs())
+            return nm
+
+        if peek in 'it' and nextc == 'l':
+            # brace-enclosed initializer list
+            typ = None
+            self.n += 2
+            if peek == 't':
+                typ = self.type()
+            if self.peek() == '\0' or self.peeknext() == '\0':
+                self.fail()
+            return Comp('INITIALIZER_LIST', typ, self.exprList('E'))
+
+        op = self.operatorName()
+        code = None
+        if op.kind == 'OPERATOR':
+            code = op.val[0]
+            if code == 'st':
+                return Comp('UNARY', op, self.type())
+            args = op.val[2]
+        elif op.kind == 'EXTENDED_OPERATOR':
+            args = op.val
+        elif op.kind == 'CAST':
+            args = 1
+        else:
+            self.fail()
+
+        if args == 0:
+            return Comp('NULLARY', op)
+
+        if args == 1:
+            suffix = False
+            if code in ('pp', 'mm'):
+                # pp_ and mm_ are the prefix variants
+                suffix = not self.check('_')
+            if op.kind == 'CAST' and self.check('_'):
+                operand = self.exprList('E')
+            elif code == 'sP':
+                operand = self.templateArgsList()
+            else:
+                operand = self.expression1()
+            if suffix:
+                operand = Comp('BINARY_ARGS', operand, operand)
+            return Comp('UNARY', op, operand)
+
+        if code is None:
+            self.fail()
+
+        if args == 2:
+            if code in ('dc', 'sc', 'cc', 'rc'):
+                left = self.type()
+            elif code[0] == 'f':
+                # fold expression
+                left = self.operatorName()
+            elif code == 'di':
+                left = self.unqualifiedName()
+            else:
+                left = self.expression1()
+
+            if code == 'cl':
+                right = self.exprList('E')
+            elif code in ('dt', 'pt'):
+                right = self.unqualifiedName()
+                if self.peek() == 'I':
+                    right = Comp('TEMPLATE', right, self.templateArgs())
+            else:
+                right = self.expression1()
+
+            return Comp('BINARY', op, Comp('BINARY_ARGS', left, right))
+
+        if args == 3:
+            if code in ('qu', 'dX'):
+                first = self.expression1()
+                second = self.expression1()
+                third = self.expression1()
+
+            elif code[0] == 'f':
+                first = self.operatorName()
+                second = self.expression1()
+                third = self.expression1()
+
+            elif code in ('nw', 'na'):
+                first = self.exprList('_')
+                second = self.type()
+                if self.peek() == 'E':
+                    self.n += 1
+                    third = None
+                elif self.peek() == 'p' and self.peeknext() == 'i':
+                    self.n += 2
+                    third = self.exprList('E')
+                elif self.peek() == 'i' and self.peeknext() == 'l':
+                    third = self.expression1()
+                else:
+                    self.fail()
+
+            else:
+                self.fail()
+
+            return Comp('TRINARY', op, Comp('TRINARY_ARG1', first,
+                                            Comp('TRINARY_ARG2', second, third)))
+
+        self.fail()
+
+    def unresolvedName(self):
+        '''
+        sr <prefix> E <base-unresolved-name> (or the old sr <type> <name>)
+        '''
+        self.n += 2
+        peek = self.peek()
+        if self.unresolved and (isdigit(peek) or islower(peek) or peek in 'CUL'):
+            # the new form is ambiguous with the old one, the whole name
+            # is parsed again the old way if this fails (see parse())
+            self.unresolved = -1
+            typ = self.unresolvedPrefix()
+            self.check('E')
+        else:
+            typ = self.type()
+
+        nm = self.unqualifiedName()
+        if self.peek() == 'I':
+            nm = Comp('TEMPLATE', nm, self.templateArgs())
+        return Comp('QUAL_NAME', typ, nm)
+
+    def unresolvedPrefix(self):
+        # like prefix() but nothing is a substitution candidate
+        ret = None
+        while True:
+            peek = self.peek()
+            if peek == 'D' and self.peeknext() in 'Tt':
+                if ret is not None:
+                    self.fail()
+                ret = self.type()
+
+            elif peek == 'I':
+                if ret is None:
+                    self.fail()
+                ret = Comp('TEMPLATE', ret, self.templateArgs())
+
+            elif peek == 'T':
+                if ret is not None:
+                    self.fail()
+                ret = self.templateParam()
+
+            elif peek == 'M':
+                self.n += 1
+                continue
+
+            elif peek == 'S':
+                if ret is not None:
+                    self.fail()
+                ret = self.substitution(True)
+                continue
+
+            else:
+                dc = self.unqualifiedName()
+                if ret is None:
+                    ret = dc
+                else:
+                    ret = Comp('QUAL_NAME', ret, dc)
+
+            if self.peek() == 'E':
+                return ret
+
+    def exprPrimary(self):
+        self.expect('L')
+        if self.peek() in '_Z':
+            ret = self.mangledName(False)
+        else:
+            typ = self.type()
+            kind = 'LITERAL'
+            if self.peek() == 'n':
+                kind = 'LITERAL_NEG'
+                self.n += 1
+            start = self.n
+            while self.peek() != 'E':
+                if self.peek() == '\0':
+                    self.fail()
+                self.n += 1
+            ret = Comp(kind, typ, name(self.s[start:self.n]))
+        self.expect('E')
+        return ret
+
+def nextIsTypeQual(p):
+    peek = p.peek()
+    if peek in 'rVK':
+        return True
+    if peek == 'D' and p.peeknext() in 'xoOw':
+        return True
+    return False
+
+def chain(quals, inner):
+    if not quals:
+        return inner
+    quals[-1].left = inner
+    return quals[0]
+
+def makeList(kind, items):
+    ret = None
+    for item in reversed(items):
+        ret = Comp(kind, item, ret)
+    return ret
+
+def isCtorDtorOrConversion(dc):
+    while dc.kind in ('QUAL_NAME', 'LOCAL_NAME'):
+        dc = dc.right
+    return dc.kind in ('CTOR', 'DTOR', 'CONVERSION')
+
+def hasReturnType(dc):
+    if dc is None:
+        return False
+    if dc.kind == 'LOCAL_NAME':
+        return hasReturnType(dc.right)
+    if dc.kind == 'TEMPLATE':
+        return not isCtorDtorOrConversion(dc.left)
+    if dc.kind in fnquals:
+        return hasReturnType(dc.left)
+    return False
+
+class Mod(object):
+    '''
+    An entry on the printer's modifier stack (a type modifier which is
+    waiting for the name it applies to).
+    '''
+    __slots__ = ('next', 'mod', 'printed', 'templates')
+
+    def __init__(self, next, mod, templates):
+        self.next = next
+        self.mod = mod
+        self.printed = False
+        self.templates = templates
+
+    def copy(self):
+        ret = Mod(self.next, self.mod, self.templates)
+        ret.printed = self.printed
+        return ret
+
+class Printer(object):
+
+    def __init__(self):
+        self.out = []
+        self.templates = None       # (template, next) tuples
+        self.modifiers = None
+        self.current_template = None
+        self.is_lambda_arg = 0
+        self.pack_index = 0
+        self.stack = []
+        self.scopes = {}
+        # (like libiberty, this is not rewound when a comma is dropped)
+        self.last = ''
+
+    def fail(self):
+        raise DemangleError('unprintable mangled name')
+
+    def append(self, s):
+        if s:
+            self.out.append(s)
+            self.last = s[-1]
+
+    def lastChar(self):
+        return self.last
+
+    def comp(self, dc):
+        if dc is None or dc.printing > 1:
+            self.fail()
+        dc.printing += 1
+        self.stack.append(dc)
+        try:
+            self.compInner(dc)
+        finally:
+            self.stack.pop()
+            dc.printing -= 1
+
+    def lookupTemplateArg(self, dc):
+        if self.templates is None:
+            self.fail()
+        return indexTemplateArg(self.templates[0].right, dc.val)
+
+    def findPack(self, dc):
+        if dc is None:
+            return None
+        kind = dc.kind
+        if kind == 'TEMPLATE_PARAM':
+            a = self.lookupTemplateArg(dc)
+            if a is not None and a.kind == 'TEMPLATE_ARGLIST':
+                return a
+            return None
+        if kind in nopack_kinds:
+            return None
+        if kind in ('EXTENDED_OPERATOR', 'CTOR', 'DTOR'):
+            return self.findPack(dc.left)
+        a = self.findPack(dc.left)
+        if a is not None:
+            return a
+        return self.findPack(dc.right)
+
+    def argsLength(self, dc):
+        count = 0
+        while dc is not None and dc.kind == 'TEMPLATE_ARGLIST':
+            elt = dc.left
+            if elt is None:
+                break
+            if elt.kind == 'PACK_EXPANSION':
+                count += packLength(self.findPack(elt.left))
+            else:
+                count += 1
+            dc = dc.right
+        return count
+
+    def subexpr(self, dc):
+        simple = dc.kind in ('NAME', 'QUAL_NAME', 'INITIALIZER_LIST', 'FUNCTION_PARAM')
+        if not simple:
+            self.append('(')
+        self.comp(dc)
+        if not simple:
+            self.append(')')
+
+    def exprOp(self, dc):
+        if dc.kind == 'OPERATOR':
+            self.append(dc.val[1])
+        else:
+            self.comp(dc)
+
+    def printTemplate(self, nm, args):
+        self.comp(nm)
+        if self.lastChar() == '<':
+            self.append(' ')
+        self.append('<')
+        self.comp(args)
+        # avoid the >> ambiguity
+        if self.lastChar() == '>':
+            self.append(' ')
+        self.append('>')
+
+    def conversion(self, dc):
+        hold = self.templates
+        if self.current_template is not None:
+            self.templates = (self.current_template, hold)
+
+        typ = dc.left
+        if typ.kind != 'TEMPLATE':
+            self.comp(typ)
+            self.templates = hold
+        else:
+            # the cast template args are printed outside the template scope
+            self.comp(typ.left)
+            self.templates = hold
+            if self.lastChar() == '<':
+                self.append(' ')
+            self.append('<')
+            self.comp(typ.right)
+            if self.lastChar() == '>':
+                self.append(' ')
+            self.append('>')
+
+    def modList(self, mods, suffix):
+        while mods is not None:
+            if mods.printed or (not suffix and mods.mod.kind in fnquals):
+                mods = mods.next
+                continue
+
+            mods.printed = True
+            hold = self.templates
+            self.templates = mods.templates
+            mod = mods.mod
+
+            if mod.kind == 'FUNCTION_TYPE':
+                self.functionType(mod, mods.next)
+                self.templates = hold
+                return
+
+            if mod.kind == 'ARRAY_TYPE':
+                self.arrayType(mod, mods.next)
+                self.templates = hold
+                return
+
+            if mod.kind == 'LOCAL_NAME':
+                holdmods = self.modifiers
+                self.modifiers = None
+                self.comp(mod.left)
+                self.modifiers = holdmods
+                self.append('::')
+                dc = mod.right
+                if dc.kind == 'DEFAULT_ARG':
+                    self.append('{default arg#%d}::' % (dc.val + 1))
+                    dc = dc.left
+                while dc.kind in fnquals:
+                    dc = dc.left
+                self.comp(dc)
+                self.templates = hold
+                return
+
+            self.mod(mod)
+            self.templates = hold
+            mods = mods.next
+
+    def mod(self, mod):
+        kind = mod.kind
+        if kind in ('RESTRICT', 'RESTRICT_THIS'):
+            self.append(' restrict')
+        elif kind in ('VOLATILE', 'VOLATILE_THIS'):
+            self.append(' volatile')
+        elif kind in ('CONST', 'CONST_THIS'):
+            self.append(' const')
+        elif kind == 'TRANSACTION_SAFE':
+            self.append(' transaction_safe')
+        elif kind in ('NOEXCEPT', 'THROW_SPEC'):
+            self.append(' noexcept' if kind == 'NOEXCEPT' else ' throw')
+            if mod.right is not None:
+                self.append('(')
+                self.comp(mod.right)
+                self.append(')')
+        elif kind == 'VENDOR_TYPE_QUAL':
+            self.append(' ')
+            self.comp(mod.right)
+        elif kind == 'POINTER':
+            self.append('*')
+        elif kind == 'REFERENCE_THIS':
+            self.append(' &')
+        elif kind == 'REFERENCE':
+            self.append('&')
+        elif kind == 'RVALUE_REFERENCE_THIS':
+            self.append(' &&')
+        elif kind == 'RVALUE_REFERENCE':
+            self.append('&&')
+        elif kind == 'COMPLEX':
+            self.append(' _Complex')
+        elif kind == 'IMAGINARY':
+            self.append(' _Imaginary')
+        elif kind == 'PTRMEM_TYPE':
+            if self.lastChar() != '(':
+                self.append(' ')
+            self.comp(mod.left)
+            self.append('::*')
+        elif kind == 'TYPED_NAME':
+            self.comp(mod.left)
+        elif kind == 'VECTOR_TYPE':
+            self.append(' __vector(')
+            self.comp(mod.left)
+            self.append(')')
+        else:
+            self.comp(mod)
+
+    def functionType(self, dc, mods):
+        needparen = False
+        needspace = False
+        p = mods
+        while p is not None and not p.printed:
+            kind = p.mod.kind
+            if kind in ('POINTER', 'REFERENCE', 'RVALUE_REFERENCE'):
+                needparen = True
+                break
+            if kind in ('RESTRICT', 'VOLATILE', 'CONST', 'VENDOR_TYPE_QUAL',
+                        'COMPLEX', 'IMAGINARY', 'PTRMEM_TYPE'):
+                needspace = True
+                needparen = True
+                break
+            p = p.next
+
+        if needparen:
+            if not needspace and self.lastChar() not in ('(', '*'):
+                needspace = True
+            if needspace and self.lastChar() != ' ':
+                self.append(' ')
+            self.append('(')
+
+        holdmods = self.modifiers
+        self.modifiers = None
+        self.modList(mods, False)
+
+        if needparen:
+            self.append(')')
+
+        self.append('(')
+        if dc.right is not None:
+            self.comp(dc.right)
+        self.append(')')
+
+        self.modList(mods, True)
+        self.modifiers = holdmods
+
+    def arrayType(self, dc, mods):
+        needspace = True
+        if mods is not None:
+            needparen = False
+            p = mods
+            while p is not None:
+                if not p.printed:
+                    if p.mod.kind == 'ARRAY_TYPE':
+                        needspace = False
+                    else:
+                        needparen = True
+                        needspace = True
+                    break
+                p = p.next
+
+            if needparen:
+                self.append(' (')
+            self.modList(mods, False)
+            if needparen:
+                self.append(')')
+
+        if needspace:
+            self.append(' ')
+        self.append('[')
+        if dc.left is not None:
+            self.comp(dc.left)
+        self.append(']')
+
+    def foldExpression(self, dc):
+        fold = dc.left.val[0]
+        if fold[0] != 'f':
+            return False
+
+        ops = dc.right
+        operator = ops.left
+        op1 = ops.right
+        op2 = None
+        if op1.kind == 'TRINARY_ARG2':
+            op2 = op1.right
+            op1 = op1.left
+
+        # print the whole pack
+        saveidx = self.pack_index
+        self.pack_index = -1
+        if fold[1] == 'l':
+            self.append('(...')
+            self.exprOp(operator)
+            self.subexpr(op1)
+            self.append(')')
+        elif fold[1] == 'r':
+            self.append('(')
+            self.subexpr(op1)
+            self.exprOp(operator)
+            self.append('...)')
+        else:
+            self.append('(')
+            self.subexpr(op1)
+            self.exprOp(operator)
+            self.append('...')
+            self.exprOp(operator)
+            self.subexpr(op2)
+            self.append(')')
+        self.pack_index = saveidx
+        return True
+
+    def pushMod(self, dc):
+        dpm = Mod(self.modifiers, dc, self.templates)
+        self.modifiers = dpm
+        return dpm
+
+    def compInner(self, dc):
+        kind = dc.kind
+
+        if kind == 'NAME':
+            self.append(dc.val)
+
+        elif kind == 'TAGGED_NAME':
+            self.comp(dc.left)
+            self.append('[abi:')
+            self.comp(dc.right)
+            self.append(']')
+
+        elif kind in ('QUAL_NAME', 'LOCAL_NAME'):
+            self.comp(dc.left)
+            self.append('::')
+            local = dc.right
+            if local.kind == 'DEFAULT_ARG':
+                self.append('{default arg#%d}::' % (local.val + 1))
+                local = local.left
+            self.comp(local)
+
+        elif kind == 'TYPED_NAME':
+            self.typedName(dc)
+
+        elif kind == 'TEMPLATE':
+            # the template is treated as a name (modifiers do not apply to
+            # its arguments)
+            holdcur = self.current_template
+            self.current_template = dc
+            holdmods = self.modifiers
+            self.modifiers = None
+            self.printTemplate(dc.left, dc.right)
+            self.modifiers = holdmods
+            self.current_template = holdcur
+
+        elif kind == 'TEMPLATE_PARAM':
+            if self.is_lambda_arg:
+                # generic lambda parameters
+                self.append('auto:%d' % (dc.val + 1))
+                return
+
+            a = self.lookupTemplateArg(dc)
+            if a is not None and a.kind == 'TEMPLATE_ARGLIST':
+                a = indexTemplateArg(a, self.pack_index)
+            if a is None:
+                self.fail()
+
+            # the argument may refer to the parameters of an outer template
+            hold = self.templates
+            self.templates = hold[1]
+            self.comp(a)
+            self.templates = hold
+
+        elif kind in special_prefixes:
+            self.append(special_prefixes[kind])
+            self.comp(dc.left)
+
+        elif kind == 'CONSTRUCTION_VTABLE':
+            self.append('construction vtable for ')
+            self.comp(dc.left)
+            self.append('-in-')
+            self.comp(dc.right)
+
+        elif kind == 'REFTEMP':
+            self.append('reference temporary #')
+            self.comp(dc.right)
+            self.append(' for ')
+            self.comp(dc.left)
+
+        elif kind == 'SUB_STD':
+            self.append(dc.val)
+
+        elif kind in cvquals:
+            # the same qualifier may be pushed more than once for arrays
+            p = self.modifiers
+            while p is not None:
+                if not p.printed:
+                    if p.mod.kind not in cvquals:
+                        break
+                    if p.mod.kind == kind:
+                        self.comp(dc.left)
+                        return
+                p = p.next
+            self.modifier(dc, None)
+
+        elif kind in ('REFERENCE', 'RVALUE_REFERENCE'):
+            self.reference(dc)
+
+        elif kind in modifier_kinds:
+            self.modifier(dc, None)
+
+        elif kind == 'BUILTIN_TYPE':
+            self.append(dc.val[0])
+
+        elif kind == 'VENDOR_TYPE':
+            self.comp(dc.left)
+
+        elif kind == 'FUNCTION_TYPE':
+            if dc.left is not None:
+                # the return type is passed down as a modifier so that the
+                # function type is printed in the right place
+                dpm = self.pushMod(dc)
+                self.comp(dc.left)
+                self.modifiers = dpm.next
+                if dpm.printed:
+                    return
+                self.append(' ')
+            self.functionType(dc, self.modifiers)
+
+        elif kind == 'ARRAY_TYPE':
+            self.arrayComp(dc)
+
+        elif kind in ('PTRMEM_TYPE', 'VECTOR_TYPE'):
+            dpm = self.pushMod(dc)
+            self.comp(dc.right)
+            if not dpm.printed:
+                self.mod(dc)
+            self.modifiers = dpm.next
+
+        elif kind == 'FIXED_TYPE':
+            accum, sat = dc.val
+            if sat:
+                self.append('_Sat ')
+            # don't print "int _Accum"
+            if dc.left.val[0] != 'int':
+                self.comp(dc.left)
+                self.append(' ')
+            self.append('_Accum' if accum else '_Fract')
+
+        elif kind in ('ARGLIST', 'TEMPLATE_ARGLIST'):
+            if dc.left is not None:
+                self.comp(dc.left)
+            if dc.right is not None:
+                self.append(', ')
+                mark = len(self.out)
+                self.comp(dc.right)
+                # drop the comma for (empty) packs which printed nothing
+                if len(self.out) == mark:
+                    self.out.pop()
+
+        elif kind == 'OPERATOR':
+            opname = dc.val[1]
+            self.append('operator')
+            if islower(opname[0]):
+                self.append(' ')
+            self.append(opname.rstrip(' ') if opname[-1] == ' ' else opname)
+
+        elif kind == 'EXTENDED_OPERATOR':
+            self.append('operator ')
+            self.comp(dc.left)
+
+        elif kind == 'CONVERSION':
+            self.append('operator ')
+            self.conversion(dc)
+
+        elif kind == 'CTOR':
+            self.comp(dc.left)
+
+        elif kind == 'DTOR':
+            self.append('~')
+            self.comp(dc.left)
+
+        elif kind == 'LAMBDA':
+            self.append('{lambda(')
+            self.is_lambda_arg += 1
+            self.comp(dc.left)
+            self.is_lambda_arg -= 1
+            self.append(')#%d}' % (dc.val + 1))
+
+        elif kind == 'UNNAMED_TYPE':
+            self.append('{unnamed type#%d}' % (dc.val + 1))
+
+        elif kind == 'CLONE':
+            self.comp(dc.left)
+            self.append(' [clone ')
+            self.comp(dc.right)
+            self.append(']')
+
+        elif kind == 'NUMBER':
+            self.append('%d' % dc.val)
+
+        elif kind == 'PACK_EXPANSION':
+            a = self.findPack(dc.left)
+            if a is None:
+                # only function parameter packs are involved
+                self.subexpr(dc.left)
+                self.append('...')
+                return
+
+            count = packLength(a)
+            for i in xrange(count):
+                self.pack_index = i
+                self.comp(dc.left)
+                if i < count - 1:
+                    self.append(', ')
+
+        elif kind == 'FUNCTION_PARAM':
+            if dc.val == 0:
+                self.append('this')
+            else:
+                self.append('{parm#%d}' % dc.val)
+
+        elif kind == 'DECLTYPE':
+            self.append('decltype (')
+            self.comp(dc.left)
+            self.append(')')
+
+        elif kind == 'INITIALIZER_LIST':
+            if dc.left is not None:
+                self.comp(dc.left)
+            self.append('{')
+            self.comp(dc.right)
+            self.append('}')
+
+        elif kind == 'NULLARY':
+            self.exprOp(dc.left)
+
+        elif kind == 'UNARY':
+            self.unary(dc)
+
+        elif kind == 'BINARY':
+            self.binary(dc)
+
+        elif kind == 'TRINARY':
+            self.trinary(dc)
+
+        elif kind in ('LITERAL', 'LITERAL_NEG'):
+            self.literal(dc)
+
+        else:
+            self.fail()
+
+    def typedName(self, dc):
+        # pass the name (and any this qualifiers) down to the type so it
+        # can be printed in the right place
+        holdmods = self.modifiers
+        self.modifiers = None
+        adpm = []
+        typed = dc.left
+        while typed is not None:
+            if len(adpm) >= 4:
+                self.fail()
+            self.modifiers = Mod(self.modifiers, typed, self.templates)
+            adpm.append(self.modifiers)
+            if typed.kind not in fnquals:
+                break
+            typed = typed.left
+
+        if typed is None:
+            self.fail()
+
+        # qualifiers of a local class apply here
+        if typed.kind == 'LOCAL_NAME':
+            typed = typed.right
+            if typed.kind == 'DEFAULT_ARG':
+                typed = typed.left
+            while typed is not None and typed.kind in fnquals:
+                if len(adpm) >= 4:
+                    self.fail()
+                top = adpm[-1]
+                new = top.copy()
+                new.next = top
+                self.modifiers = new
+                top.mod = typed
+                top.printed = False
+                top.templates = self.templates
+                adpm.append(new)
+                typed = typed.left
+            if typed is None:
+                self.fail()
+
+        # template args of the name apply to the function type as well
+        hold = self.templates
+        if typed.kind == 'TEMPLATE':
+            self.templates = (typed, hold)
+
+        self.comp(dc.right)
+        self.templates = hold
+
+        # the modifiers which the type didn't print
+        for dpm in reversed(adpm):
+            if not dpm.printed:
+                self.append(' ')
+                self.mod(dpm.mod)
+
+        self.modifiers = holdmods
+
+    def modifier(self, dc, inner):
+        dpm = self.pushMod(dc)
+        if inner is None:
+            inner = dc.left
+        self.comp(inner)
+        if not dpm.printed:
+            self.mod(dc)
+        self.modifiers = dpm.next
+
+    def reference(self, dc):
+        # reference collapsing: & + && = &
+        inner = None
+        sub = dc.left
+        hold = self.templates
+        restore = False
+        if not self.is_lambda_arg and sub.kind == 'TEMPLATE_PARAM':
+            scope = self.scopes.get(id(sub))
+            if scope is None:
+                self.scopes[id(sub)] = (sub, self.templates)
+
+            else:
+                # reentering a substitution from outside of its own tree
+                found = False
+                for i in xrange(len(self.stack) - 1, -1, -1):
+                    c = self.stack[i]
+                    if c is sub or (c is dc and i != len(self.stack) - 1):
+                        found = True
+                        break
+                if not found:
+                    self.templates = scope[1]
+                    restore = True
+
+            a = self.lookupTemplateArg(sub)
+            if a is not None and a.kind == 'TEMPLATE_ARGLIST':
+                a = indexTemplateArg(a, self.pack_index)
+            if a is None:
+                self.fail()
+            sub = a
+
+        if sub.kind == 'REFERENCE' or sub.kind == dc.kind:
+            dc = sub
+        elif sub.kind == 'RVALUE_REFERENCE':
+            inner = sub.left
+
+        self.modifier(dc, inner)
+        if restore:
+            self.templates = hold
+
+    def arrayComp(self, dc):
+        # pass the array down as a modifier (for multi-dimensional arrays),
+        # qualifiers on the array apply to the element type
+        holdmods = self.modifiers
+        first = Mod(holdmods, dc, self.templates)
+        self.modifiers = first
+        adpm = [first]
+        p = holdmods
+        while p is not None and p.mod.kind in cvquals:
+            if not p.printed:
+                if len(adpm) >= 4:
+                    self.fail()
+                new = p.copy()
+                new.next = self.modifiers
+                self.modifiers = new
+                p.printed = True
+                adpm.append(new)
+            p = p.next
+
+        self.comp(dc.right)
+        self.modifiers = holdmods
+
+        if first.printed:
+            return
+
+        for dpm in reversed(adpm[1:]):
+            self.mod(dpm.mod)
+
+        self.arrayType(dc, self.modifiers)
+
+    def unary(self, dc):
+        op = dc.left
+        operand = dc.right
+        code = None
+        if op.kind == 'OPERATOR':
+            code = op.val[0]
+            if code == 'ad':
+                # no argument list for the address of a function
+                if operand.kind == 'TYPED_NAME' and operand.left.kind == 'QUAL_NAME' \
+                        and operand.right.kind == 'FUNCTION_TYPE':
+                    operand = operand.left
+
+            if operand.kind == 'BINARY_ARGS':
+                # a suffix operator
+                self.subexpr(operand.left)
+                self.exprOp(op)
+                return
+
+        # for sizeof... just print the pack length
+        if code == 'sZ':
+            self.append('%d' % packLength(self.findPack(operand)))
+            return
+
+        if code == 'sP':
+            self.append('%d' % self.argsLength(operand))
+            return
+
+        if op.kind != 'CAST':
+            self.exprOp(op)
+        else:
+            self.append('(')
+            self.comp(op.left)
+            self.append(')')
+
+        if code == 'gs':
+            self.comp(operand)
+        elif code == 'st':
+            self.append('(')
+            self.comp(operand)
+            self.append(')')
+        else:
+            self.subexpr(operand)
+
+    def binary(self, dc):
+        op = dc.left
+        args = dc.right
+        if args.kind != 'BINARY_ARGS':
+            self.fail()
+
+        code = op.val[0] if op.kind == 'OPERATOR' else None
+        if code in ('dc', 'sc', 'cc', 'rc'):
+            self.exprOp(op)
+            self.append('<')
+            self.comp(args.left)
+            self.append('>(')
+            self.comp(args.right)
+            self.append(')')
+            return
+
+        if code is not None and self.foldExpression(dc):
+            return
+
+        # wrap > in parens so it isn't mistaken for the end of a template
+        isgt = op.kind == 'OPERATOR' and op.val[1] == '>'
+        if isgt:
+            self.append('(')
+
+        if code == 'cl' and args.left.kind == 'TYPED_NAME':
+            # no argument types for a call in an expression
+            func = args.left
+            if func.right.kind != 'FUNCTION_TYPE':
+                self.fail()
+            self.subexpr(func.left)
+        else:
+            self.subexpr(args.left)
+
+        if code == 'ix':
+            self.append('[')
+            self.comp(args.right)
+            self.append(']')
+        else:
+            if code != 'cl':
+                self.exprOp(op)
+            self.subexpr(args.right)
+
+        if isgt:
+            self.append(')')
+
+    def trinary(self, dc):
+        args = dc.right
+        if args.kind != 'TRINARY_ARG1' or args.right.kind != 'TRINARY_ARG2':
+            self.fail()
+
+        if self.foldExpression(dc):
+            return
+
+        op = dc.left
+        first = args.left
+        second = args.right.left
+        third = args.right.right
+        if op.val[0] == 'qu':
+            self.subexpr(first)
+            self.exprOp(op)
+            self.subexpr(second)
+            self.append(' : ')
+            self.subexpr(third)
+        else:
+            self.append('new ')
+            if first.left is not None:
+                self.subexpr(first)
+                self.append(' ')
+            self.comp(second)
+            if third is not None:
+                self.subexpr(third)
+
+    def literal(self, dc):
+        tp = PRINT_DEFAULT
+        typ = dc.left
+        value = dc.right
+        if typ.kind == 'BUILTIN_TYPE':
+            tp = typ.val[1]
+            if tp in literal_suffixes and value.kind == 'NAME':
+                if dc.kind == 'LITERAL_NEG':
+                    self.append('-')
+                self.comp(value)
+                self.append(literal_suffixes[tp])
+                return
+
+            if tp == PRINT_BOOL and value.kind == 'NAME' and dc.kind == 'LITERAL':
+                if value.val == '0':
+                    self.append('false')
+                    return
+                if value.val == '1':
+                    self.append('true')
+                    return
+
+        self.append('(')
+        self.comp(typ)
+        self.append(')')
+        if dc.kind == 'LITERAL_NEG':
+            self.append('-')
+        if tp == PRINT_FLOAT:
+            self.append('[')
+        self.comp(value)
+        if tp == PRINT_FLOAT:
+            self.append(']')
+
+modifier_kinds = frozenset(('VENDOR_TYPE_QUAL', 'POINTER', 'COMPLEX', 'IMAGINARY')) | fnquals
+
+nopack_kinds = frozenset(('PACK_EXPANSION', 'LAMBDA', 'NAME', 'TAGGED_NAME',
+                          'OPERATOR', 'BUILTIN_TYPE', 'SUB_STD', 'FUNCTION_PARAM',
+                          'UNNAMED_TYPE', 'FIXED_TYPE', 'DEFAULT_ARG', 'NUMBER'))
+
+literal_suffixes = {
+    PRINT_INT: '',
+    PRINT_UNSIGNED: 'u',
+    PRINT_LONG: 'l',
+    PRINT_UNSIGNED_LONG: 'ul',
+    PRINT_LONG_LONG: 'll',
+    PRINT_UNSIGNED_LONG_LONG: 'ull',
+}
+
+def indexTemplateArg(args, i):
+    a = args
+    while a is not None:
+        if a.kind != 'TEMPLATE_ARGLIST':
+            return None
+        if i <= 0:
+            break
+        i -= 1
+        a = a.right
+
+    if i != 0 or a is None:
+        return None
+    return a.left
+
+def packLength(dc):
+    count = 0
+    while dc is not None and dc.kind == 'TEMPLATE_ARGLIST' and dc.left is not None:
+        count += 1
+        dc = dc.right
+    return count
+
+def parse(mangled):
+    '''
+    Parse a mangled name into a Comp tree (raises DemangleError).
+    '''
+    try:
+        return parseName(Parser(mangled))
+    except DemangleError:
+        p = Parser(mangled, unresolved=0)
+        return parseName(p)
+
+def parseName(p):
+    mangled = p.s[:-1]
+    if mangled.startswith('_Z'):
+        dc = p.mangledName(True)
+
+    elif mangled.startswith('_GLOBAL_') and mangled[8:9] in ('.', '_', '$') \
+            and mangled[9:10] in ('D', 'I') and mangled[10:11] == '_':
+        # gcc's static constructor/destructor functions
+        kind = 'GLOBAL_CONSTRUCTORS' if mangled[9] == 'I' else 'GLOBAL_DESTRUCTORS'
+        p.n = 11
+        if p.peek() == '_' and p.peeknext() == 'Z':
+            p.n += 2
+            dc = Comp(kind, p.encoding(False))
+        else:
+            dc = Comp(kind, name(mangled[11:]))
+        p.n = p.end
+
+    else:
+        raise DemangleError('not a mangled name: %r' % mangled)
+
+    if p.peek() != '\0':
+        p.fail()
+
+    return dc
+
+def demangle(mangled):
+    '''
+    Demangle an Itanium C++ ABI mangled name (raises DemangleError if the
+    name is not valid).
+    '''
+    try:
+        dc = parse(mangled)
+        p = Printer()
+        p.comp(dc)
+    except RuntimeError:
+        # (recursion limit on hostile input)
+        raise DemangleError('mangled name too complex: %r' % mangled)
+    return ''.join(p.out)
@@ -0,0 +1,103 @@
+'''
+An index of instruction "features" (immediate operand values, mnemonics
+and referenced memory addresses) to the instructions which use them.
+
+The workspace feeds the index every opcode it makes (see makeOpcode) so
+questions like "which functions use all of these constants?" are answered
+by lookups rather than by disassembling the whole program again.
+'''
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def getOpcodeFeatures(op):
+    '''
+    Return a (mnem, imms, refs) tuple for the given opcode where imms is a
+    tuple of the immediate operand values and refs a tuple of the memory
+    addresses dereferenced by operands (which are resolvable without an
+    emulator).
+    '''
+    imms = ()
+    refs = ()
+    for oper in op.opers:
+        try:
+            if oper.isDeref():
+                addr = oper.getOperAddr(op, None)
+                if addr is not None and addr not in refs:
+                    refs += (addr,)
+
+            elif oper.isImmed():
+                imm = oper.getOperValue(op, None)
+                if imm is not None and imm not in imms:
+                    imms += (imm,)
+
+        except Exception as e:
+            logger.debug('0x%.8x: failed to index operand %r: %s', op.va, oper, e)
+
+    return op.mnem, imms, refs
+
+
+class FeatureIndex:
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.imms = {}
+        self.mnems = {}
+        self.refs = {}
+        # va -> (mnem, imms, refs) so instructions may be removed
+        self.byva = {}
+
+    def __len__(self):
+        return len(self.byva)
+
+    def addOpcode(self, va, op):
+        '''
+        Add (or replace) the features of the instruction at va.
+        '''
+        if va in self.byva:
+            self.delOpcode(va)
+
+        feats = getOpcodeFeatures(op)
+        mnem, imms, refs = feats
+        self.byva[va] = feats
+
+        self.mnems.setdefault(mnem, set()).add(va)
+        for imm in imms:
+            self.imms.setdefault(imm, set()).add(va)
+        for ref in refs:
+            self.refs.setdefault(ref, set()).add(va)
+
+    def delOpcode(self, va):
+        '''
+        Remove the features of the instruction at va (if indexed).
+        '''
+        feats = self.byva.pop(va, None)
+        if feats is None:
+            return
+
+        mnem, imms, refs = feats
+        self._discard(self.mnems, mnem, va)
+        for imm in imms:
+            self._discard(self.imms, imm, va)
+        for ref in refs:
+            self._discard(self.refs, ref, va)
+
+    def _discard(self, idx, key, va):
+        vas = idx.get(key)
+        if vas is None:
+            return
+        vas.discard(va)
+        if not vas:
+            idx.pop(key)
+
+    def findImmediate(self, imm):
+        return sorted(self.imms.get(imm, ()))
+
+    def findMnemonic(self, mnem):
+        return sorted(self.mnems.get(mnem, ()))
+
+    def findReference(self, va):
+        return sorted(self.refs.get(va, ()))
@@ -9,6 +9,7 @@ import envi.memory as e_mem
 import visgraph.pathcore as vg_path
 
 import vivisect.exc as v_exc
+import vivisect.impemu.trace as v_i_trace
 
 from vivisect.const import *
 
@@ -45,8 +46,17 @@ class WorkspaceEmulator:
         self.taintrepr = {}
 
         self.uninit_use = {}
+        self.taintwrites = set()
         self.logwrite = logwrite
         self.logread = logread
+
+        # the memory access logs (see impemu/trace.py)
+        spillrows = vw.config.viv.emulation.trace_spill_rows
+        spilldir = vw.config.viv.emulation.trace_spill_dir
+        self.readtrace = v_i_trace.TraceBuffer(spillrows=spillrows, spilldir=spilldir)
+        self.writetrace = v_i_trace.TraceBuffer(data=True, spillrows=spillrows, spilldir=spilldir)
+        self.pathids = itertools.count()
+
         self.path = self.newCodePathNode()
         self.curpath = self.path
         self.op = None
@@ -160,10 +170,26 @@ class WorkspaceEmulator:
         # getByteDef etc... use it.
         op = self.opcache.get(va)
         if op is None:
-            op = envi.Emulator.parseOpcode(self, va, arch=arch)
+            # decode our own bytes (which the emulation may have changed) but
+            # with the workspace's arch modules (whose decoders are warm)
+            if arch == envi.ARCH_DEFAULT:
+                arch = self.imem_archs[envi.ARCH_DEFAULT].getArchId()
+
+            off, b = self.getByteDef(va)
+            op = self.vw.imem_archs[(arch & envi.ARCH_MASK) >> 16].archParseOpcode(b, off, va)
             self.opcache[va] = op
         return op
 
+    def flushBlocks(self, va=None, size=1):
+        # the opcode cache has to forget the code which changed as well
+        if va is None:
+            self.opcache.clear()
+        else:
+            for x in range(va - 16, va + size):
+                self.opcache.pop(x, None)
+
+        envi.Emulator.flushBlocks(self, va, size)
+
     def checkCall(self, starteip, endeip, op):
         """
         Check if this was a call, and if so, do the required
@@ -193,24 +219,80 @@ class WorkspaceEmulator:
             if ret is None and hook:
                 hook(self, callconv, api, argv)
             elif self._func_only:
+                # what emulating the callee showed (see impemu/summary.py)
+                summ = self.vw.getFunctionSummary(endeip)
+                if summ is not None and summ.api != api:
+                    summ = None
+
+                if ret is None and summ is not None:
+                    ret = self.getSummaryReturn(summ, op, endeip, api, argv)
                 if ret is None:
                     ret = self.setVivTaint('apicall', (op, endeip, api, argv))
+
+                sp = self.getStackCounter()
+                if summ is not None:
+                    self.applySummaryWrites(summ, op, endeip, api, argv)
+
                 callconv.execCallReturn(self, ret, len(funcargs))
+                if summ is not None and summ.stackdelta is not None:
+                    self.setStackCounter(sp + summ.stackdelta)
             # no else since we'll emulate into the function
 
         return iscall
 
+    def getSummaryReturn(self, summ, op, endeip, api, argv):
+        '''
+        Return the value a call returns according to the callee's function
+        summary (or None if the summary doesn't say).
+        '''
+        if summ.retarg is not None and summ.retarg < len(argv):
+            return argv[summ.retarg]
+
+        if summ.retalloc:
+            return self.setVivTaint('alloc', (op, endeip, api, argv))
+
+    def applySummaryWrites(self, summ, op, endeip, api, argv):
+        '''
+        Taint the (pointer sized) stack memory the callee writes through its
+        arguments, so the caller doesn't use stale values from before the call.
+        '''
+        for argidx, off, size in summ.argwrites:
+            if argidx >= len(argv) or size != self.psize:
+                continue
+
+            va = argv[argidx] + off
+            if not self.isStackPointer(va):
+                continue
+
+            taint = self.setVivTaint('argwrite', (op, endeip, api, argidx, off))
+            self.writeMemoryFormat(va, '<P', taint)
+
+    def isNoReturnCall(self, va):
+        '''
+        Does control flow to va never come back (a known noreturn api or a
+        function whose summary says it never returns)?
+        '''
+        if self.vw.isNoReturnVa(va):
+            return True
+
+        summ = self.vw.getFunctionSummary(va)
+        return summ is not None and summ.noret
+
     def newCodePathNode(self, parent=None, bva=None):
         '''
         NOTE: Right now, this is only called from the actual branch state which
         needs it.  it must stay that way for now (register context is being copied
         for symbolic emulator...)
         '''
+        pathid = next(self.pathids)
         props = {
-            'bva': bva,      # the entry virtual address for this branch
-            'valist': [],    # the virtual addresses in this node in order
-            'readlog': [],   # a log of all memory reads from this block
-            'writelog': [],  # a log of all memory writes from this block
+            'bva': bva,         # the entry virtual address for this branch
+            'pathid': pathid,   # the path id of this node's rows in the traces
+            # the virtual addresses in this node in order
+            'valist': v_i_trace.newColumn(),
+            # a log of all memory reads/writes from this block
+            'readlog': self.readtrace.getPathView(pathid),
+            'writelog': self.writetrace.getPathView(pathid),
         }
         ret = vg_path.newPathNode(parent=parent, **props)
         return ret
@@ -326,6 +408,7 @@ class WorkspaceEmulator:
         hits = {}
         todo = [(funcva, self.getEmuSnap(), self.path)]
         vw = self.vw  # Save a dereference many many times
+        instr = getattr(vw, '_instr', None)  # Analysis instrumentation
 
         while len(todo):
 
@@ -333,6 +416,10 @@ class WorkspaceEmulator:
 
             self.setEmuSnap(esnap)
 
+            # the compiled block (and the index of the next step in it)
+            blk = ()
+            bidx = 0
+
             self.setProgramCounter(va)
 
             # Check if we are beyond our loop max...
@@ -365,8 +452,15 @@ class WorkspaceEmulator:
                     break
 
                 try:
-                    # FIXME unify with stepi code...
-                    op = self.parseOpcode(starteip)
+                    # Continue through the current compiled block if this is
+                    # its next instruction, otherwise start the one here
+                    if bidx >= len(blk) or blk[bidx][0].va != starteip:
+                        blk = self.getBlock(starteip)
+                        bidx = 0
+
+                    op, step = blk[bidx]
+                    bidx += 1
+
                     self.op = op
                     if self.emumon:
                         try:
@@ -381,8 +475,10 @@ class WorkspaceEmulator:
                         if self.emustop:
                             return
                     # Execute the opcode
-                    self.executeOpcode(op)
+                    flow = step() or op.iflags & envi.BLOCK_END_FLAGS
                     vg_path.getNodeProp(self.curpath, 'valist').append(starteip)
+                    if instr is not None:
+                        instr.emuInstructions(1)
 
                     endeip = self.getProgramCounter()
 
@@ -398,19 +494,23 @@ class WorkspaceEmulator:
 
                         if self.emustop:
                             return
-                    iscall = self.checkCall(starteip, endeip, op)
-                    if self.emustop:
-                        return
+
+                    # (calls and branches only ever end a block)
+                    iscall = False
+                    if flow:
+                        iscall = self.checkCall(starteip, endeip, op)
+                        if self.emustop:
+                            return
 
                     # TODO: hook things like error(...) when they have a param that indicates to 
                     # exit. Might be a bit hairy since we'll possibly have to fix up codeblocks
-                    if self.vw.isNoReturnVa(endeip):
+                    if self.isNoReturnCall(endeip):
                         vg_path.setNodeProp(self.curpath, 'cleanret', False)
                         break
 
                     # If it wasn't a call, check for branches, if so, add them to
                     # the todo list and go around again...
-                    if not iscall:
+                    if flow and not iscall:
                         blist = self.checkBranches(starteip, endeip, op)
                         if len(blist):
                             # pc in the snap will be wrong, but over-ridden at restore
@@ -524,7 +624,7 @@ class WorkspaceEmulator:
             if stackoff < 0:
                 o = '-'
             trepr = 'sp%s%d' % (o, abs(stackoff))
-        elif ttype == 'apicall':
+        elif ttype in ('apicall', 'alloc'):
             op, pc, api, argv = tinfo
             if op.va in self.taintrepr:
                 return '<0x%.8x>' % op.va
@@ -533,6 +633,9 @@ class WorkspaceEmulator:
             argsstr = ','.join([self.reprVivValue(x) for x in argv])
             trepr = '%s(%s)' % (callstr, argsstr)
             self.taintrepr[op.va] = trepr
+        elif ttype == 'argwrite':
+            op, pc, api, argidx, off = tinfo
+            trepr = '%s.arg%d[%d]' % (self.reprVivValue(pc), argidx, off)
         else:
             trepr = 'taint: 0x%.8x %s %r' % (va, ttype, tinfo)
 
@@ -556,11 +659,13 @@ class WorkspaceEmulator:
         taint = self.getVivTaint(val)
         if taint:
             va, ttype, tinfo = taint
-            if ttype == 'apicall':
+            if ttype in ('apicall', 'alloc'):
                 op, pc, api, argv = tinfo
                 rettype, retname, callconv, callname, callargs = api
                 if val not in argv:
                     return self.reprVivTaint(taint)
+            elif ttype == 'argwrite':
+                return self.reprVivTaint(taint)
 
         stackoff = self.getStackOffset(val)
         if stackoff is not None:
@@ -584,16 +689,21 @@ class WorkspaceEmulator:
         if ttype == 'uninitreg':
             self.logUninitRegUse(tinfo)
 
+        return taint
+
     def writeMemory(self, va, bytes):
         """
         Try to write the bytes to the memory object, otherwise, dont'
         complain...
         """
         if self.logwrite:
-            wlog = vg_path.getNodeProp(self.curpath, 'writelog')
-            wlog.append((self.getProgramCounter(),va,bytes))
+            pathid = vg_path.getNodeProp(self.curpath, 'pathid')
+            self.writetrace.append(self.getProgramCounter(), va, len(bytes), pathid, data=bytes)
 
-        self._useVirtAddr( va )
+        taint = self._useVirtAddr( va )
+        if taint is not None and taint[1] in ('uninitreg', 'funcstack') and len(self.taintwrites) < 0x100:
+            # remember writes through (possible) arguments for the summary
+            self.taintwrites.add((taint[1], taint[2], va - taint[0], len(bytes)))
 
         # It's totally ok to write to invalid memory during the
         # emulation pass (as long as safe_mem is true...)
@@ -601,7 +711,7 @@ class WorkspaceEmulator:
         if self._safe_mem and not probeok:
             return
 
-        return e_mem.MemoryObject.writeMemory(self, va, bytes)
+        return envi.Emulator.writeMemory(self, va, bytes)
 
     def logUninitRegUse(self, regid):
         self.uninit_use[regid] = True
@@ -611,8 +721,8 @@ class WorkspaceEmulator:
 
     def readMemory(self, va, size):
         if self.logread:
-            rlog = vg_path.getNodeProp(self.curpath, 'readlog')
-            rlog.append((self.getProgramCounter(),va,size))
+            pathid = vg_path.getNodeProp(self.curpath, 'pathid')
+            self.readtrace.append(self.getProgramCounter(), va, size, pathid)
 
         # If they read an import entry, start a taint...
         loc = self.vw.getLocation(va)
@@ -66,6 +66,7 @@ class AnalysisMonitor(EmulationMonitor):
         self.stackargs = {}
         self.operrefs = []
         self.callcomments = []
+        self.retstates = []  # (sp, regsnap) after each return (for the summary)
         self._dynamic_branch_handlers = []
 
     def addAnalysisResults(self, vw, emu):
@@ -151,6 +152,10 @@ class AnalysisMonitor(EmulationMonitor):
                     except Exception as e:
                         logger.exception('error with dyn branch handler (%s) (%s)', cb, e)
 
+    def posthook(self, emu, op, endeip):
+        if op.iflags & envi.IF_RET:
+            self.retstates.append((emu.getStackCounter(), emu.getRegisterSnap()))
+
     def apicall(self, emu, op, pc, api, argv):
         rettype, retname, convname, callname, callargs = api
         if self.vw.getComment(op.va) is None:
@@ -44,8 +44,7 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
             if arch == envi.ARCH_DEFAULT:
                 arch = (envi.ARCH_ARMV7, envi.ARCH_THUMB)[tmode]
 
-            op = envi.archs.arm.emu.ArmEmulator.parseOpcode(self, va, arch=arch)
-            self.opcache[va] = op
+            op = v_i_emulator.WorkspaceEmulator.parseOpcode(self, va, arch=arch)
         return op
 
     def stepi(self):
@@ -157,6 +156,7 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
         hits = {}
         todo = [(funcva, self.getEmuSnap(), self.path)]
         vw = self.vw    # Save a dereference many many times
+        instr = getattr(vw, '_instr', None)  # Analysis instrumentation
 
         while len(todo):
             va, esnap, self.curpath = todo.pop()
@@ -166,6 +166,10 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
             self.setProgramCounter(va)
             tmode = self.getFlag(PSR_T_bit)
 
+            # the compiled block (and the index of the next step in it)
+            blk = ()
+            bidx = 0
+
             # Check if we are beyond our loop max...
             if maxloop is not None:
                 lcount = vg_path.getPathLoopCount(self.curpath, 'bva', va)
@@ -197,8 +201,17 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
 
                 try:
 
-                    # FIXME unify with stepi code...
-                    op = self.parseOpcode(starteip | tmode)
+                    # Continue through the current compiled block if this is
+                    # its next instruction, otherwise start the one here (in
+                    # the mode this path started in)
+                    if bidx >= len(blk) or blk[bidx][0].va != starteip:
+                        if self.getFlag(PSR_T_bit) != tmode:
+                            self.setFlag(PSR_T_bit, tmode)
+                        blk = self.getBlock(starteip)
+                        bidx = 0
+
+                    op, step = blk[bidx]
+                    bidx += 1
 
                     self.op = op
                     if self.emumon:
@@ -215,8 +228,10 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
                             return
 
                     # Execute the opcode
-                    self.executeOpcode(op)
+                    flow = step() or op.iflags & envi.BLOCK_END_FLAGS
                     vg_path.getNodeProp(self.curpath, 'valist').append(starteip)
+                    if instr is not None:
+                        instr.emuInstructions(1)
 
                     endeip = self.getProgramCounter()
 
@@ -229,6 +244,10 @@ class ArmWorkspaceEmulator(v_i_emulator.WorkspaceEmulator, e_arm.ArmEmulator):
                         if self.emustop:
                             return
 
+                    # (calls and branches only ever end a block)
+                    if not flow:
+                        continue
+
                     iscall = self.checkCall(starteip, endeip, op)
                     if self.emustop:
                         return
@@ -0,0 +1,201 @@
+'''
+Per-function emulation summaries.
+
+The function emulation passes (amd64, i386 and arm) summarize what each
+function did while it was emulated: how far it moved the stack, whether any
+path returned, which argument (if any) it returns, whether it returns memory
+from an allocator and what it wrote through its pointer arguments.  Code flow
+analyzes called functions before their callers, so the summaries are built
+bottom-up over the call graph, and WorkspaceEmulator.checkCall uses the
+summary of a called function (rather than just its calling convention) while
+emulating its callers.
+
+Summaries are transient (they are not saved with the workspace).  They are
+dropped when a function is deleted or given a new api/thunk, replaced when it
+is analyzed again, and the whole store is cleared if it grows too large.
+'''
+import envi
+import visgraph.pathcore as vg_path
+
+# How many summaries the workspace keeps (before clearing them all)
+MAX_SUMMARIES = 0x10000
+
+# How many distinct writes through arguments a summary records
+MAX_ARGWRITES = 32
+
+# The (base) names of functions which return newly allocated memory
+alloc_names = frozenset([
+    'malloc', 'calloc', 'realloc', 'strdup', '_strdup', 'strndup',
+    'HeapAlloc', 'HeapReAlloc', 'LocalAlloc', 'GlobalAlloc', 'VirtualAlloc',
+    'RtlAllocateHeap', 'ExAllocatePool', 'ExAllocatePoolWithTag',
+    '_Znwm', '_Znam', '_Znwj', '_Znaj',
+    '??2@YAPAXI@Z', '??_U@YAPAXI@Z', '??2@YAPEAX_K@Z', '??_U@YAPEAX_K@Z',
+])
+
+
+class FunctionSummary:
+    '''
+    What emulating a function showed about it:
+
+        api        - the function api (arg count/types) it was built for
+        stackdelta - the stack counter change from the entry to after the
+                     return (None if the paths disagree or none returned)
+        noret      - True if no emulated path returned
+        retarg     - the index of the argument every path returns (or None)
+        retalloc   - True if every path returns memory from an allocator
+        argwrites  - a tuple of (argidx, offset, size) writes through args
+    '''
+    def __init__(self, api, stackdelta=None, noret=False, retarg=None, retalloc=False, argwrites=()):
+        self.api = api
+        self.stackdelta = stackdelta
+        self.noret = noret
+        self.retarg = retarg
+        self.retalloc = retalloc
+        self.argwrites = argwrites
+
+    def __repr__(self):
+        return 'FunctionSummary(delta=%r, noret=%r, retarg=%r, retalloc=%r, argwrites=%r)' % (
+            self.stackdelta, self.noret, self.retarg, self.retalloc, self.argwrites)
+
+
+def getCallName(vw, emu, va):
+    '''
+    Return the import/thunk name for a call target (or None).
+    '''
+    if vw.isFunction(va):
+        return vw.getFunctionMeta(va, 'Thunk')
+
+    taint = emu.getVivTaint(va)
+    if taint is None:
+        return None
+
+    tva, ttype, tinfo = taint
+    if ttype == 'import':
+        return tinfo[3]
+
+    if ttype == 'dynfunc':
+        return '%s.%s' % tinfo
+
+    return None
+
+
+def isAllocCall(vw, emu, va):
+    '''
+    Does a call to va return newly allocated memory?
+    '''
+    summ = vw.getFunctionSummary(va)
+    if summ is not None and summ.retalloc:
+        return True
+
+    name = getCallName(vw, emu, va)
+    if name is None:
+        return False
+
+    name = name.split('.')[-1]
+    # (the elf plt thunks)
+    if name.startswith('plt_'):
+        name = name[4:]
+
+    return name in alloc_names
+
+
+def getArgTaints(emu, cc, argc):
+    '''
+    Return a dict of the (taint type, taint info) of each argument's value
+    at the function entry to the argument index.
+    '''
+    ret = {}
+    idx = 0
+    off = cc.getStackArgOffset(emu, argc)
+    for atype, aval in cc.arg_def:
+        if idx >= argc:
+            break
+
+        if atype == envi.CC_REG:
+            ret[('uninitreg', aval)] = idx
+            idx += 1
+
+        elif atype == envi.CC_STACK:
+            ret[('funcstack', off)] = idx
+            off += cc.align
+            idx += 1
+
+        elif atype == envi.CC_STACK_INF:
+            while idx < argc:
+                ret[('funcstack', off)] = idx
+                off += cc.align
+                idx += 1
+
+    return ret
+
+
+def buildSummary(vw, fva, emu, emumon, api):
+    '''
+    Build the FunctionSummary for a function from the emulator (and the
+    AnalysisMonitor) which just ran it.  Returns None for an unknown
+    calling convention.
+    '''
+    rettype, retname, callconv, callname, callargs = api
+    cc = emu.getCallingConvention(callconv)
+    if cc is None:
+        return None
+
+    argtaints = getArgTaints(emu, cc, len(callargs))
+
+    deltas = set()
+    retargs = set()
+    retalloc = bool(emumon.retstates)
+    for sp, regs in emumon.retstates:
+        deltas.add(emu.getStackOffset(sp))
+
+        emu.setRegisterSnap(regs)
+        rval = cc.getReturnValue(emu)
+
+        taint = emu.getVivTaint(rval)
+        if taint is None or taint[0] != rval:
+            retargs.add(None)
+            retalloc = False
+            continue
+
+        tva, ttype, tinfo = taint
+        if ttype in ('uninitreg', 'funcstack'):
+            retargs.add(argtaints.get((ttype, tinfo)))
+        else:
+            retargs.add(None)
+
+        if ttype == 'apicall':
+            retalloc = retalloc and isAllocCall(vw, emu, tinfo[1])
+        elif ttype != 'alloc':
+            retalloc = False
+
+    noret = vw.isNoReturnVa(fva)
+    if not emumon.retstates and not noret:
+        # every path must have ended in a call which does not return
+        leaves = vg_path.getLeafNodes(emu.path)
+        noret = all(vg_path.getNodeProp(n, 'cleanret') is False for n in leaves)
+
+    argwrites = set()
+    for ttype, tinfo, off, size in emu.taintwrites:
+        idx = argtaints.get((ttype, tinfo))
+        if idx is not None:
+            argwrites.add((idx, off, size))
+
+    return FunctionSummary(
+        api,
+        stackdelta=deltas.pop() if len(deltas) == 1 else None,
+        noret=noret,
+        retarg=retargs.pop() if len(retargs) == 1 else None,
+        retalloc=retalloc,
+        argwrites=tuple(sorted(argwrites)[:MAX_ARGWRITES]),
+    )
+
+
+def analyzeFunction(vw, fva, emu, emumon, api):
+    '''
+    Build and store the summary for a just emulated function (called at the
+    end of the arch function emulation passes).
+    '''
+    summ = buildSummary(vw, fva, emu, emumon, api)
+    if summ is not None:
+        vw.setFunctionSummary(fva, summ)
+    return summ
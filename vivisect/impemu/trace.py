@@ -0,0 +1,330 @@
+'''
+Compact (column oriented) emulation traces.
+
+With logread/logwrite enabled, the workspace emulator records each memory
+access in a TraceBuffer (one for reads, one for writes) rather than as a
+tuple in a list per code path node.  The path nodes' "readlog" and
+"writelog" props are TracePathView objects which iterate/index like the
+lists they replace, and each node's "valist" is an array of addresses.
+
+Buffers may spill their rows to an (anonymous) temporary file as they go
+(see the viv.emulation config options) and export their columns to numpy
+arrays for post processing.
+'''
+import array
+import struct
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _getAddrTypecode():
+    for tc in ('L', 'Q'):
+        try:
+            if array.array(tc).itemsize == 8:
+                return tc
+        except ValueError:
+            pass
+    return None
+
+# The array typecode for 64 bit values (None where there isn't one, in
+# which case the columns are lists)
+ADDR_TYPECODE = _getAddrTypecode()
+
+# (column name, array typecode) for each column of a buffer
+columns = (
+    ('pc', ADDR_TYPECODE),
+    ('va', ADDR_TYPECODE),
+    ('size', 'I'),
+    ('path', 'I'),
+    ('off', ADDR_TYPECODE),     # the offset of the row's bytes in the data
+)
+
+
+def newColumn(typecode=ADDR_TYPECODE):
+    '''
+    Return a new (empty) append only column for the given typecode.
+    '''
+    if typecode is None:
+        return []
+    return array.array(typecode)
+
+
+def _packColumn(col, typecode):
+    if typecode is None:
+        return struct.pack('=%dQ' % len(col), *col)
+    return col.tostring()
+
+
+def _unpackColumn(raw, typecode):
+    if typecode is None:
+        return list(struct.unpack('=%dQ' % (len(raw) // 8), raw))
+    col = array.array(typecode)
+    col.fromstring(raw)
+    return col
+
+
+class TraceBuffer:
+    '''
+    An append only log of memory accesses kept as columns: the pc of the
+    instruction, the va and size of the access, the id of the code path
+    and (for buffers created with data=True) the bytes.
+
+    Rows are returned as the same tuples the emulator used to keep in
+    lists:  (pc, va, size) without data and (pc, va, bytes) with.
+
+    With spillrows set, the in memory rows are written out to a temporary
+    file (in spilldir, or the system default) every spillrows rows.
+    '''
+    def __init__(self, data=False, spillrows=0, spilldir=None):
+        self.data = data
+        self.spillrows = spillrows
+        self.spilldir = spilldir or None
+
+        self._rows = 0
+        self._runs = {}         # path id -> [[firstrow, endrow], ...]
+
+        self._spill = None
+        self._chunks = []       # (firstrow, rows, fileoffset) for each spilled chunk
+        self._loaded = None     # the (firstrow, cols) of the last chunk read back
+
+        self._newCols()
+
+    def _newCols(self):
+        self._base = self._rows
+        self._cols = [newColumn(tc) for name, tc in columns]
+        self._bytes = bytearray()
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, pc, va, size, pathid, data=None):
+        '''
+        Add a row (data is the bytes for buffers created with data=True).
+        '''
+        row = self._rows
+        self._rows += 1
+
+        pcs, vas, sizes, paths, offs = self._cols
+        pcs.append(pc)
+        vas.append(va)
+        sizes.append(size)
+        paths.append(pathid)
+        if self.data:
+            offs.append(len(self._bytes))
+            self._bytes.extend(data)
+
+        runs = self._runs.get(pathid)
+        if runs is None:
+            self._runs[pathid] = [[row, row + 1]]
+        elif runs[-1][1] == row:
+            runs[-1][1] = row + 1
+        else:
+            runs.append([row, row + 1])
+
+        if self.spillrows and self._rows - self._base >= self.spillrows:
+            self.spill()
+
+    def spill(self):
+        '''
+        Write the in memory rows out to the spill file.
+        '''
+        rows = self._rows - self._base
+        if not rows:
+            return
+
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(dir=self.spilldir)
+
+        self._spill.seek(0, 2)
+        self._chunks.append((self._base, rows, self._spill.tell()))
+
+        parts = [_packColumn(col, tc) for col, (name, tc) in zip(self._cols, columns)]
+        parts.append(bytes(self._bytes))
+        self._spill.write(struct.pack('<%dQ' % len(parts), *[len(p) for p in parts]))
+        for part in parts:
+            self._spill.write(part)
+
+        self._newCols()
+
+    def _loadChunk(self, idx):
+        first, rows, offset = self._chunks[idx]
+        if self._loaded is not None and self._loaded[0] == first:
+            return self._loaded
+
+        count = len(columns) + 1
+        self._spill.seek(offset)
+        lens = struct.unpack('<%dQ' % count, self._spill.read(8 * count))
+        cols = [_unpackColumn(self._spill.read(size), tc) for size, (name, tc) in zip(lens, columns)]
+        cols.append(bytearray(self._spill.read(lens[-1])))
+
+        self._loaded = (first, cols)
+        return self._loaded
+
+    def _getChunk(self, row):
+        '''
+        Return the (firstrow, cols) of the chunk which holds row.
+        '''
+        if row >= self._base:
+            return self._base, self._cols + [self._bytes]
+
+        lo = 0
+        hi = len(self._chunks) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self._chunks[mid][0] <= row:
+                lo = mid
+            else:
+                hi = mid - 1
+        return self._loadChunk(lo)
+
+    def _iterChunks(self):
+        for idx in range(len(self._chunks)):
+            yield self._loadChunk(idx)
+        yield self._base, self._cols + [self._bytes]
+
+    def _getRow(self, cols, idx):
+        pcs, vas, sizes, paths, offs, data = cols
+        if self.data:
+            off = offs[idx]
+            return (pcs[idx], vas[idx], bytes(data[off:off + sizes[idx]]))
+        return (pcs[idx], vas[idx], sizes[idx])
+
+    def getRow(self, row):
+        '''
+        Return the tuple for the given row number.
+        '''
+        if row < 0:
+            row += self._rows
+        if row < 0 or row >= self._rows:
+            raise IndexError(row)
+
+        first, cols = self._getChunk(row)
+        return self._getRow(cols, row - first)
+
+    __getitem__ = getRow
+
+    def __iter__(self):
+        for first, cols in self._iterChunks():
+            for idx in range(len(cols[0])):
+                yield self._getRow(cols, idx)
+
+    def iterRows(self, first, end):
+        '''
+        Yield the tuples for the rows from first up to end.
+        '''
+        row = first
+        while row < end:
+            base, cols = self._getChunk(row)
+            stop = min(end, base + len(cols[0]))
+            for idx in range(row - base, stop - base):
+                yield self._getRow(cols, idx)
+            row = stop
+
+    def getPathRuns(self, pathid):
+        '''
+        Return the list of [firstrow, endrow] runs of rows for a path id.
+        '''
+        return self._runs.get(pathid, ())
+
+    def getPathView(self, pathid):
+        return TracePathView(self, pathid)
+
+    def toNumpy(self, bigend=False):
+        '''
+        Return a dict of numpy arrays for the pc, va, size and path columns
+        (and, for buffers with data, a value column holding the bytes of
+        the 1, 2, 4 and 8 byte accesses as unsigned integers).
+        '''
+        if numpy is None:
+            raise Exception('TraceBuffer.toNumpy() requires numpy')
+
+        parts = []
+        for first, cols in self._iterChunks():
+            pcs, vas, sizes, paths, offs, data = cols
+            part = {
+                'pc': numpy.array(pcs, dtype=numpy.uint64),
+                'va': numpy.array(vas, dtype=numpy.uint64),
+                'size': numpy.array(sizes, dtype=numpy.uint32),
+                'path': numpy.array(paths, dtype=numpy.uint32),
+            }
+
+            if self.data:
+                value = numpy.zeros(len(pcs), dtype=numpy.uint64)
+                raw = numpy.frombuffer(bytes(data), dtype=numpy.uint8)
+                offs = numpy.array(offs, dtype=numpy.int64)
+                for size in (1, 2, 4, 8):
+                    idx = numpy.nonzero(part['size'] == size)[0]
+                    if not len(idx):
+                        continue
+
+                    dtype = numpy.dtype('%su%d' % (('<', '>')[bool(bigend)], size))
+                    vals = raw[offs[idx, None] + numpy.arange(size)]
+                    value[idx] = numpy.ascontiguousarray(vals).view(dtype).reshape(-1)
+                part['value'] = value
+
+            parts.append(part)
+
+        return dict((name, numpy.concatenate([p[name] for p in parts])) for name in parts[0])
+
+    def close(self):
+        '''
+        Close (and remove) the spill file (the rows spilled to it are gone
+        after this).
+        '''
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+            self._chunks = []
+            self._loaded = None
+
+
+class TracePathView:
+    '''
+    The rows of a TraceBuffer for one code path, which iterate, index and
+    append like the list of tuples the path node used to hold.
+    '''
+    def __init__(self, buf, pathid):
+        self.buf = buf
+        self.pathid = pathid
+
+    def __len__(self):
+        return sum(end - first for first, end in self.buf.getPathRuns(self.pathid))
+
+    def __nonzero__(self):
+        return bool(self.buf.getPathRuns(self.pathid))
+
+    __bool__ = __nonzero__
+
+    def __iter__(self):
+        for first, end in list(self.buf.getPathRuns(self.pathid)):
+            for row in self.buf.iterRows(first, end):
+                yield row
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return list(self)[idx]
+
+        if idx < 0:
+            idx += len(self)
+
+        if idx >= 0:
+            for first, end in self.buf.getPathRuns(self.pathid):
+                if idx < end - first:
+                    return self.buf.getRow(first + idx)
+                idx -= end - first
+
+        raise IndexError(idx)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def append(self, row):
+        pc, va, val = row
+        if self.buf.data:
+            self.buf.append(pc, va, len(val), self.pathid, data=val)
+        else:
+            self.buf.append(pc, va, val, self.pathid)
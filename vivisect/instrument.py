@@ -0,0 +1,155 @@
+'''
+Timing and event instrumentation for workspace analysis passes.
+
+When enabled (see VivWorkspace.enableInstrumentation) the workspace records
+for each analysis module (both extended and function modules) the number
+of calls, the wall and CPU time spent in it, the workspace events fired
+while it was the innermost running module, and the number of instructions
+emulated on its behalf.  Per-function wall/CPU time and emulated
+instructions are also recorded for each function analysis module.
+
+Module times are inclusive (an extended module which creates functions
+includes the time of the function modules it triggers) while events and
+emulated instructions are attributed to the innermost running module.
+'''
+import os
+import json
+import time
+import collections
+
+import vivisect.const as viv_const
+
+event_names = dict((v, k) for k, v in vars(viv_const).items() if k.startswith('VWE_'))
+
+
+def cputime():
+    t = os.times()
+    return t[0] + t[1]
+
+
+class AnalysisInstrument(object):
+
+    def __init__(self):
+        self.modules = {}
+        self.functions = collections.defaultdict(dict)
+        self.stack = []
+
+    def clear(self):
+        self.modules = {}
+        self.functions = collections.defaultdict(dict)
+        self.stack = []
+
+    def _getModStats(self, modname, kind):
+        mstats = self.modules.get(modname)
+        if mstats is None:
+            mstats = {
+                'kind': kind,
+                'calls': 0,
+                'wall': 0.0,
+                'cpu': 0.0,
+                'emu_insns': 0,
+                'events': collections.defaultdict(int),
+            }
+            self.modules[modname] = mstats
+        elif mstats['kind'] != kind:
+            # Some modules are both extended and function modules
+            mstats['kind'] = 'both'
+        return mstats
+
+    def enter(self, modname, fva=None):
+        '''
+        Mark the start of a call to the given analysis module (for the
+        function fva if it's a function module).
+        '''
+        kind = 'function' if fva is not None else 'extended'
+        mstats = self._getModStats(modname, kind)
+        self.stack.append([mstats, modname, fva, time.time(), cputime(), 0])
+
+    def leave(self):
+        '''
+        Mark the end of the most recently entered analysis module call.
+        '''
+        mstats, modname, fva, wall, cpu, insns = self.stack.pop()
+        wall = time.time() - wall
+        cpu = cputime() - cpu
+
+        mstats['calls'] += 1
+        mstats['wall'] += wall
+        mstats['cpu'] += cpu
+
+        if fva is not None:
+            fstats = self.functions[fva].get(modname)
+            if fstats is None:
+                fstats = [0.0, 0.0, 0]
+                self.functions[fva][modname] = fstats
+            fstats[0] += wall
+            fstats[1] += cpu
+            fstats[2] += insns
+
+    def event(self, event):
+        if self.stack:
+            self.stack[-1][0]['events'][event] += 1
+
+    def emuInstructions(self, count):
+        if self.stack:
+            frame = self.stack[-1]
+            frame[0]['emu_insns'] += count
+            frame[5] += count
+
+    def getModuleStats(self):
+        '''
+        Return a dictionary of modname -> stats dict where each stats dict
+        contains "kind" (extended/function/both), "calls", "wall", "cpu",
+        "emu_insns" and "events" (a dict of event name -> count).
+        '''
+        ret = {}
+        for modname, mstats in self.modules.items():
+            mstats = dict(mstats)
+            mstats['events'] = dict((event_names.get(e, str(e)), c) for e, c in mstats['events'].items())
+            ret[modname] = mstats
+        return ret
+
+    def getFunctionStats(self, fva=None):
+        '''
+        Return a dictionary of fva -> { modname: (wall, cpu, emu_insns) }
+        (or just the inner dictionary if fva is specified).
+        '''
+        if fva is not None:
+            return dict((m, tuple(s)) for m, s in self.functions.get(fva, {}).items())
+
+        ret = {}
+        for fva, fmods in self.functions.items():
+            ret[fva] = dict((m, tuple(s)) for m, s in fmods.items())
+        return ret
+
+    def getFunctionTotals(self):
+        '''
+        Return a dictionary of fva -> (wall, cpu, emu_insns, slowest modname)
+        summed across all function analysis modules.
+        '''
+        ret = {}
+        for fva, fmods in self.functions.items():
+            wall = sum(s[0] for s in fmods.values())
+            cpu = sum(s[1] for s in fmods.values())
+            insns = sum(s[2] for s in fmods.values())
+            slowest = max(fmods.items(), key=lambda x: x[1][0])[0]
+            ret[fva] = (wall, cpu, insns, slowest)
+        return ret
+
+    def getStats(self):
+        '''
+        Return a JSON serializable dictionary of all the recorded stats.
+        '''
+        funcs = {}
+        for fva, fmods in self.getFunctionStats().items():
+            funcs['0x%.8x' % fva] = dict((m, {'wall': s[0], 'cpu': s[1], 'emu_insns': s[2]})
+                                         for m, s in fmods.items())
+
+        return {
+            'modules': self.getModuleStats(),
+            'functions': funcs,
+        }
+
+    def saveJson(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.getStats(), f, indent=2, sort_keys=True)
@@ -5,6 +5,7 @@ import logging
 import Elf
 import vivisect
 import vivisect.parsers as v_parsers
+import vivisect.demangle as v_demangle
 import envi.bits as e_bits
 
 from vivisect.const import *
@@ -395,15 +396,19 @@ def loadElfIntoWorkspace(vw, elf, filename=None, baseaddr=None):
     # applyRelocs is specifically prior to "process Dynamic Symbols" because Dynamics-only symbols
     # (ie. not using Section Headers) may not get all the symbols.  Some ELF's simply list too
     # small a space using SYMTAB and SYMTABSZ
+    demangleElfNames(vw, elf)
     applyRelocs(elf, vw, addbase, baseaddr)
 
     # process Dynamic Symbols - this must happen *after* relocations, which can expand the size of this
-    for s in elf.getDynSyms():
-        stype = s.getInfoType()
-        sva = s.st_value
-
+    dynsyms = elf.getDynSyms()
+    for i in range(len(dynsyms)):
+        # (undefined symbols are skipped without building the symbol)
+        sva = dynsyms.getValue(i, 'st_value')
         if sva == 0:
             continue
+
+        s = dynsyms[i]
+        stype = s.getInfoType()
         if addbase:
             sva += baseaddr
         if sva == 0:
@@ -461,6 +466,8 @@ def loadElfIntoWorkspace(vw, elf, filename=None, baseaddr=None):
 
     # apply symbols to workspace (if any)
     relocs = elf.getRelocs()
+    # (built on the first symbol with no value: demangled name -> first reloc)
+    relocsbyname = None
     impvas = [va for va, x, y, z in vw.getImports()]
     expvas = [va for va, x, y, z in vw.getExports()]
     for s in elf.getSymbols():
@@ -499,12 +506,15 @@ def loadElfIntoWorkspace(vw, elf, filename=None, baseaddr=None):
         # if the symbol has a value of 0, it is likely a relocation point which gets updated
         sname = demangle(s.name)
         if sva == 0:
-            for reloc in relocs:
-                rname = demangle(reloc.name)
-                if rname == sname:
-                    sva = reloc.r_offset
-                    logger.info('sva==0, using relocation name: %x: %r', sva, rname)
-                    break
+            if relocsbyname is None:
+                relocsbyname = {}
+                for reloc in relocs:
+                    relocsbyname.setdefault(demangle(reloc.name), reloc)
+
+            reloc = relocsbyname.get(sname)
+            if reloc is not None:
+                sva = reloc.r_offset
+                logger.info('sva==0, using relocation name: %x: %r', sva, sname)
 
         dmglname = demangle(sname)
 
@@ -777,12 +787,17 @@ def demangle(name):
     '''
     Translate C++ mangled name back into the verbose C++ symbol name (with helpful type info)
     '''
-    name = normName(name)
+    return v_demangle.demangle(normName(name))
 
-    try:
-        import cxxfilt
-        name = cxxfilt.demangle(name)
-    except Exception as e:
-        logger.debug('failed to demangle name (%r): %r', name, e)
+def demangleElfNames(vw, elf):
+    '''
+    Demangle all the symbol, dynamic symbol and relocation names of the
+    Elf in one batch (so the loader's demangle() calls are cache hits).
+    '''
+    names = set()
+    for tbl in (elf.getDynSyms(), elf.getSymbols(), elf.getRelocs()):
+        for i in range(len(tbl)):
+            names.add(normName(tbl.getName(i)))
 
-    return name
+    workers = vw.config.viv.parsers.elf.demangle_workers
+    v_demangle.demangleMany(names, workers=workers)
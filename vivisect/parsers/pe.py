@@ -483,9 +483,9 @@ def loadPeIntoWorkspace(vw, pe, filename=None, baseaddr=None):
     if carvepes:
         pe.fd.seek(0)
         fbytes = pe.fd.read()
-        for offset, i in pe_carve.carve(fbytes, 1):
+        for offset, xkey in pe_carve.carveXor(fbytes, 1):
             # Found a sub-pe!
-            subpe = pe_carve.CarvedPE(fbytes, offset, chr(i))
+            subpe = pe_carve.CarvedPE(fbytes, offset, xkey)
             pebytes = subpe.readAtOffset(0, subpe.getFileSize())
             rva = pe.offsetToRva(offset) + baseaddr
             vw.markDeadData(rva, rva+len(pebytes))
@@ -21,7 +21,7 @@ def cmpoffset(x,y):
 
 
 class WorkspaceRenderer(e_canvas.MemoryRenderer):
-    def __init__(self, vw):
+    def __init__(self, vw, cache=True):
         self.vw = vw
 
         # Some tweakables...
@@ -29,12 +29,59 @@ class WorkspaceRenderer(e_canvas.MemoryRenderer):
         self._show_address = True
         self._show_opbytes = True
 
+        # Rendered locations are recorded and replayed until a workspace
+        # event touches them (see VivWorkspace.addRenderCache()).
+        self._rend_cache = None
+        if cache:
+            self._rend_cache = e_canvas.RenderCache()
+            vw.addRenderCache(self._rend_cache)
+
+    def clearCache(self):
+        '''
+        Drop all cached renders (call after changing the _show_* options).
+        '''
+        if self._rend_cache is not None:
+            self._rend_cache.clear()
+
+    def getPrevVa(self, mcanv, va):
+        loc = self.vw.getLocation(va - 1)
+        if loc is not None:
+            return loc[L_VA]
+        if self.vw.isValidPointer(va - 1):
+            return va - 1
+        return None
+
     def render(self, mcanv, va):
 
         loc = self.vw.getLocation(va)
         if loc is None:
             loc = (va, 1, LOC_UNDEF, None)
 
+        cache = self._rend_cache
+        if cache is None:
+            return self._renderLoc(mcanv, loc)
+
+        ent = cache.get(va)
+        if ent is not None:
+            lsize, ops = ent
+            e_canvas.replayCanvasOps(mcanv, ops)
+            return lsize
+
+        gen = cache.gen
+        rec = e_canvas.CanvasRecorder(mcanv.mem, syms=mcanv.syms)
+        try:
+            lsize = self._renderLoc(rec, loc)
+        finally:
+            rec.replay(mcanv)
+
+        lva = loc[L_VA]
+        deps = rec.vas
+        deps.add(va)
+        deps.update(xrange(lva, lva + lsize))
+        cache.put(va, lsize, rec.ops, deps, gen)
+        return lsize
+
+    def _renderLoc(self, mcanv, loc):
         lva, lsize, ltype, tinfo = loc
 
         extra = None
@@ -14,6 +14,8 @@ rep_mods = [
     ('Overlapped Locations', 'vivisect.reports.overlaplocs'),
     ('Function Complexity', 'vivisect.reports.funccomplexity'),
     ('Location Distribution', 'vivisect.reports.locationdist'),
+    ('Analysis Module Timing', 'vivisect.reports.analysismods'),
+    ('Function Analysis Timing', 'vivisect.reports.analysisfuncs'),
 ]
 
 
@@ -0,0 +1,19 @@
+"""Per function analysis timing (requires vw.enableInstrumentation())"""
+
+columns = (
+    ("Wall (ms)", int),
+    ("CPU (ms)", int),
+    ("Emulated Instructions", int),
+    ("Slowest Module", str),
+)
+
+
+def report(vw):
+    instr = vw.getInstrumentation()
+    if instr is None:
+        return {}
+
+    res = {}
+    for fva, (wall, cpu, insns, slowest) in instr.getFunctionTotals().items():
+        res[fva] = (int(wall * 1000), int(cpu * 1000), insns, slowest)
+    return res
@@ -0,0 +1,26 @@
+"""Per analysis module timing (requires vw.enableInstrumentation())"""
+
+columns = (
+    ("Kind", str),
+    ("Calls", int),
+    ("Wall (ms)", int),
+    ("CPU (ms)", int),
+    ("Events", int),
+    ("Emulated Instructions", int),
+)
+
+
+def report(vw):
+    instr = vw.getInstrumentation()
+    if instr is None:
+        return {}
+
+    res = {}
+    for modname, mstats in instr.getModuleStats().items():
+        res[modname] = (mstats['kind'],
+                        mstats['calls'],
+                        int(mstats['wall'] * 1000),
+                        int(mstats['cpu'] * 1000),
+                        sum(mstats['events'].values()),
+                        mstats['emu_insns'])
+    return res
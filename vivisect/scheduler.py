@@ -0,0 +1,268 @@
+'''
+Dependency aware scheduling of the extended analysis modules.
+
+Analysis modules may declare which workspace facts they read and write
+using module level "consumes" and "produces" tuples of fact names (see
+fact_events below).  Modules which don't declare them are assumed to
+read and write everything.  A module must run after an earlier registered
+module if either one writes what the other reads or writes, which leaves
+the registration order as the order but drops the false dependencies.
+
+The scheduler uses that graph to:
+
+    * skip modules whose inputs (the workspace events for the facts they
+      consume) have not changed since they last ran in this workspace
+    * run independent modules concurrently (when asked for more workers)
+    * report the critical path (the chain of dependent modules which
+      bounds the analysis time) along with each module's time
+
+Example (in an analysis module):
+
+    consumes = ('memory', 'files')
+    produces = ('locations', 'names')
+
+    def analyze(vw):
+        ...
+'''
+import time
+import Queue
+import logging
+import threading
+
+from vivisect.const import *
+
+logger = logging.getLogger(__name__)
+
+# The workspace facts and the events which change them
+fact_events = {
+    'memory': (VWE_ADDMMAP, VWE_ADDSEGMENT),
+    'files': (VWE_ADDFILE, VWE_SETFILEMETA),
+    'meta': (VWE_SETMETA,),
+    'locations': (VWE_ADDLOCATION, VWE_DELLOCATION),
+    'xrefs': (VWE_ADDXREF, VWE_DELXREF),
+    'relocations': (VWE_ADDRELOC,),
+    'exports': (VWE_ADDEXPORT,),
+    'names': (VWE_SETNAME,),
+    'functions': (VWE_ADDFUNCTION, VWE_DELFUNCTION),
+    'funcmeta': (VWE_SETFUNCMETA, VWE_SETFUNCARGS),
+    'codeblocks': (VWE_ADDCODEBLOCK, VWE_DELCODEBLOCK),
+    'vasets': (VWE_ADDVASET, VWE_DELVASET, VWE_SETVASETROW, VWE_DELVASETROW),
+}
+
+all_facts = frozenset(fact_events.keys())
+
+# Shorthand for everything making code/functions may change (including
+# whatever the function analysis modules do)
+fact_aliases = {
+    'codeflow': ('locations', 'xrefs', 'names', 'functions', 'funcmeta', 'codeblocks', 'vasets', 'meta'),
+}
+
+# Modules which produce these run alone (the code flow context and the
+# function analysis modules are not safe to run concurrently)
+exclusive_facts = frozenset(('functions',))
+
+
+def getFacts(names):
+    '''
+    Return the frozenset of facts for the given list of fact names (or
+    all facts for None).
+    '''
+    if names is None:
+        return all_facts
+
+    ret = set()
+    for name in names:
+        alias = fact_aliases.get(name)
+        if alias is not None:
+            ret.update(alias)
+        elif name in all_facts:
+            ret.add(name)
+        else:
+            raise Exception('Unknown analysis fact: %r' % (name,))
+    return frozenset(ret)
+
+
+class AnalysisPass(object):
+
+    def __init__(self, idx, name, mod):
+        self.idx = idx
+        self.name = name
+        self.mod = mod
+        self.consumes = getFacts(getattr(mod, 'consumes', None))
+        self.produces = getFacts(getattr(mod, 'produces', None))
+        self.exclusive = bool(self.produces & exclusive_facts)
+        self.after = set()
+
+        self.skipped = False
+        self.start = None
+        self.wall = 0.0
+
+    def dependsOn(self, other):
+        return bool(self.consumes & other.produces or
+                    self.produces & other.consumes or
+                    self.produces & other.produces)
+
+
+class AnalysisScheduler(object):
+    '''
+    Schedule (and run) the given extended analysis modules for a workspace.
+    '''
+    def __init__(self, vw, modnames=None):
+        self.vw = vw
+        if modnames is None:
+            modnames = vw.amodlist
+
+        self.passes = []
+        for name in modnames:
+            p = AnalysisPass(len(self.passes), name, vw.amods.get(name))
+            for prev in self.passes:
+                if p.dependsOn(prev):
+                    p.after.add(prev.idx)
+            self.passes.append(p)
+
+        self.wall = 0.0
+
+    def getInputs(self, p):
+        '''
+        Return the current "version" of the facts the pass consumes.
+        '''
+        counts = self.vw._event_counts
+        return tuple(sum(counts[e] for e in fact_events[fact]) for fact in sorted(p.consumes))
+
+    def run(self, workers=1, force=False):
+        '''
+        Run each pass (whose inputs changed since its last run, unless
+        force) after the passes it depends on, running up to workers
+        independent passes at once.
+        '''
+        vw = self.vw
+        if workers > 1:
+            vw._event_lock = threading.RLock()
+
+        done = set()
+        running = set()
+        finq = Queue.Queue()
+        todo = list(self.passes)
+
+        starttime = time.time()
+        try:
+            while todo or running:
+                for p in list(todo):
+                    if len(running) >= workers:
+                        break
+
+                    if not p.after <= done:
+                        continue
+
+                    if running and (p.exclusive or any(self.passes[i].exclusive for i in running)):
+                        break
+
+                    todo.remove(p)
+                    inputs = self.getInputs(p)
+                    if not force and vw._amod_inputs.get(p.name) == inputs:
+                        logger.info('skipping analysis module (inputs unchanged): %s', p.name)
+                        p.skipped = True
+                        done.add(p.idx)
+                        continue
+
+                    p.skipped = False
+                    p.start = time.time() - starttime
+                    running.add(p.idx)
+                    if workers > 1:
+                        thr = threading.Thread(target=self._runPass, args=(p, finq))
+                        thr.setDaemon(True)
+                        thr.start()
+                    else:
+                        self._runPass(p, finq)
+
+                    # passes must start in order when run one at a time
+                    if workers == 1:
+                        break
+
+                if not running:
+                    continue
+
+                idx = finq.get()
+                running.discard(idx)
+                done.add(idx)
+
+        finally:
+            vw._event_lock = None
+
+        self.wall = time.time() - starttime
+
+    def _runPass(self, p, finq):
+        vw = self.vw
+        instr = vw._instr
+        start = time.time()
+
+        vw.vprint("Extended Analysis: %s" % p.mod.__name__)
+        if instr is not None:
+            instr.enter(p.name)
+        try:
+            p.mod.analyze(vw)
+        except Exception as e:
+            vw.vprint("Extended Analysis Exception %s: %s" % (p.mod.__name__, e))
+        finally:
+            if instr is not None:
+                instr.leave()
+
+            p.wall = time.time() - start
+            vw._amod_inputs[p.name] = self.getInputs(p)
+            finq.put(p.idx)
+
+    def getCriticalPath(self):
+        '''
+        Return the list of passes (by dependency) which took the longest.
+        '''
+        total = {}
+        prev = {}
+        for p in self.passes:
+            best = None
+            for i in p.after:
+                if best is None or total[i] > total[best]:
+                    best = i
+            prev[p.idx] = best
+            total[p.idx] = p.wall + (total[best] if best is not None else 0.0)
+
+        if not total:
+            return []
+
+        idx = max(total, key=lambda i: total[i])
+        path = []
+        while idx is not None:
+            path.append(self.passes[idx])
+            idx = prev[idx]
+        path.reverse()
+        return path
+
+    def getReport(self):
+        '''
+        Return a dict describing the last run:
+
+            {
+                'wall': <elapsed seconds>,
+                'serial': <total seconds of all the passes>,
+                'critical': <seconds of the critical path>,
+                'critical_path': [<module name>, ...],
+                'passes': [ {'name':..., 'wall':..., 'start':..., 'skipped':..., 'after':[...]}, ...],
+            }
+        '''
+        path = self.getCriticalPath()
+        passes = []
+        for p in self.passes:
+            passes.append({
+                'name': p.name,
+                'wall': p.wall,
+                'start': p.start,
+                'skipped': p.skipped,
+                'after': [self.passes[i].name for i in sorted(p.after)],
+            })
+
+        return {
+            'wall': self.wall,
+            'serial': sum(p.wall for p in self.passes),
+            'critical': sum(p.wall for p in path),
+            'critical_path': [p.name for p in path],
+            'passes': passes,
+        }
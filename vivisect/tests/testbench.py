@@ -0,0 +1,31 @@
+import unittest
+
+import vivisect.bench as v_bench
+
+
+class BenchTest(unittest.TestCase):
+
+    def test_bench_bestof(self):
+        runs = [
+            {'insns_per_sec': 10.0, 'analyze_sec': 3.0, 'functions': 7},
+            {'insns_per_sec': 12.0, 'analyze_sec': 4.0, 'functions': 7},
+        ]
+        best = v_bench.bestOf(runs)
+        self.assertEqual(best, {'insns_per_sec': 12.0, 'analyze_sec': 3.0, 'functions': 7})
+
+    def test_bench_compare(self):
+        old = {'results': {'a': {'insns_per_sec': 10.0, 'analyze_sec': 4.0, 'functions': 7},
+                           'b': {'insns_per_sec': 1.0}}}
+        new = {'results': {'a': {'insns_per_sec': 15.0, 'analyze_sec': 2.0, 'functions': 8}}}
+        changes = v_bench.compareResults(old, new)
+        self.assertEqual(changes, [
+            ('a', 'analyze_sec', 4.0, 2.0, 0.5),
+            ('a', 'functions', 7, 8, None),
+            ('a', 'insns_per_sec', 10.0, 15.0, 0.5),
+        ])
+
+    def test_bench_emulate(self):
+        import vivisect.bench.emulate as vb_emulate
+        for archname in vb_emulate.loops:
+            count, elapsed = vb_emulate.emulateLoop(archname)
+            self.assertTrue(count > 1000)
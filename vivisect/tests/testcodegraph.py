@@ -1,9 +1,15 @@
 import logging
+import binascii
 import unittest
 
+import envi
+import vivisect
 import vivisect.codegraph as v_codegraph
+import vivisect.tools.graphutil as v_t_graphutil
 import vivisect.tests.helpers as helpers
 
+import visgraph.graphcore as vg_graphcore
+
 logger = logging.getLogger(__name__)
 
 class GraphCoreTest(unittest.TestCase):
@@ -46,3 +52,60 @@ class GraphCoreTest(unittest.TestCase):
         ]
         for c in codeblocks:
             self.assertTrue(cg.isCodeBlockNode(c))
+
+
+class FunctionCfgTest(unittest.TestCase):
+
+    def setUp(self):
+        # xor eax,eax; test edi,edi; jz 1009; inc eax; nop;
+        # 1009: dec edi; jnz 1002; ret
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'amd64')
+        self.vw.setMeta('Platform', 'linux')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3'))
+        self.vw.addSegment(0x1000, 14, '.text', 'test')
+        self.vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+        self.vw.makeFunction(0x1000)
+
+    def test_vivisect_codegraph_cfg(self):
+        cfg = self.vw.getFunctionCfg(0x1000)
+        self.assertEqual(cfg.blocks, (0x1000, 0x1002, 0x1009, 0x1006, 0x100d))
+        self.assertEqual(cfg.getEdges(), [
+            (0x1000, 0x1002, False),
+            (0x1002, 0x1009, False),
+            (0x1002, 0x1006, False),
+            (0x1006, 0x1009, False),
+            (0x1009, 0x1002, True),
+            (0x1009, 0x100d, False),
+        ])
+        self.assertEqual(cfg.getSuccessors(0x1009), [0x1002, 0x100d])
+        self.assertEqual(cfg.getPredecessors(0x1002), [0x1000, 0x1009])
+        self.assertEqual(cfg.getLeaves(), [0x100d])
+
+        g = v_t_graphutil.buildFunctionGraph(self.vw, 0x1000, revloop=True)
+        self.assertEqual(len(g.getNodes()), 5)
+        self.assertEqual(g.getNode(0x1000)[1].get('rootnode'), True)
+        revs = [(e[1], e[2]) for e in g.getEdges() if e[3].get('reverse')]
+        self.assertEqual(revs, [(0x1002, 0x1009)])
+
+        # blocks already in a given graph are reused
+        g = vg_graphcore.HierGraph()
+        g.addNode(nid=0x1009, cbva=0x1009, cbsize=4, color='#f00')
+        g = v_t_graphutil.buildFunctionGraph(self.vw, 0x1000, g=g)
+        self.assertEqual(len(g.getNodes()), 5)
+        self.assertEqual(g.getNode(0x1009)[1].get('color'), '#f00')
+        self.assertEqual(len(g.getRefsToByNid(0x1009)), 2)
+
+    def test_vivisect_codegraph_cfg_cache(self):
+        cfg = self.vw.getFunctionCfg(0x1000)
+        self.assertIs(cfg, self.vw.getFunctionCfg(0x1000))
+
+        # A new xref from the end of a block must invalidate the graph
+        self.vw.addXref(0x1008, 0x100d, vivisect.REF_CODE)
+        newcfg = self.vw.getFunctionCfg(0x1000)
+        self.assertIsNot(cfg, newcfg)
+        self.assertEqual(newcfg.getSuccessors(0x1006), [0x100d, 0x1009])
+
+        # ... as must changing the code blocks
+        self.vw.delCodeBlock(0x1006)
+        self.assertNotIn(0x1006, self.vw.getFunctionCfg(0x1000).blocks)
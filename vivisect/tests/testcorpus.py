@@ -0,0 +1,106 @@
+import os
+import time
+import shutil
+import struct
+import tempfile
+import unittest
+
+import vivisect.tools.corpus as v_corpus
+
+
+def makeElf(code, base=0x8048000):
+    '''
+    Return a minimal i386 ELF executable (one PT_LOAD segment and no
+    sections) which runs code.
+    '''
+    hdrsize = 0x34 + 0x20
+    ehdr = '\x7fELF\x01\x01\x01' + '\x00' * 9
+    ehdr += struct.pack('<HHIIIIIHHHHHH', 2, 3, 1, base + hdrsize, 0x34, 0, 0, 0x34, 0x20, 1, 0x28, 0, 0)
+    size = hdrsize + len(code)
+    phdr = struct.pack('<IIIIIIII', 1, 0, base, base, size, size, 5, 0x1000)
+    return ehdr + phdr + code
+
+# push ebp; mov ebp,esp; xor eax,eax; pop ebp; ret
+smallcode = '\x55\x89\xe5\x31\xc0\x5d\xc3'
+
+# (a few seconds of analysis) push ebp; mov ebp,esp; call $+8; pop ebp; ret
+slowcode = ('\x55\x89\xe5\xe8\x03\x00\x00\x00\x5d\xc3') * 500
+
+
+class CorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.indir = os.path.join(self.tmpdir, 'in')
+        self.outdir = os.path.join(self.tmpdir, 'out')
+        os.makedirs(os.path.join(self.indir, 'sub'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def addFile(self, relpath, byts):
+        fpath = os.path.join(self.indir, relpath)
+        with open(fpath, 'wb') as f:
+            f.write(byts)
+        return fpath
+
+    def test_corpus_walk(self):
+        elf = self.addFile('b.elf', makeElf(smallcode))
+        pe = self.addFile(os.path.join('sub', 'a.exe'), 'MZ' + '\x00' * 64)
+        self.addFile('notes.txt', 'not a binary')
+        self.addFile('tiny', 'MZ')
+
+        self.assertEqual(list(v_corpus.walkCorpus([self.indir])),
+                         [(elf, 'b.elf'), (pe, os.path.join('sub', 'a.exe'))])
+        self.assertEqual(list(v_corpus.walkCorpus([pe])), [(pe, 'a.exe')])
+        self.assertEqual(list(v_corpus.walkCorpus([self.indir], formats=('pe',))),
+                         [(pe, os.path.join('sub', 'a.exe'))])
+
+    def test_corpus_names(self):
+        fpath = self.addFile('b.elf', makeElf(smallcode))
+        self.assertEqual(v_corpus.getOutputName(fpath, 'b.elf'), fpath + '.viv')
+        self.assertEqual(v_corpus.getOutputName(fpath, os.path.join('sub', 'b.elf'), outdir=self.outdir),
+                         os.path.join(self.outdir, 'sub', 'b.elf.viv'))
+
+        outname = fpath + '.viv'
+        self.assertFalse(v_corpus.isUpToDate(fpath, outname))
+
+        with open(outname, 'wb') as f:
+            f.write('VIV')
+        now = time.time()
+        os.utime(outname, (now, now))
+        os.utime(fpath, (now - 10, now - 10))
+        self.assertTrue(v_corpus.isUpToDate(fpath, outname))
+
+        os.utime(fpath, (now + 10, now + 10))
+        self.assertFalse(v_corpus.isUpToDate(fpath, outname))
+
+    def test_corpus_analyze(self):
+        good = self.addFile(os.path.join('sub', 'good'), makeElf(smallcode))
+        bad = self.addFile('bad.exe', 'MZ' + '\x00' * 64)
+
+        recs = dict((rec['file'], rec) for rec in v_corpus.analyzeCorpus([self.indir], jobs=2, outdir=self.outdir))
+        self.assertEqual(recs[good]['status'], 'ok')
+        self.assertEqual(recs[good]['stats']['functions'], 1)
+        self.assertEqual(recs[bad]['status'], 'error')
+        self.assertIn('Traceback', recs[bad]['error'])
+
+        outname = os.path.join(self.outdir, 'sub', 'good.viv')
+        self.assertEqual(recs[good]['output'], outname)
+        self.assertTrue(os.path.isfile(outname))
+        self.assertFalse(os.path.exists(outname + '.tmp'))
+
+        # the good one is now up to date (and the bad one is retried)
+        recs = dict((rec['file'], rec['status']) for rec in v_corpus.analyzeCorpus([self.indir], outdir=self.outdir))
+        self.assertEqual(recs, {good: 'skipped', bad: 'error'})
+
+        recs = dict((rec['file'], rec['status']) for rec in v_corpus.analyzeCorpus([good], outdir=self.outdir, force=True))
+        self.assertEqual(recs, {good: 'ok'})
+
+    def test_corpus_timeout(self):
+        slow = self.addFile('slow', makeElf(slowcode))
+
+        recs = list(v_corpus.analyzeCorpus([slow], timeout=0.25))
+        self.assertEqual([rec['status'] for rec in recs], ['timeout'])
+        self.assertFalse(os.path.exists(slow + '.viv'))
+        self.assertFalse(v_corpus.isUpToDate(slow, slow + '.viv'))
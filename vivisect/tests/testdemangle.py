@@ -0,0 +1,59 @@
+import unittest
+
+import vivisect.demangle as v_demangle
+
+from vivisect.demangle import itanium
+
+names = (
+    ('_Z1fIiEvT_', 'void f<int>(int)'),
+    ('_ZNSsC1Ev', 'std::basic_string<char, std::char_traits<char>, std::allocator<char> >::basic_string()'),
+    ('_ZNK1A1fEv', 'A::f() const'),
+    ('_Z1gPFviE', 'g(void (*)(int))'),
+    ('_Z1hRA10_i', 'h(int (&) [10])'),
+    ('_ZTV1A', 'vtable for A'),
+    ('_ZTI1A', 'typeinfo for A'),
+    ('_ZN1A1fEv.cold', 'A::f() [clone .cold]'),
+    ('_ZNSt6vectorIiSaIiEE9push_backERKi', 'std::vector<int, std::allocator<int> >::push_back(int const&)'),
+    ('_Z1fIJidEEvDpT_', 'void f<int, double>(int, double)'),
+)
+
+
+class DemangleTest(unittest.TestCase):
+
+    def test_demangle_itanium(self):
+        for name, dname in names:
+            self.assertEqual(itanium.demangle(name), dname)
+
+        for name in ('main', '_Z', '_Z1', '_ZN1A1fEvX'):
+            self.assertRaises(itanium.DemangleError, itanium.demangle, name)
+
+    def test_demangle_names(self):
+        # unmangled or broken names come back as is
+        for name in ('main', '_start', '_Z1'):
+            self.assertEqual(v_demangle.demangleName(name), name)
+
+    def test_demangle_cache(self):
+        dmgl = v_demangle.Demangler(maxcache=4)
+        for name, dname in names:
+            self.assertEqual(dmgl.demangle(name), dname)
+            self.assertLessEqual(len(dmgl.cache), 4)
+
+        self.assertEqual(dmgl.cache.get(names[-1][0]), names[-1][1])
+        dmgl.clearCache()
+        self.assertEqual(dmgl.cache, {})
+
+    def test_demangle_many(self):
+        dmgl = v_demangle.Demangler()
+        todo = [name for name, dname in names] * 2 + ['main']
+        ret = dmgl.demangleMany(todo)
+        self.assertEqual(len(ret), len(names) + 1)
+        self.assertEqual(ret['main'], 'main')
+        for name, dname in names:
+            self.assertEqual(ret[name], dname)
+            self.assertEqual(dmgl.cache[name], dname)
+
+        # enough names to use the worker pool
+        todo = ['_ZN1A%d%sEv' % (len('f%d' % i), 'f%d' % i) for i in range(v_demangle.WORKER_MIN_NAMES * 2)]
+        ret = dmgl.demangleMany(todo, workers=2)
+        self.assertEqual(ret['_ZN1A2f0Ev'], 'A::f0()')
+        self.assertEqual(ret['_ZN1A4f511Ev'], 'A::f511()')
@@ -295,3 +295,95 @@ class ELFTests(unittest.TestCase):
             vw = viv_cli.VivCli()
             vw.loadFromFile(fn)
 
+
+
+class ElfTableTests(unittest.TestCase):
+
+    def buildSymtab(self, cls, bigend, count):
+        # packed symbols with st_name == index * 4 and st_value == index * 0x10
+        sym = cls(bigend=bigend)
+        strtab = ''
+        bytez = ''
+        for i in range(count):
+            sym.st_name = i * 4
+            sym.st_value = i * 0x10
+            sym.st_info = (Elf.STB_GLOBAL << 4) | Elf.STT_FUNC
+            sym.st_shndx = 1
+            bytez += sym.vsEmit()
+            strtab += 's%.2d\x00' % i
+        return bytez, strtab
+
+    def test_elf_records(self):
+        for cls, bigend in ((Elf.Elf32Symbol, False), (Elf.Elf32Symbol, True),
+                            (Elf.Elf64Symbol, False), (Elf.Elf64Symbol, True)):
+            bytez, strtab = self.buildSymtab(cls, bigend, 20)
+
+            names = []
+            def namer(recs, idx):
+                names.append(idx)
+                stname = recs.columns['st_name'][idx]
+                return strtab[stname:strtab.find('\x00', stname)]
+
+            recs = Elf.ElfRecords(cls, bigend, bytez, namer=namer)
+            self.assertEqual(len(recs), 20)
+            self.assertEqual(recs.columns['st_value'], tuple(range(0, 0x140, 0x10)))
+            self.assertEqual(recs.getValue(3, 'st_name'), 12)
+
+            sym = recs.getRecord(5)
+            self.assertIs(recs.getRecord(5), sym)
+            self.assertEqual(sym.getName(), 's05')
+            self.assertEqual(sym.vsEmit(), bytez[5 * len(sym):6 * len(sym)])
+            self.assertEqual(names, [5])
+
+            # a record object built by vsParse() is the same
+            vssym = cls(bigend=bigend)
+            vssym.vsParse(bytez, offset=7 * len(sym), fast=True)
+            vssym.setName('s07')
+            self.assertEqual(recs.getRecord(7).tree(), vssym.tree())
+
+            # padded (larger) entries
+            entsize = len(sym) + 8
+            padded = ''.join([bytez[i * len(sym):(i + 1) * len(sym)] + 'A' * 8 for i in range(20)])
+            precs = Elf.ElfRecords(cls, bigend, padded, entsize=entsize)
+            self.assertEqual(len(precs), 20)
+            self.assertEqual(precs.columns['st_value'], recs.columns['st_value'])
+            self.assertEqual(precs.getRecord(19).vsEmit(), recs.getRecord(19).vsEmit())
+
+            self.assertRaises(Exception, Elf.ElfRecords, cls, bigend, bytez, entsize=len(sym) - 1)
+
+    def test_elf_table(self):
+        bytez, strtab = self.buildSymtab(Elf.Elf64Symbol, False, 10)
+
+        def namer(recs, idx):
+            stname = recs.columns['st_name'][idx]
+            return strtab[stname:strtab.find('\x00', stname)]
+
+        recs = Elf.ElfRecords(Elf.Elf64Symbol, False, bytez, namer=namer)
+        table = Elf.ElfTable()
+        table.addRecords(recs, [1, 3, 5])
+        table.addRecords(recs)
+        self.assertEqual(len(table), 13)
+
+        # names and values don't build the records
+        self.assertEqual(table.getName(1), 's03')
+        self.assertEqual(table.getValue(2, 'st_value'), 0x50)
+        self.assertEqual(recs._recs, [None] * 10)
+
+        self.assertEqual(table[0].getName(), 's01')
+        self.assertEqual(table[-1].getName(), 's09')
+        self.assertEqual([s.st_value for s in table[3:6]], [0, 0x10, 0x20])
+
+        # slices (copies) share the built records
+        copy = table[:]
+        self.assertIs(copy[0], table[0])
+        self.assertIs(copy[4], table[4])
+
+        sym = Elf.Elf64Symbol()
+        sym.setName('added')
+        table.append(sym)
+        table.extend([sym])
+        self.assertEqual(len(table), 15)
+        self.assertEqual(len(copy), 13)
+        self.assertEqual(table.getName(14), 'added')
+        self.assertEqual(table.getValue(14, 'st_value'), 0)
+        self.assertEqual([s.getName() for s in table][:4], ['s01', 's03', 's05', 's00'])
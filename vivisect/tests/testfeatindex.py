@@ -0,0 +1,49 @@
+import binascii
+import unittest
+
+import envi
+import vivisect
+import vivisect.analysis.crypto.constants as v_a_constants
+
+
+class FeatureIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # mov eax,0x67452301; mov ebx,0xefcdab89; mov ecx,0x98badcfe;
+        # mov edx,0x10325476; mov eax,dword [rip + 4070]; ret
+        code = binascii.unhexlify('b801234567bb89abcdefb9fedcba98ba765432108b05e60f0000c3')
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'amd64')
+        self.vw.setMeta('Platform', 'linux')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', code)
+        self.vw.addSegment(0x1000, len(code), '.text', 'test')
+        self.vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+        self.vw.makeFunction(0x1000)
+
+    def checkQueries(self, vw):
+        self.assertEqual(vw.findImmediate(0x67452301), [0x1000])
+        self.assertEqual(vw.findImmediate(0x41414141), [])
+        self.assertEqual(vw.findMnemonic('mov'), [0x1000, 0x1005, 0x100a, 0x100f, 0x1014])
+        self.assertEqual(vw.findMnemonic('ret'), [0x101a])
+        self.assertEqual(vw.findReference(0x2000), [0x1014])
+
+        self.assertEqual(vw.findFunctionsUsingAll(imms=v_a_constants.md5_inits), [0x1000])
+        self.assertEqual(vw.findFunctionsUsingAll(imms=v_a_constants.md5_inits, mnems=('ret',)), [0x1000])
+        self.assertEqual(vw.findFunctionsUsingAll(imms=v_a_constants.md5_inits, mnems=('cpuid',)), [])
+
+    def test_featindex_queries(self):
+        self.checkQueries(self.vw)
+
+    def test_featindex_events(self):
+        # A workspace built from events indexes its opcodes on demand
+        vw = vivisect.VivWorkspace()
+        vw.importWorkspace(self.vw.exportWorkspace())
+        self.checkQueries(vw)
+
+        vw.delLocation(0x1000)
+        self.assertEqual(vw.findImmediate(0x67452301), [])
+        self.assertEqual(vw.findFunctionsUsingAll(imms=v_a_constants.md5_inits), [])
+
+    def test_featindex_crypto_constants(self):
+        v_a_constants.analyze(self.vw)
+        self.assertEqual(self.vw.getVaSetRows('Crypto Constants'), [(0x1000, 'MD5 Init')])
@@ -0,0 +1,65 @@
+import unittest
+
+import vivisect
+import vivisect.const as v_const
+import vivisect.instrument as v_instrument
+
+
+class InstrumentTest(unittest.TestCase):
+
+    def test_instrument_nesting(self):
+        instr = v_instrument.AnalysisInstrument()
+
+        instr.enter('amod')
+        instr.event(v_const.VWE_ADDFUNCTION)
+
+        instr.enter('fmod', 0x1000)
+        instr.event(v_const.VWE_ADDCODEBLOCK)
+        instr.event(v_const.VWE_ADDCODEBLOCK)
+        instr.emuInstructions(10)
+        instr.leave()
+
+        instr.enter('fmod', 0x2000)
+        instr.emuInstructions(5)
+        instr.leave()
+
+        instr.leave()
+
+        # events fired outside any module are not attributed
+        instr.event(v_const.VWE_SETMETA)
+
+        mstats = instr.getModuleStats()
+        self.assertEqual(mstats['amod']['kind'], 'extended')
+        self.assertEqual(mstats['amod']['calls'], 1)
+        self.assertEqual(mstats['amod']['events'], {'VWE_ADDFUNCTION': 1})
+        self.assertEqual(mstats['amod']['emu_insns'], 0)
+        self.assertEqual(mstats['fmod']['kind'], 'function')
+        self.assertEqual(mstats['fmod']['calls'], 2)
+        self.assertEqual(mstats['fmod']['events'], {'VWE_ADDCODEBLOCK': 2})
+        self.assertEqual(mstats['fmod']['emu_insns'], 15)
+        self.assertTrue(mstats['amod']['wall'] >= mstats['fmod']['wall'])
+
+        fstats = instr.getFunctionStats()
+        self.assertEqual(sorted(fstats.keys()), [0x1000, 0x2000])
+        self.assertEqual(fstats[0x1000]['fmod'][2], 10)
+
+        totals = instr.getFunctionTotals()
+        self.assertEqual(totals[0x2000][2:], (5, 'fmod'))
+
+        stats = instr.getStats()
+        self.assertEqual(sorted(stats['functions'].keys()), ['0x00001000', '0x00002000'])
+
+    def test_instrument_workspace(self):
+        vw = vivisect.VivWorkspace()
+        self.assertIsNone(vw.getInstrumentation())
+
+        instr = vw.enableInstrumentation()
+        self.assertIs(vw.getInstrumentation(), instr)
+
+        instr.enter('amod')
+        vw.setMeta('foo', 'bar')
+        instr.leave()
+        self.assertEqual(instr.getModuleStats()['amod']['events'], {'VWE_SETMETA': 1})
+
+        vw.enableInstrumentation(False)
+        self.assertIsNone(vw.getInstrumentation())
@@ -0,0 +1,78 @@
+import random
+import binascii
+import unittest
+
+import envi.memory
+import vivisect
+import vivisect.tools.pathengine as v_t_pathengine
+
+from vivisect.codegraph import FunctionCfg
+
+
+class PathEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        # xor eax,eax; test edi,edi; jz 1009; inc eax; nop;
+        # 1009: dec edi; jnz 1002; ret
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'amd64')
+        self.vw.setMeta('Platform', 'linux')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3'))
+        self.vw.addSegment(0x1000, 14, '.text', 'test')
+        self.vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+        self.vw.makeFunction(0x1000)
+
+    def test_vivisect_pathengine_paths(self):
+        peng = v_t_pathengine.getFunctionPathEngine(self.vw, 0x1000)
+        self.assertEqual(peng.countPaths(), 2)
+        self.assertEqual(sorted(peng.iterPaths()), [
+            (0x1000, 0x1002, 0x1006, 0x1009, 0x100d),
+            (0x1000, 0x1002, 0x1009, 0x100d),
+        ])
+        self.assertEqual(list(peng.iterPaths(thruva=0x1006)), [(0x1000, 0x1002, 0x1006, 0x1009, 0x100d)])
+        self.assertEqual(sorted(peng.iterPaths(fromva=0x1002, tova=0x1009)), [
+            (0x1002, 0x1006, 0x1009),
+            (0x1002, 0x1009),
+        ])
+
+        peng = v_t_pathengine.getFunctionPathEngine(self.vw, 0x1000, loopcnt=1)
+        self.assertEqual(peng.countPathsByLoopBound(), [2, 6])
+        self.assertEqual(peng.countPaths(thruva=0x1006), 4)
+        self.assertEqual(len(list(peng.iterPaths(maxpath=5))), 5)
+
+        paths = set(peng.iterPaths())
+        self.assertEqual(len(paths), 6)
+        self.assertIn((0x1000, 0x1002, 0x1009, 0x1002, 0x1006, 0x1009, 0x100d), paths)
+        # paths to tova end at each visit
+        self.assertEqual(peng.countPaths(tova=0x1009), 6)
+
+        samples = peng.samplePaths(50, thruva=0x1006, rand=random.Random(1))
+        self.assertEqual(len(samples), 50)
+        for path in samples:
+            self.assertIn(path, paths)
+            self.assertIn(0x1006, path)
+
+    def test_vivisect_pathengine_cover(self):
+        peng = v_t_pathengine.getFunctionPathEngine(self.vw, 0x1000, loopcnt=1)
+        self.assertEqual(peng.getCoveringPaths(), [(0x1000, 0x1002, 0x1006, 0x1009, 0x100d)])
+        self.assertEqual(len(peng.getCoveringPaths(edges=True)), 2)
+
+    def test_vivisect_pathengine_switch(self):
+        # 20 sequential 8 way "switches" is 8**20 paths
+        blocks = []
+        edges = []
+        for i in range(20):
+            head = len(blocks)
+            blocks.append(head)
+            for x in range(8):
+                edges.append((head, head + 1 + x))
+                edges.append((head + 1 + x, head + 9))
+            blocks.extend(range(head + 1, head + 9))
+        blocks.append(len(blocks))
+
+        cfg = FunctionCfg(0, blocks, [1] * len(blocks), edges, [False] * len(edges))
+        peng = v_t_pathengine.CodePathEngine(cfg)
+        self.assertEqual(peng.countPaths(), 8 ** 20)
+        self.assertEqual(len(list(peng.iterPaths(maxpath=1000))), 1000)
+        self.assertEqual(len(peng.getCoveringPaths()), 8)
+        self.assertEqual(len(peng.samplePaths(10)[0]), 41)
@@ -0,0 +1,70 @@
+import struct
+import binascii
+import unittest
+
+import envi
+import vivisect
+import vivisect.const as v_const
+
+
+class ReanalyzeTest(unittest.TestCase):
+
+    def setUp(self):
+        # 0x1000: mov edi,1; call 0x1020; ret
+        # 0x1020: mov eax,edi; ret
+        # 0x1030: ret
+        # 0x1040: dq 0x1030
+        code = binascii.unhexlify('bf01000000e816000000c3')
+        code += b'\xcc' * (0x20 - len(code))
+        code += binascii.unhexlify('89f8c3')
+        code += b'\xcc' * (0x30 - len(code))
+        code += b'\xc3' + b'\xcc' * 0xf
+        code += struct.pack('<Q', 0x1030)
+
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'amd64')
+        self.vw.setMeta('Platform', 'linux')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', code)
+        self.vw.addSegment(0x1000, len(code), '.text', 'test')
+        self.vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+        self.vw.addAnalysisModule('vivisect.analysis.generic.pointers')
+        self.vw.makeFunction(0x1000)
+        self.vw.analyze()
+
+    def test_reanalyze_clean(self):
+        vw = self.vw
+        self.assertEqual(sorted(vw.getFunctions()), [0x1000, 0x1020])
+        self.assertEqual(vw.reanalyze(), set())
+
+    def test_reanalyze_callers(self):
+        vw = self.vw
+        vw.setFunctionApi(0x1020, ('int', None, 'sysvamd64call', 'foo', (('int', 'x'),)))
+        self.assertEqual(vw.reanalyze(), set([0x1000]))
+        self.assertEqual(vw.reanalyze(), set())
+
+        # setting the same api again changes nothing
+        vw.setFunctionApi(0x1020, ('int', None, 'sysvamd64call', 'foo', (('int', 'x'),)))
+        self.assertEqual(vw.reanalyze(), set())
+
+        vw.addNoReturnVa(0x1020)
+        self.assertEqual(vw.reanalyze(), set([0x1000]))
+
+        vw.delFunction(0x1020)
+        self.assertEqual(vw.reanalyze(), set([0x1000]))
+
+    def test_reanalyze_code(self):
+        vw = self.vw
+        vw.delLocation(0x100a)
+        vw.makeCode(0x100a)
+        self.assertEqual(vw.reanalyze(), set([0x1000]))
+        self.assertEqual(len(vw.getFunctionBlocks(0x1000)), 1)
+
+    def test_reanalyze_modules(self):
+        vw = self.vw
+        vw.makePointer(0x1040, follow=False)
+        self.assertIsNone(vw.getLocation(0x1030))
+
+        # the pointers module follows just the new pointer
+        vw.reanalyze()
+        self.assertEqual(vw.getLocation(0x1030)[v_const.L_LTYPE], v_const.LOC_OP)
+        self.assertEqual(vw.reanalyze(), set())
@@ -0,0 +1,70 @@
+import binascii
+import unittest
+
+import envi.memory
+import envi.memcanvas as e_memcanvas
+import vivisect
+import vivisect.renderers as viv_rend
+
+
+class WorkspaceRenderTest(unittest.TestCase):
+
+    def setUp(self):
+        # xor eax,eax; test edi,edi; jz 1009; inc eax; nop;
+        # 1009: dec edi; jnz 1002; ret
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'amd64')
+        self.vw.setMeta('Platform', 'linux')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3'))
+        self.vw.addSegment(0x1000, 14, '.text', 'test')
+        self.vw.makeFunction(0x1000)
+
+    def render(self, rend, va=0x1000, size=14):
+        canv = e_memcanvas.StringMemoryCanvas(self.vw)
+        canv.renderMemory(va, size, rend)
+        return str(canv)
+
+    def test_vivisect_render_cache(self):
+        rend = viv_rend.WorkspaceRenderer(self.vw)
+        plain = viv_rend.WorkspaceRenderer(self.vw, cache=False)
+
+        text = self.render(plain)
+        self.assertIn('jz 0x00001009', text)
+        self.assertEqual(self.render(rend), text)
+        self.assertEqual(len(rend._rend_cache), 8)
+        # replayed from the cache
+        self.assertEqual(self.render(rend), text)
+
+        # a comment drops only that location
+        self.vw.setComment(0x1006, 'woot')
+        self.assertEqual(len(rend._rend_cache), 7)
+        text = self.render(plain)
+        self.assertIn(';woot', text)
+        self.assertEqual(self.render(rend), text)
+
+        # a name drops the named location and the ones which reference it
+        self.vw.makeName(0x1009, 'looptop')
+        self.assertIsNone(rend._rend_cache.get(0x1009))
+        self.assertIsNone(rend._rend_cache.get(0x1004))
+        self.assertIsNotNone(rend._rend_cache.get(0x1000))
+        text = self.render(plain)
+        self.assertIn('looptop: [1 XREFS]', text)
+        self.assertEqual(self.render(rend), text)
+
+        self.vw.delLocation(0x1007)
+        self.assertEqual(self.render(rend), self.render(plain))
+
+    def test_vivisect_render_window(self):
+        rend = viv_rend.WorkspaceRenderer(self.vw)
+        canv = e_memcanvas.StringMemoryCanvas(self.vw)
+
+        rvas = canv.renderMemoryWindow(0x1006, 2, margin=1, rend=rend)
+        self.assertEqual(rvas, [(0x1004, 2), (0x1006, 2), (0x1008, 1), (0x1009, 2)])
+        self.assertEqual(str(canv), self.render(rend, 0x1004, 7))
+
+        # the window stops at the end of the memory map
+        canv.clearCanvas()
+        rvas = canv.renderMemoryWindow(0x100b, 10, margin=10, rend=rend)
+        self.assertEqual(rvas[0][0], 0x1000)
+        self.assertEqual(rvas[-1], (0x100d, 1))
+        self.assertEqual(canv._canv_endva, 0x100e)
@@ -0,0 +1,103 @@
+import time
+import types
+import unittest
+
+import envi
+import vivisect
+import vivisect.scheduler as v_scheduler
+
+
+def makeModule(name, analyze, consumes=None, produces=None):
+    mod = types.ModuleType(name)
+    mod.analyze = analyze
+    if consumes is not None:
+        mod.consumes = consumes
+    if produces is not None:
+        mod.produces = produces
+    return mod
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.vw = vivisect.VivWorkspace()
+        self.vw.setMeta('Architecture', 'i386')
+        self.vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', b'\x00' * 0x100)
+        self.vw.addSegment(0x1000, 0x100, '.data', 'test')
+        self.ran = []
+
+        def analyzeA(vw):
+            time.sleep(0.1)
+            self.ran.append('a')
+            vw.makeNumber(0x1000, 4)
+
+        def analyzeB(vw):
+            self.ran.append('b')
+            vw.makeName(0x1010, 'bname')
+
+        def analyzeC(vw):
+            self.ran.append('c')
+
+        def analyzeD(vw):
+            self.ran.append('d')
+            if not vw.isLocation(0x1020):
+                vw.makeNumber(0x1020, 4)
+
+        self.mods = [
+            ('a', makeModule('a', analyzeA, ('memory',), ('locations',))),
+            ('b', makeModule('b', analyzeB, ('memory',), ('names',))),
+            ('c', makeModule('c', analyzeC, ('locations',), ())),
+            ('d', makeModule('d', analyzeD)),
+        ]
+        for name, mod in self.mods:
+            self.vw.amods[name] = mod
+            self.vw.amodlist.append(name)
+
+    def test_scheduler_facts(self):
+        self.assertEqual(v_scheduler.getFacts(('names', 'names')), frozenset(['names']))
+        self.assertEqual(v_scheduler.getFacts(None), v_scheduler.all_facts)
+        self.assertTrue('functions' in v_scheduler.getFacts(('codeflow',)))
+        self.assertRaises(Exception, v_scheduler.getFacts, ('nope',))
+
+    def test_scheduler_graph(self):
+        sched = v_scheduler.AnalysisScheduler(self.vw)
+        after = dict((p.name, sorted(p.after)) for p in sched.passes)
+        self.assertEqual(after, {'a': [], 'b': [], 'c': [0], 'd': [0, 1, 2]})
+
+    def test_scheduler_run(self):
+        sched = v_scheduler.AnalysisScheduler(self.vw)
+        sched.run()
+        self.assertEqual(self.ran, ['a', 'b', 'c', 'd'])
+
+        rep = sched.getReport()
+        self.assertEqual(rep['critical_path'], ['a', 'c', 'd'])
+        self.assertTrue(rep['critical'] >= 0.1)
+        self.assertTrue(rep['serial'] >= rep['critical'])
+
+        # nothing "a" or "b" consume changed since they ran, but "d" made a
+        # location (which "c" consumes) after "c" ran (and "c" changes
+        # nothing, so "d" is skipped as well)
+        self.ran = []
+        sched = v_scheduler.AnalysisScheduler(self.vw)
+        sched.run()
+        self.assertEqual(self.ran, ['c'])
+        self.assertEqual([p['skipped'] for p in sched.getReport()['passes']], [True, True, False, True])
+
+        self.ran = []
+        sched.run(force=True)
+        self.assertEqual(self.ran, ['a', 'b', 'c', 'd'])
+
+    def test_scheduler_workers(self):
+        sched = v_scheduler.AnalysisScheduler(self.vw)
+        sched.run(workers=2)
+        # "b" does not wait for the (slow) "a"
+        self.assertEqual(self.ran, ['b', 'a', 'c', 'd'])
+        self.assertIsNone(self.vw._event_lock)
+        self.assertTrue(self.vw.isLocation(0x1000))
+        self.assertEqual(self.vw.getName(0x1010), 'bname')
+
+    def test_scheduler_analyze(self):
+        self.vw.analyze()
+        self.assertEqual(self.ran, ['a', 'b', 'c', 'd'])
+        rep = self.vw.getAnalysisReport()
+        self.assertEqual([p['name'] for p in rep['passes']], ['a', 'b', 'c', 'd'])
@@ -0,0 +1,96 @@
+import binascii
+import unittest
+
+import envi
+import vivisect
+
+
+class FunctionSummaryTest(unittest.TestCase):
+
+    def setUp(self):
+        code = {
+            # mov rax,rdi; ret
+            0x1000: '4889f8c3',
+            # mov qword [rdi+8],1; ret
+            0x1010: '48c7470801000000c3',
+            # call 0x1070 (noret); ret
+            0x1020: 'e84b000000c3',
+            # mov rdi,rsi; call 0x1000; ret
+            0x1030: '4889f7e8c8ffffffc3',
+            # call 0x1020; ret
+            0x1040: 'e8dbffffffc3',
+            # call 0x1080 (malloc); ret
+            0x1050: 'e82b000000c3',
+            # call 0x1050; ret
+            0x1060: 'e8ebffffffc3',
+            0x1070: 'c3',
+            0x1080: 'c3',
+            # sub rsp,0x18; lea rdi,[rsp]; call 0x1010; mov rax,[rsp+8]; add rsp,0x18; ret
+            0x1090: '4883ec18488d3c24e873ffffff488b4424084883c418c3',
+        }
+        mem = bytearray(b'\xcc' * 0x100)
+        for va, hexbytes in code.items():
+            byts = binascii.unhexlify(hexbytes)
+            mem[va - 0x1000:va - 0x1000 + len(byts)] = byts
+
+        self.vw = vw = vivisect.VivWorkspace()
+        vw.setMeta('Architecture', 'amd64')
+        vw.setMeta('Platform', 'linux')
+        vw.setMeta('DefaultCall', 'sysvamd64call')
+        vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', bytes(mem))
+        vw.addSegment(0x1000, len(mem), '.text', 'test')
+        vw.addFuncAnalysisModule('vivisect.analysis.generic.codeblocks')
+        vw.addFuncAnalysisModule('vivisect.analysis.amd64.emulation')
+
+        vw.addNoReturnVa(0x1070)
+        vw.makeFunction(0x1080)
+        vw.makeFunctionThunk(0x1080, 'libc.malloc')
+        for fva in (0x1000, 0x1010, 0x1020, 0x1030, 0x1040, 0x1050, 0x1060, 0x1090):
+            vw.makeFunction(fva)
+
+    def test_summary_basic(self):
+        vw = self.vw
+        summ = vw.getFunctionSummary(0x1000)
+        self.assertEqual(summ.api, vw.getFunctionApi(0x1000))
+        self.assertEqual(summ.stackdelta, 8)
+        self.assertEqual(summ.retarg, 0)
+        self.assertFalse(summ.noret)
+        self.assertFalse(summ.retalloc)
+
+        summ = vw.getFunctionSummary(0x1010)
+        self.assertEqual(summ.argwrites, ((0, 8, 8),))
+        self.assertIsNone(summ.retarg)
+
+        summ = vw.getFunctionSummary(0x1020)
+        self.assertTrue(summ.noret)
+        self.assertIsNone(summ.stackdelta)
+
+    def test_summary_callers(self):
+        vw = self.vw
+        # the callers' summaries are built from their callees'
+        self.assertEqual(vw.getFunctionSummary(0x1030).retarg, 1)
+        self.assertTrue(vw.getFunctionSummary(0x1040).noret)
+        self.assertTrue(vw.getFunctionSummary(0x1050).retalloc)
+        self.assertTrue(vw.getFunctionSummary(0x1060).retalloc)
+
+        emu = vw.getEmulator()
+        emu.runFunction(0x1090, stopva=0x10a6)
+        self.assertEqual(emu.getStackCounter(), emu.stack_pointer)
+        rax = emu.getRegisterByName('rax')
+        self.assertEqual(emu.getVivTaint(rax)[1], 'argwrite')
+        self.assertEqual(emu.reprVivValue(rax), 'sub_00001010.arg0[8]')
+
+    def test_summary_invalidate(self):
+        vw = self.vw
+        # the same api keeps the summary
+        vw.setFunctionApi(0x1000, vw.getFunctionApi(0x1000))
+        self.assertIsNotNone(vw.getFunctionSummary(0x1000))
+
+        vw.setFunctionApi(0x1000, ('int', None, 'sysvamd64call', 'foo', (('int', 'x'), ('int', 'y'))))
+        self.assertIsNone(vw.getFunctionSummary(0x1000))
+
+        vw.delFunction(0x1010)
+        self.assertIsNone(vw.getFunctionSummary(0x1010))
+
+        vw.setFunctionSummary(0x1020, None)
+        self.assertIsNone(vw.getFunctionSummary(0x1020))
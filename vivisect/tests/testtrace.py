@@ -0,0 +1,110 @@
+import binascii
+import unittest
+
+import envi
+import vivisect
+import vivisect.impemu.trace as v_i_trace
+
+import visgraph.pathcore as vg_path
+
+
+def fillBuffer(buf):
+    '''
+    Add 10 rows (rows 3, 4 and 7 for path 1, the rest for path 0) and
+    return the list of (pathid, row tuple) for them.
+    '''
+    rows = []
+    for i in range(10):
+        pathid = int(i in (3, 4, 7))
+        pc = 0x1000 + i
+        va = 0x2000 + (i * 4)
+        byts = chr(i) + '\x00\x01\x80'
+        buf.append(pc, va, 4, pathid, data=byts)
+        if buf.data:
+            rows.append((pathid, (pc, va, byts)))
+        else:
+            rows.append((pathid, (pc, va, 4)))
+    return rows
+
+
+class TraceBufferTest(unittest.TestCase):
+
+    def checkBuffer(self, buf):
+        rows = fillBuffer(buf)
+        self.assertEqual(len(buf), 10)
+        self.assertEqual(list(buf), [row for pathid, row in rows])
+        self.assertEqual(buf[5], rows[5][1])
+        self.assertEqual(buf[-1], rows[-1][1])
+        self.assertRaises(IndexError, buf.getRow, 10)
+
+        for pathid in (0, 1):
+            prows = [row for rpathid, row in rows if rpathid == pathid]
+            view = buf.getPathView(pathid)
+            self.assertEqual(len(view), len(prows))
+            self.assertEqual(list(view), prows)
+            self.assertEqual(view[1], prows[1])
+            self.assertEqual(view[-1], prows[-1])
+            self.assertEqual(view[1:3], prows[1:3])
+
+        self.assertFalse(buf.getPathView(2))
+
+        # (the view appends like the lists did)
+        view = buf.getPathView(2)
+        row = rows[0][1]
+        view.append(row)
+        self.assertEqual(list(view), [row])
+        self.assertEqual(buf[-1], row)
+
+    def test_trace_buffer(self):
+        self.checkBuffer(v_i_trace.TraceBuffer())
+        self.checkBuffer(v_i_trace.TraceBuffer(data=True))
+
+    def test_trace_spill(self):
+        buf = v_i_trace.TraceBuffer(data=True, spillrows=3)
+        self.checkBuffer(buf)
+        self.assertEqual(len(buf._chunks), 3)
+        self.assertEqual(buf._base, 9)
+        buf.close()
+
+    @unittest.skipIf(v_i_trace.numpy is None, 'numpy is not installed')
+    def test_trace_numpy(self):
+        buf = v_i_trace.TraceBuffer(data=True, spillrows=4)
+        rows = fillBuffer(buf)
+        buf.append(0x3000, 0x4000, 2, 1, data='\x01\x02')
+        buf.append(0x3000, 0x4000, 3, 1, data='\x01\x02\x03')
+
+        cols = buf.toNumpy()
+        self.assertEqual(list(cols['pc']), [row[0] for pathid, row in rows] + [0x3000, 0x3000])
+        self.assertEqual(list(cols['path']), [pathid for pathid, row in rows] + [1, 1])
+        self.assertEqual(list(cols['size']), [4] * 10 + [2, 3])
+        self.assertEqual(list(cols['value']), [0x80010000 + i for i in range(10)] + [0x0201, 0])
+        self.assertEqual(buf.toNumpy(bigend=True)['value'][1], 0x01000180)
+
+    def test_trace_emulator(self):
+        # mov qword [rsp-8],rdi; mov rax,[rsp-8]; test rax,rax; jz 1f; mov [rsp-16],rax; 1: ret
+        code = binascii.unhexlify('48897c24f8488b4424f84885c0740548894424f0c3')
+        vw = vivisect.VivWorkspace()
+        vw.setMeta('Architecture', 'amd64')
+        vw.setMeta('Platform', 'linux')
+        vw.addMemoryMap(0x1000, envi.memory.MM_RWX, 'test', code)
+        vw.addSegment(0x1000, len(code), '.text', 'test')
+
+        emu = vw.getEmulator(logread=True, logwrite=True)
+        emu.runFunction(0x1000, maxhit=1)
+
+        sp = emu.stack_pointer
+        root = emu.path
+        self.assertEqual(list(vg_path.getNodeProp(root, 'valist')), [0x1000, 0x1005, 0x100a, 0x100d])
+        self.assertEqual(vg_path.getNodeProp(root, 'readlog')[0], (0x1005, sp - 8, 8))
+        self.assertEqual(vg_path.getNodeProp(root, 'writelog')[-1][:2], (0x1000, sp - 8))
+
+        kids = vg_path.getNodeKids(root)
+        self.assertEqual(len(kids), 2)
+        for kid in kids:
+            wlog = list(vg_path.getNodeProp(kid, 'writelog'))
+            if vg_path.getNodeProp(kid, 'bva') == 0x1014:
+                self.assertEqual(wlog, [])
+            else:
+                self.assertEqual([(pc, va) for pc, va, byts in wlog], [(0x100f, sp - 16)])
+
+        self.assertEqual(len(emu.writetrace), sum(len(vg_path.getNodeProp(n, 'writelog')) for n in [root] + kids))
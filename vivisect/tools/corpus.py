@@ -0,0 +1,224 @@
+'''
+Bulk analysis of a corpus of binaries.
+
+Each input file is loaded, analyzed and saved to its own workspace in a
+fresh worker process, so one bad (or huge) sample can neither corrupt nor
+starve the analysis of the others.  Worker processes are bounded in number
+and may be given a wall clock timeout and an address space limit.
+
+Example:
+    for rec in analyzeCorpus(['/samples'], jobs=8, timeout=600):
+        print(json.dumps(rec))
+'''
+import os
+import time
+import logging
+import traceback
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import vivisect
+import vivisect.parsers as viv_parsers
+
+logger = logging.getLogger(__name__)
+
+# Formats we know how to analyze without any user supplied hints
+# (blobs need an architecture and base address).
+corpus_formats = ('pe', 'elf', 'macho', 'ihex', 'cgc')
+
+
+def walkCorpus(paths, formats=corpus_formats):
+    '''
+    Yield (filename, relpath) tuples for every analyzable file found in
+    the given list of files and directories (directories are walked
+    recursively).  The relpath is the file name relative to the directory
+    it was found in and is used to mirror the input tree in an output
+    directory.
+    '''
+    for path in paths:
+        if os.path.isfile(path):
+            if _isCorpusFile(path, formats):
+                yield path, os.path.basename(path)
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for fname in sorted(filenames):
+                fpath = os.path.join(dirpath, fname)
+                if not os.path.isfile(fpath):
+                    continue
+                if _isCorpusFile(fpath, formats):
+                    yield fpath, os.path.relpath(fpath, path)
+
+
+def _isCorpusFile(fpath, formats):
+    try:
+        if os.path.getsize(fpath) < 4:
+            return False
+        return viv_parsers.guessFormatFilename(fpath) in formats
+    except Exception as e:
+        logger.warning('Skipping %s: %s', fpath, e)
+        return False
+
+
+def getOutputName(fpath, relpath, outdir=None):
+    '''
+    Return the workspace file name to use for the given input file.
+    '''
+    if outdir is None:
+        return fpath + '.viv'
+    return os.path.join(outdir, relpath + '.viv')
+
+
+def isUpToDate(fpath, outname):
+    '''
+    Returns True if the workspace outname exists and is newer than fpath.
+    '''
+    try:
+        return os.path.getmtime(outname) >= os.path.getmtime(fpath)
+    except OSError:
+        return False
+
+
+def analyzeFile(fpath, outname, storage=None, options=(), confdir=None):
+    '''
+    Load, analyze and save a single file into its own workspace, returning
+    a summary dictionary of the per-phase timing and workspace stats.
+    '''
+    vw = vivisect.VivWorkspace(confdir=confdir)
+    for opt in options:
+        vw.config.parseConfigOption(opt)
+
+    if storage is not None:
+        vw.setMeta('StorageModule', storage)
+
+    rec = {'file': fpath, 'output': outname}
+
+    start = time.time()
+    vw.loadFromFile(fpath)
+    rec['load_time'] = time.time() - start
+
+    start = time.time()
+    vw.analyze()
+    rec['analyze_time'] = time.time() - start
+
+    outdir = os.path.dirname(outname)
+    if outdir and not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    # Save under a temporary name and move it into place once complete so
+    # a worker killed mid save can't leave a (newer) partial workspace
+    # which isUpToDate() would then skip forever.
+    start = time.time()
+    vw.setMeta('StorageName', outname)
+    tmpname = outname + '.tmp'
+    mod = vw.loadModule(vw.getMeta('StorageModule'))
+    mod.saveWorkspace(vw, tmpname)
+    if os.name == 'nt' and os.path.exists(outname):
+        os.unlink(outname)
+    os.rename(tmpname, outname)
+    rec['save_time'] = time.time() - start
+
+    rec['stats'] = vw.getStats()
+    rec['status'] = 'ok'
+    return rec
+
+
+def _corpusWorker(conn, fpath, outname, memlimit, storage, options, confdir):
+    # Runs in the child process for each input file
+    if memlimit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memlimit, memlimit))
+
+    try:
+        rec = analyzeFile(fpath, outname, storage=storage, options=options, confdir=confdir)
+
+    except MemoryError:
+        rec = {'file': fpath, 'output': outname, 'status': 'memory'}
+
+    except Exception:
+        rec = {'file': fpath, 'output': outname, 'status': 'error',
+               'error': traceback.format_exc()}
+
+    conn.send(rec)
+    conn.close()
+
+
+def analyzeCorpus(paths, jobs=None, timeout=None, memlimit=None, outdir=None,
+                  force=False, storage=None, options=(), confdir=None):
+    '''
+    Analyze every file found in paths (see walkCorpus) in parallel worker
+    processes, yielding a summary dictionary for each file as it finishes.
+
+    Arguments:
+        jobs     - Maximum number of worker processes (default: cpu count)
+        timeout  - Seconds after which a worker is killed (default: None)
+        memlimit - Address space limit in bytes for each worker (POSIX only)
+        outdir   - Directory to write workspaces into (default: next to input)
+        force    - Re-analyze even if the workspace is newer than the input
+        storage  - Storage module name for the saved workspaces
+        options  - A list of "<secname>.<optname>=<optval>" config options
+
+    Each summary contains at least "file", "output" and "status" (one of
+    ok/skipped/timeout/memory/error) and, when analysis succeeded, the
+    load/analyze/save times and the workspace getStats().
+    '''
+    if jobs is None:
+        jobs = multiprocessing.cpu_count()
+
+    todo = walkCorpus(paths)
+    running = {}
+
+    while True:
+
+        while len(running) < jobs:
+            try:
+                fpath, relpath = todo.next()
+            except StopIteration:
+                break
+
+            outname = getOutputName(fpath, relpath, outdir=outdir)
+            if not force and isUpToDate(fpath, outname):
+                yield {'file': fpath, 'output': outname, 'status': 'skipped'}
+                continue
+
+            pconn, cconn = multiprocessing.Pipe(False)
+            args = (cconn, fpath, outname, memlimit, storage, options, confdir)
+            proc = multiprocessing.Process(target=_corpusWorker, args=args)
+            proc.daemon = True
+            proc.start()
+            cconn.close()
+            running[proc] = (pconn, fpath, outname, time.time())
+
+        if not running:
+            break
+
+        time.sleep(0.05)
+
+        for proc, (pconn, fpath, outname, start) in running.items():
+            rec = None
+            if not pconn.poll() and proc.is_alive():
+                if timeout is None or time.time() - start < timeout:
+                    continue
+                proc.terminate()
+                rec = {'file': fpath, 'output': outname, 'status': 'timeout'}
+
+            elif pconn.poll():
+                try:
+                    rec = pconn.recv()
+                except EOFError:
+                    pass
+
+            if rec is None:
+                rec = {'file': fpath, 'output': outname, 'status': 'error',
+                       'error': 'worker exited (%r)' % proc.exitcode}
+
+            proc.join()
+            pconn.close()
+            running.pop(proc)
+
+            rec['elapsed'] = time.time() - start
+            yield rec
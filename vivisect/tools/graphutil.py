@@ -1,6 +1,9 @@
 
 '''
 Some glue code to do workspace related things based on visgraph
+
+(See vivisect.tools.pathengine to count, sample or lazily enumerate code
+paths without building visgraph path trees.)
 '''
 import time
 import envi
@@ -431,108 +434,33 @@ def getOpsFromPath(vw, fgraph, path):
 
 def buildFunctionGraph(vw, fva, revloop=False, g=None):
     '''
-    Build a visgraph HierGraph for the specified function.
+    Build a visgraph HierGraph for the specified function (from the
+    workspace's cached control flow graph, see vw.getFunctionCfg()).
     '''
 
     if g is None:
         g = vg_graphcore.HierGraph()
         g.setMeta('fva', fva)
 
+    cfg = vw.getFunctionCfg(fva)
     colors = vw.getFunctionMeta(fva, 'BlockColors', default={})
-    fcb = vw.getCodeBlock(fva)
-    if fcb is None:
-        t = (fva, vw.isFunction(fva))
-        raise Exception('Invalid initial code block for 0x%.8x isfunc: %s' % t)
-
-    todo = [ (fcb, []), ]
-
-    fcbva, fcbsize, fcbfunc = fcb
 
     # Add the root node...
-    bcolor = colors.get(fva, '#0f0')
-    g.addNode(nid=fva, rootnode=True, cbva=fva, cbsize=fcbsize, color=bcolor)
-
-    while todo:
-
-        (cbva, cbsize, cbfunc), path = todo.pop()
+    blocks = cfg.blocks
+    g.addNode(nid=fva, rootnode=True, cbva=fva, cbsize=cfg.sizes[0], color=colors.get(fva, '#0f0'))
 
-        path.append(cbva)
-
-        # If the code block va doesn't have a node yet, make one
+    for i in range(1, len(blocks)):
+        cbva = blocks[i]
+        # (the caller's graph may already have a node for it)
         if not g.hasNode(cbva):
-            bcolor = colors.get(cbva, '#0f0')
-            g.addNode(nid=cbva, cbva=cbva, cbsize=cbsize, color=bcolor)
-
-        # Grab the location for the last instruction in the block
-        nextva = cbva + cbsize - 1
-        loc = vw.getLocation(nextva)
-        if loc is None:
-            raise Exception("buildFunctionGraph: Attempt to get location at 0x%x" % nextva)
-
-        lva, lsize, ltype, linfo = loc
-
-        for xrfrom, xrto, xrtype, xrflags in vw.getXrefsFrom(lva, vivisect.REF_CODE):
-
-            # For now, the graph doesn't cross function boundaries
-            # or indirects.
-            if xrflags & xrskip:
-                continue
-
-            if not g.hasNode(xrto):
-                cblock = vw.getCodeBlock(xrto)
-                if cblock is None:
-                    logger.warning('CB is None in graph building?!?! (0x%x)', xrto)
-                    logger.warning('(fva: 0x%.8x cbva: 0x%.8x)', fva, xrto)
-                    continue
-
-                tova, tosize, tofunc = cblock
-                if tova != xrto:
-                    logger.warning('CBVA != XREFTO in graph building!?')
-                    logger.warning('(cbva: 0x%.8x xrto: 0x%.8x)', tova, xrto)
-                    continue
-
-                # Since we haven't seen this node, lets add it to todo
-                # and build a new node for it.
-                todo.append(((tova,tosize,tofunc), list(path)))
-                bcolor = colors.get(tova, '#0f0')
-                g.addNode(nid=tova, cbva=tova, cbsize=tosize, color=bcolor)
-
-            # If they want it, reverse "loop" edges (graph layout...)
-            if revloop and xrto in path:
-                g.addEdgeByNids(xrto, cbva, reverse=True)
-            else:
-                g.addEdgeByNids(cbva, xrto)
-
-        if ltype == vivisect.LOC_OP and linfo & envi.IF_NOFALL:
-            continue
-
-        # If this codeblock can fall through into another, add it to
-        # todo!
-        fallva = lva + lsize
-        if not g.hasNode(fallva):
-            fallblock = vw.getCodeBlock(fallva)
-            if fallblock is None:
-                logger.warning('FB is None in graph building!??!')
-                logger.warning('(fva: 0x%.8x  fallva: 0x%.8x', fva, fallva)
-            elif fallva != fallblock[0]:
-                logger.warning('FALLVA != CBVA in graph building!??!')
-                logger.warning('(fallva: 0x%.8x CBVA: 0x%.8x', fallva, fallblock[0])
-            else:
-                fbva, fbsize, fbfunc = fallblock
-                #if fbfunc != fva and fbva not in blocks:
-                #    continue
-
-                todo.append( ((fbva,fbsize,fbfunc), list(path)) )
-                bcolor = colors.get(fallva, '#0f0')
-                g.addNode(nid=fallva, cbva=fallva, cbsize=fbsize, color=bcolor)
-
-        # If we ended up with a destination node, make the edge
-        if g.hasNode(fallva):
-            # If they want it, reverse "loop" edges (graph layout...)
-            if revloop and fallva in path:
-                g.addEdgeByNids(fallva, cbva, reverse=True)
-            else:
-                g.addEdgeByNids(cbva, fallva)
+            g.addNode(nid=cbva, cbva=cbva, cbsize=cfg.sizes[i], color=colors.get(cbva, '#0f0'))
+
+    for (fidx, tidx), loop in zip(cfg.edges, cfg.loops):
+        # If they want it, reverse "loop" edges (graph layout...)
+        if revloop and loop:
+            g.addEdgeByNids(blocks[tidx], blocks[fidx], reverse=True)
+        else:
+            g.addEdgeByNids(blocks[fidx], blocks[tidx])
 
     return g
 
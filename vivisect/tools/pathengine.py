@@ -0,0 +1,447 @@
+'''
+Code path counting, enumeration and sampling over a function's compact
+control flow graph (see VivWorkspace.getFunctionCfg).
+
+Unlike the visgraph based path generators in vivisect.tools.graphutil,
+paths here are never built as trees of path nodes.  The graph's edges
+are split (by a depth first walk from the function entry) into forward
+edges and loop edges, which makes the graph of (block, loops taken)
+states acyclic.  Path counts are then computed by dynamic programming and
+paths are enumerated lazily (as tuples of code block vas) by a depth
+first walk which only follows states that still lead to a path.  Memory
+use is bounded by the size of the graph (times the loop bound) no matter
+how many paths there are.
+
+A path starts at the function entry (or fromva) and ends at a block with
+no successors (or each time it reaches tova) and may take at most loopcnt
+loop edges in total.  Parallel edges between two blocks count once.
+
+Example:
+    peng = getFunctionPathEngine(vw, fva, loopcnt=1)
+    print('%d paths' % peng.countPaths())
+    for path in peng.iterPaths(maxpath=10):
+        print(' -> '.join('0x%.8x' % cbva for cbva in path))
+'''
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def getFunctionPathEngine(vw, fva, loopcnt=0):
+    '''
+    Return a CodePathEngine for the function at fva.
+    '''
+    return CodePathEngine(vw.getFunctionCfg(fva), loopcnt=loopcnt)
+
+
+class CodePathEngine:
+
+    def __init__(self, cfg, loopcnt=0):
+        self.cfg = cfg
+        self.loopcnt = loopcnt
+        self.blocks = cfg.blocks
+
+        # successors of each block (without duplicates)
+        self.succs = []
+        for i in range(len(cfg.blocks)):
+            succs = []
+            for t in cfg.succ[cfg.succoff[i]:cfg.succoff[i+1]]:
+                if t not in succs:
+                    succs.append(t)
+            self.succs.append(succs)
+
+        self.leaves = [int(not succs) for succs in self.succs]
+        self._classifyEdges()
+
+        # (tova, thruva) -> count tables (see _getTables)
+        self._tables = {}
+
+    def _classifyEdges(self):
+        # Walk the graph depth first from the entry block (and then any
+        # blocks not reachable from it) marking edges back to a block on
+        # the current walk as loop edges.  The remaining forward edges are
+        # acyclic and the walk's post order is a reverse topological order.
+        bcnt = len(self.blocks)
+        self.fwd = [[] for i in range(bcnt)]
+        self.back = [[] for i in range(bcnt)]
+        self.order = []
+
+        state = [0 for i in range(bcnt)]    # 0 new, 1 walking, 2 done
+        for root in range(bcnt):
+            if state[root]:
+                continue
+
+            state[root] = 1
+            stack = [(root, iter(self.succs[root]))]
+            while stack:
+                i, succs = stack[-1]
+                for t in succs:
+                    if state[t] == 1:
+                        self.back[i].append(t)
+                        continue
+
+                    self.fwd[i].append(t)
+                    if state[t] == 0:
+                        state[t] = 1
+                        stack.append((t, iter(self.succs[t])))
+                        break
+                else:
+                    state[i] = 2
+                    self.order.append(i)
+                    stack.pop()
+
+    def _countPaths(self, term, stop=None, stopcnt=None):
+        # Return a list (per loops taken) of lists (per block) of the
+        # number of paths from each state.  A path may end at any block
+        # where term[i] is set, and paths end at the stop block (where the
+        # count is taken from stopcnt if specified).
+        loopcnt = self.loopcnt
+        bcnt = len(self.blocks)
+        fwd = self.fwd
+        back = self.back
+
+        cnts = [None for j in range(loopcnt + 1)]
+        for j in range(loopcnt, -1, -1):
+            cnt = [0 for i in range(bcnt)]
+            nextcnt = None
+            if j < loopcnt:
+                nextcnt = cnts[j + 1]
+
+            for i in self.order:
+                if i == stop:
+                    if stopcnt is not None:
+                        cnt[i] = stopcnt[j][i]
+                    else:
+                        cnt[i] = term[i]
+                    continue
+
+                tot = term[i]
+                for t in fwd[i]:
+                    tot += cnt[t]
+                if nextcnt is not None:
+                    for t in back[i]:
+                        tot += nextcnt[t]
+                cnt[i] = tot
+
+            cnts[j] = cnt
+
+        return cnts
+
+    def _getTables(self, tova=None, thruva=None):
+        # Return (cnts, term, stop) where cnts are the path counts used to
+        # walk paths, term flags blocks where paths end and paths which
+        # reach stop continue in the "from" tables of the thruva block.
+        key = (tova, thruva)
+        tables = self._tables.get(key)
+        if tables is not None:
+            return tables
+
+        if tova is None:
+            term = self.leaves
+        else:
+            tidx = self.cfg.blockidx[tova]
+            term = [int(i == tidx) for i in range(len(self.blocks))]
+
+        if thruva is None:
+            tables = (self._countPaths(term), term, None)
+
+        else:
+            # paths through thruva are the paths to its first visit which
+            # may be continued by any of the paths from there.
+            cnts, term, stop = self._getTables(tova=tova)
+            sidx = self.cfg.blockidx[thruva]
+            noterm = [0 for i in range(len(self.blocks))]
+            tables = (self._countPaths(noterm, stop=sidx, stopcnt=cnts), noterm, sidx)
+
+        self._tables[key] = tables
+        return tables
+
+    def _getStart(self, fromva):
+        if fromva is None:
+            return 0
+        return self.cfg.blockidx[fromva]
+
+    def _iterChildren(self, cnts, i, j):
+        # yield the (block, loops) states following state (i, j) which
+        # lead to at least one path
+        cnt = cnts[j]
+        for t in self.fwd[i]:
+            if cnt[t]:
+                yield t, j
+
+        if j < self.loopcnt:
+            cnt = cnts[j + 1]
+            for t in self.back[i]:
+                if cnt[t]:
+                    yield t, j + 1
+
+    def _iterPaths(self, start, j, cnts, term, stop=None):
+        # yield (path, loops) tuples where path is a list of block indexes
+        if not cnts[j][start]:
+            return
+
+        path = [start]
+        if term[start] or start == stop:
+            yield list(path), j
+            if start == stop:
+                return
+
+        todo = [self._iterChildren(cnts, start, j)]
+        while todo:
+            for t, tj in todo[-1]:
+                path.append(t)
+                if term[t] or t == stop:
+                    yield list(path), tj
+
+                if t == stop:
+                    path.pop()
+                    continue
+
+                todo.append(self._iterChildren(cnts, t, tj))
+                break
+
+            else:
+                todo.pop()
+                path.pop()
+
+    def _samplePath(self, start, j, cnts, term, stop, rand):
+        # pick a path (and its loops count) uniformly from those counted
+        i = start
+        path = [i]
+        while True:
+            if i == stop:
+                return path, j
+
+            r = rand.randrange(cnts[j][i])
+            if term[i]:
+                if r == 0:
+                    return path, j
+                r -= 1
+
+            for t, tj in self._iterChildren(cnts, i, j):
+                cnt = cnts[tj][t]
+                if r < cnt:
+                    break
+                r -= cnt
+
+            i = t
+            j = tj
+            path.append(i)
+
+    def countPaths(self, fromva=None, tova=None, thruva=None):
+        '''
+        Return the number of paths from the function entry (or fromva) to
+        its terminating blocks (or to each visit of tova) which optionally
+        pass through the block thruva.
+        '''
+        cnts = self._getTables(tova=tova, thruva=thruva)[0]
+        return cnts[0][self._getStart(fromva)]
+
+    def countPathsByLoopBound(self, fromva=None, tova=None, thruva=None):
+        '''
+        Like countPaths() but return a list of counts where the count at
+        index N is the number of paths which take at most N loop edges
+        (for N from 0 to loopcnt).
+        '''
+        cnts = self._getTables(tova=tova, thruva=thruva)[0]
+        start = self._getStart(fromva)
+        return [cnts[self.loopcnt - n][start] for n in range(self.loopcnt + 1)]
+
+    def iterPaths(self, fromva=None, tova=None, thruva=None, maxpath=None):
+        '''
+        Yield the paths counted by countPaths() (with the same arguments)
+        as tuples of code block vas.
+
+        Example:
+            for path in peng.iterPaths(tova=cbva, maxpath=100):
+                dostuff(path)
+        '''
+        blocks = self.blocks
+        cnts, term, stop = self._getTables(tova=tova, thruva=thruva)
+        start = self._getStart(fromva)
+
+        pathcnt = 0
+        for prefix, j in self._iterPaths(start, 0, cnts, term, stop):
+            if stop is None:
+                paths = (prefix,)
+            else:
+                # continue paths which reached thruva with every path from it
+                fcnts, fterm, fstop = self._getTables(tova=tova)
+                paths = (prefix + tpath[1:] for tpath, tj in self._iterPaths(stop, j, fcnts, fterm))
+
+            for path in paths:
+                yield tuple(blocks[i] for i in path)
+
+                pathcnt += 1
+                if maxpath is not None and pathcnt >= maxpath:
+                    return
+
+    def samplePaths(self, count, fromva=None, tova=None, thruva=None, rand=random):
+        '''
+        Return a list of count paths (as tuples of code block vas) chosen
+        uniformly at random (with replacement) from those counted by
+        countPaths() with the same arguments.  Specify rand (an instance
+        of random.Random) for reproducible samples.
+        '''
+        blocks = self.blocks
+        cnts, term, stop = self._getTables(tova=tova, thruva=thruva)
+        start = self._getStart(fromva)
+        if not cnts[0][start]:
+            return []
+
+        ret = []
+        for x in range(count):
+            path, j = self._samplePath(start, 0, cnts, term, stop, rand)
+            if stop is not None:
+                fcnts, fterm, fstop = self._getTables(tova=tova)
+                tpath, j = self._samplePath(stop, j, fcnts, fterm, None, rand)
+                path.extend(tpath[1:])
+
+            ret.append(tuple(blocks[i] for i in path))
+
+        return ret
+
+    def getCoveringPaths(self, edges=False):
+        '''
+        Return a minimal list of loop free paths (tuples of code block vas)
+        from the function entry to its terminating blocks which together
+        visit every block (or traverse every forward edge if edges=True)
+        that lies on any such path.
+        '''
+        bcnt = len(self.blocks)
+        fwd = self.fwd
+
+        # which blocks are on a loop free path from the entry to an exit
+        down = self._countPaths(self.leaves)[0] if self.loopcnt == 0 else self._loopFreeCounts()
+        reach = [False for i in range(bcnt)]
+        if not down[0]:
+            return []
+
+        reach[0] = True
+        for i in reversed(self.order):
+            if reach[i]:
+                for t in fwd[i]:
+                    reach[t] = True
+
+        live = [reach[i] and down[i] > 0 for i in range(bcnt)]
+
+        # Solve as a minimum flow with lower bounds where each block i is
+        # split into nodes 2i (in) and 2i+1 (out) with a source 2n and
+        # sink 2n+1 and every block (or edge) to cover has a lower bound
+        # of one.
+        src = 2 * bcnt
+        snk = src + 1
+        fedges = []     # [from, to, lower bound, flow]
+        outs = [[] for n in range(snk + 1)]
+        ins = [[] for n in range(snk + 1)]
+
+        def addEdge(a, b, lbound):
+            outs[a].append(len(fedges))
+            ins[b].append(len(fedges))
+            fedges.append([a, b, lbound, 0])
+
+        addEdge(src, 0, 0)
+        for i in range(bcnt):
+            if not live[i]:
+                continue
+            addEdge(2 * i, 2 * i + 1, int(not edges))
+            if self.leaves[i]:
+                addEdge(2 * i + 1, snk, 0)
+            for t in fwd[i]:
+                if live[t]:
+                    addEdge(2 * i + 1, 2 * t, int(edges))
+
+        # find a feasible flow by sending one unit along a path through
+        # each (not yet covered) edge with a lower bound.
+        parents = [None for n in range(snk + 1)]
+        for i in reversed(self.order):
+            for eidx in outs[2 * i + 1]:
+                t = fedges[eidx][1]
+                if t != snk and parents[t] is None:
+                    parents[t] = eidx
+            eidx = outs[2 * i][0] if live[i] else None
+            if eidx is not None:
+                parents[2 * i + 1] = eidx
+        parents[0] = 0
+
+        for eidx, (a, b, lbound, flow) in enumerate(fedges):
+            if flow >= lbound:
+                continue
+
+            # walk up to the source and down to the sink
+            path = [eidx]
+            node = a
+            while node != src:
+                pidx = parents[node]
+                path.append(pidx)
+                node = fedges[pidx][0]
+
+            # (every live block leads to an exit through live blocks)
+            node = b
+            while node != snk:
+                nidx = outs[node][0]
+                path.append(nidx)
+                node = fedges[nidx][1]
+
+            for pidx in path:
+                fedges[pidx][3] += 1
+
+        # reduce the flow along sink to source paths in the residual graph
+        while True:
+            prev = [None for n in range(snk + 1)]
+            prev[snk] = -1
+            todo = [snk]
+            while todo and prev[src] is None:
+                node = todo.pop()
+                for eidx in outs[node]:
+                    n = fedges[eidx][1]
+                    if prev[n] is None:
+                        prev[n] = (eidx, 1)
+                        todo.append(n)
+                for eidx in ins[node]:
+                    a, n, lbound, flow = fedges[eidx]
+                    if flow > lbound and prev[a] is None:
+                        prev[a] = (eidx, -1)
+                        todo.append(a)
+
+            if prev[src] is None:
+                break
+
+            path = []
+            node = src
+            while node != snk:
+                eidx, sign = prev[node]
+                path.append((eidx, sign))
+                node = fedges[eidx][0] if sign == 1 else fedges[eidx][1]
+
+            amount = min(fedges[eidx][3] - fedges[eidx][2] for eidx, sign in path if sign == -1)
+            for eidx, sign in path:
+                fedges[eidx][3] += sign * amount
+
+        # decompose the flow into paths
+        ret = []
+        blocks = self.blocks
+        while fedges[0][3]:
+            path = []
+            node = src
+            while node != snk:
+                for eidx in outs[node]:
+                    if fedges[eidx][3]:
+                        break
+                fedges[eidx][3] -= 1
+                node = fedges[eidx][1]
+                if node != snk and node % 2 == 0:
+                    path.append(blocks[node // 2])
+            ret.append(tuple(path))
+
+        return ret
+
+    def _loopFreeCounts(self):
+        # loop free path counts (to exits) for each block
+        tables = self._tables.get('loopfree')
+        if tables is None:
+            peng = CodePathEngine(self.cfg, loopcnt=0)
+            tables = peng._countPaths(peng.leaves)[0]
+            self._tables['loopfree'] = tables
+        return tables
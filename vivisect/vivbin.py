@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import imp
 import sys
+import json
 import time
 import cProfile
 import argparse
@@ -50,9 +51,28 @@ def main():
                         help='Path to a directory to use for config data')
     parser.add_argument('-a', '--autosave', dest='autosave', default=False, action='store_true',
                         help='Autosave configuration data')
+    parser.add_argument('-I', '--instrument', dest='instrument', default=None, action='store',
+                        help='Record per analysis module/function timing and dump it as JSON to this file (with -B)')
+    parser.add_argument('-R', '--corpus', dest='corpus', default=False, action='store_true',
+                        help='Bulk analyze each file (or every binary found in each directory) into its own workspace in parallel worker processes')
+    parser.add_argument('-j', '--jobs', dest='jobs', default=None, type=int, action='store',
+                        help='Number of corpus worker processes (default: cpu count)')
+    parser.add_argument('--timeout', dest='timeout', default=None, type=float, action='store',
+                        help='Kill corpus workers which take longer than this many seconds per file')
+    parser.add_argument('--memlimit', dest='memlimit', default=None, type=int, action='store',
+                        help='Limit each corpus worker to this many MB of address space')
+    parser.add_argument('--outdir', dest='outdir', default=None, action='store',
+                        help='Write corpus workspaces to this directory (default: next to each input)')
+    parser.add_argument('--force', dest='force', default=False, action='store_true',
+                        help='Re-analyze corpus inputs even if their workspace is up to date')
+    parser.add_argument('--summary', dest='summary', default=None, action='store',
+                        help='Write a JSON line per corpus input to this file (- for stdout)')
     parser.add_argument('file', nargs='*')
     args = parser.parse_args()
 
+    if args.corpus:
+        return corpus(args)
+
     vw = viv_cli.VivCli(confdir=args.config, autosave=args.autosave)
 
     # setup logging
@@ -103,6 +123,9 @@ def main():
             logger.info('Loaded (%.4f sec) %s', (end - start), fname)
 
     if args.bulk:
+        if args.instrument is not None:
+            vw.enableInstrumentation()
+
         if args.doanalyze:
             if args.cprof:
                 cProfile.run("vw.analyze()")
@@ -118,6 +141,9 @@ def main():
                 module.analyze(vw)
 
         logger.info('stats: %r', vw.getStats())
+        if args.instrument is not None:
+            vw.getInstrumentation().saveJson(args.instrument)
+
         logger.info("Saving workspace: %s", vw.getMeta('StorageName'))
 
         vw.saveWorkspace()
@@ -133,5 +159,48 @@ def main():
         viv_qt_main.main(vw)
 
 
+def corpus(args):
+    import vivisect.tools.corpus as viv_corpus
+
+    logger.setLevel(loglevels[min(args.verbose, 4)])
+
+    memlimit = None
+    if args.memlimit is not None:
+        memlimit = args.memlimit * 1024 * 1024
+
+    options = []
+    if args.option is not None:
+        options.append(args.option)
+
+    summary = None
+    if args.summary == '-':
+        summary = sys.stdout
+    elif args.summary is not None:
+        summary = open(args.summary, 'a')
+
+    counts = {}
+    try:
+        recs = viv_corpus.analyzeCorpus(args.file, jobs=args.jobs, timeout=args.timeout,
+                                        memlimit=memlimit, outdir=args.outdir, force=args.force,
+                                        storage=args.storage_name, options=options,
+                                        confdir=args.config)
+        for rec in recs:
+            status = rec.get('status')
+            counts[status] = counts.get(status, 0) + 1
+            logger.info('%s: %s (%.2f sec)', status, rec.get('file'), rec.get('elapsed', 0))
+            if status == 'error':
+                logger.warning('Error analyzing %s: %s', rec.get('file'), rec.get('error'))
+
+            if summary is not None:
+                summary.write(json.dumps(rec) + '\n')
+                summary.flush()
+
+    finally:
+        if summary not in (None, sys.stdout):
+            summary.close()
+
+    logger.info('corpus: %r', counts)
+
+
 if __name__ == '__main__':
     main()
@@ -104,6 +104,47 @@ class AccessViolation(Exception):
         self.perm = perm
         Exception.__init__(self, "AccessViolation at 0x%.8x (%d)" % (va, perm))
 
+class TraceMemoryCache(e_mem.MemoryCache):
+    """
+    A page cache over the memory of a (stopped) trace.  See the
+    "CacheMemory" mode.  The trace drops the cache whenever the target
+    runs and drops the pages it writes, so this cache is never dirty.
+    """
+    def __init__(self, trace, pagesize=4096):
+        e_mem.MemoryCache.__init__(self, trace, pagesize=pagesize)
+
+    def _cachePage(self, va):
+        # Only whole pages inside one memory map (where we know them)
+        if self.mem.getMemoryMaps():
+            mmap = self.mem.getMemoryMap(va)
+            if mmap is None or va + self.pagesize > mmap[0] + mmap[1]:
+                raise PlatformException('Partial page at 0x%.8x' % va)
+
+        page = self.mem.platformReadMemory(va, self.pagesize)
+        if len(page) != self.pagesize:
+            raise PlatformException('Short page read at 0x%.8x' % va)
+        return page
+
+    def readMemory(self, va, size):
+        try:
+            return e_mem.MemoryCache.readMemory(self, va, size)
+        except Exception:
+            # Part of the page(s) may not be readable, let the
+            # platform have a go at the exact range...
+            return self.mem.platformReadMemory(va, size)
+
+    def writeMemory(self, va, bytez):
+        raise Exception('TraceMemoryCache is read only (use Trace.writeMemory)')
+
+    def clearPages(self, va, size):
+        """
+        Drop any cached pages which overlap va:va+size.
+        """
+        pageva = va & self.pagemask
+        while pageva < va + size:
+            self.pagecache.pop(pageva, None)
+            pageva += self.pagesize
+
 class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, object):
     """
     The main tracer object.  A trace instance is dynamically generated using
@@ -134,6 +175,7 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         self.initMode("ThreadProxy", True, "Proxy necessary requests through a single thread (can deadlock...)")
         self.initMode("SingleStep", False, "All calls to run() actually just step.  This allows RunForever + SingleStep to step forever ;)")
         self.initMode("FastStep", False, "All stepi() will NOT generate a step event")
+        self.initMode("CacheMemory", False, "Cache memory reads by page while the target is stopped")
 
         self.regcache = None
         self.regcachedirty = False
@@ -257,6 +299,7 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         self.curbp = None
 
         self._syncRegs()
+        self.memcache = None
         self.platformStepi()
         event = self.platformWait()
         self.platformProcessEvent(event)
@@ -314,6 +357,7 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         self.attached = False
         self.pid = 0
         self.mapcache = None
+        self.memcache = None
 
     def release(self):
         '''
@@ -501,6 +545,7 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         """
         self.requireNotRunning()
         self.mapcache = None # We may have a new memory map
+        self.memcache = None
         return self.platformAllocateMemory(size, perms=perms, suggestaddr=suggestaddr)
 
     def protectMemory(self, va, size, perms):
@@ -516,8 +561,15 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         """
         Read memory from address.  Areas that are NOT valid memory will be read
         back as \x00s (this probably goes in a mixin soon)
+
+        In "CacheMemory" mode, reads are made (and cached) by the page until
+        the target runs again.
         """
         self.requireNotRunning()
+        if self.getMode("CacheMemory"):
+            if self.memcache is None:
+                self.memcache = TraceMemoryCache(self)
+            return self.memcache.readMemory(long(address), long(size))
         return self.platformReadMemory(long(address), long(size))
 
     def writeMemory(self, address, bytez):
@@ -525,6 +577,8 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         Write the given bytes to the address in the current trace.
         """
         self.requireNotRunning()
+        if self.memcache is not None:
+            self.memcache.clearPages(long(address), len(bytez))
         self.platformWriteMemory(long(address), bytez)
 
     def searchMemory(self, needle, regex=False):
@@ -545,6 +599,18 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         self.setVariable('search', ret)
         return ret
 
+    def searchMemoryMulti(self, needles, masks=None, ranges=None,
+                          chunksize=e_mem.SEARCH_CHUNK, overlap=e_mem.SEARCH_OVERLAP):
+        """
+        Search process memory for any of the given needles (reading each
+        memory map only once).  See envi.memory.IMemory.searchMemoryMulti.
+        """
+        ret = e_mem.IMemory.searchMemoryMulti(self, needles, masks=masks, ranges=ranges,
+                                              chunksize=chunksize, overlap=overlap)
+        self.setMeta('search', [va for needle, va in ret])
+        self.setVariable('search', ret)
+        return ret
+
     def setMeta(self, name, value):
         """
         Set some metadata.  Metadata is a clean way for
@@ -799,6 +865,7 @@ class Trace(e_mem.IMemory, e_reg.RegisterContext, e_resolv.SymbolResolver, objec
         platform may be able to interpret...
         """
         self.requireNotRunning()
+        self.memcache = None
         return self.platformCall(address, args, convention)
 
     def registerNotifier(self, event, notifier):
@@ -153,6 +153,18 @@ class Breakpoint:
             d['bp'] = self
             exec(cobj, None, d)
 
+def isPatchBreak(bp):
+    """
+    Returns True if the breakpoint uses the default activate()/deactivate()
+    (a break instruction patched into memory by the trace) which allows
+    the trace to patch it in/out in batches with other breakpoints.
+    """
+    return (getattr(bp.activate, '__func__', None) is _patch_activate and
+            getattr(bp.deactivate, '__func__', None) is _patch_deactivate)
+
+_patch_activate = getattr(Breakpoint.activate, '__func__', Breakpoint.activate)
+_patch_deactivate = getattr(Breakpoint.deactivate, '__func__', Breakpoint.deactivate)
+
 class TrackerBreak(Breakpoint):
     """
     A breakpoint which will record how many times it was hit
@@ -103,6 +103,9 @@ class TraceEmulator(vtrace.Trace, v_base.TracerBase):
         # We only support single step events now
         return True
 
+    def archGetBreakInstr(self):
+        return self.arch.archGetBreakInstr()
+
     def archGetRegCtx(self):
         return self.emu
 
@@ -137,6 +140,9 @@ class TraceEmulator(vtrace.Trace, v_base.TracerBase):
     def platformDetach(self):
         pass
 
+    def platformRelease(self):
+        pass
+
 
 def setup():
     ap = argparse.ArgumentParser('lockstep')
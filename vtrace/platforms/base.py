@@ -51,6 +51,7 @@ class TracerBase(vtrace.Notifier):
         self.attached = False
         # A cache for memory maps and fd listings
         self.mapcache = None
+        self.memcache = None    # See the CacheMemory mode
         self.thread = None  # our proxy thread...
         self.threadcache = None
         self.fds = None
@@ -61,6 +62,7 @@ class TracerBase(vtrace.Notifier):
         self._join_thread = None
         self._break_after_bp = True     # Do we stop on the instruction *after* the bp?
         self._bp_saved = {}             # Store the saved bytes from breakpoint mem writes
+        self._bp_batch_gap = 16         # Breaks this close (on a page) are patched in one write
 
         self.symcache = None            # Set by setSymCachePath()
         self.vsbuilder = vs_builder.VStructBuilder()
@@ -149,6 +151,7 @@ class TracerBase(vtrace.Notifier):
             self._activBreakpoints()
 
         self.runagain = False
+        self.memcache = None
         self._syncRegs()    # Must be basically last...
         self.platformContinue()
 
@@ -199,11 +202,23 @@ class TracerBase(vtrace.Notifier):
         Cleanup all breakpoints (if the current bp is "fastbreak" this routine
         will not be called...
         '''
+        batch = []
         for bp in self.breakpoints.itervalues():
-            if bp.active:
+            if not bp.active:
                 # only effects active breaks
+                continue
+
+            if vtrace.isPatchBreak(bp):
+                batch.append(bp)
+            else:
                 bp.deactivate(self)
 
+        if batch:
+            bps = dict((bp.address, bp) for bp in batch)
+            def cleared(addr):
+                bps[addr].active = False
+            self.archClearBreakpoints(list(bps.keys()), cb=cleared)
+
     def _activBreakpoints(self):
 
         """
@@ -221,10 +236,22 @@ class TracerBase(vtrace.Notifier):
                 self.deferred.remove(bp)
                 self.breakpoints[addr] = bp
 
+        batch = []
         for bp in self.breakpoints.values():
-            if bp.isEnabled():
+            if not bp.isEnabled():
+                continue
+
+            if not bp.active and vtrace.isPatchBreak(bp):
+                batch.append(bp)
+            else:
                 bp.activate(self)
 
+        if batch:
+            bps = dict((bp.address, bp) for bp in batch)
+            def activated(addr):
+                bps[addr].active = True
+            self.archActivBreakpoints(list(bps.keys()), cb=activated)
+
     def _syncRegs(self):
         """
         Sync the reg-cache into the target process
@@ -473,6 +500,7 @@ class TracerBase(vtrace.Notifier):
         '''
         self.threadcache = None
         self.mapcache = None
+        self.memcache = None
         self.fds = None
         self.running = False
 
@@ -731,13 +759,102 @@ class TracerBase(vtrace.Notifier):
         to memory ( and saves off the old bytes ).
         '''
         b = self.archGetBreakInstr()
-        self._bp_saved[ addr ] = self.readMemory( addr, len(b) )
+        saved = self.readMemory( addr, len(b) )
         self.writeMemory( addr, b )
+        self._bp_saved[ addr ] = saved
 
     def archClearBreakpoint(self, addr):
         b = self._bp_saved.pop( addr )
         self.writeMemory( addr, b )
 
+    def _isDefaultBreakPatch(self):
+        # Platforms which override archActivBreakpoint() (eg. gdb stub
+        # "Z0" breaks) don't patch memory and get no batching.
+        return (getattr(self.archActivBreakpoint, '__func__', None) is _default_activ and
+                getattr(self.archClearBreakpoint, '__func__', None) is _default_clear)
+
+    def archActivBreakpoints(self, addrs, cb=None):
+        '''
+        Activate the breakpoints at each of the given addresses.  With the
+        default archActivBreakpoint() the breakpoints are grouped by page
+        into runs of nearby breakpoints (see _bp_batch_gap) and each run
+        is patched with one read and one write.
+
+        If specified, cb(addr) is called as each breakpoint is written (so
+        a failure part way through leaves the earlier ones marked active).
+        '''
+        def activ(addr):
+            self.archActivBreakpoint(addr)
+            if cb is not None:
+                cb(addr)
+
+        if not self._isDefaultBreakPatch():
+            for addr in addrs:
+                activ(addr)
+            return
+
+        b = self.archGetBreakInstr()
+        blen = len(b)
+        for runva, runsize, raddrs in getBreakRuns(addrs, blen, self._bp_batch_gap):
+            try:
+                run = self.readMemory(runva, runsize)
+                patched = bytearray(run)
+                for addr in raddrs:
+                    off = addr - runva
+                    patched[off:off + blen] = b
+                self.writeMemory(runva, str(patched))
+
+            except Exception:
+                # (one at a time, to find the one(s) which fail)
+                for addr in raddrs:
+                    activ(addr)
+                continue
+
+            for addr in raddrs:
+                off = addr - runva
+                self._bp_saved[addr] = run[off:off + blen]
+                if cb is not None:
+                    cb(addr)
+
+    def archClearBreakpoints(self, addrs, cb=None):
+        '''
+        Clear the (active) breakpoints at each of the given addresses.
+        See archActivBreakpoints().
+        '''
+        def clear(addr):
+            self.archClearBreakpoint(addr)
+            if cb is not None:
+                cb(addr)
+
+        if not self._isDefaultBreakPatch():
+            for addr in addrs:
+                clear(addr)
+            return
+
+        blen = len(self.archGetBreakInstr())
+        for runva, runsize, raddrs in getBreakRuns(addrs, blen, self._bp_batch_gap):
+            if len(raddrs) == 1:
+                clear(raddrs[0])
+                continue
+
+            try:
+                run = bytearray(self.readMemory(runva, runsize))
+                for addr in raddrs:
+                    saved = self._bp_saved[addr]
+                    off = addr - runva
+                    run[off:off + len(saved)] = saved
+                self.writeMemory(runva, str(run))
+
+            except Exception:
+                for addr in raddrs:
+                    clear(addr)
+                continue
+
+            for addr in raddrs:
+                self._bp_saved.pop(addr)
+                if cb is not None:
+                    cb(addr)
+
     def archGetRegCtx(self):
         """
         Return a new empty envi.registers.RegisterContext object for this
@@ -875,6 +992,34 @@ class TracerBase(vtrace.Notifier):
         '''
         pass
 
+_default_activ = getattr(TracerBase.archActivBreakpoint, '__func__', TracerBase.archActivBreakpoint)
+_default_clear = getattr(TracerBase.archClearBreakpoint, '__func__', TracerBase.archClearBreakpoint)
+
+def getBreakRuns(addrs, blen, maxgap, pagesize=4096):
+    '''
+    Group breakpoint addresses for batched patching.  Returns a list of
+    (runva, runsize, addrs) tuples where each run covers the (blen sized)
+    break instructions at addrs which are on the same page and no more
+    than maxgap bytes apart.
+    '''
+    ret = []
+    raddrs = None
+    for addr in sorted(addrs):
+        if raddrs is not None:
+            if addr - runmax <= maxgap and (addr & ~(pagesize - 1)) == (runva & ~(pagesize - 1)):
+                raddrs.append(addr)
+                runmax = max(runmax, addr + blen)
+                continue
+            ret.append((runva, runmax - runva, raddrs))
+
+        runva = addr
+        runmax = addr + blen
+        raddrs = [addr]
+
+    if raddrs is not None:
+        ret.append((runva, runmax - runva, raddrs))
+    return ret
+
 def threadwrap(func):
     def trfunc(self, *args, **kwargs):
         if threading.currentThread().__class__ == TracerThread:
@@ -0,0 +1,132 @@
+import binascii
+import unittest
+
+import envi.memory as e_mem
+import vivisect
+import vtrace
+import vtrace.envitools as v_envitools
+import vtrace.platforms.base as v_base
+
+# xor eax,eax; test edi,edi; jz +3; inc eax; nop; dec edi; jnz -11; ret
+code = binascii.unhexlify('31c085ff7403ffc090ffcf75f5c3') * 0x200
+
+
+class CountingTrace(v_envitools.TraceEmulator):
+
+    def __init__(self, emu):
+        v_envitools.TraceEmulator.__init__(self, emu)
+        self.reads = 0
+        self.writes = 0
+        self.badva = None   # writes which include this va fail
+
+    def platformReadMemory(self, va, size):
+        self.reads += 1
+        return v_envitools.TraceEmulator.platformReadMemory(self, va, size)
+
+    def platformWriteMemory(self, va, bytez):
+        if self.badva is not None and va <= self.badva < va + len(bytez):
+            raise Exception('write failed at 0x%.8x' % self.badva)
+        self.writes += 1
+        return v_envitools.TraceEmulator.platformWriteMemory(self, va, bytez)
+
+
+class TraceMemoryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        vw = vivisect.VivWorkspace()
+        vw.setMeta('Architecture', 'amd64')
+        vw.setMeta('Platform', 'linux')
+        vw.addMemoryMap(0x1000, e_mem.MM_RWX, 'test', code)
+        self.trace = CountingTrace(vw.getEmulator())
+
+    def tearDown(self):
+        self.trace.release()
+
+    def test_vtrace_memcache(self):
+        trace = self.trace
+        trace.setMode('CacheMemory', True)
+
+        self.assertEqual(trace.readMemory(0x1004, 2), '\x74\x03')
+        for va in range(0x1000, 0x1100):
+            trace.parseOpcode(va)
+        self.assertEqual(trace.reads, 1)
+
+        # writes go through and drop the page
+        trace.writeMemory(0x1004, '\x90\x90')
+        self.assertEqual(trace.writes, 1)
+        self.assertEqual(trace.readMemory(0x1003, 4), '\xff\x90\x90\xff')
+        self.assertEqual(trace.reads, 2)
+
+        # reads which straddle the end of memory skip the cache
+        self.assertEqual(trace.readMemory(0x1000 + len(code) - 2, 2), '\xf5\xc3')
+        self.assertEqual(trace.reads, 3)
+
+        # stepping drops the cache
+        trace.setProgramCounter(0x1000)
+        trace.stepi()
+        trace.readMemory(0x1000, 1)
+        self.assertEqual(trace.reads, 4)
+
+        trace.setMode('CacheMemory', False)
+        trace.readMemory(0x1000, 1)
+        trace.readMemory(0x1000, 1)
+        self.assertEqual(trace.reads, 6)
+
+    def test_vtrace_batchbreaks(self):
+        trace = self.trace
+        addrs = (0x1000, 0x1006, 0x1009, 0x100d, 0x1100, 0x1ffe, 0x2001)
+        for va in addrs:
+            trace.addBreakpoint(vtrace.Breakpoint(va))
+
+        orig = trace.readMemory(0x1000, 0x1100)
+        trace.reads = 0
+        trace._activBreakpoints()
+        self.assertEqual((trace.reads, trace.writes), (4, 4))
+
+        mem = trace.readMemory(0x1000, 0x1100)
+        diffs = [0x1000 + i for i in range(len(mem)) if mem[i] != orig[i]]
+        self.assertEqual(tuple(diffs), addrs)
+        self.assertEqual(mem[6], '\xcc')
+        self.assertTrue(all([bp.active for bp in trace.getBreakpoints()]))
+
+        trace._clearBreakpoints()
+        self.assertEqual(trace.readMemory(0x1000, 0x1100), orig)
+        self.assertEqual(trace._bp_saved, {})
+        self.assertFalse(any([bp.active for bp in trace.getBreakpoints()]))
+
+    def test_vtrace_batchbreaks_fail(self):
+        trace = self.trace
+        addrs = (0x1000, 0x1006, 0x1100, 0x1ffe, 0x2001)
+        for va in addrs:
+            trace.addBreakpoint(vtrace.Breakpoint(va))
+
+        orig = trace.readMemory(0x1000, 0x1100)
+        trace.badva = 0x1100
+        self.assertRaises(Exception, trace._activBreakpoints)
+
+        # the breakpoints written before the failure are active (and saved)
+        active = sorted([bp.address for bp in trace.getBreakpoints() if bp.active])
+        self.assertEqual(active, [0x1000, 0x1006])
+        self.assertEqual(sorted(trace._bp_saved.keys()), active)
+
+        trace._clearBreakpoints()
+        self.assertEqual(trace.readMemory(0x1000, 0x1100), orig)
+        self.assertEqual(trace._bp_saved, {})
+
+        trace.badva = None
+        trace._activBreakpoints()
+        self.assertTrue(all([bp.active for bp in trace.getBreakpoints()]))
+        self.assertEqual(trace.readMemory(0x1006, 1), '\xcc')
+
+        trace._clearBreakpoints()
+        self.assertEqual(trace.readMemory(0x1000, 0x1100), orig)
+        self.assertEqual(trace._bp_saved, {})
+
+    def test_vtrace_breakruns(self):
+        runs = v_base.getBreakRuns([0x2001, 0x1000, 0x1006, 0x1040, 0x1ffe], 1, 16)
+        self.assertEqual(runs, [
+            (0x1000, 7, [0x1000, 0x1006]),
+            (0x1040, 1, [0x1040]),
+            (0x1ffe, 1, [0x1ffe]),
+            (0x2001, 1, [0x2001]),
+        ])